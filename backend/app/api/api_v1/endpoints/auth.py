@@ -343,7 +343,7 @@ async def logout(
                 expires_at = payload.get("exp")
                 
                 # 将令牌添加到黑名单
-                add_to_blacklist(token, expires_at)
+                await add_to_blacklist(token, expires_at)
                 logger.info(f"用户 {current_user_id} 已登出，令牌已加入黑名单")
             except Exception as e:
                 logger.warning(f"无法解析令牌添加到黑名单: {str(e)}")
@@ -426,7 +426,7 @@ async def refresh_token(
             )
         
         # 验证刷新令牌
-        token_data = security_manager.verify_token(token, "refresh")
+        token_data = await security_manager.verify_token_async(token, "refresh")
         if not token_data:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -525,7 +525,7 @@ async def verify_token(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="缺少令牌参数"
             )
-        token_data = security_manager.verify_token(token)
+        token_data = await security_manager.verify_token_async(token)
         if not token_data:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -3,6 +3,7 @@ BGP管理API端点
 """
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func
 from sqlalchemy.future import select
 from typing import Dict, Any, List
 
@@ -28,6 +29,11 @@ try:
 except ImportError:
     ExaBGPService = None
 
+try:
+    from ...services.bgp_session_state import bgp_session_tracker
+except ImportError:
+    bgp_session_tracker = None
+
 
 @router.get("/sessions", response_model=None)
 async def get_bgp_sessions(db: AsyncSession = Depends(get_db)):
@@ -254,6 +260,57 @@ async def get_bgp_routes(db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"获取BGP路由失败: {str(e)}")
 
 
+async def _push_route(route_id: int, announce: bool, db: AsyncSession) -> Dict[str, Any]:
+    if BGPAnnouncement is None or ExaBGPService is None:
+        raise HTTPException(status_code=503, detail="BGP路由功能未启用")
+    
+    result = await db.execute(select(BGPAnnouncement).where(BGPAnnouncement.id == route_id))
+    announcement = result.scalars().first()
+    if not announcement:
+        raise HTTPException(status_code=404, detail="BGP路由不存在")
+    
+    announcement.is_active = announce
+    await db.commit()
+    
+    # 进程API可用时只下发这一条路由，不重写配置、不影响会话
+    outcome = await ExaBGPService(db).push_route(
+        announcement.prefix, getattr(announcement, "next_hop", None), announce=announce
+    )
+    if not outcome["success"]:
+        raise HTTPException(status_code=502, detail="下发到ExaBGP失败")
+    return {
+        "id": announcement.id,
+        "prefix": announcement.prefix,
+        "enabled": announce,
+        "method": outcome["method"],
+        "message": "BGP路由已宣告" if announce else "BGP路由已撤销"
+    }
+
+
+@router.post("/routes/{route_id}/announce", response_model=None)
+async def announce_bgp_route(route_id: int, db: AsyncSession = Depends(get_db)):
+    """宣告单条BGP路由（增量）"""
+    try:
+        return await _push_route(route_id, True, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"宣告BGP路由失败: {str(e)}")
+
+
+@router.post("/routes/{route_id}/withdraw", response_model=None)
+async def withdraw_bgp_route(route_id: int, db: AsyncSession = Depends(get_db)):
+    """撤销单条BGP路由（增量）"""
+    try:
+        return await _push_route(route_id, False, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"撤销BGP路由失败: {str(e)}")
+
+
 @router.get("/status", response_model=None)
 async def get_bgp_status(db: AsyncSession = Depends(get_db)):
     """获取BGP服务状态"""
@@ -261,8 +318,8 @@ async def get_bgp_status(db: AsyncSession = Depends(get_db)):
         return {
             "service_status": "disabled",
             "sessions_count": 0,
+            "established_sessions": 0,
             "routes_count": 0,
-            "enabled_sessions": 0,
             "enabled_routes": 0,
             "message": "BGP功能未启用"
         }
@@ -271,19 +328,25 @@ async def get_bgp_status(db: AsyncSession = Depends(get_db)):
         exabgp_service = ExaBGPService(db)
         status = await exabgp_service.get_status()
         
-        # 获取会话和路由统计
-        sessions_result = await db.execute(select(BGPSession))
-        sessions = sessions_result.scalars().all()
+        # 会话状态来自ExaBGP事件维护的内存状态，不查询会话表
+        summary = bgp_session_tracker.summary() if bgp_session_tracker is not None else {}
         
-        routes_result = await db.execute(select(BGPAnnouncement))
-        routes = routes_result.scalars().all()
+        # 路由统计
+        routes_count = await db.scalar(select(func.count()).select_from(BGPAnnouncement))
+        enabled_routes = await db.scalar(
+            select(func.count()).select_from(BGPAnnouncement).where(BGPAnnouncement.is_active.is_(True))
+        )
         
         return {
             "service_status": status,
-            "sessions_count": len(sessions),
-            "routes_count": len(routes),
-            "enabled_sessions": len([s for s in sessions if s.is_enabled]),
-            "enabled_routes": len([r for r in routes if r.is_active]),
+            "sessions_count": summary.get("peers", 0),
+            "established_sessions": summary.get("established", 0),
+            "sessions_by_status": summary.get("by_status", {}),
+            "prefixes_received": summary.get("prefixes_received", 0),
+            "prefixes_sent": summary.get("prefixes_sent", 0),
+            "sessions": bgp_session_tracker.snapshot() if bgp_session_tracker is not None else [],
+            "routes_count": routes_count or 0,
+            "enabled_routes": enabled_routes or 0,
             "message": "BGP状态获取成功"
         }
     except Exception as e:
@@ -1,18 +1,19 @@
 """
 日志管理API端点
 """
-import os
-import glob
-import json
-from datetime import datetime
+import asyncio
+from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 
-from ...core.database import get_db
-from ...core.logging import get_logger
+from ....core.database import get_db
+from ....core.logging import get_logger
+from ....core.database_manager import database_manager
+from ....core.log_store import log_store
+from ....core.log_export import ExportEncoder, encode_records, parse_cursor as parse_export_cursor
 
 router = APIRouter()
 
@@ -43,6 +44,50 @@ class LogDetailResponse(BaseModel):
     log: LogEntry
 
 
+# 应用日志 CSV 导出列
+APP_EXPORT_COLUMNS = ["id", "timestamp", "level", "service", "message", "module", "function", "line", "request_id"]
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无效的时间: {value}")
+
+
+def _page_response(result, page: int, size: int) -> Dict[str, Any]:
+    return {
+        "items": result.items,
+        "total": result.total,
+        "page": page,
+        "size": size,
+        "pages": (result.total + size - 1) // size,
+        "next_cursor": result.next_cursor,
+    }
+
+
+async def _query_logs(query: Optional[str], page: int, size: int, level: Optional[str],
+                      service: Optional[str], start_time: Optional[str], end_time: Optional[str],
+                      cursor: Optional[str]):
+    """在线程中执行日志查询；指定 cursor 时忽略 page，按游标继续翻页"""
+    try:
+        return await asyncio.to_thread(
+            log_store.query,
+            text=query,
+            level=level,
+            service=service,
+            start_time=start_time,
+            end_time=end_time,
+            limit=size,
+            offset=0 if cursor else (page - 1) * size,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("")
 async def get_logs(
     page: int = Query(1, ge=1, description="页码"),
@@ -50,89 +95,19 @@ async def get_logs(
     level: Optional[str] = Query(None, description="日志级别"),
     service: Optional[str] = Query(None, description="服务名称"),
     start_time: Optional[str] = Query(None, description="开始时间"),
-    end_time: Optional[str] = Query(None, description="结束时间")
+    end_time: Optional[str] = Query(None, description="结束时间"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor")
 ):
     """获取日志列表"""
     try:
-        # 模拟日志数据
-        logs = [
-            {
-                "id": "log-1",
-                "timestamp": datetime.now().isoformat(),
-                "level": "INFO",
-                "service": "api",
-                "message": "API请求成功",
-                "details": {
-                    "request_id": "req-123",
-                    "user_id": "user-456",
-                    "ip": "192.168.1.1"
-                }
-            },
-            {
-                "id": "log-2",
-                "timestamp": datetime.now().isoformat(),
-                "level": "ERROR",
-                "service": "database",
-                "message": "数据库连接失败",
-                "details": {
-                    "error": "Connection timeout",
-                    "retry_count": 3
-                }
-            }
-        ]
-        
-        # 应用过滤条件
-        filtered_logs = logs
-        if level:
-            filtered_logs = [log for log in filtered_logs if log["level"] == level]
-        if service:
-            filtered_logs = [log for log in filtered_logs if log["service"] == service]
-            
-        # 分页
-        total = len(filtered_logs)
-        start_idx = (page - 1) * size
-        end_idx = start_idx + size
-        paginated_logs = filtered_logs[start_idx:end_idx]
-        
-        return {
-            "items": paginated_logs,
-            "total": total,
-            "page": page,
-            "size": size,
-            "pages": (total + size - 1) // size
-        }
+        result = await _query_logs(None, page, size, level, service, start_time, end_time, cursor)
+        return _page_response(result, page, size)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get logs: {str(e)}")
 
 
-@router.get("/{log_id}")
-async def get_log(log_id: str):
-    """获取单个日志"""
-    try:
-        # 模拟获取单个日志
-        log = {
-            "id": log_id,
-            "timestamp": datetime.now().isoformat(),
-            "level": "INFO",
-            "service": "api",
-            "message": "API请求成功",
-            "details": {
-                "request_id": "req-123",
-                "user_id": "user-456",
-                "ip": "192.168.1.1",
-                "user_agent": "Mozilla/5.0",
-                "request_path": "/api/v1/users",
-                "method": "GET",
-                "status_code": 200,
-                "response_time": 120
-            }
-        }
-        
-        return JSONResponse(content=log)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get log: {str(e)}")
-
-
 @router.delete("/{log_id}")
 async def delete_log(log_id: str):
     """删除日志"""
@@ -170,6 +145,8 @@ async def clear_logs(
 async def logs_health_check():
     """日志服务健康检查"""
     try:
+        stats = log_store.get_stats()
+        last_log_time = stats["last_log_time"]
         return {
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
@@ -177,8 +154,12 @@ async def logs_health_check():
             "details": {
                 "storage": "available",
                 "search_index": "available",
-                "total_logs": 12345,
-                "last_log_time": datetime.now().isoformat()
+                "total_logs": stats["total_logs"],
+                "segments": stats["segments"],
+                "last_log_time": (
+                    datetime.fromtimestamp(last_log_time, timezone.utc).isoformat()
+                    if last_log_time is not None else None
+                )
             }
         }
     except Exception as e:
@@ -192,115 +173,75 @@ async def search_logs(
     level: Optional[str] = Query(None, description="日志级别"),
     service: Optional[str] = Query(None, description="服务名称"),
     start_time: Optional[str] = Query(None, description="开始时间"),
-    end_time: Optional[str] = Query(None, description="结束时间")
+    end_time: Optional[str] = Query(None, description="结束时间"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor")
 ):
-    """搜索日志"""
+    """搜索日志（按词元匹配，多个词之间为 AND）"""
     try:
-        # 模拟日志数据
-        logs = [
-            {
-                "id": "log-1",
-                "timestamp": datetime.now().isoformat(),
-                "level": "INFO",
-                "service": "api",
-                "message": "API请求成功",
-                "details": {
-                    "request_id": "req-123",
-                    "user_id": "user-456",
-                    "ip": "192.168.1.1"
-                }
-            },
-            {
-                "id": "log-2",
-                "timestamp": datetime.now().isoformat(),
-                "level": "ERROR",
-                "service": "database",
-                "message": "数据库连接失败",
-                "details": {
-                    "error": "Connection timeout",
-                    "retry_count": 3
-                }
-            }
-        ]
-        
-        # 搜索过滤
-        filtered_logs = [
-            log for log in logs 
-            if query.lower() in log["message"].lower() or 
-               query.lower() in log["service"].lower()
-        ]
-        
-        # 应用其他过滤条件
-        if level:
-            filtered_logs = [log for log in filtered_logs if log["level"] == level]
-        if service:
-            filtered_logs = [log for log in filtered_logs if log["service"] == service]
-            
-        # 分页
-        total = len(filtered_logs)
-        start_idx = (page - 1) * size
-        end_idx = start_idx + size
-        paginated_logs = filtered_logs[start_idx:end_idx]
-        
-        return {
-            "items": paginated_logs,
-            "total": total,
-            "page": page,
-            "size": size,
-            "pages": (total + size - 1) // size,
-            "query": query
-        }
+        result = await _query_logs(query, page, size, level, service, start_time, end_time, cursor)
+        response = _page_response(result, page, size)
+        response["query"] = query
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to search logs: {str(e)}")
 
 @router.get("/export")
 async def export_logs(
-    format: str = Query("json", description="导出格式"),
+    format: str = Query("json", description="导出格式: json / ndjson / csv"),
+    source: str = Query("app", description="日志来源: app（应用日志）/ audit / operation / all（数据库日志）"),
+    compress: bool = Query(False, description="是否gzip压缩"),
     level: Optional[str] = Query(None, description="日志级别"),
     service: Optional[str] = Query(None, description="服务名称"),
     start_time: Optional[str] = Query(None, description="开始时间"),
-    end_time: Optional[str] = Query(None, description="结束时间")
+    end_time: Optional[str] = Query(None, description="结束时间"),
+    cursor: Optional[str] = Query(None, description="续传游标：上次导出最后一条记录的 id（应用日志）或 cursor（数据库日志）")
 ):
-    """导出日志"""
+    """流式导出日志，不限制条数，内存占用与导出范围无关"""
     try:
-        # 模拟导出日志
-        logs = [
-            {
-                "id": "log-1",
-                "timestamp": datetime.now().isoformat(),
-                "level": "INFO",
-                "service": "api",
-                "message": "API请求成功",
-                "details": {
-                    "request_id": "req-123",
-                    "user_id": "user-456",
-                    "ip": "192.168.1.1"
-                }
-            }
-        ]
-        
-        # 应用过滤条件
-        filtered_logs = logs
-        if level:
-            filtered_logs = [log for log in filtered_logs if log["level"] == level]
-        if service:
-            filtered_logs = [log for log in filtered_logs if log["service"] == service]
-            
-        # 根据格式返回数据
-        if format == "csv":
-            # 简化的CSV导出
-            csv_data = "id,timestamp,level,service,message\n"
-            for log in filtered_logs:
-                csv_data += f"{log['id']},{log['timestamp']},{log['level']},{log['service']},{log['message']}\n"
-            
-            return Response(
-                content=csv_data,
-                media_type="text/csv",
-                headers={"Content-Disposition": "attachment; filename=logs.csv"}
+        if source == "app":
+            encoder = ExportEncoder(format, columns=APP_EXPORT_COLUMNS, compress=compress)
+            if cursor:
+                log_store.parse_cursor(cursor)
+            # 同步生成器由 StreamingResponse 在线程池中迭代
+            chunks = encode_records(
+                log_store.scan(level=level, service=service, start_time=start_time,
+                               end_time=end_time, after=cursor),
+                encoder,
             )
+        elif source in ("audit", "operation", "all"):
+            from ....services.monitoring_service import MonitoringService, EXPORT_SOURCES, EXPORT_COLUMNS
+
+            start_dt = _parse_datetime(start_time)
+            end_dt = _parse_datetime(end_time)
+            if cursor:
+                parse_export_cursor(cursor, [name for name in EXPORT_SOURCES if source in ("all", name)])
+            # 用于校验参数和生成响应头，实际编码在 MonitoringService.export_logs 中进行
+            encoder = ExportEncoder(format, columns=EXPORT_COLUMNS, compress=compress)
+
+            async def db_chunks():
+                # 会话随响应流的生命周期打开和关闭，不依赖请求作用域的依赖项
+                async with database_manager.async_session_factory() as db:
+                    async for chunk in MonitoringService(db).export_logs(
+                        start_time=start_dt, end_time=end_dt, log_type=source,
+                        format=format, compress=compress, cursor=cursor
+                    ):
+                        yield chunk
+
+            chunks = db_chunks()
         else:
-            # JSON格式
-            return JSONResponse(content=filtered_logs)
+            raise HTTPException(status_code=400, detail=f"不支持的日志来源: {source}")
+
+        return StreamingResponse(
+            chunks,
+            media_type=encoder.media_type,
+            headers={"Content-Disposition": f"attachment; filename={encoder.filename('logs')}"}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to export logs: {str(e)}")
 
@@ -331,7 +272,25 @@ async def get_log_services():
             {"value": "auth", "label": "认证服务"},
             {"value": "monitoring", "label": "监控服务"}
         ]
+        # 追加日志存储中实际出现的服务（未指定 service 字段时为日志器名称）
+        known = {item["value"] for item in services}
+        services.extend(
+            {"value": name, "label": name} for name in log_store.services() if name not in known
+        )
         
         return JSONResponse(content=services)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get log services: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get log services: {str(e)}")
+
+@router.get("/{log_id}")
+async def get_log(log_id: str):
+    """获取单个日志（需在静态路径之后注册，避免遮蔽 /search、/export 等）"""
+    try:
+        log = await asyncio.to_thread(log_store.get, log_id)
+        if log is None:
+            raise HTTPException(status_code=404, detail=f"日志 {log_id} 不存在")
+        return JSONResponse(content=log)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get log: {str(e)}")
@@ -492,6 +492,18 @@ async def get_performance_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get performance stats: {str(e)}")
 
+@router.get("/commands", response_model=None)
+async def get_command_stats():
+    """获取系统命令执行统计（按命令的调用次数、失败、超时、缓存命中与耗时）"""
+    try:
+        from ...core.command_executor import command_executor
+        return JSONResponse(content={
+            "commands": command_executor.get_stats(),
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get command stats: {str(e)}")
+
 @router.post("/metrics/collect", response_model=None)
 async def collect_metrics_now():
     """立即收集指标"""
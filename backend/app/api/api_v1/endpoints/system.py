@@ -14,6 +14,7 @@ from pydantic import BaseModel
 from ...core.database import get_db
 from ...core.response_handler import ResponseHandler
 from ...core.logging import get_logger
+from ...core.system_sampler import system_sampler
 
 # 简化的模式，避免依赖不存在的模块
 try:
@@ -43,6 +44,7 @@ class SystemInfo(BaseModel):
     boot_time: str
     uptime: str
     python_version: str
+    staleness: float = 0.0
 
 
 class ProcessInfo(BaseModel):
@@ -66,27 +68,30 @@ async def get_system_info():
     })
     
     try:
-        # 获取系统信息
+        # 获取系统信息（资源指标来自后台采样器的最新快照）
+        sample = await system_sampler.latest()
+        boot_time = datetime.fromtimestamp(system_sampler.boot_time)
         system_info = {
             "platform": platform.system(),
             "platform_version": platform.version(),
             "architecture": platform.architecture()[0],
             "hostname": socket.gethostname(),
-            "cpu_count": psutil.cpu_count(),
-            "cpu_usage": psutil.cpu_percent(interval=1),
-            "memory_total": psutil.virtual_memory().total,
-            "memory_available": psutil.virtual_memory().available,
-            "memory_used": psutil.virtual_memory().used,
-            "memory_percent": psutil.virtual_memory().percent,
+            "cpu_count": system_sampler.cpu_count,
+            "cpu_usage": sample.cpu_percent,
+            "memory_total": sample.memory_total,
+            "memory_available": sample.memory_available,
+            "memory_used": sample.memory_used,
+            "memory_percent": sample.memory_percent,
             "disk_usage": {
-                "total": psutil.disk_usage('/').total,
-                "used": psutil.disk_usage('/').used,
-                "free": psutil.disk_usage('/').free,
-                "percent": psutil.disk_usage('/').percent
+                "total": sample.disk_total,
+                "used": sample.disk_used,
+                "free": sample.disk_free,
+                "percent": sample.disk_percent
             },
-            "boot_time": datetime.fromtimestamp(psutil.boot_time()).isoformat(),
-            "uptime": str(datetime.now() - datetime.fromtimestamp(psutil.boot_time())),
-            "python_version": platform.python_version()
+            "boot_time": boot_time.isoformat(),
+            "uptime": str(datetime.now() - boot_time),
+            "python_version": platform.python_version(),
+            "staleness": sample.staleness
         }
         
         duration = (datetime.now() - start_time).total_seconds()
@@ -135,13 +140,15 @@ async def get_system_status():
     
     try:
         # 获取系统状态
-        cpu_usage = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+        sample = await system_sampler.latest()
+        cpu_usage = sample.cpu_percent
+        memory_usage = sample.memory_percent
+        disk_usage = sample.disk_percent
         
         status = {
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
+            "staleness": sample.staleness,
             "services": {
                 "api": "healthy",
                 "database": "healthy",
@@ -153,12 +160,12 @@ async def get_system_status():
                     "status": "normal" if cpu_usage < 80 else "warning"
                 },
                 "memory": {
-                    "usage": memory.percent,
-                    "status": "normal" if memory.percent < 80 else "warning"
+                    "usage": memory_usage,
+                    "status": "normal" if memory_usage < 80 else "warning"
                 },
                 "disk": {
-                    "usage": disk.percent,
-                    "status": "normal" if disk.percent < 80 else "warning"
+                    "usage": disk_usage,
+                    "status": "normal" if disk_usage < 80 else "warning"
                 }
             }
         }
@@ -171,8 +178,8 @@ async def get_system_status():
             "system_status": {
                 "overall_status": status["status"],
                 "cpu_usage": cpu_usage,
-                "memory_usage": memory.percent,
-                "disk_usage": disk.percent
+                "memory_usage": memory_usage,
+                "disk_usage": disk_usage
             }
         })
         
@@ -208,9 +215,10 @@ async def system_health_check():
     
     try:
         # 检查关键系统指标
-        cpu_usage = psutil.cpu_percent(interval=1)
-        memory_usage = psutil.virtual_memory().percent
-        disk_usage = psutil.disk_usage('/').percent
+        sample = await system_sampler.latest()
+        cpu_usage = sample.cpu_percent
+        memory_usage = sample.memory_percent
+        disk_usage = sample.disk_percent
         
         status = "healthy"
         if cpu_usage > 90 or memory_usage > 90 or disk_usage > 90:
@@ -220,6 +228,7 @@ async def system_health_check():
             "status": status,
             "service": "system",
             "timestamp": datetime.now().isoformat(),
+            "staleness": sample.staleness,
             "metrics": {
                 "cpu_usage": cpu_usage,
                 "memory_usage": memory_usage,
@@ -272,36 +281,36 @@ async def get_system_metrics():
     
     try:
         # 获取系统指标
-        cpu_usage = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        network = psutil.net_io_counters()
+        sample = await system_sampler.latest()
         
         metrics = {
             "timestamp": datetime.now().isoformat(),
+            "sampled_at": datetime.fromtimestamp(sample.timestamp).isoformat(),
+            "staleness": sample.staleness,
             "cpu": {
-                "usage": cpu_usage,
-                "count": psutil.cpu_count(),
-                "count_logical": psutil.cpu_count(logical=True)
+                "usage": sample.cpu_percent,
+                "count": system_sampler.cpu_count,
+                "count_logical": system_sampler.cpu_count_logical
             },
             "memory": {
-                "total": memory.total,
-                "available": memory.available,
-                "used": memory.used,
-                "percent": memory.percent
+                "total": sample.memory_total,
+                "available": sample.memory_available,
+                "used": sample.memory_used,
+                "percent": sample.memory_percent
             },
             "disk": {
-                "total": disk.total,
-                "used": disk.used,
-                "free": disk.free,
-                "percent": disk.percent
+                "total": sample.disk_total,
+                "used": sample.disk_used,
+                "free": sample.disk_free,
+                "percent": sample.disk_percent
             },
             "network": {
-                "bytes_sent": network.bytes_sent,
-                "bytes_recv": network.bytes_recv,
-                "packets_sent": network.packets_sent,
-                "packets_recv": network.packets_recv
-            }
+                "bytes_sent": sample.net_bytes_sent,
+                "bytes_recv": sample.net_bytes_recv,
+                "packets_sent": sample.net_packets_sent,
+                "packets_recv": sample.net_packets_recv
+            },
+            "connections": sample.connections
         }
         
         duration = (datetime.now() - start_time).total_seconds()
@@ -310,11 +319,11 @@ async def get_system_metrics():
             "method": "GET",
             "duration": duration,
             "metrics_summary": {
-                "cpu_usage": cpu_usage,
-                "memory_usage": memory.percent,
-                "disk_usage": disk.percent,
-                "network_bytes_sent": network.bytes_sent,
-                "network_bytes_recv": network.bytes_recv
+                "cpu_usage": sample.cpu_percent,
+                "memory_usage": sample.memory_percent,
+                "disk_usage": sample.disk_percent,
+                "network_bytes_sent": sample.net_bytes_sent,
+                "network_bytes_recv": sample.net_bytes_recv
             }
         })
         
@@ -520,9 +529,10 @@ async def system_health_check_detailed():
     """详细系统健康检查"""
     try:
         # 检查关键系统指标
-        cpu_usage = psutil.cpu_percent(interval=1)
-        memory_usage = psutil.virtual_memory().percent
-        disk_usage = psutil.disk_usage('/').percent
+        sample = await system_sampler.latest()
+        cpu_usage = sample.cpu_percent
+        memory_usage = sample.memory_percent
+        disk_usage = sample.disk_percent
         
         status = "healthy"
         if cpu_usage > 90 or memory_usage > 90 or disk_usage > 90:
@@ -532,6 +542,7 @@ async def system_health_check_detailed():
             "status": status,
             "service": "system",
             "timestamp": datetime.now().isoformat(),
+            "staleness": sample.staleness,
             "metrics": {
                 "cpu_usage": cpu_usage,
                 "memory_usage": memory_usage,
@@ -2,9 +2,18 @@
 WireGuard管理API端点 - 使用统一API路径构建器
 """
 import time
+import json
+import asyncio
 from typing import Dict, Any, List
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.api_path_builder import get_default_path_builder
+from app.core.database import get_db
+from app.core.database_manager import database_manager
+from app.schemas.wireguard import WireGuardClientBatchCreate
+from app.services.wireguard_service import WireGuardService
+from app.services.wireguard_render import QR_MEDIA_TYPES
 
 router = APIRouter()
 
@@ -185,6 +194,59 @@ async def get_servers(path_builder=Depends(get_path_builder)):
         }
     ]
 
+@router.get("/servers/{server_id}/status", response_model=None)
+async def get_server_status(server_id: int, db: AsyncSession = Depends(get_db)):
+    """获取单个接口的状态"""
+    service = WireGuardService(db)
+    if not await service.get_server_by_id(server_id):
+        raise HTTPException(status_code=404, detail="服务器不存在")
+    return await service.get_status(server_id)
+
+@router.get("/servers/{server_id}/config", response_model=None)
+async def get_server_config(server_id: int, db: AsyncSession = Depends(get_db)):
+    """获取单个接口的服务器配置和客户端配置"""
+    service = WireGuardService(db)
+    if not await service.get_server_by_id(server_id):
+        raise HTTPException(status_code=404, detail="服务器不存在")
+    return await service.get_config(server_id)
+
+@router.get("/servers/{server_id}/bundle.zip", response_model=None)
+async def download_server_bundle(
+    server_id: int,
+    qr: bool = Query(False, description="是否附带每个客户端的QR码PNG"),
+    db: AsyncSession = Depends(get_db)
+):
+    """以ZIP流下载服务器下所有客户端的配置文件"""
+    server = await WireGuardService(db).get_server_by_id(server_id)
+    if not server:
+        raise HTTPException(status_code=404, detail="服务器不存在")
+    filename = f"{server.interface or 'wg'}-clients.zip"
+
+    async def chunks():
+        # 会话随响应流的生命周期打开和关闭
+        async with database_manager.async_session_factory() as session:
+            service = WireGuardService(session)
+            bundle_server = await service.get_server_by_id(server_id)
+            async for chunk in service.iter_client_bundle(bundle_server, with_qr=qr):
+                if chunk:
+                    yield chunk
+
+    # 配置包含客户端私钥，禁止任何中间缓存
+    return StreamingResponse(
+        chunks(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
+
+@router.post("/servers:rebalance", response_model=None)
+async def rebalance_servers(
+    max_moves: int = Query(100, ge=1, le=10000, description="本次最多迁移的对等节点数"),
+    dry_run: bool = Query(False, description="只返回迁移计划，不执行"),
+    db: AsyncSession = Depends(get_db)
+):
+    """将对等节点按一致性哈希重新分布到各启用接口"""
+    return await WireGuardService(db).rebalance(max_moves=max_moves, dry_run=dry_run)
+
 @router.get("/clients", response_model=None)
 async def get_clients(path_builder=Depends(get_path_builder)):
     """获取客户端列表"""
@@ -208,4 +270,57 @@ async def get_clients(path_builder=Depends(get_path_builder)):
             "is_active": True,
             "last_seen": time.time() - 600
         }
-    ]
\ No newline at end of file
+    ]
+
+@router.post("/clients:batch", response_model=None)
+async def create_clients_batch(
+    batch: WireGuardClientBatchCreate,
+    stream: bool = Query(False, description="以NDJSON流返回进度事件，最后一行为结果"),
+    db: AsyncSession = Depends(get_db)
+):
+    """批量创建客户端"""
+    if not stream:
+        try:
+            return await WireGuardService(db).create_clients_batch(batch)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def progress(stage: str, done: int, total: int):
+            queue.put_nowait({"stage": stage, "done": done, "total": total})
+
+        async def run():
+            # 会话随任务生命周期打开和关闭；客户端断开后任务继续完成
+            async with database_manager.async_session_factory() as session:
+                return await WireGuardService(session).create_clients_batch(batch, progress=progress)
+
+        task = asyncio.create_task(run())
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        while (event := await queue.get()) is not None:
+            yield json.dumps(event) + "\n"
+        try:
+            yield json.dumps({"stage": "done", "result": task.result()}) + "\n"
+        except Exception as e:
+            yield json.dumps({"stage": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.get("/clients/{client_id}/qr", response_model=None)
+async def get_client_qr(
+    client_id: int,
+    format: str = Query("png", description="图片格式: png / svg"),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取客户端配置的QR码（按需渲染）"""
+    if format not in QR_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的QR码格式: {format}")
+    try:
+        image = await WireGuardService(db).get_client_qr(client_id, format)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if image is None:
+        raise HTTPException(status_code=404, detail="客户端不存在")
+    # QR码包含客户端私钥，禁止任何中间缓存
+    return Response(content=image, media_type=QR_MEDIA_TYPES[format], headers={"Cache-Control": "no-store"})
@@ -133,6 +133,24 @@ class PathConfig:
                          methods=["GET"],
                          parameters={"server_id": "int"}
                      ))
+        self.add_path("wireguard", "server_config", "/wireguard/servers/{server_id}/config",
+                     metadata=PathMetadata(
+                         description="获取WireGuard服务器接口配置",
+                         methods=["GET"],
+                         parameters={"server_id": "int"}
+                     ))
+        self.add_path("wireguard", "server_bundle", "/wireguard/servers/{server_id}/bundle.zip",
+                     metadata=PathMetadata(
+                         description="以ZIP流下载服务器下所有客户端配置",
+                         methods=["GET"],
+                         parameters={"server_id": "int", "qr": "bool"}
+                     ))
+        self.add_path("wireguard", "rebalance_servers", "/wireguard/servers:rebalance",
+                     metadata=PathMetadata(
+                         description="将对等节点按一致性哈希重新分布到各接口",
+                         methods=["POST"],
+                         parameters={"max_moves": "int", "dry_run": "bool"}
+                     ))
         self.add_path("wireguard", "create_server", "/wireguard/servers",
                      metadata=PathMetadata(
                          description="创建WireGuard服务器",
@@ -169,11 +187,22 @@ class PathConfig:
                          methods=["GET"],
                          parameters={"client_id": "int"}
                      ))
+        self.add_path("wireguard", "client_qr", "/wireguard/clients/{client_id}/qr",
+                     metadata=PathMetadata(
+                         description="获取WireGuard客户端配置QR码",
+                         methods=["GET"],
+                         parameters={"client_id": "int", "format": "str"}
+                     ))
         self.add_path("wireguard", "create_client", "/wireguard/clients",
                      metadata=PathMetadata(
                          description="创建WireGuard客户端",
                          methods=["POST"]
                      ))
+        self.add_path("wireguard", "batch_create_clients", "/wireguard/clients:batch",
+                     metadata=PathMetadata(
+                         description="批量创建WireGuard客户端",
+                         methods=["POST"]
+                     ))
         self.add_path("wireguard", "update_client", "/wireguard/clients/{client_id}",
                      metadata=PathMetadata(
                          description="更新WireGuard客户端",
@@ -198,6 +227,18 @@ class PathConfig:
                          description="更新BGP配置",
                          methods=["PUT"]
                      ))
+        self.add_path("bgp", "announce_route", "/bgp/routes/{route_id}/announce",
+                     metadata=PathMetadata(
+                         description="通过ExaBGP进程API宣告单条路由",
+                         methods=["POST"],
+                         parameters={"route_id": "int"}
+                     ))
+        self.add_path("bgp", "withdraw_route", "/bgp/routes/{route_id}/withdraw",
+                     metadata=PathMetadata(
+                         description="通过ExaBGP进程API撤销单条路由",
+                         methods=["POST"],
+                         parameters={"route_id": "int"}
+                     ))
         
         # IPv6路由路径
         self.add_path("ipv6", "routes", "/ipv6/routes",
@@ -6,11 +6,13 @@ import hmac
 import secrets
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
+from collections import defaultdict
 from pydantic import BaseModel
 import ipaddress
 import re
 
+from .rate_limiter import RateLimit, rate_limiter
+
 class RateLimitConfig(BaseModel):
     """速率限制配置"""
     requests_per_minute: int = 60
@@ -39,8 +41,13 @@ class APISecurityManager:
         self.rate_limit_config = rate_limit_config
         self.security_config = security_config
         
-        # 速率限制存储
-        self.rate_limit_store = defaultdict(lambda: defaultdict(deque))
+        # 速率限制规则（计数由共享的 rate_limiter 完成）
+        self.rate_limits = [
+            RateLimit("minute", rate_limit_config.requests_per_minute, 60),
+            RateLimit("hour", rate_limit_config.requests_per_hour, 3600),
+            RateLimit("day", rate_limit_config.requests_per_day, 86400),
+            RateLimit("burst", rate_limit_config.burst_limit, 10),
+        ]
         
         # 黑名单存储
         self.blacklist = set()
@@ -58,69 +65,19 @@ class APISecurityManager:
             r"eval\s*\(",  # 代码注入
         ]
     
-    def check_rate_limit(self, client_ip: str, user_id: Optional[int] = None) -> Tuple[bool, Dict[str, Any]]:
-        """检查速率限制"""
+    async def check_rate_limit(self, client_ip: str, user_id: Optional[int] = None) -> Tuple[bool, Dict[str, Any]]:
+        """检查速率限制（分钟/小时/天/10秒突发四个限制同时满足才计数）"""
         identifier = f"{client_ip}:{user_id}" if user_id else client_ip
-        current_time = time.time()
-        
-        # 清理过期记录
-        self._cleanup_rate_limit_records(identifier, current_time)
-        
-        # 检查各种限制
-        minute_limit = self._check_limit(identifier, "minute", current_time, self.rate_limit_config.requests_per_minute, 60)
-        hour_limit = self._check_limit(identifier, "hour", current_time, self.rate_limit_config.requests_per_hour, 3600)
-        day_limit = self._check_limit(identifier, "day", current_time, self.rate_limit_config.requests_per_day, 86400)
-        
-        # 检查突发限制
-        burst_limit = self._check_burst_limit(identifier, current_time)
-        
-        is_allowed = minute_limit and hour_limit and day_limit and burst_limit
-        
-        return is_allowed, {
-            "minute_remaining": max(0, self.rate_limit_config.requests_per_minute - len(self.rate_limit_store[identifier]["minute"])),
-            "hour_remaining": max(0, self.rate_limit_config.requests_per_hour - len(self.rate_limit_store[identifier]["hour"])),
-            "day_remaining": max(0, self.rate_limit_config.requests_per_day - len(self.rate_limit_store[identifier]["day"])),
-            "burst_allowed": burst_limit
+        result = await rate_limiter.hit("api", identifier, self.rate_limits)
+        
+        return result.allowed, {
+            "minute_remaining": result.remaining["minute"],
+            "hour_remaining": result.remaining["hour"],
+            "day_remaining": result.remaining["day"],
+            "burst_allowed": "burst" not in result.exceeded,
+            "retry_after": result.retry_after
         }
     
-    def _check_limit(self, identifier: str, period: str, current_time: float, limit: int, window: int) -> bool:
-        """检查特定时间窗口的限制"""
-        records = self.rate_limit_store[identifier][period]
-        
-        # 移除过期记录
-        while records and records[0] < current_time - window:
-            records.popleft()
-        
-        if len(records) >= limit:
-            return False
-        
-        # 添加当前请求
-        records.append(current_time)
-        return True
-    
-    def _check_burst_limit(self, identifier: str, current_time: float) -> bool:
-        """检查突发限制"""
-        records = self.rate_limit_store[identifier]["burst"]
-        
-        # 移除过期记录（最近10秒）
-        while records and records[0] < current_time - 10:
-            records.popleft()
-        
-        if len(records) >= self.rate_limit_config.burst_limit:
-            return False
-        
-        records.append(current_time)
-        return True
-    
-    def _cleanup_rate_limit_records(self, identifier: str, current_time: float):
-        """清理过期的速率限制记录"""
-        for period in ["minute", "hour", "day", "burst"]:
-            records = self.rate_limit_store[identifier][period]
-            window = {"minute": 60, "hour": 3600, "day": 86400, "burst": 10}[period]
-            
-            while records and records[0] < current_time - window:
-                records.popleft()
-    
     def check_ip_security(self, client_ip: str) -> Tuple[bool, str]:
         """检查IP安全性"""
         # 检查黑名单
@@ -322,7 +279,7 @@ class APISecurityMiddleware:
             return False, {"error": "IP安全检查失败", "message": ip_message}
         
         # 速率限制检查
-        rate_allowed, rate_info = self.security_manager.check_rate_limit(client_ip, user_id)
+        rate_allowed, rate_info = await self.security_manager.check_rate_limit(client_ip, user_id)
         if not rate_allowed:
             return False, {"error": "速率限制", "message": "请求过于频繁", "rate_info": rate_info}
         
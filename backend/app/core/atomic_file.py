@@ -0,0 +1,125 @@
+"""
+配置文件原子写入
+内容先写入同目录临时文件并 fsync，再 rename 覆盖目标文件，崩溃时目标文件
+要么是旧内容要么是新内容；磁盘内容与待写入内容相同时跳过写入
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def atomic_write(path: str, content: str, mode: int = 0o600) -> None:
+    """原子写入文件：临时文件 + fsync + rename，再 fsync 所在目录使 rename 持久化"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            os.fchmod(f.fileno(), mode)
+            f.write(content.encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class ConfigFileWriter:
+    """带内容哈希的原子写入器
+
+    记住每个路径最近一次写入（或读到）的内容哈希及当时的文件状态
+    （inode、大小、mtime）。文件状态变化（其他 worker 或外部程序改写、删除）
+    时重新读取磁盘内容计算哈希，内容未变化时不产生任何磁盘写入。可在多个线程中调用。
+    """
+
+    def __init__(self, mode: int = 0o600):
+        self.mode = mode
+        self._hashes: Dict[str, Tuple[Tuple[int, int, int], bytes]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"writes": 0, "skipped": 0, "errors": 0}
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _current_digest(self, path: str) -> Optional[bytes]:
+        """磁盘上文件内容的哈希，文件不存在时返回 None"""
+        signature = self._signature(path)
+        if signature is None:
+            self._hashes.pop(path, None)
+            return None
+        cached = self._hashes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            with open(path, "rb") as f:
+                digest = _digest(f.read())
+        except OSError:
+            self._hashes.pop(path, None)
+            return None
+        self._hashes[path] = (signature, digest)
+        return digest
+
+    def write(self, path: Optional[str], content: str) -> bool:
+        """写入文件，返回是否实际写入（内容未变化时返回 False）
+
+        写入失败时记录日志并抛出 OSError，由调用方决定是否继续。
+        """
+        if not path:
+            return False
+        data = content.encode()
+        digest = _digest(data)
+        with self._lock:
+            if self._current_digest(path) == digest:
+                self.stats["skipped"] += 1
+                return False
+            try:
+                os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+                atomic_write(path, content, self.mode)
+            except OSError as e:
+                self._hashes.pop(path, None)
+                self.stats["errors"] += 1
+                logger.error(f"写入配置文件失败 {path}: {e}")
+                raise
+            signature = self._signature(path)
+            if signature is not None:
+                self._hashes[path] = (signature, digest)
+            self.stats["writes"] += 1
+            return True
+
+    def forget(self, path: str) -> None:
+        """文件被删除后清除记录的哈希"""
+        with self._lock:
+            self._hashes.pop(path, None)
+
+
+# 全局配置文件写入器
+config_file_writer = ConfigFileWriter()
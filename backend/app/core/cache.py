@@ -1,200 +1,446 @@
 """
 缓存策略模块
-实现多级缓存、缓存失效、缓存预热
+实现两级缓存（有界本地LRU + Redis）、单飞加载、标签失效、概率提前刷新和缓存预热
 """
 
 import time
 import json
+import math
+import random
+import asyncio
+import hashlib
 import logging
-from typing import Any, Optional, Dict, List, Callable
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
 from functools import wraps
-import redis
-from redis import ConnectionPool
-import hashlib
+
+from .unified_config import settings
+
+try:
+    from .monitoring import monitoring_manager
+except ImportError:  # prometheus_client 未安装
+    monitoring_manager = None
 
 logger = logging.getLogger(__name__)
 
+# 标签集合的过期时间只延长不缩短；用 TTL 比较代替 EXPIRE 的 NX/GT 选项（需要 Redis 7）
+_EXTEND_TTL_SCRIPT = """
+local ttl = redis.call('TTL', KEYS[1])
+if ttl >= 0 and ttl >= tonumber(ARGV[1]) then
+    return 0
+end
+return redis.call('EXPIRE', KEYS[1], ARGV[1])
+"""
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "delta", "tags")
+
+    def __init__(self, value: Any, size: int, expires_at: float, delta: float, tags: Set[str]):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.delta = delta
+        self.tags = tags
+
+
+class LocalCache:
+    """有界本地缓存：按最近最少使用淘汰，同时限制条目数和总字节数"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            self.expirations += 1
+            _record_eviction("expired")
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: _Entry) -> None:
+        if entry.size > self.max_bytes:
+            self._remove(key)
+            return
+        self._remove(key)
+        self._entries[key] = entry
+        self.size_bytes += entry.size
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        evicted = 0
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            _record_eviction("size", evicted)
+
+    def _remove(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.size_bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        return True
+
+    def delete(self, key: str) -> bool:
+        return self._remove(key)
+
+    def delete_tag(self, tag: str) -> int:
+        keys = list(self._tags.get(tag, ()))
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def delete_prefix(self, prefix: str) -> int:
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self.size_bytes = 0
+
+
+def _record_eviction(reason: str, count: int = 1) -> None:
+    if monitoring_manager is not None:
+        monitoring_manager.record_cache_eviction(reason, count)
+
+
+def _record_request(tier: str, result: str) -> None:
+    if monitoring_manager is not None:
+        monitoring_manager.record_cache_request(tier, result)
+
+
 class CacheManager:
-    """缓存管理器"""
-    
-    def __init__(self, redis_pool: Optional[ConnectionPool] = None):
-        self.redis_pool = redis_pool
-        self.cache_enabled = redis_pool is not None
-        self.local_cache = {}  # 本地缓存
+    """缓存管理器
+
+    读取顺序为本地缓存 -> Redis；所有 Redis 键带 namespace 前缀，
+    清空和模式删除使用 SCAN，不会影响同一 Redis 中的其他数据。
+
+    删除和标签失效只清除本进程的本地缓存和 Redis，其他工作进程的本地副本
+    不会收到通知：普通条目最多在 local_ttl 内仍可能读到旧值，带标签的条目
+    按 tagged_local_ttl（通常更短）保留，以缩短标签失效后的不一致窗口。
+    """
+
+    def __init__(self, redis_client=None, namespace: str = "cache:", local_ttl: int = 300,
+                 max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, beta: float = 1.0,
+                 tagged_local_ttl: int = 30):
+        self.redis = redis_client
+        self.cache_enabled = redis_client is not None
+        self.namespace = namespace
+        self.local_ttl = local_ttl
+        self.tagged_local_ttl = min(tagged_local_ttl, local_ttl)
+        # 脚本按 SHA 以 EVALSHA 执行，不在每次写入时发送脚本正文
+        self._extend_ttl = redis_client.register_script(_EXTEND_TTL_SCRIPT) if redis_client is not None else None
+        self.beta = beta
+        self.local_cache = LocalCache(max_entries, max_bytes)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refreshing: Set[str] = set()
         self.cache_stats = {
             'hits': 0,
+            'local_hits': 0,
             'misses': 0,
             'sets': 0,
-            'deletes': 0
+            'deletes': 0,
+            'coalesced': 0,
+            'early_refreshes': 0,
         }
-    
-    def get(self, key: str) -> Optional[Any]:
-        """获取缓存数据"""
-        # 先检查本地缓存
-        if key in self.local_cache:
-            item = self.local_cache[key]
-            if time.time() < item['expires']:
-                self.cache_stats['hits'] += 1
-                return item['data']
-            else:
-                del self.local_cache[key]
-        
-        # 检查Redis缓存
+
+    def _redis_key(self, key: str) -> str:
+        return self.namespace + key
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}tag:{tag}"
+
+    def _local_expiry(self, expires_at: float, now: float, tags: Set[str]) -> float:
+        """本地副本的过期时间：不超过真实过期时间和本地保留时长"""
+        return min(expires_at, now + (self.tagged_local_ttl if tags else self.local_ttl))
+
+    def _update_size_metrics(self) -> None:
+        if monitoring_manager is not None:
+            monitoring_manager.update_cache_size(len(self.local_cache), self.local_cache.size_bytes)
+
+    # 读取
+    async def _get_entry(self, key: str) -> Optional[_Entry]:
+        now = time.time()
+        entry = self.local_cache.get(key, now)
+        if entry is not None:
+            self.cache_stats['local_hits'] += 1
+            _record_request("local", "hit")
+            return entry
+        _record_request("local", "miss")
+
         if self.cache_enabled:
             try:
-                redis_client = redis.Redis(connection_pool=self.redis_pool)
-                cached_data = redis_client.get(key)
-                if cached_data:
-                    data = json.loads(cached_data)
-                    # 存储到本地缓存
-                    self.local_cache[key] = {
-                        'data': data,
-                        'expires': time.time() + 300  # 5分钟本地缓存
-                    }
-                    self.cache_stats['hits'] += 1
-                    return data
+                raw = await self.redis.get(self._redis_key(key))
             except Exception as e:
                 logger.warning(f"Redis缓存读取失败: {e}")
-        
-        self.cache_stats['misses'] += 1
+                raw = None
+            if raw is not None:
+                _record_request("redis", "hit")
+                envelope = json.loads(raw)
+                value, expires_at = envelope["v"], envelope["e"]
+                delta, tags = envelope.get("d", 0.0), set(envelope.get("t", ()))
+                self.local_cache.set(key, _Entry(value, len(raw), self._local_expiry(expires_at, now, tags), delta, tags))
+                self._update_size_metrics()
+                # 返回值按 Redis 中的真实过期时间做提前刷新判断
+                return _Entry(value, len(raw), expires_at, delta, tags)
+            _record_request("redis", "miss")
         return None
-    
-    def set(self, key: str, data: Any, ttl: int = 3600):
-        """设置缓存数据"""
-        # 设置本地缓存
-        self.local_cache[key] = {
-            'data': data,
-            'expires': time.time() + min(ttl, 300)  # 本地缓存最多5分钟
-        }
-        
-        # 设置Redis缓存
+
+    async def get(self, key: str) -> Optional[Any]:
+        """获取缓存数据"""
+        entry = await self._get_entry(key)
+        if entry is None:
+            self.cache_stats['misses'] += 1
+            return None
+        self.cache_stats['hits'] += 1
+        return entry.value
+
+    # 写入
+    async def set(self, key: str, data: Any, ttl: int = 3600, tags: Iterable[str] = (),
+                  delta: float = 0.0):
+        """设置缓存数据
+
+        Args:
+            tags: 标签，invalidate_tags 时一并删除
+            delta: 生成该值的耗时（秒），用于概率提前刷新
+        """
+        now = time.time()
+        tags = set(tags)
+        expires_at = now + ttl
+        raw = json.dumps({"v": data, "e": expires_at, "d": delta, "t": sorted(tags)}, default=str)
+        self.local_cache.set(key, _Entry(data, len(raw), self._local_expiry(expires_at, now, tags), delta, tags))
+        self._update_size_metrics()
+        self.cache_stats['sets'] += 1
+
         if self.cache_enabled:
             try:
-                redis_client = redis.Redis(connection_pool=self.redis_pool)
-                redis_client.setex(key, ttl, json.dumps(data, default=str))
-                self.cache_stats['sets'] += 1
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(self._redis_key(key), raw, ex=ttl)
+                    for tag in tags:
+                        pipe.sadd(self._tag_key(tag), key)
+                        await self._extend_ttl(keys=[self._tag_key(tag)], args=[ttl], client=pipe)
+                    await pipe.execute()
             except Exception as e:
                 logger.warning(f"Redis缓存设置失败: {e}")
-    
-    def delete(self, key: str):
+
+    async def get_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int = 3600,
+                         tags: Iterable[str] = ()) -> Any:
+        """读取缓存，未命中时调用 loader 加载
+
+        同一键的并发未命中只执行一次 loader（单飞）；命中时按 XFetch 算法
+        以随过期临近而增大的概率在后台提前刷新，避免过期瞬间的缓存击穿。
+        """
+        entry = await self._get_entry(key)
+        if entry is not None:
+            self.cache_stats['hits'] += 1
+            if entry.delta and self._should_refresh(entry) and key not in self._refreshing:
+                self._refreshing.add(key)
+                self.cache_stats['early_refreshes'] += 1
+                task = asyncio.get_running_loop().create_task(self._load(key, loader, ttl, tags))
+                task.add_done_callback(lambda t, k=key: self._finish_refresh(k, t))
+            return entry.value
+
+        self.cache_stats['misses'] += 1
+        return await self._load(key, loader, ttl, tags)
+
+    def _should_refresh(self, entry: _Entry) -> bool:
+        # XFetch: now - delta * beta * ln(rand) >= expiry
+        return time.time() - entry.delta * self.beta * math.log(random.random() or 1e-12) >= entry.expires_at
+
+    def _finish_refresh(self, key: str, task: asyncio.Task) -> None:
+        self._refreshing.discard(key)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"缓存提前刷新失败 {key}: {task.exception()}")
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int,
+                    tags: Iterable[str]) -> Any:
+        """单飞加载：加载在独立任务中执行，发起者被取消时加载继续，其他等待者不受影响"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.cache_stats['coalesced'] += 1
+        else:
+            task = asyncio.get_running_loop().create_task(self._fill(key, loader, ttl, tags))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._load_done(k, t))
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int,
+                    tags: Iterable[str]) -> Any:
+        start = time.perf_counter()
+        value = await loader()
+        await self.set(key, value, ttl, tags, delta=time.perf_counter() - start)
+        return value
+
+    def _load_done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都已取消时避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    # 失效
+    async def delete(self, key: str):
         """删除缓存"""
-        # 删除本地缓存
-        if key in self.local_cache:
-            del self.local_cache[key]
-        
-        # 删除Redis缓存
+        self.local_cache.delete(key)
+        self._update_size_metrics()
+        self.cache_stats['deletes'] += 1
+
         if self.cache_enabled:
             try:
-                redis_client = redis.Redis(connection_pool=self.redis_pool)
-                redis_client.delete(key)
-                self.cache_stats['deletes'] += 1
+                await self.redis.delete(self._redis_key(key))
             except Exception as e:
                 logger.warning(f"Redis缓存删除失败: {e}")
-    
-    def delete_pattern(self, pattern: str):
-        """按模式删除缓存"""
+
+    async def _scan_delete(self, match: str) -> int:
+        deleted = 0
+        batch: List[str] = []
+        async for redis_key in self.redis.scan_iter(match=match, count=500):
+            batch.append(redis_key)
+            if len(batch) >= 500:
+                deleted += await self.redis.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await self.redis.unlink(*batch)
+        return deleted
+
+    async def delete_pattern(self, pattern: str):
+        """按前缀模式删除缓存（如 'user:*'），Redis 中使用 SCAN 逐批删除"""
+        prefix = pattern.split("*", 1)[0]
+        deleted = self.local_cache.delete_prefix(prefix)
+        self._update_size_metrics()
+
         if self.cache_enabled:
             try:
-                redis_client = redis.Redis(connection_pool=self.redis_pool)
-                keys = redis_client.keys(pattern)
-                if keys:
-                    redis_client.delete(*keys)
-                    self.cache_stats['deletes'] += len(keys)
+                deleted = max(deleted, await self._scan_delete(self._redis_key(pattern)))
             except Exception as e:
                 logger.warning(f"模式删除缓存失败: {e}")
-    
-    def clear(self):
-        """清空所有缓存"""
+        self.cache_stats['deletes'] += deleted
+
+    async def invalidate_tags(self, *tags: str):
+        """删除带有任一标签的所有缓存"""
+        deleted = 0
+        for tag in tags:
+            deleted += self.local_cache.delete_tag(tag)
+        self._update_size_metrics()
+
+        if self.cache_enabled:
+            try:
+                for tag in tags:
+                    tag_key = self._tag_key(tag)
+                    keys = await self.redis.smembers(tag_key)
+                    redis_keys = [self._redis_key(k.decode() if isinstance(k, bytes) else k) for k in keys]
+                    await self.redis.unlink(tag_key, *redis_keys)
+                    deleted = max(deleted, len(redis_keys))
+            except Exception as e:
+                logger.warning(f"按标签删除缓存失败: {e}")
+        self.cache_stats['deletes'] += deleted
+
+    async def clear(self):
+        """清空本缓存命名空间下的所有数据"""
         self.local_cache.clear()
+        self._update_size_metrics()
         if self.cache_enabled:
             try:
-                redis_client = redis.Redis(connection_pool=self.redis_pool)
-                redis_client.flushdb()
+                await self._scan_delete(self.namespace + "*")
             except Exception as e:
                 logger.warning(f"清空缓存失败: {e}")
-    
+
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计"""
         total_requests = self.cache_stats['hits'] + self.cache_stats['misses']
         hit_rate = (self.cache_stats['hits'] / total_requests * 100) if total_requests > 0 else 0
-        
+
         return {
             'cache_enabled': self.cache_enabled,
             'local_cache_size': len(self.local_cache),
-            'hits': self.cache_stats['hits'],
-            'misses': self.cache_stats['misses'],
+            'local_cache_bytes': self.local_cache.size_bytes,
+            'local_evictions': self.local_cache.evictions,
+            'local_expirations': self.local_cache.expirations,
+            'inflight_loads': len(self._inflight),
             'hit_rate': hit_rate,
-            'sets': self.cache_stats['sets'],
-            'deletes': self.cache_stats['deletes']
+            **self.cache_stats,
         }
 
 class CacheDecorator:
     """缓存装饰器"""
-    
+
     def __init__(self, cache_manager: CacheManager):
         self.cache_manager = cache_manager
-    
-    def cache(self, ttl: int = 3600, key_prefix: str = ""):
-        """缓存装饰器"""
+
+    def cache(self, ttl: int = 3600, key_prefix: str = "", tags: Iterable[str] = ()):
+        """缓存装饰器（并发未命中只执行一次被装饰函数）"""
         def decorator(func):
             @wraps(func)
             async def wrapper(*args, **kwargs):
                 # 生成缓存键
                 cache_key = self._generate_cache_key(func, args, kwargs, key_prefix)
-                
-                # 尝试从缓存获取
-                cached_result = self.cache_manager.get(cache_key)
-                if cached_result is not None:
-                    logger.debug(f"缓存命中: {cache_key}")
-                    return cached_result
-                
-                # 执行函数
-                result = await func(*args, **kwargs)
-                
-                # 存储到缓存
-                self.cache_manager.set(cache_key, result, ttl)
-                logger.debug(f"缓存存储: {cache_key}")
-                
-                return result
+                return await self.cache_manager.get_or_set(
+                    cache_key, lambda: func(*args, **kwargs), ttl, tags
+                )
             return wrapper
         return decorator
-    
+
     def _generate_cache_key(self, func: Callable, args: tuple, kwargs: dict, prefix: str) -> str:
         """生成缓存键"""
         # 创建参数哈希
         params = str(args) + str(sorted(kwargs.items()))
         params_hash = hashlib.md5(params.encode()).hexdigest()
-        
+
         # 组合缓存键
         key = f"{prefix}:{func.__name__}:{params_hash}"
         return key
 
 class CacheWarmer:
     """缓存预热器"""
-    
+
     def __init__(self, cache_manager: CacheManager):
         self.cache_manager = cache_manager
-    
+
     async def warm_user_cache(self, user_ids: List[int]):
         """预热用户缓存"""
         for user_id in user_ids:
             cache_key = f"user:{user_id}"
-            if not self.cache_manager.get(cache_key):
+            if not await self.cache_manager.get(cache_key):
                 # 这里应该从数据库加载用户数据
                 # user_data = await load_user_from_db(user_id)
-                # self.cache_manager.set(cache_key, user_data, 3600)
+                # await self.cache_manager.set(cache_key, user_data, 3600, tags=[f"user:{user_id}"])
                 pass
-    
+
     async def warm_server_cache(self, server_ids: List[int]):
         """预热服务器缓存"""
         for server_id in server_ids:
             cache_key = f"server:{server_id}"
-            if not self.cache_manager.get(cache_key):
+            if not await self.cache_manager.get(cache_key):
                 # 这里应该从数据库加载服务器数据
                 # server_data = await load_server_from_db(server_id)
-                # self.cache_manager.set(cache_key, server_data, 3600)
+                # await self.cache_manager.set(cache_key, server_data, 3600, tags=[f"server:{server_id}"])
                 pass
-    
+
     async def warm_statistics_cache(self):
         """预热统计缓存"""
         stats_keys = [
@@ -203,61 +449,65 @@ class CacheWarmer:
             'client_count',
             'active_connections'
         ]
-        
+
         for key in stats_keys:
-            if not self.cache_manager.get(key):
+            if not await self.cache_manager.get(key):
                 # 这里应该计算统计数据
                 # stats = await calculate_statistics()
-                # self.cache_manager.set(key, stats, 1800)  # 30分钟缓存
+                # await self.cache_manager.set(key, stats, 1800, tags=["statistics"])  # 30分钟缓存
                 pass
 
 class CacheInvalidator:
     """缓存失效器"""
-    
+
     def __init__(self, cache_manager: CacheManager):
         self.cache_manager = cache_manager
-    
-    def invalidate_user_cache(self, user_id: int):
+
+    async def invalidate_user_cache(self, user_id: int):
         """使用户缓存失效"""
-        patterns = [
-            f"user:{user_id}",
-            f"user_clients:{user_id}",
-            f"user_stats:{user_id}"
-        ]
-        
-        for pattern in patterns:
-            self.cache_manager.delete(pattern)
-    
-    def invalidate_server_cache(self, server_id: int):
+        for key in (f"user:{user_id}", f"user_clients:{user_id}", f"user_stats:{user_id}"):
+            await self.cache_manager.delete(key)
+        await self.cache_manager.invalidate_tags(f"user:{user_id}")
+
+    async def invalidate_server_cache(self, server_id: int):
         """使服务器缓存失效"""
-        patterns = [
-            f"server:{server_id}",
-            f"server_clients:{server_id}",
-            f"server_stats:{server_id}"
-        ]
-        
-        for pattern in patterns:
-            self.cache_manager.delete(pattern)
-    
-    def invalidate_statistics_cache(self):
+        for key in (f"server:{server_id}", f"server_clients:{server_id}", f"server_stats:{server_id}"):
+            await self.cache_manager.delete(key)
+        await self.cache_manager.invalidate_tags(f"server:{server_id}")
+
+    async def invalidate_statistics_cache(self):
         """使统计缓存失效"""
-        patterns = [
-            "user_count",
-            "server_count",
-            "client_count",
-            "active_connections",
-            "system_stats"
-        ]
-        
-        for pattern in patterns:
-            self.cache_manager.delete(pattern)
-    
-    def invalidate_all_cache(self):
+        for key in ("user_count", "server_count", "client_count", "active_connections", "system_stats"):
+            await self.cache_manager.delete(key)
+        await self.cache_manager.invalidate_tags("statistics")
+
+    async def invalidate_all_cache(self):
         """使所有缓存失效"""
-        self.cache_manager.clear()
+        await self.cache_manager.clear()
+
+
+def _create_redis_client():
+    if not (settings.USE_REDIS and settings.REDIS_URL):
+        return None
+    try:
+        import redis.asyncio as redis_asyncio
+    except ImportError:
+        logger.warning("未安装 redis 异步客户端，仅使用本地缓存")
+        return None
+    return redis_asyncio.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_POOL_SIZE,
+        decode_responses=True,
+    )
 
 # 创建全局缓存管理器
-cache_manager = CacheManager()
+cache_manager = CacheManager(
+    _create_redis_client(),
+    local_ttl=settings.CACHE_LOCAL_TTL,
+    max_entries=settings.CACHE_LOCAL_MAX_ENTRIES,
+    max_bytes=settings.CACHE_LOCAL_MAX_BYTES,
+    tagged_local_ttl=settings.CACHE_LOCAL_TAGGED_TTL,
+)
 cache_decorator = CacheDecorator(cache_manager)
 cache_warmer = CacheWarmer(cache_manager)
 cache_invalidator = CacheInvalidator(cache_manager)
@@ -0,0 +1,224 @@
+"""
+异步系统命令执行器
+基于 asyncio.create_subprocess_exec，统一提供并发上限、超时、输出截断、
+只读探测结果缓存和按命令统计的耗时指标
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+from .unified_config import settings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class CommandResult:
+    """命令执行结果"""
+    args: Tuple[str, ...]
+    returncode: int
+    stdout: str
+    stderr: str
+    duration: float
+    timed_out: bool = False
+    truncated: bool = False
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+class _CommandStats:
+    __slots__ = ("calls", "failures", "timeouts", "cache_hits", "total_time", "max_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        executed = self.calls - self.cache_hits
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "cache_hits": self.cache_hits,
+            "avg_time": self.total_time / executed if executed else 0.0,
+            "max_time": self.max_time,
+        }
+
+
+class CommandExecutor:
+    """系统命令执行器
+
+    所有命令共享一个信号量限制并发子进程数；命令不经过shell，
+    进程失败、超时或可执行文件不存在都通过 CommandResult 返回而不抛出异常。
+    """
+
+    def __init__(self, max_concurrency: int = 8, default_timeout: float = 30.0,
+                 max_output_bytes: int = 1024 * 1024):
+        self.default_timeout = default_timeout
+        self.max_output_bytes = max_output_bytes
+        self._max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._cache: Dict[Tuple[str, ...], Tuple[float, CommandResult]] = {}
+        self._stats: Dict[str, _CommandStats] = {}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # 延迟创建，确保绑定到运行中的事件循环
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    @staticmethod
+    def _metric_key(args: Sequence[str]) -> str:
+        """统计键：可执行文件名加子命令，如 'systemctl is-active'"""
+        name = os.path.basename(args[0])
+        if len(args) > 1 and not args[1].startswith("-"):
+            return f"{name} {args[1]}"
+        return name
+
+    @staticmethod
+    async def _read_capped(stream: asyncio.StreamReader, limit: int) -> Tuple[bytes, bool]:
+        """读取输出，超过上限的部分丢弃但继续读取以免子进程阻塞"""
+        chunks = []
+        size = 0
+        truncated = False
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            if size < limit:
+                chunks.append(chunk[:limit - size])
+            if size + len(chunk) > limit:
+                truncated = True
+            size += len(chunk)
+        return b"".join(chunks), truncated
+
+    async def _execute(self, args: Tuple[str, ...], timeout: float, input_data: Optional[bytes],
+                       max_output: int) -> CommandResult:
+        start = time.perf_counter()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except (FileNotFoundError, PermissionError) as e:
+            return CommandResult(args, 127, "", str(e), time.perf_counter() - start)
+
+        async def feed() -> Optional[str]:
+            """写入标准输入（与读取输出并行，避免双方都等待管道缓冲），返回写入错误"""
+            if input_data is None:
+                return None
+            try:
+                process.stdin.write(input_data)
+                await process.stdin.drain()
+                process.stdin.close()
+            except (BrokenPipeError, ConnectionResetError) as e:
+                # 子进程未读完输入就退出
+                return f"写入标准输入失败: {e}"
+            return None
+
+        async def communicate():
+            stdin_error, (stdout, out_cut), (stderr, err_cut) = await asyncio.gather(
+                feed(),
+                self._read_capped(process.stdout, max_output),
+                self._read_capped(process.stderr, max_output),
+            )
+            await process.wait()
+            return stdout, stderr, out_cut or err_cut, stdin_error
+
+        try:
+            stdout, stderr, truncated, stdin_error = await asyncio.wait_for(communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+            return CommandResult(args, -1, "", f"命令执行超时 ({timeout}s)",
+                                 time.perf_counter() - start, timed_out=True)
+
+        stderr = stderr.decode(errors="replace")
+        returncode = process.returncode
+        if stdin_error:
+            # 输入没有完整送达，即使子进程返回0也视为失败
+            stderr = f"{stderr.rstrip()}\n{stdin_error}".lstrip()
+            returncode = returncode or -1
+        return CommandResult(
+            args,
+            returncode,
+            stdout.decode(errors="replace"),
+            stderr,
+            time.perf_counter() - start,
+            truncated=truncated,
+        )
+
+    async def run(self, args: Sequence[str], timeout: Optional[float] = None,
+                  input_data: Optional[bytes] = None, cache_ttl: float = 0,
+                  max_output_bytes: Optional[int] = None) -> CommandResult:
+        """执行命令
+
+        Args:
+            args: 命令及参数列表（不经过shell）
+            timeout: 超时秒数，默认使用执行器配置
+            input_data: 写入标准输入的数据
+            cache_ttl: 大于0时缓存结果，仅用于只读探测命令（如 systemctl is-active）
+            max_output_bytes: stdout/stderr 各自保留的最大字节数
+        """
+        args = tuple(str(a) for a in args)
+        stats = self._stats.setdefault(self._metric_key(args), _CommandStats())
+        stats.calls += 1
+
+        if cache_ttl > 0:
+            cached = self._cache.get(args)
+            if cached and cached[0] > time.monotonic():
+                stats.cache_hits += 1
+                return replace(cached[1], cached=True)
+
+        async with self.semaphore:
+            result = await self._execute(
+                args,
+                timeout or self.default_timeout,
+                input_data,
+                max_output_bytes or self.max_output_bytes,
+            )
+
+        stats.total_time += result.duration
+        stats.max_time = max(stats.max_time, result.duration)
+        if result.timed_out:
+            stats.timeouts += 1
+            logger.warning(f"命令执行超时: {' '.join(args)}")
+        if not result.ok:
+            stats.failures += 1
+
+        if cache_ttl > 0 and not result.timed_out:
+            self._cache[args] = (time.monotonic() + cache_ttl, result)
+        return result
+
+    def invalidate(self, *prefix: str) -> None:
+        """清除以 prefix 开头的缓存结果（服务状态变更后调用）"""
+        for key in [k for k in self._cache if k[:len(prefix)] == prefix]:
+            del self._cache[key]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """按命令返回调用次数、失败数、超时数、缓存命中数与耗时"""
+        return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+
+# 全局命令执行器
+command_executor = CommandExecutor(
+    max_concurrency=getattr(settings, "COMMAND_MAX_CONCURRENCY", 8),
+    default_timeout=getattr(settings, "COMMAND_DEFAULT_TIMEOUT", 30.0),
+    max_output_bytes=getattr(settings, "COMMAND_MAX_OUTPUT_BYTES", 1024 * 1024),
+)
@@ -0,0 +1,82 @@
+"""
+多 worker 单执行者选举
+同一主机上的多个 uvicorn/gunicorn worker 各自运行后台任务时，写数据库、读写共享
+状态文件的任务只应由一个 worker 执行。每项任务对应一个锁文件，持有其非阻塞排他
+flock 的 worker 即为执行者；持有者退出（包括崩溃）时内核释放锁，其他 worker 在下
+一次尝试时接替。
+"""
+import fcntl
+import os
+import tempfile
+from typing import Dict, Optional
+
+from .unified_config import settings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def _default_lock_dir() -> str:
+    return getattr(settings, "LEADER_LOCK_DIR", "") or os.path.join(tempfile.gettempdir(), "ipv6-wireguard-manager")
+
+
+class LeaderLock:
+    """一项任务的执行者锁"""
+
+    def __init__(self, name: str, lock_dir: Optional[str] = None):
+        self.name = name
+        self.lock_dir = lock_dir
+        self._fd: Optional[int] = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.lock_dir or _default_lock_dir(), f"{self.name}.lock")
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """尝试成为执行者（已持有时直接返回 True），不阻塞"""
+        if self._fd is not None:
+            return True
+        path = self.path
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            logger.warning(f"无法打开执行者锁文件 {path}: {e}")
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        try:
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+        except OSError:
+            pass
+        logger.info(f"本进程（PID {os.getpid()}）成为 {self.name} 的执行者")
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+_locks: Dict[str, LeaderLock] = {}
+
+
+def leader_lock(name: str) -> LeaderLock:
+    """按任务名取得本进程内共享的执行者锁"""
+    lock = _locks.get(name)
+    if lock is None:
+        lock = _locks[name] = LeaderLock(name)
+    return lock
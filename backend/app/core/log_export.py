@@ -0,0 +1,125 @@
+"""
+日志流式导出
+把记录迭代器编码为 JSON / NDJSON / CSV 数据块，可选 gzip 压缩；
+数据块按大小合并后输出，内存占用与导出范围无关
+"""
+import csv
+import io
+import json
+import zlib
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+EXPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value: Any) -> str:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class ExportEncoder:
+    """增量编码器：feed 返回已攒满的数据块，finish 返回剩余数据"""
+
+    def __init__(self, format: str = "ndjson", columns: Optional[Sequence[str]] = None,
+                 compress: bool = False, chunk_size: int = CHUNK_SIZE):
+        if format not in EXPORT_MEDIA_TYPES:
+            raise ValueError(f"不支持的导出格式: {format}")
+        if format == "csv" and not columns:
+            raise ValueError("CSV 导出需要指定列")
+        self.format = format
+        self.columns = list(columns or [])
+        self.chunk_size = chunk_size
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer) if format == "csv" else None
+        self._count = 0
+
+        if self._csv:
+            self._csv.writerow(self.columns)
+        elif format == "json":
+            self._buffer.write("[")
+
+    @property
+    def media_type(self) -> str:
+        return "application/gzip" if self._compressor else EXPORT_MEDIA_TYPES[self.format]
+
+    def filename(self, base: str) -> str:
+        return f"{base}.{self.format}" + (".gz" if self._compressor else "")
+
+    @staticmethod
+    def _cell(value: Any) -> Any:
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, default=_json_default)
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        return _json_default(value)
+
+    def _drain(self, final: bool = False) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        if self._compressor:
+            data = self._compressor.compress(data)
+            if final:
+                data += self._compressor.flush()
+        return data
+
+    def feed(self, record: Dict[str, Any]) -> bytes:
+        if self._csv:
+            self._csv.writerow([self._cell(record.get(column)) for column in self.columns])
+        else:
+            if self.format == "json" and self._count:
+                self._buffer.write(",")
+            self._buffer.write(json.dumps(record, ensure_ascii=False, default=_json_default))
+            if self.format == "ndjson":
+                self._buffer.write("\n")
+        self._count += 1
+        if self._buffer.tell() >= self.chunk_size:
+            return self._drain()
+        return b""
+
+    def finish(self) -> bytes:
+        if self.format == "json":
+            self._buffer.write("]")
+        return self._drain(final=True)
+
+
+def encode_records(records: Iterable[Dict[str, Any]], encoder: ExportEncoder) -> Iterator[bytes]:
+    """同步迭代器版本（StreamingResponse 会在线程池中迭代）"""
+    for record in records:
+        chunk = encoder.feed(record)
+        if chunk:
+            yield chunk
+    tail = encoder.finish()
+    if tail:
+        yield tail
+
+
+async def aencode_records(records: AsyncIterable[Dict[str, Any]], encoder: ExportEncoder) -> AsyncIterator[bytes]:
+    """异步迭代器版本，用于数据库游标"""
+    async for record in records:
+        chunk = encoder.feed(record)
+        if chunk:
+            yield chunk
+    tail = encoder.finish()
+    if tail:
+        yield tail
+
+
+def format_cursor(source: str, record_id: int) -> str:
+    """数据库日志导出的续传游标：'<类型>:<ID>'"""
+    return f"{source}:{record_id}"
+
+
+def parse_cursor(cursor: str, sources: Sequence[str]) -> Tuple[str, int]:
+    source, _, record_id = (cursor or "").partition(":")
+    if source not in sources or not record_id.isdigit():
+        raise ValueError(f"无效的导出游标: {cursor}")
+    return source, int(record_id)
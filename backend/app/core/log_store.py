@@ -0,0 +1,743 @@
+"""
+日志存储与查询引擎
+跟踪 JSON 格式日志文件（StructuredFormatter / JSONFormatter 输出），
+追加写入按时间分区的段文件；每个段在内存中维护时间范围、级别/服务索引，
+最近的段另有全文倒排索引（更早的段全文查询时扫描段文件），查询只访问命中的段和行，
+支持精确总数与键集游标分页
+"""
+import asyncio
+import bisect
+import glob
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from .unified_config import settings
+from .logging import get_logger
+from .leader import leader_lock
+
+logger = get_logger(__name__)
+
+SEGMENT_SUFFIX = ".ndjson"
+TAIL_STATE_FILE = "tail.json"
+
+# 英文/数字按单词切分，中文按单字和双字切分
+_TOKEN_RE = re.compile(r"[0-9a-z_]+|[一-鿿]+")
+MAX_TOKEN_LENGTH = 64
+
+# 参与全文索引的字段（其余字段只存储不索引）
+INDEXED_FIELDS = ("message", "exception", "logger", "module", "function",
+                  "request_id", "user_id", "ip_address", "error")
+
+TimeValue = Union[None, str, float, int, datetime]
+
+
+def tokenize(text: str, query: bool = False) -> Set[str]:
+    """切分词元；建立索引时中文同时生成单字和双字，查询时中文只使用双字"""
+    tokens: Set[str] = set()
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        if word[0] < "一":
+            if len(word) <= MAX_TOKEN_LENGTH:
+                tokens.add(word)
+            continue
+        if len(word) == 1 or not query:
+            tokens.update(word)
+        tokens.update(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def parse_timestamp(value: TimeValue) -> Optional[float]:
+    """解析为 UTC 时间戳；无时区的时间按 UTC 处理（日志格式化器使用 utcnow）"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _contains(rows: Sequence[int], row: int) -> bool:
+    i = bisect.bisect_left(rows, row)
+    return i < len(rows) and rows[i] == row
+
+
+class LogSegment:
+    """一个段文件及其内存索引，行号即段内追加顺序"""
+
+    def __init__(self, segment_id: int, partition: int, path: str):
+        self.segment_id = segment_id
+        self.partition = partition
+        self.path = path
+        self.offsets = array("Q")
+        self.timestamps = array("d")
+        self.level_rows: Dict[int, array] = {}
+        self.service_rows: Dict[int, array] = {}
+        # 全文倒排索引；超出 LogStore.index_segments 的旧段为 None，全文查询时扫描文件
+        self.tokens: Optional[Dict[str, array]] = {}
+        self.min_ts = float("inf")
+        self.max_ts = float("-inf")
+        self.size = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.offsets)
+
+    def add(self, offset: int, ts: float, level: int, service: int, tokens: Iterable[str]) -> int:
+        row = len(self.offsets)
+        self.offsets.append(offset)
+        self.timestamps.append(ts)
+        self.level_rows.setdefault(level, array("I")).append(row)
+        self.service_rows.setdefault(service, array("I")).append(row)
+        if self.tokens is not None:
+            for token in tokens:
+                self.tokens.setdefault(token, array("I")).append(row)
+        self.min_ts = min(self.min_ts, ts)
+        self.max_ts = max(self.max_ts, ts)
+        return row
+
+    def read(self, rows: Sequence[int]) -> List[bytes]:
+        lines = []
+        with open(self.path, "rb") as f:
+            for row in rows:
+                f.seek(self.offsets[row])
+                lines.append(f.readline())
+        return lines
+
+
+@dataclass
+class LogQueryResult:
+    """查询结果：items 按时间倒序，next_cursor 为空表示没有更多数据"""
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    total: int = 0
+    next_cursor: Optional[str] = None
+
+
+class LogStore:
+    """追加写入的分段日志存储
+
+    新段在日志时间跨过 segment_span 边界或行数达到 segment_max_lines 时创建；
+    条目ID为 "<段号>-<行号>"，同时用作键集分页游标。
+    只有最近 index_segments 个段在内存中保留全文倒排索引（0 表示全部保留），
+    每个 worker 的内存占用不随保留期增长。
+    锁只保护内存索引，查询读取和解码段文件时不持有锁。
+    """
+
+    def __init__(self, directory: str, segment_span: int = 3600,
+                 segment_max_lines: int = 200_000, retention_days: int = 30,
+                 index_segments: int = 168):
+        self.directory = directory
+        self.segment_span = segment_span
+        self.segment_max_lines = segment_max_lines
+        self.retention_days = retention_days
+        self.index_segments = index_segments
+        self._segments: List[LogSegment] = []
+        self._by_id: Dict[int, LogSegment] = {}
+        self._levels: List[str] = []
+        self._level_codes: Dict[str, int] = {}
+        self._services: List[str] = []
+        self._service_codes: Dict[str, int] = {}
+        self._active_file = None
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.skipped = 0
+
+    # 字典编码
+    @staticmethod
+    def _code(value: str, values: List[str], codes: Dict[str, int]) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    @staticmethod
+    def _service_of(entry: Dict[str, Any]) -> str:
+        return str(entry.get("service") or entry.get("logger") or "unknown")
+
+    # 加载与写入
+    def load(self) -> None:
+        """从段文件建立内存索引（只索引完整的行，不修改文件）"""
+        with self._lock:
+            if self._loaded:
+                return
+            self.refresh()
+            self._loaded = True
+            total = sum(segment.count for segment in self._segments)
+            logger.info(f"日志存储已加载: {len(self._segments)} 个段, {total} 条日志")
+
+    def refresh(self) -> int:
+        """索引其他进程追加到段文件的新行，发现新段并移除已删除的段，返回新增条数
+
+        只有一个进程写入段文件（见 LogTailer），其余进程靠它跟上写入进程的内容。
+        按 stat 的文件大小判断段是否增长，只读取增长部分；读取文件时不持有锁。
+        """
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            paths = sorted(glob.glob(os.path.join(self.directory, f"*{SEGMENT_SUFFIX}")))
+            known = {segment.path for segment in self._segments}
+            for path in paths:
+                if path in known:
+                    continue
+                name = os.path.basename(path)[:-len(SEGMENT_SUFFIX)]
+                try:
+                    segment_id, partition = (int(part) for part in name.split("-", 1))
+                except ValueError:
+                    logger.warning(f"忽略无法识别的日志段文件: {path}")
+                    continue
+                segment = LogSegment(segment_id, partition, path)
+                self._segments.append(segment)
+                self._by_id[segment_id] = segment
+            self._segments.sort(key=lambda segment: segment.segment_id)
+            self._trim_token_index()
+            segments = [(segment, segment.size) for segment in self._segments]
+
+        grown = []
+        for segment, indexed in segments:
+            try:
+                size = os.stat(segment.path).st_size
+                if size <= indexed:
+                    continue
+                with open(segment.path, "rb") as f:
+                    f.seek(indexed)
+                    data = f.read(size - indexed)
+            except FileNotFoundError:
+                grown.append((segment, indexed, None))  # 写入进程按保留期删除了该段
+                continue
+            end = data.rfind(b"\n") + 1
+            if end:
+                grown.append((segment, indexed, data[:end]))
+
+        added = 0
+        with self._lock:
+            for segment, indexed, data in grown:
+                if data is None:
+                    if self._by_id.pop(segment.segment_id, None) is not None:
+                        self._segments.remove(segment)
+                    continue
+                if segment.size != indexed:
+                    continue  # 读取期间已由其他调用索引
+                for raw in data.splitlines(keepends=True):
+                    try:
+                        self._index(segment, raw, segment.size)
+                        added += 1
+                    except ValueError:
+                        self.skipped += 1
+                    segment.size += len(raw)
+        return added
+
+    def _trim_token_index(self) -> None:
+        """丢弃最近 index_segments 个段之前的全文倒排索引"""
+        if not self.index_segments:
+            return
+        for segment in self._segments[:-self.index_segments]:
+            segment.tokens = None
+
+    def take_over(self) -> None:
+        """成为写入进程时调用：跟上已有内容，截断上一个写入进程崩溃时写了一半的末行"""
+        with self._lock:
+            self.close()
+            self.refresh()
+            if not self._segments:
+                return
+            segment = self._segments[-1]
+            try:
+                if os.path.getsize(segment.path) > segment.size:
+                    os.truncate(segment.path, segment.size)
+            except OSError as e:
+                logger.warning(f"修复日志段末行失败 {segment.path}: {e}")
+
+    @staticmethod
+    def _indexed_text(entry: Dict[str, Any]) -> str:
+        return " ".join(str(entry[key]) for key in INDEXED_FIELDS if entry.get(key) is not None)
+
+    def _index(self, segment: LogSegment, raw: bytes, offset: int,
+               entry: Optional[Dict[str, Any]] = None) -> None:
+        if entry is None:
+            entry = json.loads(raw)
+        ts = parse_timestamp(entry.get("timestamp"))
+        level = str(entry.get("level") or "INFO").upper()
+        segment.add(
+            offset,
+            ts if ts is not None else time.time(),
+            self._code(level, self._levels, self._level_codes),
+            self._code(self._service_of(entry), self._services, self._service_codes),
+            tokenize(self._indexed_text(entry)) if segment.tokens is not None else (),
+        )
+
+    def _segment_for(self, ts: float) -> LogSegment:
+        partition = int(ts // self.segment_span)
+        active = self._segments[-1] if self._segments else None
+        # 乱序到达的旧时间日志留在当前段，段的 min/max 时间仍能正确裁剪
+        if active and active.partition >= partition and active.count < self.segment_max_lines:
+            return active
+
+        if self._active_file:
+            self._active_file.close()
+            self._active_file = None
+        segment_id = active.segment_id + 1 if active else 1
+        path = os.path.join(self.directory, f"{segment_id:08d}-{partition}{SEGMENT_SUFFIX}")
+        segment = LogSegment(segment_id, partition, path)
+        self._segments.append(segment)
+        self._by_id[segment_id] = segment
+        self._trim_token_index()
+        return segment
+
+    def append_lines(self, lines: Iterable[Union[str, bytes]]) -> int:
+        """追加日志行（每行一个JSON对象），返回写入条数；无法解析的行计入 skipped"""
+        self.load()
+        written = 0
+        with self._lock:
+            for line in lines:
+                raw = line.encode() if isinstance(line, str) else line
+                raw = raw.strip()
+                if not raw:
+                    continue
+                try:
+                    entry = json.loads(raw)
+                    if not isinstance(entry, dict):
+                        raise ValueError("not an object")
+                except ValueError:
+                    self.skipped += 1
+                    continue
+
+                ts = parse_timestamp(entry.get("timestamp"))
+                segment = self._segment_for(ts if ts is not None else time.time())
+                if self._active_file is None:
+                    self._active_file = open(segment.path, "ab")
+                raw += b"\n"
+                self._active_file.write(raw)
+                self._index(segment, raw, segment.size, entry)
+                segment.size += len(raw)
+                written += 1
+            if self._active_file:
+                self._active_file.flush()
+        return written
+
+    def close(self) -> None:
+        with self._lock:
+            if self._active_file:
+                self._active_file.close()
+                self._active_file = None
+
+    def apply_retention(self, now: Optional[float] = None) -> int:
+        """删除最新日志早于保留期的段（当前写入段除外），返回删除的段数"""
+        if not self.retention_days:
+            return 0
+        cutoff = (now or time.time()) - self.retention_days * 86400
+        removed = 0
+        with self._lock:
+            for segment in list(self._segments[:-1]):
+                if segment.max_ts >= cutoff:
+                    continue
+                self._segments.remove(segment)
+                del self._by_id[segment.segment_id]
+                try:
+                    os.remove(segment.path)
+                except OSError as e:
+                    logger.warning(f"删除过期日志段失败 {segment.path}: {e}")
+                removed += 1
+        return removed
+
+    # 查询
+    def _match(self, segment: LogSegment, tokens: Set[str], level: Optional[int],
+               service: Optional[int], start_ts: Optional[float],
+               end_ts: Optional[float]) -> Sequence[int]:
+        """返回段内命中的行号（升序，调用时的快照）；需持有锁，段须有全文索引或 tokens 为空"""
+        postings: List[array] = []
+        for token in tokens:
+            rows = segment.tokens.get(token)
+            if rows is None:
+                return ()
+            postings.append(rows)
+        for code, index in ((level, segment.level_rows), (service, segment.service_rows)):
+            if code is not None:
+                rows = index.get(code)
+                if rows is None:
+                    return ()
+                postings.append(rows)
+
+        full_range = ((start_ts is None or segment.min_ts >= start_ts)
+                      and (end_ts is None or segment.max_ts <= end_ts))
+        if postings:
+            postings.sort(key=len)
+            base, others = postings[0], postings[1:]
+        else:
+            base, others = range(segment.count), []
+        if not others and full_range:
+            return base[:]
+
+        timestamps = segment.timestamps
+        result = []
+        for row in base:
+            if others and not all(_contains(rows, row) for rows in others):
+                continue
+            if not full_range:
+                ts = timestamps[row]
+                if (start_ts is not None and ts < start_ts) or (end_ts is not None and ts > end_ts):
+                    continue
+            result.append(row)
+        return result
+
+    def _decode(self, segment: LogSegment, rows: Sequence[int]) -> List[Dict[str, Any]]:
+        """读取并解码指定行；段已被保留策略删除时返回空列表（不需要持有锁）"""
+        try:
+            lines = segment.read(rows)
+        except FileNotFoundError:
+            return []
+        items = []
+        for row, raw in zip(rows, lines):
+            entry = json.loads(raw)
+            entry["id"] = f"{segment.segment_id}-{row}"
+            entry.setdefault("service", self._service_of(entry))
+            items.append(entry)
+        return items
+
+    def _segment_rows(self, segment: LogSegment, tokens: Set[str], codes: Tuple[Optional[int], Optional[int]],
+                      start_ts: Optional[float], end_ts: Optional[float],
+                      batch_size: int = 1000) -> Sequence[int]:
+        """返回段内命中的行号（升序）；段没有全文索引时按级别/服务/时间过滤后扫描文件匹配词元"""
+        with self._lock:
+            if segment.segment_id not in self._by_id or not segment.count:
+                return ()
+            if (start_ts is not None and segment.max_ts < start_ts) or \
+                    (end_ts is not None and segment.min_ts > end_ts):
+                return ()
+            if segment.tokens is not None:
+                return self._match(segment, tokens, codes[0], codes[1], start_ts, end_ts)
+            candidates = self._match(segment, set(), codes[0], codes[1], start_ts, end_ts)
+
+        rows = []
+        for i in range(0, len(candidates), batch_size):
+            batch = candidates[i:i + batch_size]
+            try:
+                lines = segment.read(batch)
+            except FileNotFoundError:
+                return ()
+            for row, raw in zip(batch, lines):
+                if tokens <= tokenize(self._indexed_text(json.loads(raw))):
+                    rows.append(row)
+        return rows
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> Tuple[int, int]:
+        try:
+            segment_id, row = (int(part) for part in cursor.split("-", 1))
+        except (AttributeError, ValueError):
+            raise ValueError(f"无效的日志游标: {cursor}")
+        return segment_id, row
+
+    def _filter_codes(self, level: Optional[str], service: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """解析级别/服务编码；指定的值从未出现过时返回 None（结果必然为空）"""
+        level_code = service_code = None
+        if level:
+            level_code = self._level_codes.get(level.upper())
+            if level_code is None:
+                return None
+        if service:
+            service_code = self._service_codes.get(service)
+            if service_code is None:
+                return None
+        return level_code, service_code
+
+    def scan(self, text: Optional[str] = None, level: Optional[str] = None,
+             service: Optional[str] = None, start_time: TimeValue = None,
+             end_time: TimeValue = None, after: Optional[str] = None,
+             batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """按写入顺序（时间正序）逐批读取全部命中日志，用于导出
+
+        after 为上次读取到的最后一条ID，从其后继续；读取段文件时不持有锁，不阻塞写入。
+        """
+        self.load()
+        tokens = tokenize(text, query=True) if text else set()
+        start_ts = parse_timestamp(start_time)
+        end_ts = parse_timestamp(end_time)
+        position = self.parse_cursor(after) if after else None
+
+        with self._lock:
+            codes = self._filter_codes(level, service)
+            if codes is None:
+                return
+            segments = [segment for segment in self._segments
+                        if position is None or segment.segment_id >= position[0]]
+
+        for segment in segments:
+            rows = self._segment_rows(segment, tokens, codes, start_ts, end_ts)
+            if position and segment.segment_id == position[0]:
+                rows = rows[bisect.bisect_right(rows, position[1]):]
+            for i in range(0, len(rows), batch_size):
+                yield from self._decode(segment, rows[i:i + batch_size])
+
+    def query(self, text: Optional[str] = None, level: Optional[str] = None,
+              service: Optional[str] = None, start_time: TimeValue = None,
+              end_time: TimeValue = None, limit: int = 20, offset: int = 0,
+              cursor: Optional[str] = None) -> LogQueryResult:
+        """按时间倒序查询
+
+        text 按词元做 AND 匹配；total 为不考虑游标和偏移的命中总数；
+        cursor 为上一页 next_cursor，返回严格早于该条目的日志。
+        只在匹配内存索引时持有锁，读取和解码段文件在锁外进行。
+        """
+        self.load()
+        tokens = tokenize(text, query=True) if text else set()
+        start_ts = parse_timestamp(start_time)
+        end_ts = parse_timestamp(end_time)
+        position = self.parse_cursor(cursor) if cursor else None
+
+        result = LogQueryResult()
+        with self._lock:
+            codes = self._filter_codes(level, service)
+            if codes is None:
+                return result
+            segments = list(reversed(self._segments))
+
+        # 先确定每个段要读取的行，再在锁外读取
+        pages: List[Tuple[LogSegment, Sequence[int]]] = []
+        skip = offset
+        taken = 0
+        remaining = 0
+        for segment in segments:
+            rows = self._segment_rows(segment, tokens, codes, start_ts, end_ts)
+            if not rows:
+                continue
+            result.total += len(rows)
+
+            if taken >= limit:
+                remaining += len(rows)
+                continue
+            upto = len(rows)
+            if position:
+                if segment.segment_id > position[0]:
+                    continue
+                if segment.segment_id == position[0]:
+                    upto = bisect.bisect_left(rows, position[1])
+            if skip >= upto:
+                skip -= upto
+                continue
+            hi = upto - skip
+            skip = 0
+            take = min(limit - taken, hi)
+            pages.append((segment, rows[hi - take:hi][::-1]))
+            taken += take
+            remaining += hi - take
+
+        for segment, rows in pages:
+            result.items.extend(self._decode(segment, rows))
+        if remaining and pages:
+            segment, rows = pages[-1]
+            result.next_cursor = f"{segment.segment_id}-{rows[-1]}"
+        return result
+
+    def get(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        """按ID读取单条日志"""
+        self.load()
+        try:
+            segment_id, row = self.parse_cursor(entry_id)
+        except ValueError:
+            return None
+        with self._lock:
+            segment = self._by_id.get(segment_id)
+            if segment is None or not 0 <= row < segment.count:
+                return None
+        items = self._decode(segment, [row])
+        return items[0] if items else None
+
+    def levels(self) -> List[str]:
+        with self._lock:
+            return list(self._levels)
+
+    def services(self) -> List[str]:
+        with self._lock:
+            return sorted(self._services)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            segments = [segment for segment in self._segments if segment.count]
+            return {
+                "segments": len(self._segments),
+                "total_logs": sum(segment.count for segment in segments),
+                "bytes": sum(segment.size for segment in self._segments),
+                "tokens": sum(len(segment.tokens) for segment in self._segments if segment.tokens is not None),
+                "indexed_segments": sum(segment.tokens is not None for segment in self._segments),
+                "skipped_lines": self.skipped,
+                "first_log_time": min((s.min_ts for s in segments), default=None),
+                "last_log_time": max((s.max_ts for s in segments), default=None),
+            }
+
+
+class LogTailer:
+    """跟踪日志文件的新增内容并写入 LogStore
+
+    读取位置（inode + 偏移）保存在存储目录中，重启后继续；
+    文件被轮转时先读完旧文件再切换到新文件。
+    多个 worker 中只有持有执行者锁的一个采集并写入段文件，其余 worker 只索引
+    段文件的新内容，并在每个周期重试获取锁，执行者退出后接替采集。
+    """
+
+    def __init__(self, store: LogStore, path: Optional[str], poll_interval: float = 1.0,
+                 chunk_size: int = 4 * 1024 * 1024):
+        self.store = store
+        self.path = path
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self._handle = None
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._task: Optional[asyncio.Task] = None
+        self._last_retention = 0.0
+        self._leader = leader_lock("log-tailer")
+
+    @property
+    def is_writer(self) -> bool:
+        """本进程是否为采集日志、写入段文件的执行者"""
+        return self._leader.held
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.store.directory, TAIL_STATE_FILE)
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            return state if state.get("path") == self.path else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self) -> None:
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"path": self.path, "inode": self._inode, "offset": self._offset}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _open(self, path: str, offset: int) -> None:
+        self._handle = open(path, "rb")
+        self._inode = os.fstat(self._handle.fileno()).st_ino
+        self._offset = offset
+
+    def _resume(self) -> bool:
+        """按保存的 inode 找回上次读取的文件（可能已被轮转改名）"""
+        state = self._load_state()
+        if not os.path.exists(self.path):
+            return False
+        for candidate in [self.path] + sorted(glob.glob(self.path + ".*")):
+            try:
+                if state and os.stat(candidate).st_ino == state.get("inode"):
+                    self._open(candidate, state.get("offset", 0))
+                    return True
+            except OSError:
+                continue
+        self._open(self.path, 0)
+        return True
+
+    def poll(self) -> int:
+        """读取所有已完整写入的新行，返回写入存储的条数"""
+        if self._handle is None and not self._resume():
+            return 0
+
+        written = 0
+        while True:
+            self._handle.seek(self._offset)
+            data = self._handle.read(self.chunk_size)
+            end = data.rfind(b"\n") + 1
+            if end:
+                written += self.store.append_lines(data[:end].splitlines())
+                self._offset += end
+                self._save_state()
+            if len(data) < self.chunk_size:
+                break
+
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            current = None
+        if current is not None and current.st_ino != self._inode:
+            # 旧文件已读完，切换到轮转后的新文件
+            self._handle.close()
+            self._open(self.path, 0)
+            self._save_state()
+        elif current is not None and current.st_size < self._offset:
+            logger.warning(f"日志文件被截断，从头读取: {self.path}")
+            self._offset = 0
+        return written
+
+    async def _elect(self) -> bool:
+        """尝试成为执行者，新当选时先接管段文件"""
+        if self._leader.held:
+            return True
+        if not self._leader.try_acquire():
+            return False
+        self._handle = None
+        await asyncio.to_thread(self.store.take_over)
+        return True
+
+    async def _run(self) -> None:
+        await asyncio.to_thread(self.store.load)
+        while True:
+            try:
+                if not await self._elect():
+                    await asyncio.to_thread(self.store.refresh)
+                else:
+                    await asyncio.to_thread(self.poll)
+                    if time.monotonic() - self._last_retention > 3600:
+                        self._last_retention = time.monotonic()
+                        await asyncio.to_thread(self.store.apply_retention)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"日志采集失败: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        """启动后台采集任务"""
+        if not self.path:
+            logger.info("未配置日志文件，日志存储不采集新日志")
+            return
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"日志采集已启动: {self.path}")
+
+    async def stop(self) -> None:
+        """停止后台采集任务"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+        self.store.close()
+        self._leader.release()
+
+
+# 全局日志存储与采集器
+log_store = LogStore(
+    settings.LOG_STORE_DIR,
+    segment_span=settings.LOG_STORE_SEGMENT_SPAN,
+    segment_max_lines=settings.LOG_STORE_SEGMENT_MAX_LINES,
+    retention_days=settings.LOG_STORE_RETENTION_DAYS,
+    index_segments=settings.LOG_STORE_INDEX_SEGMENTS,
+)
+log_tailer = LogTailer(
+    log_store,
+    settings.LOG_STORE_SOURCE or settings.LOG_FILE,
+    poll_interval=settings.LOG_STORE_POLL_INTERVAL,
+)
@@ -48,6 +48,83 @@ database_connections = Gauge(
     registry=registry
 )
 
+cache_requests_total = Counter(
+    'cache_requests_total',
+    'Cache lookups by tier and result',
+    ['tier', 'result'],
+    registry=registry
+)
+
+cache_evictions_total = Counter(
+    'cache_evictions_total',
+    'Local cache evictions',
+    ['reason'],
+    registry=registry
+)
+
+cache_local_entries = Gauge(
+    'cache_local_entries',
+    'Number of entries in the local cache',
+    registry=registry
+)
+
+cache_local_bytes = Gauge(
+    'cache_local_bytes',
+    'Approximate size of the local cache in bytes',
+    registry=registry
+)
+
+wireguard_keypool_depth = Gauge(
+    'wireguard_keypool_depth',
+    'Number of pre-generated WireGuard keypairs in the pool',
+    registry=registry
+)
+
+wireguard_keypool_refill_rate = Gauge(
+    'wireguard_keypool_refill_rate',
+    'Keypairs generated per second by the most recent refill batch',
+    registry=registry
+)
+
+wireguard_keypool_served_total = Counter(
+    'wireguard_keypool_served_total',
+    'Keypairs handed out by source',
+    ['source'],
+    registry=registry
+)
+
+wireguard_keypool_refilled_total = Counter(
+    'wireguard_keypool_refilled_total',
+    'Keypairs generated by the background refill task',
+    registry=registry
+)
+
+bgp_prefix_assignment_probes = Histogram(
+    'bgp_prefix_assignment_probes',
+    'Slots probed per sticky IPv6 prefix assignment',
+    buckets=[1, 2, 3, 4, 6, 8, 16, 32, 64, 65],
+    registry=registry
+)
+
+bgp_prefix_assignment_fallback_total = Counter(
+    'bgp_prefix_assignment_fallback_total',
+    'Sticky prefix assignments that exhausted the probe limit and took the lowest free slot',
+    registry=registry
+)
+
+bgp_session_transitions_total = Counter(
+    'bgp_session_transitions_total',
+    'BGP session state transitions reported by ExaBGP',
+    ['status'],
+    registry=registry
+)
+
+bgp_sessions_established = Gauge(
+    'bgp_sessions_established',
+    'BGP sessions currently in the established state',
+    registry=registry
+)
+
 system_info = Info(
     'system_info',
     'System information',
@@ -98,6 +175,46 @@ class MonitoringManager:
         """更新活跃连接数"""
         active_connections.set(count)
     
+    def record_cache_request(self, tier: str, result: str):
+        """记录缓存查询结果（tier: local/redis，result: hit/miss）"""
+        cache_requests_total.labels(tier=tier, result=result).inc()
+    
+    def record_cache_eviction(self, reason: str, count: int = 1):
+        """记录本地缓存淘汰（reason: size/expired）"""
+        cache_evictions_total.labels(reason=reason).inc(count)
+    
+    def update_cache_size(self, entries: int, size_bytes: int):
+        """更新本地缓存条目数和字节数"""
+        cache_local_entries.set(entries)
+        cache_local_bytes.set(size_bytes)
+    
+    def record_keypool_served(self, source: str):
+        """记录密钥对发放（source: pool/inline）"""
+        wireguard_keypool_served_total.labels(source=source).inc()
+    
+    def record_keypool_refill(self, count: int):
+        """记录后台补充的密钥对数量"""
+        wireguard_keypool_refilled_total.inc(count)
+    
+    def update_keypool(self, depth: int, refill_rate: float):
+        """更新密钥对池深度和补充速率"""
+        wireguard_keypool_depth.set(depth)
+        wireguard_keypool_refill_rate.set(refill_rate)
+    
+    def record_prefix_probes(self, probes: int, fallback: bool = False):
+        """记录粘性前缀分配的探测次数"""
+        bgp_prefix_assignment_probes.observe(probes)
+        if fallback:
+            bgp_prefix_assignment_fallback_total.inc()
+    
+    def record_bgp_session_transition(self, status: str):
+        """记录BGP会话状态变化"""
+        bgp_session_transitions_total.labels(status=status).inc()
+    
+    def update_bgp_sessions(self, established: int):
+        """更新已建立的BGP会话数"""
+        bgp_sessions_established.set(established)
+    
     def get_metrics(self) -> str:
         """获取Prometheus指标"""
         return generate_latest(registry).decode('utf-8')
@@ -0,0 +1,245 @@
+"""
+前缀池空闲空间索引
+以"槽位"（基础前缀按目标长度切分后的子网序号）为单位维护有序的空闲区间，
+分配/释放/保留只需二分查找，不再展开整个子网列表
+"""
+import ipaddress
+import json
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Optional, Tuple, Union
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class PrefixFreeIndex:
+    """基于有序空闲区间的前缀分配索引
+
+    空闲空间保存为互不相交、按起点排序的半开区间 [start, end)，
+    区间数量只与碎片程度有关，与已分配前缀的数量无关。
+    列表头部已用尽的区间只移动 _head 标记，积累到一半时再整体删除，
+    最低槽位分配为均摊 O(1)；空闲槽位数随变更维护，不需要遍历区间。
+    """
+
+    def __init__(self, base_prefix: str, prefix_len: int,
+                 free_ranges: Optional[Iterable[Tuple[int, int]]] = None):
+        self.network: Network = ipaddress.ip_network(base_prefix, strict=False)
+        # 目标长度小于基础前缀长度时按基础前缀长度分配
+        self.prefix_len = max(prefix_len, self.network.prefixlen)
+        if self.prefix_len > self.network.max_prefixlen:
+            raise ValueError(f"前缀长度超出范围: /{prefix_len}")
+
+        self._shift = self.network.max_prefixlen - self.prefix_len
+        self._base = int(self.network.network_address)
+        self.capacity = 1 << (self.prefix_len - self.network.prefixlen)
+
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._head = 0
+        self._free = 0
+        self._dumped: Optional[str] = None
+        if free_ranges is None:
+            free_ranges = [(0, self.capacity)]
+        for start, end in sorted(free_ranges):
+            start, end = max(start, self._ends[-1] if self._ends else 0), min(end, self.capacity)
+            if start < end:
+                self._starts.append(start)
+                self._ends.append(end)
+                self._free += end - start
+
+    # 构建与序列化
+    @classmethod
+    def from_used(cls, base_prefix: str, prefix_len: int, used_prefixes: Iterable[str]) -> "PrefixFreeIndex":
+        """根据已占用的前缀重建索引（O(n log n)，仅在索引缺失时执行一次）
+
+        主机粒度的索引（/32、/128）按地址取槽位："10.0.0.2/24" 这样带子网长度的
+        接口写法只占用 10.0.0.2，而不是整个 /24。
+        """
+        index = cls(base_prefix, prefix_len, free_ranges=[])
+        hosts = index.prefix_len == index.network.max_prefixlen
+        used = []
+        for prefix in used_prefixes:
+            if hosts:
+                try:
+                    prefix = str(ipaddress.ip_interface(prefix).ip)
+                except ValueError:
+                    continue
+            slot_range = index.slot_range(prefix)
+            if slot_range:
+                used.append(slot_range)
+        used.sort()
+
+        cursor = 0
+        for start, end in used:
+            if start > cursor:
+                index._starts.append(cursor)
+                index._ends.append(start)
+                index._free += start - cursor
+            cursor = max(cursor, end)
+        if cursor < index.capacity:
+            index._starts.append(cursor)
+            index._ends.append(index.capacity)
+            index._free += index.capacity - cursor
+        return index
+
+    @classmethod
+    def loads(cls, base_prefix: str, prefix_len: int, data: str) -> "PrefixFreeIndex":
+        """从持久化字符串恢复索引"""
+        return cls(base_prefix, prefix_len, free_ranges=[tuple(r) for r in json.loads(data)])
+
+    def dumps(self) -> str:
+        """序列化为紧凑的JSON区间列表（未变更时返回上次的结果）"""
+        if self._dumped is None:
+            self._dumped = json.dumps([[s, e] for s, e in self.ranges()], separators=(",", ":"))
+        return self._dumped
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        """当前的空闲区间列表（按起点排序）"""
+        return list(zip(self._starts[self._head:], self._ends[self._head:]))
+
+    # 槽位换算
+    def slot_range(self, prefix: str) -> Optional[Tuple[int, int]]:
+        """返回前缀覆盖的槽位区间，不在池内时返回None"""
+        if not isinstance(prefix, str):
+            return None
+        try:
+            subnet = ipaddress.ip_network(prefix, strict=False)
+        except ValueError:
+            return None
+        if subnet.version != self.network.version or not subnet.subnet_of(self.network):
+            return None
+
+        start = (int(subnet.network_address) - self._base) >> self._shift
+        if subnet.prefixlen >= self.prefix_len:
+            return start, start + 1
+        return start, start + (1 << (self.prefix_len - subnet.prefixlen))
+
+    def prefix_at(self, slot: int) -> str:
+        """槽位序号转换为CIDR字符串"""
+        address = ipaddress.ip_address(self._base + (slot << self._shift))
+        return f"{address}/{self.prefix_len}"
+
+    def normalize(self, prefix: str) -> Optional[str]:
+        """校验并规范化单个可分配前缀
+
+        前缀必须是池内、长度等于分配长度、主机位为零的网络（如 "2001:db8:0:1::/64"），
+        否则返回None。
+        """
+        if not isinstance(prefix, str):
+            return None
+        try:
+            subnet = ipaddress.ip_network(prefix.strip(), strict=True)
+        except ValueError:
+            return None
+        if (subnet.version != self.network.version or subnet.prefixlen != self.prefix_len
+                or not subnet.subnet_of(self.network)):
+            return None
+        return str(subnet)
+
+    # 查询
+    @property
+    def free_count(self) -> int:
+        return self._free
+
+    @property
+    def fragments(self) -> int:
+        return len(self._starts) - self._head
+
+    def is_free(self, prefix: str) -> bool:
+        slot_range = self.slot_range(prefix)
+        return slot_range is not None and self._containing(*slot_range) >= 0
+
+    def _containing(self, start: int, end: int) -> int:
+        """返回完整包含 [start, end) 的空闲区间下标，不存在时返回-1"""
+        i = bisect_right(self._starts, start, self._head) - 1
+        if i >= self._head and self._ends[i] >= end:
+            return i
+        return -1
+
+    # 变更
+    def allocate(self) -> Optional[str]:
+        """取出最低的空闲槽位"""
+        head = self._head
+        if head == len(self._starts):
+            return None
+        slot = self._starts[head]
+        if slot + 1 == self._ends[head]:
+            self._head = head + 1
+            if self._head * 2 >= len(self._starts):
+                del self._starts[:self._head]
+                del self._ends[:self._head]
+                self._head = 0
+        else:
+            self._starts[head] = slot + 1
+        self._changed(-1)
+        return self.prefix_at(slot)
+
+    def allocate_in(self, start: int, end: int) -> Optional[str]:
+        """取出 [start, end) 内最低的空闲槽位，区间内没有空闲槽位时返回None"""
+        i = bisect_right(self._starts, start, self._head) - 1
+        if i >= self._head and self._ends[i] > start:
+            slot = start
+        elif i + 1 < len(self._starts) and self._starts[i + 1] < end:
+            slot = self._starts[i + 1]
+        else:
+            return None
+        self._take(slot, slot + 1)
+        return self.prefix_at(slot)
+
+    def reserve(self, prefix: str) -> bool:
+        """从空闲空间中取出指定前缀
+
+        前缀必须是 normalize 接受的单个可分配前缀；不合法、不在池内或已被占用时返回False。
+        """
+        prefix = self.normalize(prefix)
+        if prefix is None:
+            return False
+        return self._take(*self.slot_range(prefix))
+
+    def _take(self, start: int, end: int) -> bool:
+        i = self._containing(start, end)
+        if i < 0:
+            return False
+
+        left_start, right_end = self._starts[i], self._ends[i]
+        pieces = []
+        if left_start < start:
+            pieces.append((left_start, start))
+        if end < right_end:
+            pieces.append((end, right_end))
+        self._starts[i:i + 1] = [s for s, _ in pieces]
+        self._ends[i:i + 1] = [e for _, e in pieces]
+        self._changed(start - end)
+        return True
+
+    def release(self, prefix: str) -> bool:
+        """将前缀归还空闲空间并与相邻区间合并，已空闲或不在池内时返回False"""
+        slot_range = self.slot_range(prefix)
+        if slot_range is None:
+            return False
+        start, end = slot_range
+
+        i = bisect_left(self._starts, start, self._head)
+        if i > self._head and self._ends[i - 1] > start:
+            return False
+        if i < len(self._starts) and self._starts[i] < end:
+            return False
+
+        merge_left = i > self._head and self._ends[i - 1] == start
+        merge_right = i < len(self._starts) and self._starts[i] == end
+        if merge_left and merge_right:
+            self._ends[i - 1] = self._ends[i]
+            del self._starts[i]
+            del self._ends[i]
+        elif merge_left:
+            self._ends[i - 1] = end
+        elif merge_right:
+            self._starts[i] = start
+        else:
+            self._starts.insert(i, start)
+            self._ends.insert(i, end)
+        self._changed(end - start)
+        return True
+
+    def _changed(self, delta: int) -> None:
+        self._free += delta
+        self._dumped = None
@@ -0,0 +1,295 @@
+"""
+统一速率限制引擎
+基于 GCRA（通用信元速率算法）：每个键只保存一个“理论到达时间”，内存占用 O(1)；
+Redis 后端用 Lua 脚本原子地检查并更新多个限制，多个 worker 共享同一配额，
+Redis 不可用时回退到进程内存后端
+"""
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .unified_config import settings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# 统计“当前被限流标识”时最多记录的条目数
+LIMITED_TRACK_MAX = 10000
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """限制规则：period 秒内最多 limit 次，burst 为允许瞬时突发的请求数（默认等于 limit）"""
+    name: str
+    limit: int
+    period: float
+    burst: Optional[int] = None
+
+    @property
+    def interval(self) -> float:
+        """两次请求之间的平均间隔"""
+        return self.period / self.limit
+
+    @property
+    def tolerance(self) -> float:
+        return self.interval * (self.burst or self.limit)
+
+
+@dataclass
+class RateLimitResult:
+    """检查结果；被拒绝时所有限制都不计数"""
+    allowed: bool
+    remaining: Dict[str, int] = field(default_factory=dict)
+    reset_after: Dict[str, float] = field(default_factory=dict)
+    retry_after: float = 0.0
+    exceeded: List[str] = field(default_factory=list)
+
+    def headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.remaining:
+            headers["X-RateLimit-Remaining"] = str(min(self.remaining.values()))
+        if self.reset_after:
+            headers["X-RateLimit-Reset"] = str(math.ceil(max(self.reset_after.values())))
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def gcra(now: float, tats: Sequence[Optional[float]], limits: Sequence[RateLimit],
+         cost: int = 1) -> Tuple[RateLimitResult, List[float]]:
+    """计算一次请求的结果和新的理论到达时间（与 Lua 脚本逻辑一致）"""
+    result = RateLimitResult(allowed=True)
+    new_tats = []
+    for limit, stored in zip(limits, tats):
+        tat = max(stored if stored is not None else now, now)
+        new_tat = tat + limit.interval * cost
+        allow_at = new_tat - limit.tolerance
+        if allow_at > now:
+            result.allowed = False
+            result.exceeded.append(limit.name)
+            result.retry_after = max(result.retry_after, allow_at - now)
+        new_tats.append(new_tat)
+
+    for limit, stored, new_tat in zip(limits, tats, new_tats):
+        tat = new_tat if result.allowed else max(stored if stored is not None else now, now)
+        result.remaining[limit.name] = max(0, int((now - (tat - limit.tolerance)) / limit.interval))
+        result.reset_after[limit.name] = max(0.0, tat - now)
+    return result, new_tats
+
+
+class RateLimitBackend:
+    """速率限制存储后端"""
+
+    name = "base"
+
+    async def hit(self, keys: Sequence[str], limits: Sequence[RateLimit], cost: int) -> RateLimitResult:
+        raise NotImplementedError
+
+    async def reset(self, keys: Sequence[str]) -> None:
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """进程内存后端（单 worker 或 Redis 不可用时使用）"""
+
+    name = "memory"
+
+    def __init__(self, sweep_every: int = 10000):
+        self._tats: Dict[str, float] = {}
+        self._sweep_every = sweep_every
+        self._calls = 0
+
+    def _sweep(self, now: float) -> None:
+        # 理论到达时间已过去的键与不存在等价，可以直接删除
+        for key in [key for key, tat in self._tats.items() if tat <= now]:
+            del self._tats[key]
+
+    async def hit(self, keys: Sequence[str], limits: Sequence[RateLimit], cost: int) -> RateLimitResult:
+        now = time.time()
+        self._calls += 1
+        if self._calls % self._sweep_every == 0:
+            self._sweep(now)
+        result, new_tats = gcra(now, [self._tats.get(key) for key in keys], limits, cost)
+        if result.allowed:
+            self._tats.update(zip(keys, new_tats))
+        return result
+
+    async def reset(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            self._tats.pop(key, None)
+
+    def clear(self) -> None:
+        self._tats.clear()
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+
+# KEYS: 各限制的键；ARGV[1]: cost，之后每个限制两个参数：interval、tolerance
+# 返回 {allowed, retry_after, {超出的限制序号(从1开始)...}, remaining_1, reset_1, remaining_2, reset_2, ...}，
+# 浮点数以字符串返回
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local allowed = 1
+local retry_after = 0
+local exceeded = {}
+local tats = {}
+local new_tats = {}
+
+for i = 1, #KEYS do
+    local interval = tonumber(ARGV[i * 2])
+    local tolerance = tonumber(ARGV[i * 2 + 1])
+    local stored = redis.call('GET', KEYS[i])
+    local tat = now
+    if stored then
+        tat = math.max(tonumber(stored), now)
+    end
+    local new_tat = tat + interval * cost
+    local allow_at = new_tat - tolerance
+    if allow_at > now then
+        allowed = 0
+        exceeded[#exceeded + 1] = i
+        retry_after = math.max(retry_after, allow_at - now)
+    end
+    tats[i] = tat
+    new_tats[i] = new_tat
+end
+
+local result = {allowed, tostring(retry_after), exceeded}
+for i = 1, #KEYS do
+    local interval = tonumber(ARGV[i * 2])
+    local tolerance = tonumber(ARGV[i * 2 + 1])
+    local tat = tats[i]
+    if allowed == 1 then
+        tat = new_tats[i]
+        redis.call('SET', KEYS[i], tostring(tat), 'PX', math.ceil((tat - now) * 1000) + 1)
+    end
+    result[#result + 1] = math.max(0, math.floor((now - (tat - tolerance)) / interval))
+    result[#result + 1] = tostring(math.max(0, tat - now))
+end
+return result
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Redis 后端，所有 worker 共享配额；client 可以是 redis.asyncio 或 fakeredis 的异步客户端"""
+
+    name = "redis"
+
+    def __init__(self, client):
+        self.client = client
+        self._script = client.register_script(GCRA_SCRIPT)
+
+    async def hit(self, keys: Sequence[str], limits: Sequence[RateLimit], cost: int) -> RateLimitResult:
+        args: List[Any] = [cost]
+        for limit in limits:
+            args.extend((repr(limit.interval), repr(limit.tolerance)))
+        reply = await self._script(keys=list(keys), args=args)
+
+        result = RateLimitResult(allowed=int(reply[0]) == 1, retry_after=float(reply[1]))
+        result.exceeded = [limits[int(i) - 1].name for i in reply[2]]
+        for i, limit in enumerate(limits):
+            result.remaining[limit.name] = int(reply[3 + i * 2])
+            result.reset_after[limit.name] = float(reply[4 + i * 2])
+        return result
+
+    async def reset(self, keys: Sequence[str]) -> None:
+        await self.client.delete(*keys)
+
+
+class RateLimiter:
+    """速率限制器
+
+    identifier 在同一 scope 下对应一组限制，例如 scope="api" 的
+    分钟/小时/天/突发四个限制；所有限制同时满足时才计数。
+    """
+
+    def __init__(self, backend: Optional[RateLimitBackend] = None, prefix: str = "ratelimit",
+                 fallback_cooldown: float = 30.0):
+        self.prefix = prefix
+        self.fallback = MemoryRateLimitBackend()
+        self.backend = backend or self.fallback
+        self.fallback_cooldown = fallback_cooldown
+        self._backend_down_until = 0.0
+        self._stats = {"allowed": 0, "denied": 0, "fallbacks": 0}
+        # 当前处于限流中的 (scope, identifier) -> 解除时间（单调时钟，本进程观察到的）
+        self._limited: Dict[Tuple[str, str], float] = {}
+
+    def _keys(self, scope: str, identifier: str, limits: Sequence[RateLimit]) -> List[str]:
+        return [f"{self.prefix}:{scope}:{identifier}:{limit.name}" for limit in limits]
+
+    async def hit(self, scope: str, identifier: str, limits: Sequence[RateLimit],
+                  cost: int = 1) -> RateLimitResult:
+        """记录一次请求并返回是否放行"""
+        keys = self._keys(scope, identifier, limits)
+        backend = self.backend
+        if backend is not self.fallback and time.monotonic() < self._backend_down_until:
+            backend = self.fallback
+
+        try:
+            result = await backend.hit(keys, limits, cost)
+        except Exception as e:
+            if backend is self.fallback:
+                raise
+            # Redis 故障时在冷却期内使用内存后端，各 worker 独立计数
+            logger.warning(f"速率限制后端 {backend.name} 不可用，回退到内存后端: {e}")
+            self._backend_down_until = time.monotonic() + self.fallback_cooldown
+            self._stats["fallbacks"] += 1
+            result = await self.fallback.hit(keys, limits, cost)
+
+        self._stats["allowed" if result.allowed else "denied"] += 1
+        if not result.allowed:
+            now = time.monotonic()
+            if len(self._limited) >= LIMITED_TRACK_MAX:
+                self._purge_limited(now)
+            if len(self._limited) < LIMITED_TRACK_MAX:
+                self._limited[(scope, identifier)] = now + result.retry_after
+        return result
+
+    def _purge_limited(self, now: float) -> None:
+        for key in [key for key, until in self._limited.items() if until <= now]:
+            del self._limited[key]
+
+    def limited_count(self, scope: Optional[str] = None) -> int:
+        """当前处于限流中的标识（如客户端IP）数量，可按 scope 过滤"""
+        self._purge_limited(time.monotonic())
+        if scope is None:
+            return len(self._limited)
+        return sum(1 for limited_scope, _ in self._limited if limited_scope == scope)
+
+    async def reset(self, scope: str, identifier: str, limits: Sequence[RateLimit]) -> None:
+        keys = self._keys(scope, identifier, limits)
+        await self.fallback.reset(keys)
+        if self.backend is not self.fallback:
+            try:
+                await self.backend.reset(keys)
+            except Exception as e:
+                logger.warning(f"重置速率限制失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "degraded": self.backend is not self.fallback and time.monotonic() < self._backend_down_until,
+            "memory_keys": len(self.fallback),
+            "limited": self.limited_count(),
+            **self._stats,
+        }
+
+
+def _create_backend() -> Optional[RateLimitBackend]:
+    if not (settings.USE_REDIS and settings.REDIS_URL):
+        return None
+    try:
+        import redis.asyncio as redis_asyncio
+    except ImportError:
+        logger.warning("未安装 redis 异步客户端，速率限制使用内存后端")
+        return None
+    client = redis_asyncio.from_url(settings.REDIS_URL, decode_responses=True)
+    return RedisRateLimitBackend(client)
+
+
+# 全局速率限制器
+rate_limiter = RateLimiter(_create_backend())
@@ -1,44 +1,180 @@
 # API响应压缩模块
 
-import gzip
 import zlib
-import brotli
 import json
-from typing import Any, Dict, List, Optional, Union
-from fastapi import Request, Response
-from fastapi.responses import JSONResponse
+import math
 import time
+import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
 from enum import Enum
 
+from .unified_config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖
+    zstandard = None
+
 class CompressionType(Enum):
     """压缩类型"""
     GZIP = "gzip"
     DEFLATE = "deflate"
     BROTLI = "br"
+    ZSTD = "zstd"
     NONE = "identity"
 
+# 各算法的 (最快, 默认, 高压缩率) 级别；brotli 10/11 对动态内容过慢，不使用
+LEVELS = {
+    CompressionType.GZIP: (1, 6, 9),
+    CompressionType.DEFLATE: (1, 6, 9),
+    CompressionType.BROTLI: (1, 5, 9),
+    CompressionType.ZSTD: (1, 3, 12),
+}
+
+LEVEL_RANGE = {
+    CompressionType.GZIP: (1, 9),
+    CompressionType.DEFLATE: (1, 9),
+    CompressionType.BROTLI: (0, 11),
+    CompressionType.ZSTD: (1, 22),
+}
+
+
+def is_available(compression_type: CompressionType) -> bool:
+    """当前环境是否支持该压缩算法"""
+    if compression_type == CompressionType.BROTLI:
+        return brotli is not None
+    if compression_type == CompressionType.ZSTD:
+        return zstandard is not None
+    return compression_type != CompressionType.NONE
+
+
+def clamp_level(compression_type: CompressionType, level: int) -> int:
+    low, high = LEVEL_RANGE[compression_type]
+    return max(low, min(high, level))
+
+
+class StreamEncoder:
+    """增量压缩器，统一 gzip/deflate/brotli/zstd 的接口"""
+
+    def __init__(self, compression_type: CompressionType, level: int):
+        self.type = compression_type
+        level = clamp_level(compression_type, level)
+        if compression_type == CompressionType.GZIP:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+        elif compression_type == CompressionType.DEFLATE:
+            self._obj = zlib.compressobj(level)
+        elif compression_type == CompressionType.BROTLI:
+            self._obj = brotli.Compressor(quality=level)
+        elif compression_type == CompressionType.ZSTD:
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"不支持的压缩类型: {compression_type.value}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.type == CompressionType.BROTLI:
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        """输出已输入数据的完整压缩块（流仍可继续写入）"""
+        if self.type == CompressionType.BROTLI:
+            return self._obj.flush()
+        if self.type == CompressionType.ZSTD:
+            return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.type == CompressionType.BROTLI:
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def compress_bytes(content: bytes, compression_type: CompressionType, level: int) -> Tuple[bytes, float]:
+    """一次性压缩，返回压缩结果和消耗的CPU时间（秒）"""
+    start = time.thread_time()
+    encoder = StreamEncoder(compression_type, level)
+    compressed = encoder.compress(content) + encoder.finish()
+    return compressed, time.thread_time() - start
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding，返回 编码 -> q 值"""
+    result = {}
+    for part in header.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        result[token.strip()] = q
+    return result
+
 class CompressionConfig:
     """压缩配置"""
     def __init__(
         self,
         min_size: int = 1024,  # 最小压缩大小
         max_size: int = 10 * 1024 * 1024,  # 最大压缩大小
-        compression_level: int = 6,  # 压缩级别
+        compression_level: int = 6,  # 压缩级别（adaptive=False 时使用）
         enabled_types: List[CompressionType] = None,
-        exclude_content_types: List[str] = None
+        exclude_content_types: List[str] = None,
+        adaptive: bool = True,  # 按响应大小和CPU预算选择压缩级别
+        cpu_budget: float = 0.25,  # 压缩可占用的CPU核数，超出后使用最快级别
+        large_size: int = 1024 * 1024,  # 超过该大小使用最快级别
+        offload_size: int = 64 * 1024,  # 超过该大小在线程池中压缩，不阻塞事件循环
+        cache_max_bytes: int = 16 * 1024 * 1024,  # 预压缩结果缓存的总大小，0 表示不缓存
+        cache_max_entries: int = 1024
     ):
         self.min_size = min_size
         self.max_size = max_size
         self.compression_level = compression_level
-        self.enabled_types = enabled_types or [CompressionType.GZIP, CompressionType.BROTLI]
+        # 列表顺序即服务端偏好顺序，环境不支持的算法会被忽略
+        self.enabled_types = [
+            t for t in (enabled_types or [CompressionType.GZIP, CompressionType.BROTLI]) if is_available(t)
+        ]
         self.exclude_content_types = exclude_content_types or [
             "image/", "video/", "audio/", "application/zip", "application/gzip"
         ]
+        self.adaptive = adaptive
+        self.cpu_budget = cpu_budget
+        self.large_size = large_size
+        self.offload_size = offload_size
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_max_entries = cache_max_entries
+
+    def is_excluded(self, content_type: str) -> bool:
+        return any(content_type.startswith(t) for t in self.exclude_content_types)
+
+    def negotiate(self, accept_encoding: str) -> CompressionType:
+        """按服务端偏好选择客户端接受（q > 0）的压缩类型"""
+        if not accept_encoding:
+            return CompressionType.NONE
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        for compression_type in self.enabled_types:
+            if accepted.get(compression_type.value, wildcard) > 0:
+                return compression_type
+        return CompressionType.NONE
 
 class ResponseCompressor:
     """响应压缩器"""
-    
+
     def __init__(self, config: CompressionConfig):
         self.config = config
         self.logger = logging.getLogger(__name__)
@@ -46,223 +182,498 @@ class ResponseCompressor:
             "total_requests": 0,
             "compressed_requests": 0,
             "bytes_saved": 0,
+            "original_bytes": 0,
             "compression_ratio": 0.0
         }
-    
-    def should_compress(self, content: bytes, content_type: str, 
+
+    def should_compress(self, content: bytes, content_type: str,
                        accept_encoding: str) -> Tuple[bool, CompressionType]:
         """判断是否应该压缩"""
         # 检查内容大小
         if len(content) < self.config.min_size:
             return False, CompressionType.NONE
-        
+
         if len(content) > self.config.max_size:
             return False, CompressionType.NONE
-        
+
         # 检查内容类型
-        for exclude_type in self.config.exclude_content_types:
-            if content_type.startswith(exclude_type):
-                return False, CompressionType.NONE
-        
+        if self.config.is_excluded(content_type):
+            return False, CompressionType.NONE
+
         # 检查客户端支持的压缩类型
         compression_type = self._get_best_compression_type(accept_encoding)
         if compression_type == CompressionType.NONE:
             return False, CompressionType.NONE
-        
+
         return True, compression_type
-    
+
     def _get_best_compression_type(self, accept_encoding: str) -> CompressionType:
         """获取最佳压缩类型"""
-        accept_encoding = accept_encoding.lower()
-        
-        # 按优先级选择压缩类型
-        if CompressionType.BROTLI in self.config.enabled_types and "br" in accept_encoding:
-            return CompressionType.BROTLI
-        elif CompressionType.GZIP in self.config.enabled_types and "gzip" in accept_encoding:
-            return CompressionType.GZIP
-        elif CompressionType.DEFLATE in self.config.enabled_types and "deflate" in accept_encoding:
-            return CompressionType.DEFLATE
-        
-        return CompressionType.NONE
-    
+        return self.config.negotiate(accept_encoding)
+
     def compress_content(self, content: bytes, compression_type: CompressionType) -> bytes:
         """压缩内容"""
+        if compression_type == CompressionType.NONE:
+            return content
         try:
-            if compression_type == CompressionType.GZIP:
-                return gzip.compress(content, compresslevel=self.config.compression_level)
-            elif compression_type == CompressionType.DEFLATE:
-                return zlib.compress(content, level=self.config.compression_level)
-            elif compression_type == CompressionType.BROTLI:
-                return brotli.compress(content, quality=self.config.compression_level)
-            else:
-                return content
+            return compress_bytes(content, compression_type, self.config.compression_level)[0]
         except Exception as e:
             self.logger.error(f"压缩失败: {e}")
             return content
-    
-    def compress_response(self, response: Response, content: bytes, 
+
+    def compress_response(self, response: Response, content: bytes,
                          content_type: str, accept_encoding: str) -> Response:
         """压缩响应"""
         should_compress, compression_type = self.should_compress(
             content, content_type, accept_encoding
         )
-        
+
         if not should_compress:
             response.body = content
             return response
-        
+
         # 压缩内容
         compressed_content = self.compress_content(content, compression_type)
-        
+
         # 更新响应
         response.body = compressed_content
         response.headers["Content-Encoding"] = compression_type.value
         response.headers["Content-Length"] = str(len(compressed_content))
-        
+        response.headers["Vary"] = "Accept-Encoding"
+
         # 更新统计
         self._update_stats(len(content), len(compressed_content))
-        
+
         return response
-    
+
     def _update_stats(self, original_size: int, compressed_size: int):
         """更新压缩统计"""
         self.compression_stats["total_requests"] += 1
         self.compression_stats["compressed_requests"] += 1
         self.compression_stats["bytes_saved"] += original_size - compressed_size
-        
-        if self.compression_stats["total_requests"] > 0:
+        self.compression_stats["original_bytes"] += original_size
+
+        if self.compression_stats["original_bytes"] > 0:
             self.compression_stats["compression_ratio"] = (
-                self.compression_stats["bytes_saved"] / 
-                (self.compression_stats["total_requests"] * original_size)
+                self.compression_stats["bytes_saved"] / self.compression_stats["original_bytes"]
             )
-    
+
     def get_stats(self) -> Dict[str, Any]:
         """获取压缩统计"""
         return self.compression_stats.copy()
 
 class JSONCompressor:
     """JSON压缩器"""
-    
+
     def __init__(self, config: CompressionConfig):
         self.config = config
         self.compressor = ResponseCompressor(config)
-    
+
     def compress_json_response(self, data: Any, accept_encoding: str) -> JSONResponse:
         """压缩JSON响应"""
         # 序列化JSON
         json_content = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
         content_bytes = json_content.encode('utf-8')
-        
+
         # 创建响应
         response = JSONResponse(content=data)
-        
+
         # 压缩响应
         compressed_response = self.compressor.compress_response(
             response, content_bytes, "application/json", accept_encoding
         )
-        
+
         return compressed_response
 
 class StreamingCompressor:
     """流式压缩器"""
-    
+
     def __init__(self, config: CompressionConfig):
         self.config = config
         self.compressor = ResponseCompressor(config)
-    
-    def compress_stream(self, data_stream, compression_type: CompressionType):
-        """压缩数据流"""
-        if compression_type == CompressionType.GZIP:
-            compressor = gzip.GzipFile(mode='wb', compresslevel=self.config.compression_level)
-        elif compression_type == CompressionType.DEFLATE:
-            compressor = zlib.compressobj(level=self.config.compression_level)
-        elif compression_type == CompressionType.BROTLI:
-            compressor = brotli.Compressor(quality=self.config.compression_level)
-        else:
+
+    def compress_stream(self, data_stream: Iterable[bytes], compression_type: CompressionType,
+                        flush_each: bool = False):
+        """压缩数据流
+
+        Args:
+            flush_each: 每个分块后立即输出完整压缩块（用于 SSE 等需要实时到达的流）
+        """
+        if compression_type == CompressionType.NONE or not is_available(compression_type):
             yield from data_stream
             return
-        
-        try:
-            for chunk in data_stream:
-                if compression_type == CompressionType.GZIP:
-                    compressed_chunk = compressor.compress(chunk)
-                elif compression_type == CompressionType.DEFLATE:
-                    compressed_chunk = compressor.compress(chunk)
-                elif compression_type == CompressionType.BROTLI:
-                    compressed_chunk = compressor.compress(chunk)
-                
-                if compressed_chunk:
-                    yield compressed_chunk
-            
-            # 完成压缩
-            if compression_type == CompressionType.GZIP:
-                final_chunk = compressor.close()
-            elif compression_type == CompressionType.DEFLATE:
-                final_chunk = compressor.flush()
-            elif compression_type == CompressionType.BROTLI:
-                final_chunk = compressor.finish()
-            
-            if final_chunk:
-                yield final_chunk
-                
-        finally:
-            if hasattr(compressor, 'close'):
-                compressor.close()
+
+        encoder = StreamEncoder(compression_type, self.config.compression_level)
+        for chunk in data_stream:
+            compressed_chunk = encoder.compress(chunk)
+            if flush_each:
+                compressed_chunk += encoder.flush()
+            if compressed_chunk:
+                yield compressed_chunk
+
+        # 完成压缩
+        final_chunk = encoder.finish()
+        if final_chunk:
+            yield final_chunk
+
+
+class CompressionBudget:
+    """压缩CPU预算：按指数衰减统计最近的压缩耗时，估算压缩占用的CPU核数"""
+
+    def __init__(self, cpu_budget: float, half_life: float = 5.0):
+        self.cpu_budget = cpu_budget
+        self._tau = half_life / math.log(2)
+        self._spent = 0.0
+        self._last = time.monotonic()
+
+    def _decay(self, now: float) -> None:
+        self._spent *= math.exp(-(now - self._last) / self._tau)
+        self._last = now
+
+    def charge(self, cpu_seconds: float) -> None:
+        self._decay(time.monotonic())
+        self._spent += cpu_seconds
+
+    def usage(self) -> float:
+        self._decay(time.monotonic())
+        return self._spent / self._tau
+
+    def exceeded(self) -> bool:
+        return self.usage() > self.cpu_budget
+
+
+class PrecompressedCache:
+    """以 (响应体摘要, 编码) 为键的预压缩结果LRU缓存，限制条目数和总字节数"""
+
+    def __init__(self, max_bytes: int, max_entries: int = 1024):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size_bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, digest: str, encoding: CompressionType) -> Optional[bytes]:
+        key = (digest, encoding.value)
+        body = self._entries.get(key)
+        if body is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return body
+
+    def put(self, digest: str, encoding: CompressionType, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        key = (digest, encoding.value)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size_bytes -= len(old)
+        self._entries[key] = body
+        self.size_bytes += len(body)
+        while self.size_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _without(headers: List[Tuple[bytes, bytes]], *names: bytes) -> List[Tuple[bytes, bytes]]:
+    return [(key, value) for key, value in headers if key.lower() not in names]
+
+
+def _add_vary(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    vary = _header(headers, b"vary")
+    if vary is None:
+        return headers + [(b"vary", b"Accept-Encoding")]
+    if "accept-encoding" in vary.lower() or vary.strip() == "*":
+        return headers
+    return _without(headers, b"vary") + [(b"vary", f"{vary}, Accept-Encoding".encode("latin-1"))]
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def _route_name(scope: Dict[str, Any]) -> str:
+    """路由模板（路由匹配后由框架写入 scope），避免按具体路径统计造成高基数"""
+    route = scope.get("route")
+    if getattr(route, "path", None):
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        return getattr(endpoint, "__qualname__", repr(endpoint))
+    return "<unmatched>"
+
 
 class CompressionMiddleware:
-    """压缩中间件"""
-    
-    def __init__(self, config: CompressionConfig):
-        self.config = config
-        self.compressor = ResponseCompressor(config)
-        self.json_compressor = JSONCompressor(config)
-    
-    async def __call__(self, request: Request, call_next):
+    """压缩中间件（纯 ASGI 实现）
+
+    - 完整响应体：压缩结果按响应体摘要缓存，热点响应只压缩一次；
+      不带凭据（Authorization / Cookie）且不设置 Cookie 的 GET 响应生成 ETag，
+      支持 If-None-Match 返回 304（路由自己设置的 ETag 始终可用于 304）
+    - 流式响应：逐块增量压缩，SSE 每块立即刷新
+    - 压缩级别按响应大小和CPU预算自适应，压缩效果按路由汇总到 CompressionAnalyzer
+    """
+
+    def __init__(self, app, config: Optional[CompressionConfig] = None,
+                 analyzer: Optional["CompressionAnalyzer"] = None):
+        self.app = app
+        self.config = config or DEFAULT_COMPRESSION_CONFIG
+        self.analyzer = analyzer or compression_analyzer
+        self.budget = CompressionBudget(self.config.cpu_budget)
+        self.cache = PrecompressedCache(self.config.cache_max_bytes, self.config.cache_max_entries)
+        self.logger = logging.getLogger(__name__)
+        self.stats = {
+            "total_requests": 0,
+            "compressed_responses": 0,
+            "streamed_responses": 0,
+            "not_modified": 0,
+            "budget_throttled": 0,
+        }
+
+    async def __call__(self, scope, receive, send):
         """中间件处理"""
-        start_time = time.time()
-        
-        # 处理请求
-        response = await call_next(request)
-        
-        # 获取Accept-Encoding头
-        accept_encoding = request.headers.get("Accept-Encoding", "")
-        
-        # 检查响应类型
-        content_type = response.headers.get("Content-Type", "")
-        
-        # 获取响应内容
-        if hasattr(response, 'body'):
-            content = response.body
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        request_headers = scope["headers"]
+        encoding = self.config.negotiate(_header(request_headers, b"accept-encoding") or "")
+        if method == "HEAD" or (encoding == CompressionType.NONE and method != "GET"):
+            await self.app(scope, receive, send)
+            return
+
+        self.stats["total_requests"] += 1
+        credentialed = any(key.lower() in (b"authorization", b"cookie") for key, _ in request_headers)
+        responder = _CompressionResponder(
+            self, scope, send, encoding, _header(request_headers, b"if-none-match"), credentialed
+        )
+        await self.app(scope, receive, responder.send)
+
+    def select_level(self, compression_type: CompressionType, size: Optional[int], cacheable: bool) -> int:
+        """选择压缩级别
+
+        结果会被缓存的响应使用高压缩率级别（压缩一次多次复用）；
+        流式或超大响应使用最快级别；CPU预算用尽时一律使用最快级别。
+        """
+        if not self.config.adaptive:
+            return clamp_level(compression_type, self.config.compression_level)
+        fast, default, high = LEVELS[compression_type]
+        if self.budget.exceeded():
+            self.stats["budget_throttled"] += 1
+            return fast
+        if size is None or size >= self.config.large_size:
+            return fast
+        return high if cacheable else default
+
+    def should_offload(self, compression_type: CompressionType, level: int, size: int) -> bool:
+        """是否在线程池中压缩
+
+        高于默认级别的压缩（缓存响应的高压缩率级别、MAX_COMPRESSION_CONFIG）
+        和较大的响应体耗时可达数十毫秒，不能在事件循环中同步执行。
+        """
+        return size >= self.config.offload_size or level > LEVELS[compression_type][1]
+
+    def record(self, scope, content_type: str, encoding: CompressionType, original_size: int,
+               compressed_size: int, cpu_time: float, cached: bool = False) -> None:
+        self.stats["compressed_responses"] += 1
+        if not cached:
+            self.budget.charge(cpu_time)
+        self.analyzer.analyze_compression(
+            content_type.split(";")[0].strip(), original_size, compressed_size, encoding.value,
+            route=_route_name(scope), cpu_time=cpu_time, cached=cached
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "cpu_usage": self.budget.usage(),
+            "cpu_budget": self.config.cpu_budget,
+            "cache_entries": len(self.cache),
+            "cache_bytes": self.cache.size_bytes,
+            **{f"cache_{key}": value for key, value in self.cache.stats.items()},
+        }
+
+
+class _CompressionResponder:
+    """包装单个请求的 send，推迟发送响应头直到看到第一个响应体分块"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope, send, encoding: CompressionType,
+                 if_none_match: Optional[str], credentialed: bool = False):
+        self.middleware = middleware
+        self.config = middleware.config
+        self.scope = scope
+        self._send = send
+        self.encoding = encoding
+        self.if_none_match = if_none_match
+        self.credentialed = credentialed
+        self.start_message = None
+        self.encoder: Optional[StreamEncoder] = None
+        self.passthrough = False
+        self.flush_each = False
+        self.content_type = ""
+        self.original_size = 0
+        self.compressed_size = 0
+        self.cpu_time = 0.0
+
+    async def send(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+        if self.encoder is not None:
+            await self._send_stream_chunk(message)
+            return
+
+        headers = list(self.start_message.get("headers", []))
+        self.content_type = _header(headers, b"content-type") or ""
+        body = message.get("body", b"")
+        if _header(headers, b"content-encoding") or self.config.is_excluded(self.content_type):
+            await self._pass(message)
+        elif message.get("more_body", False):
+            await self._start_stream(headers, message)
         else:
-            content = b""
-        
-        # 压缩响应
-        if content and len(content) > 0:
-            compressed_response = self.compressor.compress_response(
-                response, content, content_type, accept_encoding
-            )
-            
-            # 更新处理时间
-            process_time = time.time() - start_time
-            compressed_response.headers["X-Process-Time"] = str(process_time)
-            
-            return compressed_response
-        
-        return response
+            await self._send_full(headers, body)
+
+    async def _pass(self, message) -> None:
+        self.passthrough = True
+        await self._send(self.start_message)
+        await self._send(message)
+
+    async def _send_full(self, headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        status = self.start_message["status"]
+        cache_control = (_header(headers, b"cache-control") or "").lower()
+        cacheable = self.scope["method"] == "GET" and status == 200 and "no-store" not in cache_control
+
+        etag = digest = None
+        if cacheable:
+            digest = 'W/"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+            etag = _header(headers, b"etag")
+            # 带凭据的请求和设置 Cookie 的响应因用户而异，不自动生成验证器
+            if etag is None and not self.credentialed and _header(headers, b"set-cookie") is None:
+                etag = digest
+                headers.append((b"etag", etag.encode("latin-1")))
+            if etag and self.if_none_match and _etag_matches(self.if_none_match, etag):
+                self.middleware.stats["not_modified"] += 1
+                headers = _without(headers, b"content-length", b"content-type")
+                await self._send({**self.start_message, "status": 304, "headers": _add_vary(headers)})
+                await self._send({"type": "http.response.body", "body": b""})
+                return
+
+        encoding = self.encoding
+        if encoding == CompressionType.NONE or not self.config.min_size <= len(body) <= self.config.max_size:
+            if cacheable:
+                headers = _add_vary(headers)
+            await self._send({**self.start_message, "headers": headers})
+            await self._send({"type": "http.response.body", "body": body})
+            return
+
+        compressed = self.middleware.cache.get(digest, encoding) if cacheable else None
+        cached = compressed is not None
+        cpu_time = 0.0
+        if not cached:
+            level = self.middleware.select_level(encoding, len(body), cacheable)
+            try:
+                if self.middleware.should_offload(encoding, level, len(body)):
+                    compressed, cpu_time = await asyncio.to_thread(compress_bytes, body, encoding, level)
+                else:
+                    compressed, cpu_time = compress_bytes(body, encoding, level)
+            except Exception as e:
+                self.middleware.logger.error(f"压缩失败: {e}")
+                await self._send({**self.start_message, "headers": headers})
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            if cacheable:
+                self.middleware.cache.put(digest, encoding, compressed)
+
+        headers = _add_vary(_without(headers, b"content-length", b"content-encoding"))
+        headers += [
+            (b"content-encoding", encoding.value.encode("latin-1")),
+            (b"content-length", str(len(compressed)).encode("latin-1")),
+        ]
+        await self._send({**self.start_message, "headers": headers})
+        await self._send({"type": "http.response.body", "body": compressed})
+        self.middleware.record(self.scope, self.content_type, encoding, len(body), len(compressed),
+                               cpu_time, cached=cached)
+
+    async def _start_stream(self, headers: List[Tuple[bytes, bytes]], message) -> None:
+        if self.encoding == CompressionType.NONE:
+            await self._pass(message)
+            return
+        self.middleware.stats["streamed_responses"] += 1
+        self.flush_each = self.content_type.startswith("text/event-stream")
+        level = self.middleware.select_level(self.encoding, None, False)
+        self.encoder = StreamEncoder(self.encoding, level)
+        headers = _add_vary(_without(headers, b"content-length", b"content-encoding"))
+        headers.append((b"content-encoding", self.encoding.value.encode("latin-1")))
+        await self._send({**self.start_message, "headers": headers})
+        await self._send_stream_chunk(message)
+
+    async def _send_stream_chunk(self, message) -> None:
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        start = time.thread_time()
+        chunk = self.encoder.compress(body) if body else b""
+        if not more_body:
+            chunk += self.encoder.finish()
+        elif self.flush_each:
+            chunk += self.encoder.flush()
+        self.cpu_time += time.thread_time() - start
+        self.original_size += len(body)
+        self.compressed_size += len(chunk)
+
+        if chunk or not more_body:
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        if not more_body:
+            self.middleware.record(self.scope, self.content_type, self.encoding, self.original_size,
+                                   self.compressed_size, self.cpu_time)
+
 
 class CompressionAnalyzer:
     """压缩分析器"""
-    
+
     def __init__(self):
         self.analysis_data = {
             "content_types": {},
             "compression_ratios": {},
+            "routes": {},
             "performance_metrics": {}
         }
-    
-    def analyze_compression(self, content_type: str, original_size: int, 
-                          compressed_size: int, compression_type: str):
-        """分析压缩效果"""
+
+    def analyze_compression(self, content_type: str, original_size: int,
+                          compressed_size: int, compression_type: str,
+                          route: Optional[str] = None, cpu_time: float = 0.0, cached: bool = False):
+        """分析压缩效果
+
+        Args:
+            route: 路由模板，提供时按路由汇总压缩率和CPU耗时
+            cpu_time: 本次压缩消耗的CPU时间（秒），命中预压缩缓存时为 0
+            cached: 是否命中预压缩缓存
+        """
         if content_type not in self.analysis_data["content_types"]:
             self.analysis_data["content_types"][content_type] = {
                 "count": 0,
@@ -270,7 +681,7 @@ class CompressionAnalyzer:
                 "total_compressed_size": 0,
                 "avg_ratio": 0.0
             }
-        
+
         data = self.analysis_data["content_types"][content_type]
         data["count"] += 1
         data["total_original_size"] += original_size
@@ -279,22 +690,46 @@ class CompressionAnalyzer:
             data["total_compressed_size"] / data["total_original_size"]
             if data["total_original_size"] > 0 else 0
         )
-        
-        # 记录压缩类型效果
-        if compression_type not in self.analysis_data["compression_ratios"]:
-            self.analysis_data["compression_ratios"][compression_type] = []
-        
+
+        # 记录压缩类型效果（只保留汇总值，避免随请求数无限增长）
         ratio = compressed_size / original_size if original_size > 0 else 0
-        self.analysis_data["compression_ratios"][compression_type].append(ratio)
-    
+        ratios = self.analysis_data["compression_ratios"].get(compression_type)
+        if ratios is None:
+            self.analysis_data["compression_ratios"][compression_type] = {
+                "count": 1, "total": ratio, "min": ratio, "max": ratio
+            }
+        else:
+            ratios["count"] += 1
+            ratios["total"] += ratio
+            ratios["min"] = min(ratios["min"], ratio)
+            ratios["max"] = max(ratios["max"], ratio)
+
+        if route is not None:
+            routes = self.analysis_data["routes"]
+            if route not in routes:
+                routes[route] = {
+                    "count": 0,
+                    "cache_hits": 0,
+                    "total_original_size": 0,
+                    "total_compressed_size": 0,
+                    "cpu_time": 0.0
+                }
+            data = routes[route]
+            data["count"] += 1
+            data["cache_hits"] += int(cached)
+            data["total_original_size"] += original_size
+            data["total_compressed_size"] += compressed_size
+            data["cpu_time"] += cpu_time
+
     def get_analysis_report(self) -> Dict[str, Any]:
         """获取分析报告"""
         report = {
             "content_type_analysis": {},
             "compression_type_analysis": {},
+            "route_analysis": {},
             "recommendations": []
         }
-        
+
         # 分析内容类型
         for content_type, data in self.analysis_data["content_types"].items():
             report["content_type_analysis"][content_type] = {
@@ -302,49 +737,74 @@ class CompressionAnalyzer:
                 "avg_compression_ratio": data["avg_ratio"],
                 "total_bytes_saved": data["total_original_size"] - data["total_compressed_size"]
             }
-        
+
         # 分析压缩类型
         for compression_type, ratios in self.analysis_data["compression_ratios"].items():
-            if ratios:
-                report["compression_type_analysis"][compression_type] = {
-                    "avg_ratio": sum(ratios) / len(ratios),
-                    "min_ratio": min(ratios),
-                    "max_ratio": max(ratios),
-                    "count": len(ratios)
-                }
-        
+            report["compression_type_analysis"][compression_type] = {
+                "avg_ratio": ratios["total"] / ratios["count"],
+                "min_ratio": ratios["min"],
+                "max_ratio": ratios["max"],
+                "count": ratios["count"]
+            }
+
+        # 分析路由
+        for route, data in self.analysis_data["routes"].items():
+            compressed_count = data["count"] - data["cache_hits"]
+            report["route_analysis"][route] = {
+                "count": data["count"],
+                "cache_hits": data["cache_hits"],
+                "compression_ratio": (
+                    data["total_compressed_size"] / data["total_original_size"]
+                    if data["total_original_size"] > 0 else 0
+                ),
+                "total_bytes_saved": data["total_original_size"] - data["total_compressed_size"],
+                "cpu_time_ms": data["cpu_time"] * 1000,
+                "avg_cpu_time_ms": data["cpu_time"] * 1000 / compressed_count if compressed_count else 0.0
+            }
+
         # 生成建议
         report["recommendations"] = self._generate_recommendations()
-        
+
         return report
-    
+
     def _generate_recommendations(self) -> List[str]:
         """生成优化建议"""
         recommendations = []
-        
+
         # 分析压缩效果
         for content_type, data in self.analysis_data["content_types"].items():
             if data["avg_ratio"] > 0.8:  # 压缩率低于20%
                 recommendations.append(f"内容类型 {content_type} 压缩效果不佳，考虑调整压缩策略")
-        
+
         # 分析压缩类型
         for compression_type, ratios in self.analysis_data["compression_ratios"].items():
-            if ratios and sum(ratios) / len(ratios) > 0.9:  # 平均压缩率低于10%
+            if ratios["total"] / ratios["count"] > 0.9:  # 平均压缩率低于10%
                 recommendations.append(f"压缩类型 {compression_type} 效果不佳，考虑使用其他压缩算法")
-        
+
+        # 分析路由：压缩收益低但CPU耗时高的路由
+        for route, data in self.analysis_data["routes"].items():
+            if data["total_original_size"] and data["cpu_time"] > 1.0 and \
+                    data["total_compressed_size"] / data["total_original_size"] > 0.8:
+                recommendations.append(f"路由 {route} 压缩收益低且CPU耗时高，考虑排除压缩")
+
         return recommendations
 
+# 全局压缩分析器
+compression_analyzer = CompressionAnalyzer()
+
 # 默认压缩配置
 DEFAULT_COMPRESSION_CONFIG = CompressionConfig(
     min_size=1024,
     max_size=10 * 1024 * 1024,
     compression_level=6,
-    enabled_types=[CompressionType.GZIP, CompressionType.BROTLI],
+    enabled_types=[CompressionType.BROTLI, CompressionType.ZSTD, CompressionType.GZIP],
     exclude_content_types=[
-        "image/", "video/", "audio/", 
+        "image/", "video/", "audio/",
         "application/zip", "application/gzip",
         "application/pdf"
-    ]
+    ],
+    cpu_budget=getattr(settings, "RESPONSE_COMPRESSION_CPU_BUDGET", 0.25),
+    cache_max_bytes=getattr(settings, "RESPONSE_COMPRESSION_CACHE_BYTES", 16 * 1024 * 1024)
 )
 
 # 高性能压缩配置
@@ -355,7 +815,8 @@ HIGH_PERFORMANCE_CONFIG = CompressionConfig(
     enabled_types=[CompressionType.GZIP],
     exclude_content_types=[
         "image/", "video/", "audio/"
-    ]
+    ],
+    adaptive=False
 )
 
 # 最大压缩配置
@@ -366,5 +827,6 @@ MAX_COMPRESSION_CONFIG = CompressionConfig(
     enabled_types=[CompressionType.BROTLI, CompressionType.GZIP],
     exclude_content_types=[
         "image/", "video/", "audio/"
-    ]
+    ],
+    adaptive=False
 )
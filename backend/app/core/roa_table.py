@@ -0,0 +1,297 @@
+"""
+RPKI ROA 前缀树
+把 rpki-client / Routinator 导出的 ROA（VRP）载入按地址族划分的压缩前缀树（Patricia
+树），按 RFC 6811 判定路由起源：存在覆盖该前缀、起源AS相同且 maxLength 不小于前缀
+长度的 ROA 为 valid；只有不匹配的覆盖 ROA 为 invalid；没有覆盖 ROA 为 not_found。
+查询只沿根到前缀的路径比较，步数不超过前缀长度。
+"""
+import csv
+import io
+import ipaddress
+import json
+import socket
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+VALID = "valid"
+INVALID = "invalid"
+NOT_FOUND = "not_found"
+
+_NONE = -1
+
+# (网络地址整数, 前缀长度, maxLength, 起源AS)
+ROA = Tuple[int, int, int, int]
+
+
+def parse_asn(value: Any) -> int:
+    """解析 13335 / "13335" / "AS13335" 形式的AS号"""
+    if isinstance(value, int):
+        asn = value
+    else:
+        text = str(value).strip()
+        asn = int(text[2:] if text[:2].upper() == "AS" else text)
+    if not 0 <= asn <= 0xFFFFFFFF:
+        raise ValueError(f"无效的AS号: {value}")
+    return asn
+
+
+def _parse_prefix(prefix: str) -> Tuple[int, int, int]:
+    """返回 (地址族版本, 网络地址整数, 前缀长度)，主机位清零
+
+    载入全量 ROA 和批量校验时每条都要解析，用 inet_pton 代替 ipaddress（快约一个数量级）。
+    """
+    address, _, length = prefix.strip().partition("/")
+    version, family, bits = (6, socket.AF_INET6, 128) if ":" in address else (4, socket.AF_INET, 32)
+    try:
+        value = int.from_bytes(socket.inet_pton(family, address), "big")
+    except OSError:
+        raise ValueError(f"无效的地址: {prefix}") from None
+    length = int(length) if length else bits
+    if not 0 <= length <= bits:
+        raise ValueError(f"无效的前缀长度: {prefix}")
+    return version, value >> (bits - length) << (bits - length), length
+
+
+class _PrefixTrie:
+    """单个地址族的 Patricia 树
+
+    节点保存在并行数组中：子节点、前缀长度、键（该节点或其某个后代的网络地址整数）、
+    该前缀的 ROA 在 asn/max_length 数组中的起始位置和数量。只有分叉点和 ROA 前缀
+    成为节点，节点数不超过不同前缀数的两倍。
+    """
+
+    def __init__(self, bits: int, roas: List[ROA]):
+        self.bits = bits
+        self.zero = array("i")
+        self.one = array("i")
+        self.length = array("B")
+        self.key: List[int] = []
+        self.first = array("i")
+        self.count = array("I")
+        self.asn = array("I")
+        self.max_length = array("B")
+        self._new_node(0, 0)
+        self._build(roas)
+
+    def _new_node(self, key: int, length: int) -> int:
+        self.zero.append(_NONE)
+        self.one.append(_NONE)
+        self.length.append(length)
+        self.key.append(key)
+        self.first.append(_NONE)
+        self.count.append(0)
+        return len(self.length) - 1
+
+    def _build(self, roas: List[ROA]) -> None:
+        """按 (地址, 长度) 排序后即为前序遍历顺序，用栈保存最右路径逐个挂接，O(n)"""
+        roas.sort()
+        stack = [0]
+        previous = None
+        for value, prefix_len, max_len, asn in roas:
+            if (value, prefix_len) != previous:
+                previous = (value, prefix_len)
+                node = self._attach(stack, value, prefix_len)
+                self.first[node] = len(self.asn)
+            elif self.asn and self.asn[-1] == asn and self.max_length[-1] == max_len:
+                continue  # 重复的 ROA
+            self.asn.append(asn)
+            self.max_length.append(max_len)
+            self.count[node] += 1
+
+    def _attach(self, stack: List[int], value: int, prefix_len: int) -> int:
+        bits = self.bits
+        zero, one, length, key = self.zero, self.one, self.length, self.key
+        if prefix_len == 0:
+            return 0
+        # 弹出不是新前缀祖先的节点（根节点总是祖先）
+        while True:
+            top = stack[-1]
+            top_len = length[top]
+            if top_len <= prefix_len and not (key[top] ^ value) >> (bits - top_len):
+                break
+            stack.pop()
+        if top_len == prefix_len:
+            return top  # 已作为分叉点存在
+        children = one if (value >> (bits - 1 - top_len)) & 1 else zero
+        child = children[top]
+        node = self._new_node(value, prefix_len)
+        if child == _NONE:
+            children[top] = node
+            stack.append(node)
+            return node
+        # 已有子树与新前缀在某一位分叉，插入分叉点
+        common = min(length[child], prefix_len)
+        diff = (key[child] ^ value) >> (bits - common)
+        common -= diff.bit_length()
+        if common == prefix_len:
+            # 新前缀是已有子树的祖先（仅在输入未排序时发生）
+            raise ValueError("ROA 未按前缀排序")
+        fork = self._new_node(value, common)
+        children[top] = fork
+        if (value >> (bits - 1 - common)) & 1:
+            one[fork], zero[fork] = node, child
+        else:
+            zero[fork], one[fork] = node, child
+        stack.append(fork)
+        stack.append(node)
+        return node
+
+    def _prefix_of(self, node: int) -> str:
+        bits, prefix_len = self.bits, self.length[node]
+        value = self.key[node] >> (bits - prefix_len) << (bits - prefix_len) if prefix_len else 0
+        address = ipaddress.IPv4Address(value) if bits == 32 else ipaddress.IPv6Address(value)
+        return f"{address}/{prefix_len}"
+
+    def validate(self, value: int, prefix_len: int, origin: int) -> str:
+        bits = self.bits
+        zero, one, length, key = self.zero, self.one, self.length, self.key
+        first, count, asns, max_lengths = self.first, self.count, self.asn, self.max_length
+        covered = False
+        node = 0
+        while node != _NONE:
+            node_len = length[node]
+            if node_len > prefix_len or (key[node] ^ value) >> (bits - node_len):
+                break
+            start = first[node]
+            if start != _NONE:
+                covered = True
+                for i in range(start, start + count[node]):
+                    # AS0 ROA 表示该前缀不应被任何AS宣告，永不匹配
+                    if asns[i] == origin and origin != 0 and max_lengths[i] >= prefix_len:
+                        return VALID
+            if node_len == bits:
+                break
+            node = one[node] if (value >> (bits - 1 - node_len)) & 1 else zero[node]
+        return INVALID if covered else NOT_FOUND
+
+    def covering(self, value: int, prefix_len: int) -> List[Dict[str, Any]]:
+        """覆盖该前缀的全部 ROA（由短到长）"""
+        bits = self.bits
+        out = []
+        node = 0
+        while node != _NONE:
+            node_len = self.length[node]
+            if node_len > prefix_len or (self.key[node] ^ value) >> (bits - node_len):
+                break
+            start = self.first[node]
+            if start != _NONE:
+                prefix = self._prefix_of(node)
+                for i in range(start, start + self.count[node]):
+                    out.append({"prefix": prefix, "max_length": self.max_length[i], "asn": self.asn[i]})
+            if node_len == bits:
+                break
+            node = self.one[node] if (value >> (bits - 1 - node_len)) & 1 else self.zero[node]
+        return out
+
+    @property
+    def node_count(self) -> int:
+        return len(self.length)
+
+    @property
+    def memory_bytes(self) -> int:
+        arrays = (self.zero, self.one, self.length, self.first, self.count, self.asn, self.max_length)
+        # 键列表只计指针，节点与其后代共享同一个整数对象
+        return sum(a.itemsize * len(a) for a in arrays) + 8 * len(self.key)
+
+
+class ROATable:
+    """IPv4/IPv6 ROA 前缀树，构建后只读，可在线程间共享"""
+
+    def __init__(self, ipv4: List[ROA], ipv6: List[ROA], metadata: Optional[Dict[str, Any]] = None,
+                 skipped: int = 0):
+        self.skipped = skipped
+        self.metadata = metadata or {}
+        self._tries = {4: _PrefixTrie(32, ipv4), 6: _PrefixTrie(128, ipv6)}
+        # 去重后的 ROA 数
+        self.roa_count = sum(len(trie.asn) for trie in self._tries.values())
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Tuple[str, Optional[int], Any]],
+                     metadata: Optional[Dict[str, Any]] = None) -> "ROATable":
+        """从 (前缀, maxLength, AS号) 构建；格式错误或 maxLength 越界的条目跳过并计数"""
+        families: Dict[int, List[ROA]] = {4: [], 6: []}
+        skipped = 0
+        for prefix, max_length, asn in entries:
+            try:
+                version, value, prefix_len = _parse_prefix(prefix)
+                max_length = prefix_len if max_length in (None, "") else int(max_length)
+                if not prefix_len <= max_length <= (32 if version == 4 else 128):
+                    raise ValueError(f"maxLength 越界: {prefix} {max_length}")
+                families[version].append((value, prefix_len, max_length, parse_asn(asn)))
+            except (ValueError, TypeError, AttributeError):
+                skipped += 1
+        return cls(families[4], families[6], metadata, skipped)
+
+    def _lookup(self, prefix: str) -> Tuple[_PrefixTrie, int, int]:
+        version, value, prefix_len = _parse_prefix(prefix)
+        return self._tries[version], value, prefix_len
+
+    def validate(self, prefix: str, origin_asn: int) -> str:
+        """返回 valid / invalid / not_found"""
+        trie, value, prefix_len = self._lookup(prefix)
+        return trie.validate(value, prefix_len, origin_asn)
+
+    def validate_many(self, routes: Iterable[Tuple[str, int]]) -> List[Optional[str]]:
+        """一次校验一批 (前缀, 起源AS)；前缀无法解析的条目结果为 None"""
+        results: List[Optional[str]] = []
+        tries = self._tries
+        for prefix, origin_asn in routes:
+            try:
+                version, value, prefix_len = _parse_prefix(prefix)
+            except ValueError:
+                results.append(None)
+                continue
+            results.append(tries[version].validate(value, prefix_len, origin_asn))
+        return results
+
+    def covering(self, prefix: str) -> List[Dict[str, Any]]:
+        """覆盖该前缀的全部 ROA"""
+        trie, value, prefix_len = self._lookup(prefix)
+        return trie.covering(value, prefix_len)
+
+    def __len__(self) -> int:
+        return self.roa_count
+
+    @property
+    def node_count(self) -> int:
+        return sum(trie.node_count for trie in self._tries.values())
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(trie.memory_bytes for trie in self._tries.values())
+
+
+def parse_roa_json(data: Any) -> Tuple[List[Tuple[str, Optional[int], Any]], Dict[str, Any]]:
+    """解析 rpki-client (`-j`) / Routinator (`--format json`) 的 JSON 导出
+
+    两者都是 {"metadata": {...}, "roas": [{"asn": ..., "prefix": ..., "maxLength": ...}, ...]}，
+    asn 可能是整数或 "AS13335"。
+    """
+    if isinstance(data, (str, bytes)):
+        data = json.loads(data)
+    entries = [
+        (roa.get("prefix", ""), roa.get("maxLength", roa.get("max_length")), roa.get("asn"))
+        for roa in data.get("roas", [])
+    ]
+    return entries, data.get("metadata") or {}
+
+
+def parse_roa_csv(text: str) -> List[Tuple[str, Optional[int], Any]]:
+    """解析 CSV 导出（ASN,IP Prefix,Max Length[,Trust Anchor[,Expires]]），表头行自动跳过"""
+    entries = []
+    for row in csv.reader(io.StringIO(text)):
+        if len(row) < 3 or row[0].strip().upper() in ("", "ASN"):
+            continue
+        entries.append((row[1], row[2], row[0]))
+    return entries
+
+
+def load_roa_file(path: str) -> ROATable:
+    """按内容识别 JSON/CSV 格式载入 ROA 文件并构建前缀树"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.lstrip()[:1] == b"{":
+        entries, metadata = parse_roa_json(data)
+    else:
+        entries, metadata = parse_roa_csv(data.decode("utf-8", errors="replace")), {}
+    return ROATable.from_entries(entries, metadata)
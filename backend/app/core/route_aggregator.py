@@ -0,0 +1,234 @@
+"""
+路由聚合
+基于二叉前缀树把一组前缀合并为覆盖范围完全相同的最小前缀集合：相邻的两半合并为
+上一级前缀，被覆盖的更长前缀不再单独宣告。增删单个前缀只更新根到该前缀的路径，
+并返回需要新宣告/撤销的聚合前缀差量。
+"""
+import ipaddress
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_PRESENT = 1  # 该前缀本身被加入
+_FULL = 2     # 该节点的整个地址范围都被覆盖
+_NONE = -1
+
+
+class RouteAggregator:
+    """单个地址族、单个根前缀下的增量路由聚合
+
+    节点保存在并行数组中（子节点、父节点、标志位），百万级前缀时也不为每个节点
+    创建 Python 对象。聚合结果为"被完全覆盖且父节点未被完全覆盖"的节点。
+    limit 为最大聚合前缀数（对应对等体的 max-prefix），超出时 add() 拒绝并回滚。
+    """
+
+    def __init__(self, root_prefix: str = "::/0", limit: Optional[int] = None):
+        self.root = ipaddress.ip_network(root_prefix, strict=False)
+        self.limit = limit
+        self._bits = self.root.max_prefixlen
+        self._address_class = type(self.root.network_address)
+        self._root_len = self.root.prefixlen
+        self._root_value = int(self.root.network_address) >> (self._bits - self._root_len) if self._root_len else 0
+        self._zero = array("i")
+        self._one = array("i")
+        self._parent = array("i")
+        self._flags = bytearray()
+        self._free: List[int] = []
+        self._count = 0
+        self._aggregates = 0
+        self._new_node(_NONE)
+
+    # 节点存储
+    def _new_node(self, parent: int) -> int:
+        if self._free:
+            node = self._free.pop()
+            self._zero[node] = self._one[node] = _NONE
+            self._parent[node] = parent
+            self._flags[node] = 0
+            return node
+        self._zero.append(_NONE)
+        self._one.append(_NONE)
+        self._parent.append(parent)
+        self._flags.append(0)
+        return len(self._flags) - 1
+
+    def _is_full(self, node: int) -> bool:
+        return node != _NONE and self._flags[node] & _FULL != 0
+
+    def _refresh(self, node: int) -> bool:
+        """重新计算节点的覆盖标志，返回是否发生变化"""
+        flags = self._flags[node]
+        full = flags & _PRESENT or (self._is_full(self._zero[node]) and self._is_full(self._one[node]))
+        new_flags = (flags & _PRESENT) | (_FULL if full else 0)
+        self._flags[node] = new_flags
+        return new_flags != flags
+
+    # 前缀换算
+    def _parse(self, prefix: str) -> Tuple[int, int]:
+        address, _, length = prefix.partition("/")
+        address = ipaddress.ip_address(address)
+        length = int(length) if length else self._bits
+        if address.version != self.root.version or not self._root_len <= length <= self._bits:
+            raise ValueError(f"前缀 {prefix} 不在 {self.root} 内")
+        value = int(address) >> (self._bits - length)
+        if value >> (length - self._root_len) != self._root_value:
+            raise ValueError(f"前缀 {prefix} 不在 {self.root} 内")
+        return value, length
+
+    def _format(self, value: int, length: int) -> str:
+        address = self._address_class(value << (self._bits - length) if length else 0)
+        return f"{address}/{length}"
+
+    def _path(self, value: int, length: int, create: bool) -> List[int]:
+        """从根到目标前缀的节点路径；create=False 且节点不存在时返回空列表"""
+        zero, one = self._zero, self._one
+        node = 0
+        path = [node]
+        for shift in range(length - self._root_len - 1, -1, -1):
+            children = one if (value >> shift) & 1 else zero
+            child = children[node]
+            if child == _NONE:
+                if not create:
+                    return []
+                child = self._new_node(node)
+                children[node] = child
+            node = child
+            path.append(node)
+        return path
+
+    def _top_full(self, path: List[int]) -> int:
+        flags = self._flags
+        for i, node in enumerate(path):
+            if flags[node] & _FULL:
+                return i
+        return -1
+
+    def _collect(self, node: int, value: int, length: int, skip: set, out: List[str]) -> None:
+        """收集子树中的最大覆盖节点；skip 中的节点（本次变化的节点）继续向下"""
+        stack = [(node, value, length)]
+        while stack:
+            node, value, length = stack.pop()
+            if node == _NONE:
+                continue
+            if self._flags[node] & _FULL and node not in skip:
+                out.append(self._format(value, length))
+                continue
+            stack.append((self._one[node], (value << 1) | 1, length + 1))
+            stack.append((self._zero[node], value << 1, length + 1))
+
+    def _path_prefix(self, value: int, length: int, index: int) -> Tuple[int, int]:
+        depth = self._root_len + index
+        return value >> (length - depth), depth
+
+    # 增删
+    def add(self, prefix: str) -> Tuple[List[str], List[str]]:
+        """加入前缀，返回 (新增的聚合前缀, 被取代的聚合前缀)
+
+        超出 limit 时回滚并抛出 OverflowError。
+        """
+        value, length = self._parse(prefix)
+        path = self._path(value, length, create=True)
+        node = path[-1]
+        if self._flags[node] & _PRESENT:
+            return [], []
+
+        old_top = self._top_full(path)
+        self._flags[node] |= _PRESENT
+        self._count += 1
+        changed = set()
+        for n in reversed(path):
+            if not self._refresh(n):
+                break
+            changed.add(n)
+        if old_top >= 0:
+            return [], []  # 已被更短的前缀覆盖，聚合结果不变
+
+        top = self._top_full(path)
+        top_value, top_length = self._path_prefix(value, length, top)
+        removed: List[str] = []
+        self._collect(path[top], top_value, top_length, changed, removed)
+        added = [self._format(top_value, top_length)]
+
+        self._aggregates += 1 - len(removed)
+        if self.limit is not None and self._aggregates > self.limit:
+            self.discard(prefix)
+            raise OverflowError(f"聚合后的前缀数将超过限制 {self.limit}")
+        return added, removed
+
+    def discard(self, prefix: str) -> Tuple[List[str], List[str]]:
+        """移除前缀，返回 (新增的聚合前缀, 被撤销的聚合前缀)"""
+        value, length = self._parse(prefix)
+        path = self._path(value, length, create=False)
+        if not path or not self._flags[path[-1]] & _PRESENT:
+            return [], []
+
+        old_top = self._top_full(path)
+        node = path[-1]
+        self._flags[node] &= ~_PRESENT
+        self._count -= 1
+        changed = set()
+        for n in reversed(path):
+            if not self._refresh(n):
+                break
+            changed.add(n)
+        self._prune(path)
+        if path[old_top] not in changed:
+            return [], []  # 仍被更短的前缀覆盖
+
+        top_value, top_length = self._path_prefix(value, length, old_top)
+        added: List[str] = []
+        self._collect(path[old_top], top_value, top_length, changed, added)
+        self._aggregates += len(added) - 1
+        return added, [self._format(top_value, top_length)]
+
+    def _prune(self, path: List[int]) -> None:
+        """回收不再有用的叶子节点"""
+        for node in reversed(path[1:]):
+            if self._flags[node] & _PRESENT or self._zero[node] != _NONE or self._one[node] != _NONE:
+                return
+            parent = self._parent[node]
+            if self._zero[parent] == node:
+                self._zero[parent] = _NONE
+            else:
+                self._one[parent] = _NONE
+            self._flags[node] = 0
+            self._free.append(node)
+
+    # 查询
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, prefix: str) -> bool:
+        value, length = self._parse(prefix)
+        path = self._path(value, length, create=False)
+        return bool(path) and self._flags[path[-1]] & _PRESENT != 0
+
+    @property
+    def aggregate_count(self) -> int:
+        return self._aggregates
+
+    @property
+    def node_count(self) -> int:
+        return len(self._flags) - len(self._free)
+
+    @property
+    def memory_bytes(self) -> int:
+        """节点数组占用的字节数"""
+        return sum(a.itemsize * len(a) for a in (self._zero, self._one, self._parent)) + len(self._flags)
+
+    def aggregates(self) -> List[str]:
+        """当前的聚合前缀（按地址排序）"""
+        out: List[str] = []
+        self._collect(0, self._root_value, self._root_len, set(), out)
+        return out
+
+
+def aggregate_prefixes(prefixes: Iterable[str]) -> List[str]:
+    """一次性聚合一组前缀（IPv4 与 IPv6 分别聚合），返回最小前缀集合"""
+    aggregators: Dict[int, RouteAggregator] = {}
+    for prefix in prefixes:
+        version = ipaddress.ip_network(prefix, strict=False).version
+        aggregator = aggregators.get(version)
+        if aggregator is None:
+            aggregator = aggregators[version] = RouteAggregator("0.0.0.0/0" if version == 4 else "::/0")
+        aggregator.add(prefix)
+    return [p for version in sorted(aggregators) for p in aggregators[version].aggregates()]
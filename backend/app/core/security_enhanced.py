@@ -2,6 +2,7 @@
 增强安全模块
 提供密码哈希、JWT令牌、权限验证等安全功能
 """
+import uuid
 from datetime import datetime, timedelta
 from typing import Any, Union, Optional, List, Dict
 from jose import jwt, JWTError
@@ -79,6 +80,8 @@ class SecurityManager:
             )
         
         to_encode["exp"] = expire
+        to_encode["iat"] = datetime.utcnow()
+        to_encode.setdefault("jti", uuid.uuid4().hex)
         to_encode["type"] = "access"
         encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
         return encoded_jwt
@@ -92,6 +95,8 @@ class SecurityManager:
         
         to_encode = {
             "exp": expire,
+            "iat": datetime.utcnow(),
+            "jti": uuid.uuid4().hex,
             "sub": str(user_id),
             "type": "refresh"
         }
@@ -109,12 +114,6 @@ class SecurityManager:
             令牌载荷字典，包含 'sub' (用户ID) 等字段，验证失败返回None
         """
         try:
-            # 检查令牌是否在黑名单中（仅对access token检查）
-            if token_type == "access":
-                from .token_blacklist import is_blacklisted
-                if is_blacklisted(token):
-                    return None
-            
             payload = jwt.decode(
                 token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
             )
@@ -124,10 +123,25 @@ class SecurityManager:
             if token_type_in_payload != token_type:
                 return None
             
+            # 检查令牌是否已撤销（按 jti 或用户水位线，纯内存查询）
+            from .token_blacklist import token_blacklist
+            if token_blacklist.is_payload_revoked(payload, token):
+                return None
+            
             return payload
         except JWTError:
             return None
 
+    async def verify_token_async(self, token: str, token_type: str = "access") -> Optional[Dict[str, Any]]:
+        """验证令牌并返回载荷，撤销检查包含其他worker的撤销（没有Redis广播时由定时拉取同步）"""
+        payload = self.verify_token(token, token_type)
+        if payload is None:
+            return None
+        from .token_blacklist import token_blacklist
+        if await token_blacklist.check_payload(payload, token):
+            return None
+        return payload
+
 
 # 全局安全管理器实例
 security_manager = SecurityManager()
@@ -160,7 +174,7 @@ async def get_current_user_id(
         raise credentials_exception
     
     try:
-        payload = security_manager.verify_token(token, "access")
+        payload = await security_manager.verify_token_async(token, "access")
         if payload is None:
             raise credentials_exception
         user_id = payload.get("sub")
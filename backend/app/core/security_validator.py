@@ -16,6 +16,7 @@ import structlog
 from .unified_config import settings
 from .exception_handlers import SecurityError, ErrorCodes
 from .logging_manager import security_logger, get_logger
+from .rate_limiter import RateLimit, rate_limiter
 
 logger = get_logger("security_validator")
 
@@ -26,7 +27,7 @@ class SecurityValidator:
         self.logger = logger
         self.failed_attempts = {}  # 存储失败尝试
         self.blocked_ips = set()    # 被阻止的IP
-        self.rate_limits = {}       # 速率限制
+        self.rate_limits = [RateLimit("minute", 100, 60)]  # 速率限制规则
     
     async def validate_request(self, request: Request) -> bool:
         """验证请求安全性"""
@@ -75,33 +76,17 @@ class SecurityValidator:
         return request.client.host if request.client else "unknown"
     
     async def _check_rate_limit(self, client_ip: str) -> bool:
-        """检查速率限制"""
-        current_time = time.time()
-        window_size = 60  # 1分钟窗口
-        max_requests = 100  # 最大请求数
-        
-        # 清理过期记录
-        if client_ip in self.rate_limits:
-            self.rate_limits[client_ip] = [
-                timestamp for timestamp in self.rate_limits[client_ip]
-                if current_time - timestamp < window_size
-            ]
-        else:
-            self.rate_limits[client_ip] = []
-        
-        # 检查是否超过限制
-        if len(self.rate_limits[client_ip]) >= max_requests:
+        """检查速率限制（每分钟100次，多个worker共享计数）"""
+        result = await rate_limiter.hit("request", client_ip, self.rate_limits)
+        if not result.allowed:
             # 记录可疑活动
             security_logger.log_suspicious_activity(
                 user_id="anonymous",
                 activity="rate_limit_exceeded",
                 ip_address=client_ip,
-                details={"requests": len(self.rate_limits[client_ip]), "limit": max_requests}
+                details={"limit": self.rate_limits[0].limit, "retry_after": result.retry_after}
             )
             return False
-        
-        # 记录请求
-        self.rate_limits[client_ip].append(current_time)
         return True
     
     def _validate_headers(self, request: Request) -> bool:
@@ -325,7 +310,8 @@ class SecurityValidator:
         """获取安全状态"""
         return {
             "blocked_ips": len(self.blocked_ips),
-            "rate_limited_ips": len(self.rate_limits),
+            "rate_limited_ips": rate_limiter.limited_count("request"),
+            "rate_limited_requests": rate_limiter.get_stats()["denied"],
             "failed_login_attempts": len(self.failed_attempts),
             "timestamp": datetime.utcnow().isoformat()
         }
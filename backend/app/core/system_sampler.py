@@ -0,0 +1,157 @@
+"""
+系统指标后台采样器
+按固定间隔在线程中采集CPU、内存、磁盘、网络和连接数，
+结果写入环形缓冲区，请求处理只读取最新快照
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Deque, Dict, Any, List, Optional
+
+import psutil
+
+from .unified_config import settings
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class SystemSample:
+    """一次系统指标采样"""
+    timestamp: float
+    cpu_percent: float
+    memory_total: int
+    memory_available: int
+    memory_used: int
+    memory_percent: float
+    disk_total: int
+    disk_used: int
+    disk_free: int
+    disk_percent: float
+    net_bytes_sent: int
+    net_bytes_recv: int
+    net_packets_sent: int
+    net_packets_recv: int
+    connections: int
+
+    @property
+    def staleness(self) -> float:
+        """距采样时刻的秒数"""
+        return max(0.0, time.time() - self.timestamp)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["staleness"] = round(self.staleness, 3)
+        return data
+
+
+class SystemMetricsSampler:
+    """系统指标采样器"""
+
+    def __init__(self, interval: float = 5.0, history: int = 120, disk_path: str = "/"):
+        self.interval = interval
+        self.disk_path = disk_path
+        self._samples: Deque[SystemSample] = deque(maxlen=history)
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Optional[asyncio.Task] = None
+
+        # 静态信息只读取一次
+        self.cpu_count = psutil.cpu_count()
+        self.cpu_count_logical = psutil.cpu_count(logical=True)
+        self.boot_time = psutil.boot_time()
+
+        # 初始化CPU计数基线，之后的 cpu_percent(interval=None) 返回两次调用之间的占用率
+        psutil.cpu_percent(interval=None)
+
+    def _collect(self) -> SystemSample:
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        network = psutil.net_io_counters()
+        try:
+            connections = len(psutil.net_connections())
+        except (psutil.AccessDenied, OSError):
+            connections = 0
+
+        return SystemSample(
+            timestamp=time.time(),
+            cpu_percent=psutil.cpu_percent(interval=None),
+            memory_total=memory.total,
+            memory_available=memory.available,
+            memory_used=memory.used,
+            memory_percent=memory.percent,
+            disk_total=disk.total,
+            disk_used=disk.used,
+            disk_free=disk.free,
+            disk_percent=disk.percent,
+            net_bytes_sent=network.bytes_sent,
+            net_bytes_recv=network.bytes_recv,
+            net_packets_sent=network.packets_sent,
+            net_packets_recv=network.packets_recv,
+            connections=connections,
+        )
+
+    def sample_now(self) -> SystemSample:
+        """同步采集一次并写入缓冲区（不阻塞等待CPU采样窗口）"""
+        sample = self._collect()
+        self._samples.append(sample)
+        return sample
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                sample = await asyncio.to_thread(self._collect)
+                self._samples.append(sample)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"系统指标采样失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """启动后台采样任务"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"系统指标采样器已启动，间隔 {self.interval}s")
+
+    async def stop(self) -> None:
+        """停止后台采样任务"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def latest(self) -> SystemSample:
+        """返回最新快照
+
+        缓冲区为空（采样器未启动或首次采样未完成）时在线程中采集一次，
+        不在事件循环中执行 psutil 调用；并发请求共用同一次采集。
+        """
+        if self._samples:
+            return self._samples[-1]
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.get_running_loop().create_task(asyncio.to_thread(self.sample_now))
+            # 所有等待者都已取消时避免 "exception was never retrieved" 警告
+            self._pending.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(self._pending)
+
+    def history(self, limit: Optional[int] = None) -> List[SystemSample]:
+        """按时间顺序返回缓冲区中的采样"""
+        samples = list(self._samples)
+        return samples[-limit:] if limit else samples
+
+
+# 全局采样器实例
+system_sampler = SystemMetricsSampler(
+    interval=getattr(settings, "SYSTEM_METRICS_INTERVAL", 5.0),
+    history=getattr(settings, "SYSTEM_METRICS_HISTORY", 120),
+)
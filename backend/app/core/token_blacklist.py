@@ -1,265 +1,514 @@
 """
-JWT令牌黑名单管理
-支持令牌撤销和验证，可选择内存存储或数据库存储
+JWT令牌撤销管理
+按 jti 记录被撤销的令牌，布隆过滤器快速排除绝大多数未撤销的令牌；
+过期条目通过按过期时间排序的堆分摊清理；按用户撤销使用“此时间之前签发的令牌无效”水位线。
+撤销记录持久化到数据库或Redis，并通过Redis发布/订阅同步到其他worker；
+没有Redis时撤销记录写入数据库，各worker定时增量拉取新的撤销记录。
+令牌校验只查内存，不访问持久化后端
 """
-import time
+import hashlib
+import heapq
+import json
+import math
 import os
-from typing import Dict, Optional, Set, List
-from datetime import datetime, timedelta
+import time
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.unified_config import settings
 from ..core.logging import get_logger
 
 logger = get_logger(__name__)
 
-# 简单的内存存储用于令牌黑名单（生产环境应该使用Redis）
-_token_blacklist: Dict[str, float] = {}
-_token_jti_map: Dict[str, str] = {}  # jti -> token 映射
-
-# 清理间隔（秒）
-_CLEANUP_INTERVAL = 3600  # 1小时
-_last_cleanup = time.time()
-
 # 从环境变量获取存储类型，默认为内存存储
 USE_DATABASE_STORAGE = os.getenv("USE_DATABASE_BLACKLIST", "false").lower() == "true"
 
+REVOCATION_CHANNEL = "token_revocations"
+
+# 增量拉取时回看的秒数：覆盖事务提交延迟和主机间的时钟偏差，重复拉到的记录按幂等方式应用
+POLL_OVERLAP = 5.0
+
+
+class BloomFilter:
+    """布隆过滤器：不在集合中的键一定返回 False"""
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def token_claims(token: str) -> Dict[str, Any]:
+    """读取令牌载荷（不校验签名，只用于撤销登记和查询）"""
+    from jose import jwt
+    try:
+        return jwt.get_unverified_claims(token)
+    except Exception:
+        return {}
+
+
+def token_key(token: str, claims: Optional[Dict[str, Any]] = None) -> str:
+    """撤销记录的键：优先使用 jti，没有 jti 的旧令牌使用令牌哈希"""
+    claims = token_claims(token) if claims is None else claims
+    jti = claims.get("jti")
+    return str(jti) if jti else "sha256:" + hashlib.sha256(token.encode()).hexdigest()
+
+
+class RevocationStore:
+    """撤销记录持久化后端"""
+
+    async def add(self, jti: str, expires_at: float, user_id: Optional[str] = None,
+                  reason: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    async def remove(self, jti: str) -> None:
+        raise NotImplementedError
+
+    async def set_watermark(self, user_id: str, revoked_before: float, expires_at: float) -> None:
+        raise NotImplementedError
+
+    async def load_active(self, now: float) -> Tuple[Dict[str, float], Dict[str, Tuple[float, float]]]:
+        """返回未过期的 {jti: 过期时间} 与 {用户ID: (水位线, 过期时间)}"""
+        raise NotImplementedError
+
+    async def changes_since(self, since: datetime) -> Tuple[Dict[str, float], Dict[str, Tuple[float, float]]]:
+        """返回 since（UTC）之后写入且未过期的撤销记录和水位线，格式同 load_active"""
+        raise NotImplementedError
+
+
+class RedisRevocationStore(RevocationStore):
+    """Redis 持久化：有序集合保存 jti，哈希保存用户水位线；同时负责发布/订阅"""
+
+    def __init__(self, client, prefix: str = "token_revocation", channel: str = REVOCATION_CHANNEL):
+        self.client = client
+        self.jti_key = f"{prefix}:jti"
+        self.watermark_key = f"{prefix}:user"
+        self.channel = channel
+
+    async def add(self, jti, expires_at, user_id=None, reason=None):
+        await self.client.zadd(self.jti_key, {jti: expires_at})
+
+    async def remove(self, jti):
+        await self.client.zrem(self.jti_key, jti)
+
+    async def set_watermark(self, user_id, revoked_before, expires_at):
+        await self.client.hset(self.watermark_key, user_id, json.dumps([revoked_before, expires_at]))
+
+    async def load_active(self, now):
+        await self.client.zremrangebyscore(self.jti_key, "-inf", now)
+        entries = {
+            (jti.decode() if isinstance(jti, bytes) else jti): float(score)
+            for jti, score in await self.client.zrange(self.jti_key, 0, -1, withscores=True)
+        }
+        watermarks = {}
+        for user_id, raw in (await self.client.hgetall(self.watermark_key)).items():
+            before, expires_at = json.loads(raw)
+            if expires_at > now:
+                watermarks[user_id.decode() if isinstance(user_id, bytes) else user_id] = (before, expires_at)
+        return entries, watermarks
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        await self.client.publish(self.channel, json.dumps(event))
+
+    async def listen(self, callback) -> None:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    callback(json.loads(message["data"]))
+        finally:
+            await pubsub.unsubscribe(self.channel)
+
 
 class TokenBlacklist:
-    """令牌黑名单管理类，支持内存和数据库两种存储方式"""
-    
-    def __init__(self, use_database=False):
+    """令牌撤销管理
+
+    查询只在内存中完成：布隆过滤器判定不存在即返回，命中后再查精确字典。
+    撤销操作先更新内存，再等待写入持久化后端并广播给其他worker；没有广播通道时
+    每个worker定时从持久化后端拉取新写入的记录（created_at 之后），并定期全量重新加载
+    以同步被移除的记录。其他worker的撤销最多延迟一个拉取间隔生效。
+    """
+
+    def __init__(self, use_database=False, store: Optional[RevocationStore] = None,
+                 bus: Optional[RedisRevocationStore] = None, capacity: int = 100_000):
         """初始化黑名单管理器
-        
+
         Args:
-            use_database: 是否使用数据库存储，默认为False使用内存存储
+            use_database: 是否使用数据库持久化撤销记录
+            store: 持久化后端，默认根据 use_database 选择数据库后端
+            bus: Redis 发布/订阅通道，用于多worker同步
+            capacity: 布隆过滤器初始容量，超出后自动扩容重建
         """
         self.use_database = use_database or USE_DATABASE_STORAGE
-        self._db_blacklist = None
-        
-        # 如果使用数据库存储，初始化数据库黑名单
-        if self.use_database:
+        if store is None and self.use_database:
             try:
                 from .database_token_blacklist import DatabaseTokenBlacklist
-                self._db_blacklist = DatabaseTokenBlacklist()
+                store = DatabaseTokenBlacklist()
                 logger.info("使用数据库存储令牌黑名单")
             except ImportError as e:
                 logger.warning(f"无法导入数据库黑名单模块，回退到内存存储: {e}")
                 self.use_database = False
-        else:
-            logger.info("使用内存存储令牌黑名单")
-    
-    def add_token(self, token: str, expires_at: Optional[float] = None, jti: Optional[str] = None) -> bool:
-        """将令牌添加到黑名单
-        
-        Args:
-            token: JWT令牌
-            expires_at: 令牌过期时间（Unix时间戳），如果为None则从令牌中解析
-            jti: JWT ID，如果为None则从令牌中解析
-            
-        Returns:
-            bool: 是否成功添加
-        """
-        if self.use_database and self._db_blacklist:
-            return self._db_blacklist.add_token(token, expires_at, jti)
-        
-        # 内存存储实现
-        global _token_blacklist, _token_jti_map, _last_cleanup
-        
-        # 清理过期令牌
-        self._cleanup_expired_tokens()
-        
-        # 如果没有提供过期时间，尝试从令牌中解析
-        if expires_at is None:
-            try:
-                # 这里应该解析JWT获取过期时间，简化实现
-                # 实际应该使用jwt.decode解析
-                expires_at = time.time() + 3600  # 默认1小时后过期
-            except Exception:
-                expires_at = time.time() + 3600
-        
-        # 如果提供了jti，建立映射关系
-        if jti:
-            _token_jti_map[jti] = token
-        
-        _token_blacklist[token] = expires_at
-        logger.info(f"令牌已添加到黑名单: {token[:10]}...")
-        return True
-    
+        self.store = store
+        self.bus = bus
+        self.instance_id = uuid.uuid4().hex
+
+        self._capacity = capacity
+        self._revoked: Dict[str, float] = {}
+        self._watermarks: Dict[str, Tuple[float, float]] = {}
+        self._expiry: List[Tuple[float, str, str]] = []
+        self._bloom = BloomFilter(capacity)
+        self._listener: Optional[asyncio.Task] = None
+        self._poller: Optional[asyncio.Task] = None
+        # 上次拉取（或全量加载）开始的时间戳
+        self._synced_at = 0.0
+        self.poll_interval = settings.TOKEN_REVOCATION_POLL_INTERVAL
+        self.reload_interval = settings.TOKEN_REVOCATION_RELOAD_INTERVAL
+
+    # 内存状态
+    def _rebuild_bloom(self) -> None:
+        capacity = self._capacity
+        while capacity < len(self._revoked) * 2:
+            capacity *= 2
+        self._bloom = BloomFilter(capacity)
+        for jti in self._revoked:
+            self._bloom.add(jti)
+
+    def _expire(self, now: float) -> None:
+        """弹出堆顶已过期的条目；每个条目只被弹出一次，总开销分摊到各次调用"""
+        expiry = self._expiry
+        removed = 0
+        while expiry and expiry[0][0] <= now:
+            expires_at, kind, key = heapq.heappop(expiry)
+            if kind == "jti":
+                if self._revoked.get(key) == expires_at:
+                    del self._revoked[key]
+                    removed += 1
+            elif self._watermarks.get(key, (0, None))[1] == expires_at:
+                del self._watermarks[key]
+        # 布隆过滤器不支持删除，失效条目过多时重建以保持误判率
+        if removed and self._bloom.count > max(self._capacity // 2, len(self._revoked) * 2):
+            self._rebuild_bloom()
+
+    def _apply_jti(self, jti: str, expires_at: float) -> None:
+        if expires_at <= time.time():
+            return
+        if self._revoked.get(jti, 0) >= expires_at:
+            return
+        self._revoked[jti] = expires_at
+        heapq.heappush(self._expiry, (expires_at, "jti", jti))
+        self._bloom.add(jti)
+        if self._bloom.count > self._bloom.capacity:
+            self._rebuild_bloom()
+
+    def _apply_watermark(self, user_id: str, revoked_before: float, expires_at: float) -> None:
+        current = self._watermarks.get(user_id)
+        if current and current[0] >= revoked_before:
+            return
+        self._watermarks[user_id] = (revoked_before, expires_at)
+        heapq.heappush(self._expiry, (expires_at, "user", user_id))
+
+    def _apply_event(self, event: Dict[str, Any]) -> None:
+        """应用其他worker广播的撤销事件"""
+        if event.get("origin") == self.instance_id:
+            return
+        kind = event.get("type")
+        if kind == "jti":
+            self._apply_jti(event["jti"], float(event["expires_at"]))
+        elif kind == "user":
+            self._apply_watermark(str(event["user_id"]), float(event["revoked_before"]), float(event["expires_at"]))
+        elif kind == "remove":
+            self._revoked.pop(event["jti"], None)
+
+    # 持久化与广播
+    async def _persist(self, event: Dict[str, Any], persist) -> bool:
+        """等待撤销记录写入持久化后端并广播；失败时返回 False（当前进程内存中的撤销仍然生效）"""
+        try:
+            if persist is not None:
+                await persist
+            if self.bus:
+                await self.bus.publish({**event, "origin": self.instance_id})
+            return True
+        except Exception as e:
+            logger.error(f"同步令牌撤销记录失败: {e}")
+            return False
+
+    @property
+    def polls_store(self) -> bool:
+        """没有广播通道时，通过定时拉取持久化后端看到其他worker的撤销"""
+        return self.bus is None and self.store is not None
+
+    # 查询
+    def is_revoked(self, jti: Optional[str], user_id: Optional[str] = None,
+                   issued_at: Optional[float] = None) -> bool:
+        """检查 jti 或用户水位线是否使令牌失效"""
+        now = time.time()
+        if self._expiry and self._expiry[0][0] <= now:
+            self._expire(now)
+
+        if user_id is not None and self._watermarks:
+            watermark = self._watermarks.get(str(user_id))
+            if watermark and (issued_at is None or issued_at < watermark[0]):
+                return True
+
+        if not jti or jti not in self._bloom:
+            return False
+        return jti in self._revoked
+
+    def is_payload_revoked(self, payload: Dict[str, Any], token: Optional[str] = None) -> bool:
+        """按已解码的令牌载荷检查（令牌校验路径使用）"""
+        jti = payload.get("jti")
+        if not jti and token:
+            jti = token_key(token, payload)
+        return self.is_revoked(jti, payload.get("sub"), payload.get("iat"))
+
+    async def check_payload(self, payload: Dict[str, Any], token: Optional[str] = None) -> bool:
+        """按已解码的令牌载荷检查（异步校验路径使用，只查内存，不访问持久化后端）"""
+        return self.is_payload_revoked(payload, token)
+
     def is_blacklisted(self, token: str) -> bool:
-        """检查令牌是否在黑名单中
-        
+        """检查令牌是否已被撤销
+
         Args:
             token: JWT令牌
-            
+
         Returns:
             bool: 是否在黑名单中
         """
-        if self.use_database and self._db_blacklist:
-            return self._db_blacklist.is_blacklisted(token)
-        
-        # 内存存储实现
-        global _token_blacklist
-        
-        # 清理过期令牌
-        self._cleanup_expired_tokens()
-        
-        # 检查令牌是否在黑名单中
-        if token in _token_blacklist:
-            return True
-            
-        # 如果不在黑名单中，检查jti映射
-        # 这里简化实现，实际应该解析JWT获取jti
-        # 然后检查jti对应的token是否在黑名单中
-        
-        return False
-    
-    def remove_token(self, token: str) -> bool:
-        """从黑名单中移除令牌
-        
+        return self.is_payload_revoked(token_claims(token), token)
+
+    # 撤销
+    async def add_token(self, token: str, expires_at: Optional[float] = None, jti: Optional[str] = None) -> bool:
+        """将令牌添加到黑名单
+
         Args:
             token: JWT令牌
-            
+            expires_at: 令牌过期时间（Unix时间戳），如果为None则从令牌中解析
+            jti: JWT ID，如果为None则从令牌中解析
+
         Returns:
-            bool: 是否成功移除
+            bool: 是否已持久化（False 时撤销只在当前进程生效）
         """
-        if self.use_database and self._db_blacklist:
-            return self._db_blacklist.remove_token(token)
-        
-        # 内存存储实现
-        global _token_blacklist, _token_jti_map
-        
-        # 从黑名单中移除令牌
-        if token in _token_blacklist:
-            del _token_blacklist[token]
-            
-            # 从jti映射中移除
-            jti_to_remove = None
-            for jti, mapped_token in _token_jti_map.items():
-                if mapped_token == token:
-                    jti_to_remove = jti
-                    break
-                    
-            if jti_to_remove:
-                del _token_jti_map[jti_to_remove]
-                
-            logger.info(f"令牌已从黑名单移除: {token[:10]}...")
-            return True
-            
-        return False
-    
-    def revoke_by_jti(self, jti: str) -> bool:
-        """通过JTI撤销令牌
-        
+        claims = token_claims(token)
+        jti = jti or token_key(token, claims)
+        if expires_at is None:
+            expires_at = claims.get("exp") or time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        return await self.revoke_by_jti(jti, float(expires_at), user_id=claims.get("sub"))
+
+    async def revoke_by_jti(self, jti: str, expires_at: Optional[float] = None,
+                      user_id: Optional[str] = None, reason: Optional[str] = None) -> bool:
+        """通过JTI撤销令牌，记录保留到令牌自身过期
+
         Args:
             jti: JWT ID
-            
+            expires_at: 令牌过期时间，未知时按刷新令牌的最长有效期保留
+
         Returns:
-            bool: 是否成功撤销
+            bool: 是否已持久化（False 时撤销只在当前进程生效）
         """
-        if self.use_database and self._db_blacklist:
-            return self._db_blacklist.revoke_by_jti(jti)
-        
-        # 内存存储实现
-        global _token_blacklist, _token_jti_map
-        
-        # 查找jti对应的令牌
-        if jti in _token_jti_map:
-            token = _token_jti_map[jti]
-            # 添加到黑名单，使用当前时间+1小时作为过期时间
-            return self.add_token(token, time.time() + 3600, jti)
-            
-        return False
-    
-    def revoke_user_tokens(self, user_id: int) -> int:
-        """撤销用户的所有令牌
-        
+        if expires_at is None:
+            expires_at = time.time() + settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+        self._apply_jti(jti, expires_at)
+        persisted = await self._persist(
+            {"type": "jti", "jti": jti, "expires_at": expires_at},
+            self.store.add(jti, expires_at, user_id, reason) if self.store else None,
+        )
+        logger.info(f"令牌已撤销: jti={jti[:16]}")
+        return persisted
+
+    async def revoke_user_tokens(self, user_id, revoked_before: Optional[float] = None) -> float:
+        """撤销用户在此之前签发的所有令牌
+
+        只记录一个水位线，不扫描令牌；水位线保留到最长的令牌有效期结束。
+        iat 为整数秒，因此与撤销同一秒内签发的令牌仍然有效。
+
         Args:
             user_id: 用户ID
-            
+            revoked_before: 水位线时间戳，默认当前时间
+
         Returns:
-            int: 撤销的令牌数量
+            float: 生效的水位线
         """
-        if self.use_database and self._db_blacklist:
-            return self._db_blacklist.revoke_user_tokens(user_id)
-        
-        # 内存存储实现
-        # 这里简化实现，实际应该解析JWT获取用户ID
-        # 然后撤销该用户的所有令牌
-        logger.warning("内存存储不支持按用户ID撤销令牌，请使用数据库存储")
-        return 0
-    
-    def _cleanup_expired_tokens(self):
-        """清理过期的令牌"""
-        if self.use_database and self._db_blacklist:
-            return self._db_blacklist._cleanup_expired_tokens()
-        
-        # 内存存储实现
-        global _token_blacklist, _last_cleanup
-        
-        current_time = time.time()
-        
-        # 检查是否需要清理
-        if current_time - _last_cleanup < _CLEANUP_INTERVAL:
+        now = time.time()
+        revoked_before = float(int(revoked_before if revoked_before is not None else now))
+        lifetime = max(settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60, settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+        expires_at = now + lifetime
+        user_id = str(user_id)
+
+        self._apply_watermark(user_id, revoked_before, expires_at)
+        await self._persist(
+            {"type": "user", "user_id": user_id, "revoked_before": revoked_before, "expires_at": expires_at},
+            self.store.set_watermark(user_id, revoked_before, expires_at) if self.store else None,
+        )
+        logger.info(f"用户 {user_id} 在 {revoked_before} 之前签发的令牌已全部撤销")
+        return revoked_before
+
+    async def remove_token(self, token: str) -> bool:
+        """从黑名单中移除令牌
+
+        Args:
+            token: JWT令牌
+
+        Returns:
+            bool: 是否成功移除
+        """
+        jti = token_key(token)
+        if self._revoked.pop(jti, None) is None and self.store is None:
+            return False
+        await self._persist({"type": "remove", "jti": jti}, self.store.remove(jti) if self.store else None)
+        logger.info(f"令牌已从黑名单移除: jti={jti[:16]}")
+        return True
+
+    # 生命周期
+    async def load(self) -> None:
+        """从持久化后端重建内存状态和布隆过滤器"""
+        if not self.store:
             return
-            
-        # 清理过期令牌
-        expired_tokens = [
-            token for token, expires_at in _token_blacklist.items()
-            if expires_at <= current_time
-        ]
-        
-        for token in expired_tokens:
-            del _token_blacklist[token]
-            
-            # 从jti映射中移除
-            jti_to_remove = None
-            for jti, mapped_token in _token_jti_map.items():
-                if mapped_token == token:
-                    jti_to_remove = jti
-                    break
-                    
-            if jti_to_remove:
-                del _token_jti_map[jti_to_remove]
-        
-        _last_cleanup = current_time
-        
-        if expired_tokens:
-            logger.info(f"清理了 {len(expired_tokens)} 个过期令牌")
-    
+        started = time.time()
+        entries, watermarks = await self.store.load_active(started)
+        self._revoked = {}
+        self._watermarks = {}
+        self._expiry = []
+        for jti, expires_at in entries.items():
+            self._revoked[jti] = expires_at
+            self._expiry.append((expires_at, "jti", jti))
+        for user_id, (revoked_before, expires_at) in watermarks.items():
+            self._watermarks[user_id] = (revoked_before, expires_at)
+            self._expiry.append((expires_at, "user", user_id))
+        heapq.heapify(self._expiry)
+        self._rebuild_bloom()
+        self._synced_at = started
+        logger.info(f"令牌撤销记录已加载: {len(self._revoked)} 个令牌, {len(self._watermarks)} 个用户水位线")
+
+    async def poll(self) -> int:
+        """拉取上次同步之后其他worker写入的撤销记录，返回应用的条数"""
+        started = time.time()
+        since = datetime.utcfromtimestamp(max(self._synced_at - POLL_OVERLAP, 0))
+        entries, watermarks = await self.store.changes_since(since)
+        for jti, expires_at in entries.items():
+            self._apply_jti(jti, expires_at)
+        for user_id, (revoked_before, expires_at) in watermarks.items():
+            self._apply_watermark(user_id, revoked_before, expires_at)
+        self._synced_at = started
+        return len(entries) + len(watermarks)
+
+    async def start(self) -> None:
+        """加载撤销记录，订阅其他worker的撤销事件（没有Redis时定时拉取）"""
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"加载令牌撤销记录失败: {e}")
+        if self.bus and not self._listener:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        elif self.polls_store and not self._poller:
+            self._poller = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def _poll_loop(self) -> None:
+        loaded_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if time.monotonic() - loaded_at >= self.reload_interval:
+                    await self.load()
+                    loaded_at = time.monotonic()
+                else:
+                    await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"拉取令牌撤销记录失败，下个周期重试: {e}")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                await self.bus.listen(self._apply_event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"令牌撤销订阅中断，5秒后重连: {e}")
+            await asyncio.sleep(5)
+
+    async def stop(self) -> None:
+        for task in (self._listener, self._poller):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._listener = self._poller = None
+
+    def _cleanup_expired_tokens(self):
+        """清理过期的撤销记录"""
+        self._expire(time.time())
+
     def get_blacklisted_count(self) -> int:
         """获取黑名单中的令牌数量
-        
+
         Returns:
             int: 黑名单中的令牌数量
         """
-        if self.use_database and self._db_blacklist:
-            return self._db_blacklist.get_blacklisted_count()
-        
-        # 内存存储实现
-        global _token_blacklist
         self._cleanup_expired_tokens()
-        return len(_token_blacklist)
-    
+        return len(self._revoked)
+
     def get_all_blacklisted(self) -> List[str]:
-        """获取所有黑名单中的令牌（仅用于调试）
-        
+        """获取所有已撤销令牌的 jti（仅用于调试）
+
         Returns:
-            List[str]: 黑名单中的令牌列表
+            List[str]: jti 列表
         """
-        if self.use_database and self._db_blacklist:
-            return self._db_blacklist.get_all_blacklisted()
-        
-        # 内存存储实现
-        global _token_blacklist
         self._cleanup_expired_tokens()
-        return list(_token_blacklist.keys())
+        return list(self._revoked.keys())
+
+
+def _create_bus() -> Optional[RedisRevocationStore]:
+    if not (settings.USE_REDIS and settings.REDIS_URL):
+        return None
+    try:
+        import redis.asyncio as redis_asyncio
+    except ImportError:
+        return None
+    return RedisRevocationStore(redis_asyncio.from_url(settings.REDIS_URL, decode_responses=True))
+
+
+def _create_blacklist() -> TokenBlacklist:
+    bus = _create_bus()
+    if bus is None:
+        # 没有Redis时其他worker收不到撤销广播，撤销记录写入数据库，各worker定时拉取
+        return TokenBlacklist(use_database=True)
+    # 未启用数据库存储时，Redis 同时作为持久化后端
+    store = bus if not USE_DATABASE_STORAGE else None
+    return TokenBlacklist(store=store, bus=bus)
 
 
 # 全局令牌黑名单实例
-token_blacklist = TokenBlacklist()
+token_blacklist = _create_blacklist()
 
 
-def add_to_blacklist(token: str, expires_at: Optional[float] = None, jti: Optional[str] = None) -> bool:
+async def add_to_blacklist(token: str, expires_at: Optional[float] = None, jti: Optional[str] = None) -> bool:
     """将令牌添加到黑名单（便捷函数）"""
-    return token_blacklist.add_token(token, expires_at, jti)
+    return await token_blacklist.add_token(token, expires_at, jti)
 
 
 def is_blacklisted(token: str) -> bool:
@@ -267,22 +516,21 @@ def is_blacklisted(token: str) -> bool:
     return token_blacklist.is_blacklisted(token)
 
 
-def remove_from_blacklist(token: str) -> bool:
+async def remove_from_blacklist(token: str) -> bool:
     """从黑名单移除令牌（便捷函数）"""
-    return token_blacklist.remove_token(token)
+    return await token_blacklist.remove_token(token)
 
 
-def revoke_by_jti(jti: str) -> bool:
+async def revoke_by_jti(jti: str, expires_at: Optional[float] = None) -> bool:
     """通过JTI撤销令牌（便捷函数）"""
-    return token_blacklist.revoke_by_jti(jti)
+    return await token_blacklist.revoke_by_jti(jti, expires_at)
 
 
-def revoke_user_tokens(user_id: int) -> int:
-    """撤销用户的所有令牌（便捷函数）"""
-    return token_blacklist.revoke_user_tokens(user_id)
+async def revoke_user_tokens(user_id) -> float:
+    """撤销用户的所有令牌（便捷函数），返回水位线"""
+    return await token_blacklist.revoke_user_tokens(user_id)
 
 
 def get_blacklisted_count() -> int:
     """获取黑名单中的令牌数量（便捷函数）"""
     return token_blacklist.get_blacklisted_count()
-
@@ -51,6 +51,8 @@ class UnifiedSettings(BaseSettings):
     SECRET_KEY: str = Field(default_factory=lambda: secrets.token_urlsafe(32))
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=60 * 24 * 8, ge=1, le=525600)  # 8 days, max 1 year
     REFRESH_TOKEN_EXPIRE_DAYS: int = Field(default=30, ge=1, le=365)  # 30 days, max 1 year
+    TOKEN_REVOCATION_POLL_INTERVAL: float = Field(default=2.0, ge=0.2, le=300)  # 没有Redis时轮询其他worker撤销记录的间隔（秒）
+    TOKEN_REVOCATION_RELOAD_INTERVAL: float = Field(default=300.0, ge=10, le=86400)  # 全量重新加载间隔（同步移除的记录）
     
     # 服务器配置
     SERVER_NAME: Optional[str] = None
@@ -118,12 +120,30 @@ class UnifiedSettings(BaseSettings):
     WIREGUARD_INTERFACE: str = "wg0"
     WIREGUARD_NETWORK: str = "10.0.0.0/24"
     WIREGUARD_IPV6_NETWORK: str = "fd00::/64"
+    WIREGUARD_SYNC_BACKEND: str = "auto"  # auto | wg | stub
+    WIREGUARD_CONFIG_FLUSH_DELAY: float = Field(default=2.0, ge=0, le=60)  # 配置文件延迟写入秒数
+    WIREGUARD_PROVISION_WORKERS: int = Field(default=0, ge=0, le=64)  # 批量开通进程数，0 表示自动
+    WIREGUARD_QR_CACHE_BYTES: int = Field(default=8 * 1024 * 1024, ge=0, le=512 * 1024 * 1024)  # QR码缓存大小
+    WIREGUARD_TELEMETRY_INTERVAL: float = Field(default=10.0, ge=1, le=3600)  # 对等节点遥测采集间隔（秒）
+    WIREGUARD_TELEMETRY_HISTORY: int = Field(default=30, ge=2, le=1440)  # 每个对等节点保留的采样数
+    WIREGUARD_KEYPOOL_SIZE: int = Field(default=256, ge=0, le=100000)  # 预生成密钥对池容量（0为禁用）
+    
+    # ExaBGP配置
+    EXABGP_API_SOCKET: str = "/run/exabgp/ipv6wgm.sock"  # announce-routes 桥接进程的套接字（为空时禁用进程API）
+    BGP_SESSION_FLUSH_INTERVAL: float = Field(default=2.0, ge=0.1, le=300.0)  # BGP会话状态批量写回间隔（秒）
+    BGP_LOCAL_AS: int = Field(default=65001, ge=1, le=4294967295)  # 本地AS号（宣告的起源AS）
+    
+    # RPKI配置
+    RPKI_ROA_FILE: str = ""  # rpki-client/Routinator 导出的ROA文件（JSON或CSV，为空时禁用RPKI校验）
+    RPKI_RELOAD_INTERVAL: float = Field(default=60.0, ge=1, le=86400)  # ROA文件变化检查间隔（秒）
     
     # 监控配置
     ENABLE_METRICS: bool = True
     METRICS_PORT: int = Field(default=9090, ge=1024, le=65535)
     ENABLE_HEALTH_CHECK: bool = True
     HEALTH_CHECK_INTERVAL: int = Field(default=30, ge=5, le=300)
+    SYSTEM_METRICS_INTERVAL: float = Field(default=5.0, ge=0.5, le=300)  # 系统指标采样间隔（秒）
+    SYSTEM_METRICS_HISTORY: int = Field(default=120, ge=1, le=10000)  # 环形缓冲区保留的采样数
     
     # 日志配置
     LOG_LEVEL: str = "INFO"
@@ -131,14 +151,33 @@ class UnifiedSettings(BaseSettings):
     LOG_FILE: Optional[str] = None
     LOG_ROTATION: str = "1 day"
     LOG_RETENTION: str = "30 days"
+    LOG_STORE_DIR: str = "logs/store"  # 日志查询存储的段文件目录
+    LOG_STORE_SOURCE: Optional[str] = None  # 采集的JSON日志文件，默认使用 LOG_FILE
+    LOG_STORE_SEGMENT_SPAN: int = Field(default=3600, ge=60, le=86400)  # 每个段覆盖的时间跨度（秒）
+    LOG_STORE_SEGMENT_MAX_LINES: int = Field(default=200_000, ge=1000, le=10_000_000)
+    LOG_STORE_RETENTION_DAYS: int = Field(default=30, ge=0, le=3650)  # 0 表示不清理
+    LOG_STORE_INDEX_SEGMENTS: int = Field(default=168, ge=0, le=100_000)  # 保留全文倒排索引的最近段数，0 表示全部保留
+    LOG_STORE_POLL_INTERVAL: float = Field(default=1.0, ge=0.1, le=60)
     
     # 性能配置
     MAX_WORKERS: int = Field(default=4, ge=1, le=32)
+    LEADER_LOCK_DIR: str = ""  # 多worker执行者选举的锁文件目录，为空时使用系统临时目录
     WORKER_CLASS: str = "uvicorn.workers.UvicornWorker"
     KEEP_ALIVE: int = Field(default=2, ge=1, le=60)
     MAX_REQUESTS: int = Field(default=1000, ge=100, le=10000)
     MAX_REQUESTS_JITTER: int = Field(default=100, ge=0, le=1000)
-    
+    COMMAND_MAX_CONCURRENCY: int = Field(default=8, ge=1, le=64)  # 并发系统命令上限
+    COMMAND_DEFAULT_TIMEOUT: float = Field(default=30.0, ge=1, le=600)  # 系统命令默认超时（秒）
+    COMMAND_MAX_OUTPUT_BYTES: int = Field(default=1024 * 1024, ge=1024, le=64 * 1024 * 1024)
+    SERVICE_STATUS_CACHE_TTL: float = Field(default=5.0, ge=0, le=300)  # 服务状态探测结果缓存（秒）
+    RESPONSE_COMPRESSION_ENABLED: bool = True  # 由 Nginx 统一压缩时可关闭
+    RESPONSE_COMPRESSION_CPU_BUDGET: float = Field(default=0.25, gt=0, le=4)  # 压缩可占用的CPU核数
+    RESPONSE_COMPRESSION_CACHE_BYTES: int = Field(default=16 * 1024 * 1024, ge=0, le=1024 * 1024 * 1024)
+    CACHE_LOCAL_MAX_ENTRIES: int = Field(default=10000, ge=0, le=10000000)  # 本地缓存条目上限
+    CACHE_LOCAL_MAX_BYTES: int = Field(default=64 * 1024 * 1024, ge=0, le=4 * 1024 * 1024 * 1024)
+    CACHE_LOCAL_TTL: int = Field(default=300, ge=1, le=86400)  # 本地缓存最长保留（秒）
+    CACHE_LOCAL_TAGGED_TTL: int = Field(default=30, ge=1, le=86400)  # 带标签条目的本地保留（秒）
+
     # 邮件配置
     SMTP_TLS: bool = True
     SMTP_PORT: Optional[int] = Field(default=None, ge=1, le=65535)
@@ -35,12 +35,65 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ 数据库初始化失败: {e}")
         raise
     
+    # 启动系统指标采样器
+    from .core.system_sampler import system_sampler
+    system_sampler.start()
+    
+    # 启动日志采集
+    from .core.log_store import log_tailer
+    log_tailer.start()
+    
+    # 加载令牌撤销记录并订阅多worker同步
+    from .core.token_blacklist import token_blacklist
+    await token_blacklist.start()
+    
+    # 启动WireGuard对等节点遥测采集
+    from .services.wireguard_telemetry import peer_telemetry
+    peer_telemetry.start()
+    
+    # 启动WireGuard密钥对预生成
+    from .services.wireguard_keypool import keypair_reservoir
+    keypair_reservoir.start()
+    
+    # 连接ExaBGP进程API通道（增量宣告/撤销路由，每次连接后重放当前路由）
+    from .services.exabgp_api import exabgp_api
+    from .services.exabgp_service import replay_commands
+    exabgp_api.set_replay(replay_commands)
+    exabgp_api.start()
+    
+    # 跟踪ExaBGP上报的BGP会话状态并批量写回
+    from .services.bgp_session_state import bgp_session_tracker
+    exabgp_api.add_event_handler(bgp_session_tracker.handle)
+    bgp_session_tracker.start()
+    
+    # 载入RPKI ROA表，每次更新后重新校验全部宣告
+    from .services.rpki_validation import rpki_validator
+    from .services.bgp_service import bgp_service
+    rpki_validator.add_reload_handler(lambda table: bgp_service.validate_announcements())
+    rpki_validator.start()
+    
     logger.info("✅ 应用启动完成！")
     
     yield
     
     # 关闭时执行
     logger.info("🛑 关闭IPv6 WireGuard Manager...")
+    await system_sampler.stop()
+    await log_tailer.stop()
+    await token_blacklist.stop()
+    await peer_telemetry.stop()
+    await keypair_reservoir.stop()
+    await exabgp_api.stop()
+    await bgp_session_tracker.stop()
+    await rpki_validator.stop()
+    try:
+        from .services.wireguard_sync import peer_reconciler
+        await peer_reconciler.flush_all()
+        logger.info("✅ WireGuard配置已写入")
+        from .services.wireguard_service import shutdown_provision_pool
+        shutdown_provision_pool()
+    except Exception as e:
+        logger.error(f"❌ WireGuard配置写入失败: {e}")
     try:
         await close_db()
         logger.info("✅ 数据库连接已关闭")
@@ -79,6 +132,11 @@ if settings.BACKEND_CORS_ORIGINS:
         max_age=3600,
     )
 
+# 响应压缩中间件（纯 ASGI，支持流式响应）
+if getattr(settings, "RESPONSE_COMPRESSION_ENABLED", True):
+    from .core.response_compression import CompressionMiddleware, DEFAULT_COMPRESSION_CONFIG
+    app.add_middleware(CompressionMiddleware, config=DEFAULT_COMPRESSION_CONFIG)
+
 # 安全头中间件
 @app.middleware("http")
 async def add_security_headers(request: Request, call_next):
@@ -1,7 +1,7 @@
 """
 IPv6前缀池与分配模型
 """
-from sqlalchemy import Column, String, Boolean, Integer, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Boolean, Integer, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -17,6 +17,8 @@ class PrefixPool(Base):
     prefix_len = Column(Integer, nullable=False)  # 要分配的子网前缀长度
     description = Column(Text, nullable=True)
     enabled = Column(Boolean, default=True)
+    # 空闲区间保存在 pool_free_ranges 表；为False时下次分配按已分配前缀重建
+    free_ranges_built = Column(Boolean, nullable=False, default=False, server_default="0")
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -38,4 +40,22 @@ class PoolPrefix(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
-    pool = relationship("PrefixPool", back_populates="prefixes")
\ No newline at end of file
+    pool = relationship("PrefixPool", back_populates="prefixes")
+
+    __table_args__ = (
+        Index('idx_pool_prefixes_pool_prefix', 'pool_id', 'prefix'),
+    )
+
+class PoolFreeRange(Base):
+    """前缀池的一个空闲槽位区间 [start_slot, end_slot)"""
+    __tablename__ = "pool_free_ranges"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    pool_id = Column(Integer, ForeignKey("prefix_pools.id", ondelete="CASCADE"), nullable=False)
+    # 零填充的十六进制槽位序号，字符串顺序即数值顺序
+    start_slot = Column(String(32), nullable=False)
+    end_slot = Column(String(32), nullable=False)
+
+    __table_args__ = (
+        Index('idx_pool_free_ranges_pool_start', 'pool_id', 'start_slot', unique=True),
+    )
@@ -1,7 +1,8 @@
 """
 IPv6前缀池模型
 """
-from sqlalchemy import Column, String, Boolean, Integer, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, String, Boolean, Integer, DateTime, ForeignKey, Text, Enum, UniqueConstraint
+from sqlalchemy.dialects.mysql import LONGTEXT
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -33,17 +34,24 @@ class IPv6PrefixPool(Base):
     whitelist_enabled = Column(Boolean, default=False)  # 启用白名单
     rpki_enabled = Column(Boolean, default=False)  # 启用RPKI预检
     enabled = Column(Boolean, default=True)
+    # 空闲区间索引（JSON编码的 [start, end) 槽位区间），为空时按有效分配重建
+    free_ranges = Column(Text().with_variant(LONGTEXT(), "mysql"), nullable=True)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # 关联关系
-    allocations = relationship("IPv6Allocation", back_populates="pool", cascade="all, delete-orphan")
+    allocations = relationship("IPv6PrefixAllocation", back_populates="pool", cascade="all, delete-orphan")
     whitelist_entries = relationship("IPv6Whitelist", back_populates="pool", cascade="all, delete-orphan")
 
 
-class IPv6Allocation(Base):
-    __tablename__ = "ipv6_allocations"
+class IPv6PrefixAllocation(Base):
+    """前缀池的分配记录（与 models_complete.IPv6Allocation 的 ipv6_pools 分配表相互独立）"""
+    __tablename__ = "ipv6_prefix_allocations"
+    # 同一前缀在池内只有一条记录，释放后再分配时复用该记录
+    __table_args__ = (
+        UniqueConstraint("pool_id", "allocated_prefix", name="uq_ipv6_allocation_pool_prefix"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     pool_id = Column(Integer, ForeignKey("ipv6_prefix_pools.id"), nullable=False)
@@ -57,8 +65,8 @@ class IPv6Allocation(Base):
     
     # 关联关系
     pool = relationship("IPv6PrefixPool", back_populates="allocations")
-    client = relationship("WireGuardClient", back_populates="ipv6_allocations")
-    server = relationship("WireGuardServer", back_populates="ipv6_allocations")
+    client = relationship("WireGuardClient")
+    server = relationship("WireGuardServer")
 
 
 class IPv6Whitelist(Base):
@@ -3,12 +3,12 @@
 """
 from sqlalchemy import (
     Column, String, Boolean, DateTime, Text, ForeignKey, Table,
-    Integer, BigInteger, Float, Enum, Index, UniqueConstraint, CheckConstraint
+    Integer, BigInteger, Float, Enum, Index, UniqueConstraint, CheckConstraint, JSON
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, synonym
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID, INET, CIDR
-from sqlalchemy.dialects.mysql import JSON as MySQLJSON
+from sqlalchemy.dialects.mysql import JSON as MySQLJSON, LONGTEXT
 import uuid
 from datetime import datetime
 from enum import Enum as PyEnum
@@ -235,12 +235,21 @@ class WireGuardServer(Base):
     private_key = Column(String(255), nullable=False)
     public_key = Column(String(255), nullable=False, index=True)
     listen_port = Column(Integer, nullable=False, default=51820)
-    address = Column(String(100), nullable=False)  # 服务器IP地址
-    dns = Column(String(255), nullable=True)       # DNS服务器
+    address = Column(String(100), nullable=True)   # 服务器IP地址（旧字段，见 ipv4_address/ipv6_address）
+    dns = Column(String(255), nullable=True)       # DNS服务器（旧字段，见 dns_servers）
+    ipv4_address = Column(String(45), nullable=True)
+    ipv6_address = Column(String(45), nullable=True)
+    dns_servers = Column(JSON, nullable=True)      # DNS服务器列表
+    mtu = Column(Integer, default=1420, nullable=False)
+    config_file_path = Column(Text, nullable=True)
+    # 客户端地址空闲区间索引（JSON），为空时按现有客户端重建
+    ipv4_free_ranges = Column(Text().with_variant(LONGTEXT(), "mysql"), nullable=True)
+    ipv6_free_ranges = Column(Text().with_variant(LONGTEXT(), "mysql"), nullable=True)
     
     # 状态
     status = Column(Enum(WireGuardStatus), default=WireGuardStatus.INACTIVE, nullable=False)
     is_enabled = Column(Boolean, default=True, nullable=False)
+    is_active = synonym("is_enabled")
     
     # 统计信息
     total_clients = Column(Integer, default=0, nullable=False)
@@ -253,8 +262,8 @@ class WireGuardServer(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     last_sync = Column(DateTime(timezone=True), nullable=True)
     
-    # 外键
-    created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
+    # 外键（由服务层或批量开通创建时为空）
+    created_by = Column(Integer, ForeignKey('users.id'), nullable=True)
     
     # 关系
     created_by_user = relationship("User", back_populates="wireguard_servers")
@@ -283,17 +292,23 @@ class WireGuardClient(Base):
     # 网络配置
     private_key = Column(String(255), nullable=False)
     public_key = Column(String(255), nullable=False, index=True)
-    allowed_ips = Column(String(255), nullable=False)  # 允许的IP地址
+    allowed_ips = Column(String(255), nullable=True)   # 允许的IP地址（逗号分隔）
     endpoint = Column(String(255), nullable=True)      # 客户端端点
+    ipv4_address = Column(String(45), nullable=True)   # 隧道地址
+    ipv6_address = Column(String(45), nullable=True)
+    persistent_keepalive = Column(Integer, default=25, nullable=False)
+    config_file_path = Column(Text, nullable=True)
     
     # 状态
     status = Column(Enum(WireGuardStatus), default=WireGuardStatus.INACTIVE, nullable=False)
     is_enabled = Column(Boolean, default=True, nullable=False)
+    is_active = synonym("is_enabled")
     
     # 统计信息
     bytes_sent = Column(BigInteger, default=0, nullable=False)
     bytes_received = Column(BigInteger, default=0, nullable=False)
     last_handshake = Column(DateTime(timezone=True), nullable=True)
+    last_seen = synonym("last_handshake")
     
     # 时间字段
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -301,7 +316,7 @@ class WireGuardClient(Base):
     
     # 外键
     server_id = Column(Integer, ForeignKey('wireguard_servers.id', ondelete='CASCADE'), nullable=False)
-    created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
+    created_by = Column(Integer, ForeignKey('users.id'), nullable=True)
     
     # 关系
     server = relationship("WireGuardServer", back_populates="clients")
@@ -314,6 +329,9 @@ class WireGuardClient(Base):
         Index('idx_wg_clients_status', 'status'),
         Index('idx_wg_clients_created_by', 'created_by'),
         UniqueConstraint('server_id', 'name', name='uq_wg_client_server_name'),
+        # 同一服务器内隧道地址唯一（NULL 不参与比较）
+        UniqueConstraint('server_id', 'ipv4_address', name='uq_wg_client_server_ipv4'),
+        UniqueConstraint('server_id', 'ipv6_address', name='uq_wg_client_server_ipv6'),
     )
 
     def __repr__(self):
@@ -335,6 +353,7 @@ class BGPSession(Base):
     remote_ip = Column(String(45), nullable=False)   # 支持IPv4和IPv6
     hold_time = Column(Integer, default=180, nullable=False)
     keepalive_time = Column(Integer, default=60, nullable=False)
+    password = Column(String(128), nullable=True)    # TCP MD5 密码
     
     # 状态
     status = Column(Enum(BGPStatus), default=BGPStatus.IDLE, nullable=False)
@@ -351,7 +370,7 @@ class BGPSession(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
     # 外键
-    created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
+    created_by = Column(Integer, ForeignKey('users.id'), nullable=True)
     
     # 关系
     created_by_user = relationship("User")
@@ -375,6 +394,8 @@ class BGPAnnouncement(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     prefix = Column(String(50), nullable=False)  # 宣告的前缀
+    next_hop = Column(String(128), nullable=True)  # 为空时为 self
+    asn = Column(Integer, nullable=True)           # 起源AS，为空时为本地AS
     description = Column(Text, nullable=True)
     
     # 状态
@@ -386,7 +407,7 @@ class BGPAnnouncement(Base):
     
     # 外键
     session_id = Column(Integer, ForeignKey('bgp_sessions.id', ondelete='CASCADE'), nullable=False)
-    created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
+    created_by = Column(Integer, ForeignKey('users.id'), nullable=True)
     
     # 关系
     session = relationship("BGPSession", back_populates="announcements")
@@ -6,6 +6,8 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from ..core.database import Base
+# audit_logs 表由 models_complete 定义，这里复用同一个模型，避免同一元数据中重复定义表
+from .models_complete import AuditLog  # noqa: F401
 
 
 class SystemMetric(Base):
@@ -23,27 +25,6 @@ class SystemMetric(Base):
         return f"<SystemMetric(id={self.id}, name={self.metric_name}, value={self.metric_value})>"
 
 
-class AuditLog(Base):
-    """审计日志模型"""
-    __tablename__ = "audit_logs"
-
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
-    action = Column(String(100), nullable=False, index=True)
-    resource_type = Column(String(50), nullable=True)
-    resource_id = Column(Integer, nullable=True)
-    details = Column(Text, nullable=True)
-    ip_address = Column(String(45), nullable=True)
-    user_agent = Column(Text, nullable=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-
-    # 关系
-    user = relationship("User", back_populates="audit_logs")
-
-    def __repr__(self):
-        return f"<AuditLog(id={self.id}, action={self.action}, user_id={self.user_id})>"
-
-
 class OperationLog(Base):
     """操作日志模型"""
     __tablename__ = "operation_logs"
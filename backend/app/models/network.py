@@ -32,7 +32,7 @@ class FirewallRule(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False, index=True)
-    table_name = Column(String(20), nullable=False)  # 'filter', 'nat', 'mangle'
+    table_name = Column(String(20), nullable=False)  # 'filter', 'nat', 'mangle', 'raw'
     chain_name = Column(String(50), nullable=False)
     rule_spec = Column(Text, nullable=False)
     action = Column(String(20), nullable=False)
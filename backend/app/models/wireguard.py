@@ -1,68 +1,12 @@
 """
 WireGuard相关模型
+服务器和客户端统一使用 models_complete.py 中的定义（同一张表只能在元数据中声明一次）
 """
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, ForeignKey, BigInteger
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
 from sqlalchemy.sql import func
 
 from ..core.database import Base
-
-
-class WireGuardServer(Base):
-    """WireGuard服务器模型"""
-    __tablename__ = "wireguard_servers"
-
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String(100), nullable=False, index=True)
-    interface = Column(String(20), default='wg0', nullable=False)
-    listen_port = Column(Integer, nullable=False)
-    private_key = Column(Text, nullable=False)
-    public_key = Column(Text, nullable=False)
-    ipv4_address = Column(String(45), nullable=True)
-    ipv6_address = Column(String(45), nullable=True)
-    dns_servers = Column(Text, nullable=True)
-    mtu = Column(Integer, default=1420, nullable=False)
-    config_file_path = Column(Text, nullable=True)
-    is_active = Column(Boolean, default=True, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
-
-    # 关系
-    clients = relationship("WireGuardClient", secondary="client_server_relations", back_populates="servers")
-    ipv6_allocations = relationship("IPv6Allocation", back_populates="server")
-
-    def __repr__(self):
-        return f"<WireGuardServer(id={self.id}, name={self.name}, interface={self.interface})>"
-
-
-class WireGuardClient(Base):
-    """WireGuard客户端模型"""
-    __tablename__ = "wireguard_clients"
-
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String(100), nullable=False, index=True)
-    description = Column(Text, nullable=True)
-    private_key = Column(Text, nullable=False)
-    public_key = Column(Text, nullable=False)
-    ipv4_address = Column(String(45), nullable=True)
-    ipv6_address = Column(String(45), nullable=True)
-    allowed_ips = Column(Text, nullable=True)
-    persistent_keepalive = Column(Integer, default=25, nullable=False)
-    qr_code = Column(Text, nullable=True)
-    config_file_path = Column(Text, nullable=True)
-    is_active = Column(Boolean, default=True, nullable=False)
-    last_seen = Column(DateTime(timezone=True), nullable=True)
-    bytes_received = Column(BigInteger, default=0, nullable=False)
-    bytes_sent = Column(BigInteger, default=0, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
-
-    # 关系
-    servers = relationship("WireGuardServer", secondary="client_server_relations", back_populates="clients")
-    ipv6_allocations = relationship("IPv6Allocation", back_populates="client")
-
-    def __repr__(self):
-        return f"<WireGuardClient(id={self.id}, name={self.name})>"
+from .models_complete import WireGuardServer, WireGuardClient, WireGuardStatus
 
 
 class ClientServerRelation(Base):
@@ -76,3 +20,6 @@ class ClientServerRelation(Base):
 
     def __repr__(self):
         return f"<ClientServerRelation(client_id={self.client_id}, server_id={self.server_id})>"
+
+
+__all__ = ["WireGuardServer", "WireGuardClient", "WireGuardStatus", "ClientServerRelation"]
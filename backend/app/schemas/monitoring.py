@@ -75,6 +75,7 @@ class SystemStats(BaseModel):
     network_tx: int
     active_connections: int
     timestamp: datetime
+    staleness: float = 0.0  # 采样距今秒数
 
 class ServiceStatus(BaseModel):
     service_name: str
@@ -110,8 +111,10 @@ class LogQuery(BaseModel):
     message: Optional[str] = None
     limit: int = 100
     offset: int = 0
+    cursor: Optional[str] = None  # 上一页的 next_cursor，指定时忽略 offset
 
 class LogResponse(BaseModel):
     logs: List[Dict[str, Any]]
     total: int
-    has_more: bool
\ No newline at end of file
+    has_more: bool
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -80,11 +80,27 @@ class WireGuardClientUpdate(WireGuardClientBase):
     allowed_ips: Optional[List[str]] = None
     persistent_keepalive: Optional[int] = None
 
+class WireGuardClientBatchItem(WireGuardClientBase):
+    server_id: Optional[int] = None  # 以批量请求的 server_id 为准
+
+class WireGuardClientBatchCreate(BaseModel):
+    server_id: int
+    clients: List[WireGuardClientBatchItem]
+
+    @field_validator('clients')
+    @classmethod
+    def validate_clients(cls, v):
+        if not 1 <= len(v) <= 5000:
+            raise ValueError('每批客户端数量必须在1-5000之间')
+        names = [client.name for client in v]
+        if len(set(names)) != len(names):
+            raise ValueError('同一批次中的客户端名称不能重复')
+        return v
+
 class WireGuardClient(WireGuardClientBase):
     id: int
     private_key: str
     public_key: str
-    qr_code: Optional[str] = None
     config_file_path: Optional[str] = None
     is_active: bool
     last_seen: Optional[datetime] = None
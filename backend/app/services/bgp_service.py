@@ -2,20 +2,42 @@
 BGP服务管理模块
 """
 import asyncio
-import subprocess
+import ipaddress
 import json
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional, Tuple
-from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 
-from ..models.bgp import BGPSession, BGPOperation, OperationType, SessionStatus
-from ..models.ipv6_pool import IPv6PrefixPool, IPv6Allocation, BGPAlert
-from ..core.database import get_db
+from ..models.bgp import BGPSession, BGPAnnouncement, BGPOperation, OperationType, BGPStatus
+from ..models.ipv6_pool import IPv6PrefixPool, IPv6PrefixAllocation, BGPAlert, PoolStatus
+from ..core.unified_config import settings
+from ..core.database_manager import database_manager
 from ..core.logging import get_logger
+from ..core.leader import leader_lock
+from ..core.prefix_index import PrefixFreeIndex
+from ..core.command_executor import command_executor
+from ..core.route_aggregator import RouteAggregator
+from ..core.roa_table import INVALID, VALID
+from .exabgp_api import ExaBGPCommandError, exabgp_api, route_command
+from .bgp_session_state import bgp_session_tracker
+from .prefix_assignment import pool_hash_key, sticky_prefix_assigner
+from .rpki_validation import rpki_validator
 
 logger = get_logger(__name__)
 
+# 路由变更下发失败后，按数据库重新同步该池宣告前的等待时间（秒）
+ROUTE_RESYNC_DELAY = 5.0
+
+
+def _timestamp(value: datetime) -> float:
+    # SQLite 等后端读回的时间不带时区，按写入时的 UTC 处理
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
 
 class BGPService:
     """BGP服务管理类"""
@@ -24,6 +46,14 @@ class BGPService:
         self.exabgp_config_path = "/etc/exabgp/exabgp.conf"
         self.exabgp_service_name = "exabgp"
         self.supervisor_service_name = "supervisor"
+        # 分配即宣告池的路由聚合器: pool_id -> (对应的空闲索引快照, 聚合器)
+        self._pool_routes: Dict[int, Tuple[Optional[str], RouteAggregator]] = {}
+        # 等待调用方提交后下发的路由变更、失败后的重新同步任务
+        self._route_tasks: set = set()
+        # 本地AS号（宣告的起源AS）
+        self.local_asn = getattr(settings, "BGP_LOCAL_AS", 65001)
+        # 多 worker 时只由持锁进程维护宣告的 RPKI_INVALID 告警
+        self._rpki_leader = leader_lock("rpki-alerts")
     
     async def reload_exabgp(self, session_id: Optional[str] = None) -> Dict:
         """重载ExaBGP配置"""
@@ -147,17 +177,27 @@ class BGPService:
             }
     
     async def get_session_status(self, session_id: str) -> Dict:
-        """获取BGP会话状态"""
+        """获取BGP会话状态（优先使用ExaBGP事件维护的内存状态，未收到事件时读取最近写回的状态）"""
         try:
-            # 这里应该从ExaBGP或BGP监控工具获取实际状态
-            # 目前返回模拟数据
+            state = bgp_session_tracker.session(int(session_id))
+            if state is not None:
+                return {"session_id": session_id, "source": "exabgp", **state}
+            
+            async with self._session() as db:
+                session = await db.get(BGPSession, int(session_id))
+            if session is None:
+                return {"session_id": session_id, "status": "unknown", "error": "会话不存在"}
+            # 运行时间由建立时间推算，不依赖最近一次写回的时刻
+            established = session.status == BGPStatus.ESTABLISHED and session.established_time
             return {
                 "session_id": session_id,
-                "status": "established",
-                "uptime": 3600,
-                "prefixes_received": 100,
-                "prefixes_sent": 50,
-                "last_update": datetime.now().isoformat()
+                "source": "database",
+                "neighbor": session.remote_ip,
+                "status": session.status.value if session.status else "unknown",
+                "since": session.established_time.isoformat() if established else None,
+                "uptime": max(0, int(time.time() - _timestamp(session.established_time))) if established else 0,
+                "prefixes_received": session.prefixes_received or 0,
+                "prefixes_sent": session.prefixes_sent or 0,
             }
         except Exception as e:
             logger.error(f"获取BGP会话状态失败: {str(e)}")
@@ -167,135 +207,184 @@ class BGPService:
                 "error": str(e)
             }
     
+    @asynccontextmanager
+    async def _session(self, db: Optional[AsyncSession] = None):
+        """使用调用方的会话（由调用方提交），未提供时新建会话并在结束时提交/回滚"""
+        if db is not None:
+            yield db
+            return
+        async with database_manager.get_session() as session:
+            yield session
+    
+    async def _lock_pool(self, db: AsyncSession, pool_id: int) -> Optional[IPv6PrefixPool]:
+        """加行锁读取前缀池，串行化同一池上的并发分配/释放（锁持有到事务结束）"""
+        result = await db.execute(
+            select(IPv6PrefixPool)
+            .where(IPv6PrefixPool.id == pool_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().first()
+    
+    async def _load_index(self, db: AsyncSession, pool: IPv6PrefixPool) -> PrefixFreeIndex:
+        """读取池的空闲空间索引，缺失或损坏时按有效分配记录重建"""
+        if pool.free_ranges:
+            try:
+                return PrefixFreeIndex.loads(pool.prefix, pool.prefix_length, pool.free_ranges)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"前缀池 {pool.id} 空闲索引损坏，重新构建: {e}")
+        
+        result = await db.execute(
+            select(IPv6PrefixAllocation.allocated_prefix).where(
+                IPv6PrefixAllocation.pool_id == pool.id,
+                IPv6PrefixAllocation.is_active == True
+            )
+        )
+        return PrefixFreeIndex.from_used(pool.prefix, pool.prefix_length, result.scalars().all())
+    
     async def allocate_ipv6_prefix(
         self, 
-        pool_id: str, 
-        client_id: str, 
-        auto_announce: bool = False
+        pool_id: int, 
+        client_id: Optional[int] = None, 
+        db: Optional[AsyncSession] = None
     ) -> Dict:
-        """分配IPv6前缀（完整版本）
-        实现复杂的前缀池管理、冲突检测、子网划分等逻辑。
-        """
-        db = next(get_db())
+        """分配IPv6前缀
         
+        在同一事务内锁定前缀池行、从空闲区间索引取出前缀、写入分配记录并维护
+        used_count，并发请求在池行锁上排队，不会拿到相同的前缀。指定客户端时
+        前缀由池密钥哈希决定，同一客户端在任何进程/节点上得到相同的前缀。
+        分配即宣告的池按聚合后的前缀增量宣告，聚合结果超过池的最大前缀数时拒绝分配。
+        """
         try:
-            # 获取前缀池
-            pool = db.query(IPv6PrefixPool).filter(IPv6PrefixPool.id == pool_id).first()
-            if not pool:
-                return {"success": False, "message": "前缀池不存在"}
-            
-            # 检查容量
-            if pool.used_count >= pool.total_capacity:
-                return {"success": False, "message": "前缀池已满"}
-            
-            # 验证前缀池配置
-            if not pool.enabled:
-                return {"success": False, "message": "前缀池未启用"}
-            
-            # 计算可用空间
-            available_space = await self._calculate_available_space(pool)
-            if available_space <= 0:
-                return {"success": False, "message": "前缀池空间不足"}
-            
-            # 分配前缀
-            allocated_prefix = await self._allocate_from_pool(pool, client_id)
-            
-            # 验证分配的前缀
-            if not await self._validate_prefix_allocation(allocated_prefix):
-                return {"success": False, "message": "前缀分配验证失败"}
-            
-            # 创建分配记录
-            allocation = IPv6Allocation(
-                pool_id=pool_id,
-                client_id=client_id,
-                allocated_prefix=allocated_prefix,
-                is_active=True
-            )
-            db.add(allocation)
-            
-            # 更新池使用计数
-            pool.used_count += 1
-            if pool.used_count >= pool.total_capacity:
-                pool.status = "depleted"
-            
-            db.commit()
+            async with self._session(db) as session:
+                pool = await self._lock_pool(session, pool_id)
+                if not pool:
+                    return {"success": False, "message": "前缀池不存在"}
+                
+                # 验证前缀池配置
+                if not pool.enabled:
+                    return {"success": False, "message": "前缀池未启用"}
+                
+                # 客户端在该池已有有效分配时直接返回（重复请求不会多占前缀）
+                if client_id is not None:
+                    result = await session.execute(
+                        select(IPv6PrefixAllocation).where(
+                            IPv6PrefixAllocation.pool_id == pool.id,
+                            IPv6PrefixAllocation.client_id == client_id,
+                            IPv6PrefixAllocation.is_active == True
+                        )
+                    )
+                    existing = result.scalars().first()
+                    if existing:
+                        return {
+                            "success": True,
+                            "message": "客户端已分配IPv6前缀",
+                            "allocated_prefix": existing.allocated_prefix,
+                            "allocation_id": str(existing.id)
+                        }
+                
+                # 检查容量
+                used_count = pool.used_count or 0
+                if used_count >= pool.total_capacity:
+                    return {"success": False, "message": "前缀池已满"}
+                
+                # 有客户端时按池密钥哈希粘性分配（跨进程/节点稳定），否则取最低可用前缀
+                aggregator = await self._pool_aggregator(session, pool) if pool.auto_announce else None
+                index = await self._load_index(session, pool)
+                if client_id is not None:
+                    allocated_prefix, _ = sticky_prefix_assigner.assign(
+                        index, pool_hash_key(pool.id, pool.prefix), str(client_id)
+                    )
+                else:
+                    allocated_prefix = index.allocate()
+                if allocated_prefix is None:
+                    pool.status = PoolStatus.DEPLETED
+                    if not pool.free_ranges:
+                        pool.free_ranges = index.dumps()  # 保存重建的索引
+                    return {"success": False, "message": "前缀池空间不足"}
+                
+                # 验证分配的前缀（失败时不写回索引）
+                if not self._validate_prefix_allocation(allocated_prefix):
+                    return {"success": False, "message": "前缀分配验证失败"}
+                
+                # RPKI预检：以本地AS宣告该前缀会被判为 invalid 时拒绝分配（未载入ROA表时跳过）
+                if pool.rpki_enabled and rpki_validator.validate(allocated_prefix, self.local_asn) == INVALID:
+                    message = f"前缀 {allocated_prefix} 由 AS{self.local_asn} 宣告时RPKI校验为 invalid"
+                    logger.warning(message)
+                    await self.create_alert(
+                        "RPKI_INVALID", "ERROR", message, prefix=allocated_prefix, pool_id=pool.id, db=session
+                    )
+                    return {"success": False, "message": "前缀RPKI校验无效"}
+                
+                # 更新宣告聚合，超过对等体最大前缀数时拒绝分配
+                route_changes = ([], [])
+                if aggregator is not None:
+                    try:
+                        route_changes = aggregator.add(allocated_prefix)
+                    except OverflowError:
+                        message = f"前缀池 {pool.name} 聚合后的宣告数将超过最大前缀限制 {pool.max_prefix_limit}"
+                        logger.warning(message)
+                        await self.create_alert(
+                            "PREFIX_LIMIT", "WARNING", message, prefix=allocated_prefix, pool_id=pool.id, db=session
+                        )
+                        return {"success": False, "message": "超过前缀池最大宣告前缀数"}
+                
+                # 创建分配记录，复用此前释放留下的记录
+                result = await session.execute(
+                    select(IPv6PrefixAllocation).where(
+                        IPv6PrefixAllocation.pool_id == pool.id,
+                        IPv6PrefixAllocation.allocated_prefix == allocated_prefix
+                    )
+                )
+                allocation = result.scalars().first()
+                if allocation is None:
+                    allocation = IPv6PrefixAllocation(pool_id=pool.id, allocated_prefix=allocated_prefix)
+                    session.add(allocation)
+                elif allocation.is_active:
+                    # 索引与分配记录不一致，丢弃索引下次重建
+                    logger.warning(f"前缀池 {pool.id} 空闲索引与分配记录不一致: {allocated_prefix}")
+                    pool.free_ranges = None
+                    return {"success": False, "message": "前缀池索引已重建，请重试"}
+                allocation.client_id = client_id
+                allocation.is_active = True
+                allocation.allocated_at = datetime.now()
+                allocation.released_at = None
+                
+                # 更新池索引和使用计数
+                pool.free_ranges = index.dumps()
+                pool.used_count = used_count + 1
+                if pool.used_count >= pool.total_capacity or index.free_count == 0:
+                    pool.status = PoolStatus.DEPLETED
+                
+                await session.flush()
+                allocation_id = allocation.id
+                free_ranges = pool.free_ranges
             
             # 记录分配信息
-            await self._record_allocation(allocated_prefix, client_id, pool_id)
+            self._record_allocation(allocated_prefix, client_id, pool_id)
             
-            # 如果启用自动宣告，则创建BGP宣告
-            if auto_announce and pool.auto_announce:
-                await self._create_bgp_announcement(allocated_prefix, pool)
+            # 分配即宣告：提交后缓存聚合器并下发聚合差量
+            if aggregator is not None:
+                await self._publish_routes(db, pool_id, free_ranges, aggregator, route_changes)
             
             return {
                 "success": True,
                 "message": "IPv6前缀分配成功",
                 "allocated_prefix": allocated_prefix,
-                "allocation_id": str(allocation.id)
+                "allocation_id": str(allocation_id)
             }
             
         except Exception as e:
-            db.rollback()
             logger.error(f"IPv6前缀分配失败: {str(e)}")
+            if db is not None:
+                await db.rollback()
             return {
                 "success": False,
                 "message": "IPv6前缀分配失败",
                 "error": str(e)
             }
-        finally:
-            db.close()
-    
-    async def _calculate_available_space(self, pool: IPv6PrefixPool) -> int:
-        """计算前缀池中可用的地址空间"""
-        # 总空间减去已分配空间
-        total_space = 2 ** (128 - pool.prefix_length)
-        allocated_space = await self._get_allocated_space(pool)
-        return total_space - allocated_space
-    
-    async def _get_allocated_space(self, pool: IPv6PrefixPool) -> int:
-        """获取已分配的空间大小"""
-        db = next(get_db())
-        try:
-            # 查询该池中已激活的分配记录数量
-            count = db.query(IPv6Allocation).filter(
-                IPv6Allocation.pool_id == pool.id,
-                IPv6Allocation.is_active == True
-            ).count()
-            return count
-        finally:
-            db.close()
-    
-    async def _allocate_from_pool(self, pool: IPv6PrefixPool, client_id: str) -> str:
-        """从前缀池中分配具体的前缀"""
-        # 基于客户端ID的哈希分配算法
-        # 1. 基于客户端ID的哈希分配
-        # 2. 避免冲突
-        # 3. 支持连续分配
-        
-        client_hash = hash(client_id) % 65536
-        pool_base = pool.prefix.split('/')[0]
-        
-        # 计算子网索引
-        subnet_bits = 64 - pool.prefix_length  # 假设分配/64子网
-        max_subnets = 2 ** subnet_bits
-        subnet_index = client_hash % max_subnets
-        
-        # 生成具体的前缀
-        base_parts = pool_base.split(':')
-        # 确保有足够的部分
-        while len(base_parts) < 8:
-            base_parts.append('0')
-        
-        # 在适当位置插入子网索引
-        subnet_hex = hex(subnet_index)[2:].zfill(4)
-        if len(base_parts) >= 4:
-            base_parts[4] = subnet_hex
-        
-        allocated_prefix = ':'.join(base_parts) + '::/64'
-        
-        return allocated_prefix
     
-    async def _record_allocation(self, prefix: str, client_id: str, pool_id: str) -> None:
+    def _record_allocation(self, prefix: str, client_id: Optional[int], pool_id: int) -> None:
         """记录前缀分配信息"""
         # 记录详细的分配信息
         allocation_info = {
@@ -308,11 +397,9 @@ class BGPService:
         
         logger.info(f"Recorded IPv6 prefix allocation: {allocation_info}")
     
-    async def _validate_prefix_allocation(self, prefix: str) -> bool:
+    def _validate_prefix_allocation(self, prefix: str) -> bool:
         """验证前缀分配是否有效"""
         try:
-            # 验证前缀格式
-            import ipaddress
             network = ipaddress.IPv6Network(prefix)
             
             # 检查前缀长度是否合理
@@ -327,59 +414,96 @@ class BGPService:
         except Exception:
             return False
     
-    async def release_ipv6_prefix(self, allocation_id: str) -> Dict:
-        """释放IPv6前缀"""
-        db = next(get_db())
-        
+    async def release_ipv6_prefix(self, allocation_id: int, db: Optional[AsyncSession] = None) -> Dict:
+        """释放IPv6前缀（重复释放不会重复扣减 used_count）"""
         try:
-            # 获取分配记录
-            allocation = db.query(IPv6Allocation).filter(
-                IPv6Allocation.id == allocation_id
-            ).first()
-            
-            if not allocation:
-                return {"success": False, "message": "分配记录不存在"}
-            
-            # 更新分配记录
-            allocation.is_active = False
-            allocation.released_at = datetime.now()
-            
-            # 更新池使用计数
-            pool = allocation.pool
-            pool.used_count -= 1
-            if pool.status == "depleted" and pool.used_count < pool.total_capacity:
-                pool.status = "active"
+            async with self._session(db) as session:
+                # 获取分配记录
+                result = await session.execute(
+                    select(IPv6PrefixAllocation.pool_id).where(IPv6PrefixAllocation.id == allocation_id)
+                )
+                pool_id = result.scalar()
+                if pool_id is None:
+                    return {"success": False, "message": "分配记录不存在"}
+                
+                # 先锁池再锁分配记录，与分配路径的加锁顺序一致
+                pool = await self._lock_pool(session, pool_id)
+                result = await session.execute(
+                    select(IPv6PrefixAllocation)
+                    .where(IPv6PrefixAllocation.id == allocation_id)
+                    .with_for_update()
+                    .execution_options(populate_existing=True)
+                )
+                allocation = result.scalars().first()
+                if not allocation or not allocation.is_active:
+                    return {"success": False, "message": "分配记录已释放"}
+                
+                # 更新分配记录
+                allocation.is_active = False
+                allocation.released_at = datetime.now()
+                released_prefix = allocation.allocated_prefix
+                
+                # 更新宣告聚合、池索引和使用计数
+                aggregator = None
+                route_changes = ([], [])
+                if pool and pool.auto_announce:
+                    aggregator = await self._pool_aggregator(session, pool)
+                    route_changes = aggregator.discard(released_prefix)
+                if pool:
+                    index = await self._load_index(session, pool)
+                    if index.release(released_prefix):
+                        pool.free_ranges = index.dumps()
+                    pool.used_count = max((pool.used_count or 0) - 1, 0)
+                    if pool.status == PoolStatus.DEPLETED and pool.used_count < pool.total_capacity:
+                        pool.status = PoolStatus.ACTIVE
+                
+                await session.flush()
+                free_ranges = pool.free_ranges if pool else None
             
-            db.commit()
+            # 分配即宣告：提交后缓存聚合器并下发聚合差量（撤销或拆分聚合前缀）
+            if aggregator is not None:
+                await self._publish_routes(db, pool_id, free_ranges, aggregator, route_changes)
             
             return {
                 "success": True,
                 "message": "IPv6前缀释放成功",
-                "released_prefix": allocation.allocated_prefix
+                "released_prefix": released_prefix
             }
             
         except Exception as e:
-            db.rollback()
             logger.error(f"IPv6前缀释放失败: {str(e)}")
+            if db is not None:
+                await db.rollback()
             return {
                 "success": False,
                 "message": "IPv6前缀释放失败",
                 "error": str(e)
             }
-        finally:
-            db.close()
     
-    async def check_rpki_validation(self, prefix: str) -> Dict:
-        """检查RPKI验证"""
+    async def check_rpki_validation(self, prefix: str, origin_asn: Optional[int] = None) -> Dict:
+        """按本地ROA表检查前缀的RPKI起源校验结果（默认起源AS为本地AS）"""
+        origin_asn = self.local_asn if origin_asn is None else origin_asn
         try:
-            # 这里应该调用RPKI验证服务
-            # 目前返回模拟数据
+            state = rpki_validator.validate(prefix, origin_asn)
+            if state is None:
+                return {
+                    "prefix": prefix,
+                    "valid": None,
+                    "state": "unknown",
+                    "reason": "ROA表未载入",
+                    "asn": origin_asn
+                }
+            covering = rpki_validator.covering(prefix)
+            prefix_len = ipaddress.ip_network(prefix, strict=False).prefixlen
+            matched = [roa for roa in covering if roa["asn"] == origin_asn and roa["max_length"] >= prefix_len]
             return {
                 "prefix": prefix,
-                "valid": True,
-                "reason": "Valid",
-                "asn": 65001,
-                "max_length": 48
+                "valid": state == VALID,
+                "state": state,
+                "reason": {"valid": "Valid", "invalid": "Invalid", "not_found": "NotFound"}[state],
+                "asn": origin_asn,
+                "max_length": matched[0]["max_length"] if matched else None,
+                "covering_roas": covering
             }
         except Exception as e:
             logger.error(f"RPKI验证失败: {str(e)}")
@@ -390,6 +514,72 @@ class BGPService:
                 "error": str(e)
             }
     
+    async def validate_announcements(self, db: Optional[AsyncSession] = None) -> Dict:
+        """用当前ROA表一次校验全部已启用的宣告，并同步宣告的 RPKI_INVALID 告警
+
+        告警状态保存在数据库中：新变为 invalid 的宣告产生告警，恢复的宣告关闭告警。
+        每个 worker 都会在ROA表更新后校验，只有持有选举锁的 worker 写告警。
+        """
+        if not rpki_validator.loaded:
+            return {"success": False, "message": "ROA表未载入"}
+        try:
+            async with self._session(db) as session:
+                result = await session.execute(
+                    select(BGPAnnouncement.id, BGPAnnouncement.prefix, BGPAnnouncement.asn, BGPAnnouncement.session_id)
+                    .where(BGPAnnouncement.is_active.is_(True))
+                )
+                rows = result.tuples().all()
+                states = rpki_validator.validate_many(
+                    [(prefix, asn or self.local_asn) for _, prefix, asn, _ in rows]
+                )
+                
+                invalid = {}
+                for (announcement_id, prefix, asn, session_id), state in zip(rows, states):
+                    if state == INVALID:
+                        invalid[(prefix, session_id)] = asn or self.local_asn
+                if self._rpki_leader.try_acquire():
+                    await self._sync_rpki_alerts(session, invalid)
+            
+            counts = Counter(state or "error" for state in states)
+            return {
+                "success": True,
+                "total": len(rows),
+                "valid": counts["valid"],
+                "invalid": counts["invalid"],
+                "not_found": counts["not_found"],
+                "unparsable": counts["error"],
+                "invalid_prefixes": sorted(prefix for prefix, _ in invalid)
+            }
+        except Exception as e:
+            logger.error(f"批量RPKI校验失败: {str(e)}")
+            return {"success": False, "message": "批量RPKI校验失败", "error": str(e)}
+    
+    async def _sync_rpki_alerts(self, session: AsyncSession, invalid: Dict[Tuple[str, Optional[int]], int]) -> None:
+        """按本次校验结果创建/关闭宣告的 RPKI_INVALID 告警（分配预检产生的池告警不在此处理）"""
+        result = await session.execute(
+            select(BGPAlert).where(
+                BGPAlert.alert_type == "RPKI_INVALID",
+                BGPAlert.is_resolved.is_(False),
+                BGPAlert.pool_id.is_(None),
+            )
+        )
+        open_alerts = {}
+        now = datetime.now(timezone.utc)
+        for alert in result.scalars().all():
+            key = (alert.prefix, alert.session_id)
+            if key in invalid and key not in open_alerts:
+                open_alerts[key] = alert
+            else:
+                alert.is_resolved = True
+                alert.resolved_at = now
+        for (prefix, session_id), asn in invalid.items():
+            if (prefix, session_id) not in open_alerts:
+                await self.create_alert(
+                    "RPKI_INVALID", "ERROR", f"宣告 {prefix}（AS{asn}）RPKI校验为 invalid",
+                    prefix=prefix, session_id=session_id, db=session
+                )
+        await session.flush()
+    
     async def create_alert(
         self, 
         alert_type: str, 
@@ -397,22 +587,22 @@ class BGPService:
         message: str, 
         prefix: Optional[str] = None,
         session_id: Optional[str] = None,
-        pool_id: Optional[str] = None
+        pool_id: Optional[str] = None,
+        db: Optional[AsyncSession] = None
     ) -> Dict:
         """创建告警"""
-        db = next(get_db())
-        
         try:
-            alert = BGPAlert(
-                alert_type=alert_type,
-                severity=severity,
-                message=message,
-                prefix=prefix,
-                session_id=session_id,
-                pool_id=pool_id
-            )
-            db.add(alert)
-            db.commit()
+            async with self._session(db) as session:
+                alert = BGPAlert(
+                    alert_type=alert_type,
+                    severity=severity,
+                    message=message,
+                    prefix=prefix,
+                    session_id=session_id,
+                    pool_id=pool_id
+                )
+                session.add(alert)
+                await session.flush()
             
             return {
                 "success": True,
@@ -421,15 +611,12 @@ class BGPService:
             }
             
         except Exception as e:
-            db.rollback()
             logger.error(f"创建告警失败: {str(e)}")
             return {
                 "success": False,
                 "message": "创建告警失败",
                 "error": str(e)
             }
-        finally:
-            db.close()
     
     # 私有方法
     async def _record_operation(
@@ -440,24 +627,20 @@ class BGPService:
         message: str
     ) -> str:
         """记录操作"""
-        db = next(get_db())
-        
         try:
-            operation = BGPOperation(
-                session_id=session_id,
-                operation_type=operation_type,
-                status=status,
-                message=message
-            )
-            db.add(operation)
-            db.commit()
-            return str(operation.id)
+            async with self._session() as session:
+                operation = BGPOperation(
+                    session_id=session_id,
+                    operation_type=operation_type,
+                    status=status,
+                    message=message
+                )
+                session.add(operation)
+                await session.flush()
+                return str(operation.id)
         except Exception as e:
-            db.rollback()
             logger.error(f"记录操作失败: {str(e)}")
             return None
-        finally:
-            db.close()
     
     async def _update_operation(
         self, 
@@ -467,24 +650,20 @@ class BGPService:
         error_details: Optional[str] = None
     ):
         """更新操作状态"""
-        db = next(get_db())
-        
         try:
-            operation = db.query(BGPOperation).filter(
-                BGPOperation.id == operation_id
-            ).first()
-            
-            if operation:
-                operation.status = status
-                operation.message = message
-                operation.error_details = error_details
-                operation.completed_at = datetime.now()
-                db.commit()
+            async with self._session() as session:
+                result = await session.execute(
+                    select(BGPOperation).where(BGPOperation.id == operation_id)
+                )
+                operation = result.scalars().first()
+                
+                if operation:
+                    operation.status = status
+                    operation.message = message
+                    operation.error_details = error_details
+                    operation.completed_at = datetime.now()
         except Exception as e:
-            db.rollback()
             logger.error(f"更新操作状态失败: {str(e)}")
-        finally:
-            db.close()
     
     async def _backup_config(self) -> str:
         """备份当前配置"""
@@ -535,75 +714,35 @@ group exabgp {
 }
 """
     
+    async def _control_service(self, action: str, timeout: float) -> Dict:
+        """通过systemctl控制ExaBGP服务，失败时回退到supervisorctl"""
+        result = await command_executor.run(
+            ["systemctl", action, self.exabgp_service_name], timeout=timeout
+        )
+        if not result.ok and not result.timed_out:
+            result = await command_executor.run(
+                ["supervisorctl", "restart", self.exabgp_service_name], timeout=timeout
+            )
+        command_executor.invalidate("systemctl", "is-active", self.exabgp_service_name)
+        return result
+
     async def _reload_service(self) -> Dict:
         """重载服务"""
-        try:
-            # 尝试使用systemctl
-            result = subprocess.run(
-                ["systemctl", "reload", self.exabgp_service_name],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0:
-                return {"success": True}
-            else:
-                # 尝试使用supervisorctl
-                result = subprocess.run(
-                    ["supervisorctl", "restart", self.exabgp_service_name],
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                
-                if result.returncode == 0:
-                    return {"success": True}
-                else:
-                    return {
-                        "success": False,
-                        "error": f"重载失败: {result.stderr}"
-                    }
-                    
-        except subprocess.TimeoutExpired:
+        result = await self._control_service("reload", timeout=30)
+        if result.ok:
+            return {"success": True}
+        if result.timed_out:
             return {"success": False, "error": "重载超时"}
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        return {"success": False, "error": f"重载失败: {result.stderr}"}
     
     async def _restart_service(self) -> Dict:
         """重启服务"""
-        try:
-            # 尝试使用systemctl
-            result = subprocess.run(
-                ["systemctl", "restart", self.exabgp_service_name],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            
-            if result.returncode == 0:
-                return {"success": True}
-            else:
-                # 尝试使用supervisorctl
-                result = subprocess.run(
-                    ["supervisorctl", "restart", self.exabgp_service_name],
-                    capture_output=True,
-                    text=True,
-                    timeout=60
-                )
-                
-                if result.returncode == 0:
-                    return {"success": True}
-                else:
-                    return {
-                        "success": False,
-                        "error": f"重启失败: {result.stderr}"
-                    }
-                    
-        except subprocess.TimeoutExpired:
+        result = await self._control_service("restart", timeout=60)
+        if result.ok:
+            return {"success": True}
+        if result.timed_out:
             return {"success": False, "error": "重启超时"}
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        return {"success": False, "error": f"重启失败: {result.stderr}"}
     
     async def _calculate_next_prefix(self, pool: IPv6PrefixPool) -> str:
         """计算下一个可用的前缀"""
@@ -616,10 +755,101 @@ group exabgp {
         next_suffix = hex(used_count + 1)[2:].zfill(4)
         return f"{base_prefix}:{next_suffix}::{pool.prefix_length}"
     
-    async def _create_bgp_announcement(self, prefix: str, pool: IPv6PrefixPool):
-        """创建BGP宣告"""
-        # 这里应该创建BGP宣告记录
-        pass
+    async def _pool_aggregator(self, db: AsyncSession, pool: IPv6PrefixPool) -> RouteAggregator:
+        """取出分配即宣告池的路由聚合器
+
+        缓存的聚合器与其对应的空闲索引快照一起保存；快照与当前池状态不一致（其他
+        进程修改过该池或上次操作未提交）时按有效分配记录重建。取出即从缓存移除，
+        操作提交后再放回。
+        """
+        cached = self._pool_routes.pop(pool.id, None)
+        if cached and cached[0] is not None and cached[0] == pool.free_ranges:
+            aggregator = cached[1]
+            aggregator.limit = pool.max_prefix_limit
+            return aggregator
+        
+        aggregator = RouteAggregator(pool.prefix)
+        result = await db.execute(
+            select(IPv6PrefixAllocation.allocated_prefix).where(
+                IPv6PrefixAllocation.pool_id == pool.id,
+                IPv6PrefixAllocation.is_active == True
+            )
+        )
+        for prefix in result.scalars().all():
+            try:
+                aggregator.add(prefix)
+            except ValueError:
+                logger.warning(f"前缀池 {pool.id} 中的分配 {prefix} 不在池前缀内，忽略")
+        aggregator.limit = pool.max_prefix_limit
+        return aggregator
+    
+    def _spawn(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._route_tasks.add(task)
+        task.add_done_callback(self._route_tasks.discard)
+
+    async def _publish_routes(self, db: Optional[AsyncSession], pool_id: int, free_ranges: Optional[str],
+                              aggregator: RouteAggregator, route_changes: Tuple[List[str], List[str]]) -> None:
+        """事务提交后缓存聚合器并下发聚合差量
+
+        未传入会话时本方法的会话已经提交，直接下发；使用调用方的会话时等调用方提交后
+        再下发，调用方回滚时丢弃（缓存的聚合器已取出，下次按分配记录重建）。
+        """
+        if db is None:
+            self._pool_routes[pool_id] = (free_ranges, aggregator)
+            await self._push_route_changes(pool_id, *route_changes)
+            return
+
+        finished = []
+
+        def committed(_session) -> None:
+            if finished:
+                return
+            finished.append(True)
+            self._pool_routes[pool_id] = (free_ranges, aggregator)
+            self._spawn(self._push_route_changes(pool_id, *route_changes))
+
+        def rolled_back(_session) -> None:
+            finished.append(True)
+
+        event.listen(db.sync_session, "after_commit", committed, once=True)
+        event.listen(db.sync_session, "after_rollback", rolled_back, once=True)
+
+    async def _push_route_changes(self, pool_id: int, announce: List[str], withdraw: List[str]):
+        """通过ExaBGP进程API下发聚合差量：先宣告新前缀再撤销旧前缀，避免路由空窗
+
+        下发失败时 ExaBGP 与聚合器状态不再一致：丢弃缓存的聚合器，稍后按数据库重新同步该池。
+        """
+        commands = [route_command("announce", prefix) for prefix in announce]
+        commands += [route_command("withdraw", prefix) for prefix in withdraw]
+        if not commands:
+            return
+        try:
+            await exabgp_api.send(commands)
+        except ExaBGPCommandError as e:
+            logger.warning(f"下发路由变更失败（宣告 {announce}，撤销 {withdraw}），稍后重新同步: {e}")
+            self._pool_routes.pop(pool_id, None)
+            self._spawn(self._resync_pool_routes(pool_id, withdraw))
+
+    async def _resync_pool_routes(self, pool_id: int, withdraw: List[str], delay: float = ROUTE_RESYNC_DELAY):
+        """按有效分配记录重新宣告池的聚合前缀，并补发失败的撤销（不再被覆盖的部分）"""
+        await asyncio.sleep(delay)
+        try:
+            async with database_manager.get_session() as session:
+                pool = await session.get(IPv6PrefixPool, pool_id)
+                announce = []
+                if pool is not None and pool.auto_announce and pool.enabled:
+                    aggregator = await self._pool_aggregator(session, pool)
+                    announce = aggregator.aggregates()
+            announced = set(announce)
+            commands = [route_command("announce", prefix) for prefix in announce]
+            commands += [route_command("withdraw", prefix) for prefix in withdraw if prefix not in announced]
+            if commands:
+                await exabgp_api.send(commands)
+            logger.info(f"前缀池 {pool_id} 的宣告已重新同步: {len(commands)} 条命令")
+        except Exception as e:
+            # 通道断开时由重连后的重放恢复宣告
+            logger.warning(f"重新同步前缀池 {pool_id} 的宣告失败: {e}")
 
 
 # 全局BGP服务实例
@@ -0,0 +1,415 @@
+"""
+BGP会话状态跟踪
+消费 ExaBGP `encoder json` 输出的 neighbor-changes（state）和 update 事件（经
+ExaBGP API通道转发），在内存中维护每个对等体的会话状态和收发前缀集合。事件只修改
+内存并标记对等体为脏，后台任务按固定间隔把脏对等体合并成一个事务批量写回
+bgp_sessions 表，突发的大量 UPDATE 只产生一次写入。
+每个 worker 都维护内存状态（任一 worker 都能回答状态查询），只有选举出的执行者
+写回数据库。写回的是会话建立时间而不是运行时间，运行时间在读取时推算。
+"""
+import asyncio
+import ipaddress
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select, update
+
+from ..core.unified_config import settings
+from ..core.logging import get_logger
+from ..core.leader import leader_lock
+from ..models import BGPSession, BGPStatus
+
+try:
+    from ..core.monitoring import monitoring_manager
+except ImportError:  # prometheus_client 未安装
+    monitoring_manager = None
+
+logger = get_logger(__name__)
+
+# ExaBGP neighbor-changes 的状态名 -> 会话状态
+_STATES = {
+    "up": BGPStatus.ESTABLISHED,
+    "established": BGPStatus.ESTABLISHED,
+    "connected": BGPStatus.CONNECT,
+    "connect": BGPStatus.CONNECT,
+    "down": BGPStatus.IDLE,
+    "idle": BGPStatus.IDLE,
+    "active": BGPStatus.ACTIVE,
+    "opensent": BGPStatus.OPENSENT,
+    "openconfirm": BGPStatus.OPENCONFIRM,
+}
+
+UNKNOWN = "unknown"
+
+
+def _datetime(timestamp: float) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp else None
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return 0.0
+    # SQLite 等后端读回的时间不带时区，按写入时的 UTC 处理
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _normalize_address(address: str) -> str:
+    address = str(address).strip()
+    try:
+        return str(ipaddress.ip_address(address))
+    except ValueError:
+        return address
+
+
+def _nlri_prefixes(entries: Any) -> Iterable[str]:
+    """取出一个地址族下的NLRI
+
+    ExaBGP 4.1+ 为 [{"nlri": "2001:db8::/48"}, ...]，4.0 为 {"2001:db8::/48": {...}, ...}；
+    非字符串的NLRI（flowspec 等）忽略。
+    """
+    if isinstance(entries, dict):
+        return [key for key in entries if isinstance(key, str)]
+    if isinstance(entries, list):
+        return [entry["nlri"] for entry in entries
+                if isinstance(entry, dict) and isinstance(entry.get("nlri"), str)]
+    return []
+
+
+@dataclass
+class PeerState:
+    """一个对等体的实时会话状态"""
+    neighbor: str
+    status: Optional[BGPStatus] = None  # 尚未收到状态事件
+    since: float = 0.0
+    reason: Optional[str] = None
+    local_address: Optional[str] = None
+    peer_as: Optional[int] = None
+    received: Set[str] = field(default_factory=set)
+    sent: Set[str] = field(default_factory=set)
+    updates: int = 0
+    transitions: int = 0
+    last_update: float = 0.0
+
+    def uptime(self, now: Optional[float] = None) -> int:
+        if self.status != BGPStatus.ESTABLISHED or not self.since:
+            return 0
+        return max(0, int((now or time.time()) - self.since))
+
+    def to_dict(self, now: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            "neighbor": self.neighbor,
+            "status": self.status.value if self.status else UNKNOWN,
+            "since": _datetime(self.since).isoformat() if self.since else None,
+            "uptime": self.uptime(now),
+            "reason": self.reason,
+            "local_address": self.local_address,
+            "peer_as": self.peer_as,
+            "prefixes_received": len(self.received),
+            "prefixes_sent": len(self.sent),
+            "updates": self.updates,
+            "transitions": self.transitions,
+            "last_update": _datetime(self.last_update).isoformat() if self.last_update else None,
+        }
+
+
+class BGPSessionTracker:
+    """BGP会话状态跟踪器"""
+
+    def __init__(self, flush_interval: float = 2.0, persist: bool = True):
+        self.flush_interval = flush_interval
+        self.persist = persist
+        self._leader = leader_lock("bgp-session-tracker")
+        self._peers: Dict[str, PeerState] = {}
+        self._dirty: Set[str] = set()
+        self._session_ids: Dict[str, List[int]] = {}
+        self._neighbors_by_id: Dict[int, str] = {}
+        self._ids_loaded_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "events": 0,
+            "state_events": 0,
+            "update_events": 0,
+            "ignored_events": 0,
+            "transitions": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "rows_updated": 0,
+            "last_flush_at": 0.0,
+            "last_flush_peers": 0,
+        }
+
+    # 事件处理（在 ExaBGP API 通道的读取循环中同步调用，只修改内存）
+    def handle(self, event: Dict[str, Any]) -> None:
+        self.stats["events"] += 1
+        kind = event.get("type")
+        at = float(event.get("time") or time.time())
+        if kind == "state":
+            self._on_state(event.get("neighbor") or {}, at)
+        elif kind == "update":
+            self._on_update(event.get("neighbor") or {}, at)
+        elif kind == "notification" and event.get("notification") == "shutdown":
+            # ExaBGP 退出，所有会话随之断开
+            for peer in self._peers.values():
+                self._transition(peer, BGPStatus.IDLE, at, "exabgp shutdown")
+        else:
+            self.stats["ignored_events"] += 1
+
+    def _peer(self, neighbor: Dict[str, Any]) -> Optional[PeerState]:
+        address = (neighbor.get("address") or {}).get("peer") or neighbor.get("ip")
+        if not address:
+            self.stats["ignored_events"] += 1
+            return None
+        key = _normalize_address(address)
+        peer = self._peers.get(key)
+        if peer is None:
+            peer = self._peers[key] = PeerState(neighbor=key)
+        local = (neighbor.get("address") or {}).get("local")
+        if local:
+            peer.local_address = local
+        peer_as = (neighbor.get("asn") or {}).get("peer")
+        if peer_as is not None:
+            peer.peer_as = peer_as
+        return peer
+
+    def _transition(self, peer: PeerState, status: BGPStatus, at: float, reason: Optional[str]) -> None:
+        if status != BGPStatus.ESTABLISHED and (peer.received or peer.sent):
+            # 会话断开后对端撤销全部路由
+            peer.received.clear()
+            peer.sent.clear()
+            self._dirty.add(peer.neighbor)
+        if status == peer.status:
+            return
+        peer.status = status
+        peer.since = at
+        peer.reason = reason
+        peer.transitions += 1
+        self.stats["transitions"] += 1
+        self._dirty.add(peer.neighbor)
+        if monitoring_manager:
+            monitoring_manager.record_bgp_session_transition(status.value)
+
+    def _on_state(self, neighbor: Dict[str, Any], at: float) -> None:
+        self.stats["state_events"] += 1
+        peer = self._peer(neighbor)
+        if peer is None:
+            return
+        state = str(neighbor.get("state", "")).lower()
+        status = _STATES.get(state)
+        if status is None:
+            logger.debug(f"忽略未知的BGP会话状态: {state}")
+            return
+        self._transition(peer, status, at, neighbor.get("reason"))
+
+    def _on_update(self, neighbor: Dict[str, Any], at: float) -> None:
+        self.stats["update_events"] += 1
+        peer = self._peer(neighbor)
+        if peer is None:
+            return
+        update_message = (neighbor.get("message") or {}).get("update") or {}
+        target = peer.sent if neighbor.get("direction") == "send" else peer.received
+        before = len(target)
+        for next_hops in (update_message.get("announce") or {}).values():
+            if isinstance(next_hops, dict):
+                for entries in next_hops.values():
+                    target.update(_nlri_prefixes(entries))
+        for entries in (update_message.get("withdraw") or {}).values():
+            target.difference_update(_nlri_prefixes(entries))
+        peer.updates += 1
+        peer.last_update = at
+        if len(target) != before:
+            self._dirty.add(peer.neighbor)
+
+    # 数据库回写
+    def collect_dirty(self) -> List[Dict[str, Any]]:
+        """取出自上次写回以来变化的对等体的当前状态（同一对等体的多次变化合并为一行）
+
+        尚未收到状态事件的对等体状态未知，不写回（不覆盖数据库中的状态）。
+        """
+        rows = []
+        for key in self._dirty:
+            peer = self._peers[key]
+            if peer.status is None:
+                continue
+            established = peer.status == BGPStatus.ESTABLISHED
+            rows.append({
+                "neighbor": key,
+                "status": peer.status,
+                "established_time": _datetime(peer.since) if established else None,
+                "last_update": _datetime(peer.last_update),
+                "prefixes_received": len(peer.received),
+                "prefixes_sent": len(peer.sent),
+            })
+        self._dirty.clear()
+        return rows
+
+    async def _load_session_ids(self, session) -> None:
+        """加载地址 -> 会话ID映射，并以数据库中的状态作为尚未收到事件的对等体的初始状态"""
+        result = await session.execute(
+            select(BGPSession.id, BGPSession.remote_ip, BGPSession.status, BGPSession.established_time)
+        )
+        session_ids: Dict[str, List[int]] = {}
+        neighbors_by_id: Dict[int, str] = {}
+        for session_id, neighbor, status, established_time in result.tuples().all():
+            key = _normalize_address(neighbor)
+            session_ids.setdefault(key, []).append(session_id)
+            neighbors_by_id[session_id] = key
+            peer = self._peers.get(key)
+            if peer is None:
+                peer = self._peers[key] = PeerState(neighbor=key)
+            if peer.status is None and status is not None:
+                peer.status = status
+                if status == BGPStatus.ESTABLISHED:
+                    peer.since = _timestamp(established_time)
+        self._session_ids = session_ids
+        self._neighbors_by_id = neighbors_by_id
+        self._ids_loaded_at = time.monotonic()
+
+    async def _write_back(self, rows: List[Dict[str, Any]]) -> int:
+        """一个事务内按主键批量更新会话状态（ORM bulk UPDATE，一条语句 executemany）"""
+        from ..core.database_manager import database_manager
+
+        async with database_manager.get_session() as session:
+            # 出现未知对等体（新建会话）时刷新地址 -> ID 映射，最多每30秒一次
+            if not self._session_ids or (
+                any(row["neighbor"] not in self._session_ids for row in rows)
+                and time.monotonic() - self._ids_loaded_at > 30
+            ):
+                await self._load_session_ids(session)
+
+            params = [
+                {"id": session_id, **{k: v for k, v in row.items() if k != "neighbor"}}
+                for row in rows
+                for session_id in self._session_ids.get(row["neighbor"], ())
+            ]
+            if params:
+                await session.execute(update(BGPSession), params)
+        return len(params)
+
+    async def flush(self) -> int:
+        """把脏对等体写回数据库，返回更新的行数；失败时保留脏标记等待下次重试"""
+        rows = self.collect_dirty()
+        if not rows or not self.persist:
+            return 0
+        try:
+            updated = await self._write_back(rows)
+        except Exception:
+            self.stats["flush_failures"] += 1
+            self._dirty.update(row["neighbor"] for row in rows)
+            raise
+        self.stats["flushes"] += 1
+        self.stats["rows_updated"] += updated
+        self.stats["last_flush_at"] = time.time()
+        self.stats["last_flush_peers"] = len(rows)
+        return updated
+
+    # 生命周期
+    def _elect(self) -> bool:
+        """尝试成为写回执行者；刚接替时把当前全部状态标记为待写回"""
+        held = self._leader.held
+        if not self._leader.try_acquire():
+            return False
+        if not held:
+            self._dirty.update(self._peers)
+        return True
+
+    async def _run(self) -> None:
+        if self.persist:
+            from ..core.database_manager import database_manager
+            try:
+                async with database_manager.get_session() as session:
+                    await self._load_session_ids(session)
+            except Exception as e:
+                logger.warning(f"加载BGP会话地址映射失败: {e}")
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if not self.persist or self._elect():
+                    await self.flush()
+                else:
+                    # 由其他 worker 写回，这里只维护内存状态
+                    self._dirty.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"BGP会话状态写回失败: {e}")
+            if monitoring_manager:
+                monitoring_manager.update_bgp_sessions(
+                    sum(1 for peer in self._peers.values() if peer.status == BGPStatus.ESTABLISHED)
+                )
+
+    def start(self) -> None:
+        """启动后台写回任务"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"BGP会话状态跟踪已启动，写回间隔 {self.flush_interval}s")
+
+    async def stop(self) -> None:
+        """停止后台写回任务，执行者写回剩余的变化后释放执行者锁"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if not self._leader.held:
+            return
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"BGP会话状态写回失败: {e}")
+        finally:
+            self._leader.release()
+
+    @property
+    def is_writer(self) -> bool:
+        return self._leader.held
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # 查询
+    def peer(self, neighbor: str) -> Optional[Dict[str, Any]]:
+        peer = self._peers.get(_normalize_address(neighbor))
+        return peer.to_dict() if peer else None
+
+    def session(self, session_id: int) -> Optional[Dict[str, Any]]:
+        """按会话ID查询（需已加载过地址映射）"""
+        neighbor = self._neighbors_by_id.get(session_id)
+        return self.peer(neighbor) if neighbor else None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return [self._peers[key].to_dict(now) for key in sorted(self._peers)]
+
+    def summary(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for peer in self._peers.values():
+            status = peer.status.value if peer.status else UNKNOWN
+            by_status[status] = by_status.get(status, 0) + 1
+        return {
+            "peers": len(self._peers),
+            "established": by_status.get(BGPStatus.ESTABLISHED.value, 0),
+            "by_status": by_status,
+            "prefixes_received": sum(len(peer.received) for peer in self._peers.values()),
+            "prefixes_sent": sum(len(peer.sent) for peer in self._peers.values()),
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "running": self.running,
+            "writer": self.is_writer,
+            "tracked_peers": len(self._peers),
+            "dirty_peers": len(self._dirty),
+        }
+
+
+# 全局BGP会话状态跟踪器
+bgp_session_tracker = BGPSessionTracker(
+    flush_interval=getattr(settings, "BGP_SESSION_FLUSH_INTERVAL", 2.0),
+)
@@ -0,0 +1,275 @@
+"""
+ExaBGP 进程 API 通道
+通过 announce-routes 桥接进程（scripts/exabgp_api_bridge.py）的 Unix 套接字向
+ExaBGP 下发 announce/withdraw 命令，单条路由变更不再重写配置、不重载服务、不影响
+BGP会话。命令进入有界队列（满时调用方等待），写入时合并为一批，按 ExaBGP 的
+done/error 确认顺序逐条完成；非确认行作为事件交给注册的处理函数。
+ExaBGP 重启后经API下发的路由随之丢失，每次（重）连接后按注册的重放函数重新宣告。
+"""
+import asyncio
+import ipaddress
+import json
+import re
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..core.unified_config import settings
+from ..core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_COMMUNITY = re.compile(r"^\d{1,10}:\d{1,10}$")
+
+
+class ExaBGPCommandError(RuntimeError):
+    """ExaBGP 拒绝命令、确认超时或通道未连接"""
+
+
+def route_command(
+    action: str,
+    prefix: str,
+    next_hop: Optional[str] = None,
+    neighbor: Optional[str] = None,
+    communities: Iterable[str] = (),
+) -> str:
+    """构造一条路由命令，所有字段先校验，避免换行或多余参数注入到 ExaBGP"""
+    if action not in ("announce", "withdraw"):
+        raise ValueError(f"不支持的路由操作: {action}")
+    parts = []
+    if neighbor:
+        parts += ["neighbor", str(ipaddress.ip_address(neighbor))]
+    parts += [action, "route", str(ipaddress.ip_network(prefix, strict=False))]
+    parts += ["next-hop", "self" if next_hop in (None, "", "self") else str(ipaddress.ip_address(next_hop))]
+    communities = list(communities)
+    if communities and action == "announce":
+        for community in communities:
+            if not _COMMUNITY.match(community):
+                raise ValueError(f"无效的community: {community}")
+        parts += ["community", "[" + " ".join(communities) + "]"]
+    return " ".join(parts)
+
+
+class ExaBGPAPIChannel:
+    """到 ExaBGP 桥接进程的长连接
+
+    - 背压：待发送队列容量为 max_pending，满时 send() 等待
+    - 批量：写入任务一次取出最多 batch_size 条命令合并写入
+    - 确认：ExaBGP 按命令顺序回复 done/error，与发送顺序的 Future 一一对应
+    - 断线：未确认的命令以 ExaBGPCommandError 失败，后台按退避间隔重连
+    - 重放：连接建立后先下发重放函数返回的命令，恢复 ExaBGP 重启前经API宣告的路由
+    """
+
+    def __init__(self, socket_path: str, max_pending: int = 1024, batch_size: int = 64,
+                 ack_timeout: float = 5.0):
+        self.socket_path = socket_path
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.ack_timeout = ack_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._inflight: Deque[Tuple[asyncio.Future, float]] = deque()
+        self._handlers: List[Callable[[Dict[str, Any]], Any]] = []
+        self._replay: Optional[Callable[[], Awaitable[List[str]]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected = False
+        self.stats = {
+            "sent": 0,
+            "acked": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "batches": 0,
+            "events": 0,
+            "reconnects": 0,
+            "replayed": 0,
+            "replay_failures": 0,
+            "last_ack_ms": 0.0,
+        }
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def add_event_handler(self, handler: Callable[[Dict[str, Any]], Any]) -> None:
+        """注册 ExaBGP 事件处理函数（参数为解析后的JSON；非JSON行为 {"raw": 行}）"""
+        self._handlers.append(handler)
+
+    def set_replay(self, replay: Optional[Callable[[], Awaitable[List[str]]]]) -> None:
+        """注册（重）连接后重放的命令来源（返回当前应宣告路由的命令列表）"""
+        self._replay = replay
+
+    async def _replay_routes(self) -> None:
+        if self._replay is None:
+            return
+        try:
+            commands = await self._replay()
+            for i in range(0, len(commands), self.batch_size):
+                await self.send(commands[i:i + self.batch_size])
+            self.stats["replayed"] += len(commands)
+            if commands:
+                logger.info(f"已向ExaBGP重放 {len(commands)} 条路由")
+        except Exception as e:
+            self.stats["replay_failures"] += 1
+            logger.error(f"向ExaBGP重放路由失败: {e}")
+
+    # 发送
+    async def send(self, commands: Sequence[str]) -> None:
+        """下发一批命令并等待全部确认；任一命令失败时抛出 ExaBGPCommandError"""
+        if not self._connected or self._queue is None:
+            raise ExaBGPCommandError("ExaBGP API 通道未连接")
+        loop = asyncio.get_running_loop()
+        futures = []
+        for command in commands:
+            if "\n" in command or "\r" in command:
+                raise ValueError("命令中不能包含换行")
+            future = loop.create_future()
+            await self._queue.put((command.encode() + b"\n", future))
+            futures.append(future)
+
+        done, pending = await asyncio.wait(futures, timeout=self.ack_timeout)
+        for future in pending:
+            future.cancel()
+        if pending:
+            self.stats["timeouts"] += len(pending)
+            raise ExaBGPCommandError(f"{len(pending)} 条命令在 {self.ack_timeout}s 内未确认")
+        failed = [f for f in done if f.exception() is not None]
+        if failed:
+            raise ExaBGPCommandError(f"{len(failed)}/{len(futures)} 条命令失败: {failed[0].exception()}")
+
+    async def announce(self, prefix: str, next_hop: Optional[str] = None, neighbor: Optional[str] = None,
+                       communities: Iterable[str] = ()) -> None:
+        await self.send([route_command("announce", prefix, next_hop, neighbor, communities)])
+
+    async def withdraw(self, prefix: str, next_hop: Optional[str] = None, neighbor: Optional[str] = None) -> None:
+        await self.send([route_command("withdraw", prefix, next_hop, neighbor)])
+
+    # 连接管理
+    async def _writer_loop(self, writer: asyncio.StreamWriter) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            now = time.perf_counter()
+            lines = []
+            for line, future in batch:
+                if future.done():  # 调用方已超时放弃
+                    continue
+                self._inflight.append((future, now))
+                lines.append(line)
+            if not lines:
+                continue
+            writer.write(b"".join(lines))
+            await writer.drain()
+            self.stats["sent"] += len(lines)
+            self.stats["batches"] += 1
+
+    async def _reader_loop(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionResetError("桥接进程关闭了连接")
+            text = line.decode(errors="replace").strip()
+            if text in ("done", "error"):
+                self._complete(text == "done")
+            elif text:
+                self._dispatch(text)
+
+    def _complete(self, ok: bool) -> None:
+        if not self._inflight:
+            logger.warning("收到无对应命令的ExaBGP确认")
+            return
+        future, sent_at = self._inflight.popleft()
+        self.stats["last_ack_ms"] = (time.perf_counter() - sent_at) * 1000
+        if ok:
+            self.stats["acked"] += 1
+        else:
+            self.stats["errors"] += 1
+        if not future.done():
+            if ok:
+                future.set_result(None)
+            else:
+                future.set_exception(ExaBGPCommandError("ExaBGP返回error"))
+
+    def _dispatch(self, text: str) -> None:
+        try:
+            event = json.loads(text)
+        except ValueError:
+            event = {"raw": text}
+        self.stats["events"] += 1
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.warning(f"ExaBGP事件处理失败: {e}")
+
+    def _fail_inflight(self, reason: str) -> None:
+        while self._inflight:
+            future, _ = self._inflight.popleft()
+            if not future.done():
+                future.set_exception(ExaBGPCommandError(reason))
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=1 << 20)
+            except OSError as e:
+                logger.debug(f"连接ExaBGP API桥接进程失败: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            backoff = 0.5
+            self._connected = True
+            logger.info(f"已连接ExaBGP API通道: {self.socket_path}")
+            tasks = [asyncio.create_task(self._writer_loop(writer)),
+                     asyncio.create_task(self._reader_loop(reader))]
+            replay = asyncio.create_task(self._replay_routes())
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    if task.exception():
+                        logger.warning(f"ExaBGP API通道断开: {task.exception()}")
+            finally:
+                self._connected = False
+                for task in (*tasks, replay):
+                    task.cancel()
+                await asyncio.gather(*tasks, replay, return_exceptions=True)
+                writer.close()
+                self._fail_inflight("ExaBGP API通道断开")
+                self.stats["reconnects"] += 1
+
+    def start(self) -> None:
+        """启动后台连接任务（socket_path 为空时不启用）"""
+        if not self.socket_path or (self._task and not self._task.done()):
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._connected = False
+        self._fail_inflight("ExaBGP API通道已关闭")
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                if not future.done():
+                    future.set_exception(ExaBGPCommandError("ExaBGP API通道已关闭"))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "connected": self._connected,
+            "socket": self.socket_path,
+            "inflight": len(self._inflight),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+# 全局ExaBGP API通道
+exabgp_api = ExaBGPAPIChannel(getattr(settings, "EXABGP_API_SOCKET", "/run/exabgp/ipv6wgm.sock"))
@@ -1,17 +1,96 @@
 """
 ExaBGP集成服务：根据数据库中的BGP会话与宣告生成配置并应用
+进程API通道（重）连接时按同一组路由重放宣告，ExaBGP 重启后不丢失经API下发的路由
 """
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 import os
+import ipaddress
 import logging
 
 from ..models.bgp import BGPSession as BGPSessionModel, BGPAnnouncement as BGPAnnouncementModel
+from ..models.ipv6_pool import IPv6PrefixPool, IPv6PrefixAllocation
 from ..core.logging import get_logger
+from ..core.atomic_file import atomic_write
+from ..core.command_executor import command_executor
+from ..core.route_aggregator import aggregate_prefixes
+from .exabgp_api import ExaBGPCommandError, exabgp_api, route_command
 
 logger = get_logger(__name__)
 
+EXABGP_SERVICE_NAME = "exabgp"
+# 会话宣告与全局宣告附带的 community（与配置文件一致）
+SESSION_COMMUNITY = "65001:100"
+GLOBAL_COMMUNITY = "65001:200"
+
+
+def aggregate_announcements(announcements: List[BGPAnnouncementModel]) -> List[Tuple[str, str]]:
+    """按下一跳聚合已启用的宣告，相邻/被覆盖的前缀合并为最小前缀集合"""
+    by_next_hop: Dict[str, List[str]] = {}
+    for ann in announcements:
+        if not ann.is_active:
+            continue
+        try:
+            prefix = str(ipaddress.ip_network(ann.prefix, strict=False))
+        except ValueError:
+            logger.warning(f"忽略无效的宣告前缀: {ann.prefix}")
+            continue
+        by_next_hop.setdefault(ann.next_hop or "self", []).append(prefix)
+    return [
+        (prefix, next_hop)
+        for next_hop, prefixes in by_next_hop.items()
+        for prefix in aggregate_prefixes(prefixes)
+    ]
+
+
+async def desired_routes(db: AsyncSession) -> List[Tuple[str, str, Optional[str]]]:
+    """当前应宣告的路由 (前缀, 下一跳, community)，配置文件和API重放使用同一份结果
+
+    包括已启用会话的宣告，以及分配即宣告前缀池中有效分配聚合后的前缀（与
+    BGPService 经API增量下发的一致，不带 community）。
+    """
+    result = await db.execute(select(BGPSessionModel.id).where(BGPSessionModel.is_enabled == True))
+    enabled = {str(session_id) for session_id in result.scalars().all()}
+    result = await db.execute(select(BGPAnnouncementModel))
+    grouped: Dict[str, List[BGPAnnouncementModel]] = {}
+    for ann in result.scalars().all():
+        key = str(ann.session_id) if ann.session_id else "__global__"
+        grouped.setdefault(key, []).append(ann)
+
+    routes = []
+    for key, announcements in grouped.items():
+        if key != "__global__" and key not in enabled:
+            continue
+        community = GLOBAL_COMMUNITY if key == "__global__" else SESSION_COMMUNITY
+        routes += [(prefix, next_hop, community) for prefix, next_hop in aggregate_announcements(announcements)]
+
+    result = await db.execute(
+        select(IPv6PrefixAllocation.pool_id, IPv6PrefixAllocation.allocated_prefix)
+        .join(IPv6PrefixPool, IPv6PrefixPool.id == IPv6PrefixAllocation.pool_id)
+        .where(
+            IPv6PrefixPool.auto_announce == True,
+            IPv6PrefixPool.enabled == True,
+            IPv6PrefixAllocation.is_active == True,
+        )
+    )
+    by_pool: Dict[int, List[str]] = {}
+    for pool_id, prefix in result.tuples().all():
+        by_pool.setdefault(pool_id, []).append(prefix)
+    for prefixes in by_pool.values():
+        routes += [(prefix, "self", None) for prefix in aggregate_prefixes(prefixes)]
+    return routes
+
+
+async def replay_commands() -> List[str]:
+    """API通道（重）连接后重放的宣告命令"""
+    from ..core.database_manager import database_manager
+
+    async with database_manager.get_session() as session:
+        routes = await desired_routes(session)
+    return [route_command("announce", prefix, next_hop, communities=[community] if community else [])
+            for prefix, next_hop, community in routes]
+
 
 class ExaBGPService:
     def __init__(self, db: AsyncSession, config_path: str = "/etc/exabgp/exabgp.conf"):
@@ -26,15 +105,6 @@ class ExaBGPService:
         result = await self.db.execute(select(BGPSessionModel))
         sessions: List[BGPSessionModel] = result.scalars().all()
 
-        result = await self.db.execute(select(BGPAnnouncementModel))
-        announcements: List[BGPAnnouncementModel] = result.scalars().all()
-
-        # 将宣告按会话分组
-        grouped: dict[str, List[BGPAnnouncementModel]] = {}
-        for ann in announcements:
-            key = str(ann.session_id) if ann.session_id else "__global__"
-            grouped.setdefault(key, []).append(ann)
-
         config_lines = []
         
         # 全局配置
@@ -63,14 +133,14 @@ class ExaBGPService:
         # BGP会话配置
         config_lines.append("# BGP Sessions")
         for sess in sessions:
-            if not sess.enabled:
+            if not sess.is_enabled:
                 continue
                 
-            config_lines.append(f"neighbor {sess.neighbor} {{")
+            config_lines.append(f"neighbor {sess.remote_ip} {{")
             config_lines.append(f"    # 会话: {sess.name}")
             config_lines.append(f"    description \"{sess.description or 'WireGuard BGP Session'}\";")
             config_lines.append(f"    router-id 192.168.1.1;")
-            config_lines.append(f"    local-address {sess.neighbor.split(':')[0] if ':' in sess.neighbor else sess.neighbor.split()[0]};")
+            config_lines.append(f"    local-address {sess.local_ip};")
             config_lines.append(f"    local-as {sess.local_as or 65001};")
             config_lines.append(f"    peer-as {sess.remote_as};")
             
@@ -98,47 +168,25 @@ class ExaBGPService:
             config_lines.append("    api {")
             config_lines.append("        processes [ announce-routes ];")
             config_lines.append("        neighbor-changes;")
+            config_lines.append("        receive {")
+            config_lines.append("            parsed;")
+            config_lines.append("            update;")
+            config_lines.append("            notification;")
+            config_lines.append("        }")
             config_lines.append("    }")
             config_lines.append("}")
             config_lines.append("")
 
-        # 路由宣告配置
+        # 路由宣告配置（与API通道重放的路由相同）
         config_lines.append("# Route Announcements")
-        for sess in sessions:
-            if not sess.enabled:
-                continue
-                
-            key = str(sess.id)
-            session_announcements = grouped.get(key, [])
-            
-            if session_announcements:
-                config_lines.append(f"# Session: {sess.name}")
-                for ann in session_announcements:
-                    if not ann.enabled:
-                        continue
-                        
-                    # 判断是IPv4还是IPv6前缀
-                    if ':' in ann.prefix:
-                        # IPv6前缀
-                        config_lines.append(f"announce route {ann.prefix} next-hop {ann.next_hop or 'self'} community [65001:100] large-community [65001:100:1];")
-                    else:
-                        # IPv4前缀
-                        config_lines.append(f"announce route {ann.prefix} next-hop {ann.next_hop or 'self'} community [65001:100] large-community [65001:100:1];")
-                config_lines.append("")
-
-        # 全局宣告
-        global_announcements = grouped.get("__global__", [])
-        if global_announcements:
-            config_lines.append("# Global Announcements")
-            for ann in global_announcements:
-                if not ann.enabled:
-                    continue
-                    
-                if ':' in ann.prefix:
-                    config_lines.append(f"announce route {ann.prefix} next-hop {ann.next_hop or 'self'} community [65001:200] large-community [65001:200:1];")
-                else:
-                    config_lines.append(f"announce route {ann.prefix} next-hop {ann.next_hop or 'self'} community [65001:200] large-community [65001:200:1];")
-            config_lines.append("")
+        for prefix, next_hop, community in await desired_routes(self.db):
+            if community:
+                config_lines.append(
+                    f"announce route {prefix} next-hop {next_hop} community [{community}] large-community [{community}:1];"
+                )
+            else:
+                config_lines.append(f"announce route {prefix} next-hop {next_hop};")
+        config_lines.append("")
 
         # 路由映射和策略
         config_lines.append("# Route Policies")
@@ -160,24 +208,49 @@ class ExaBGPService:
         return '\n'.join(config_lines)
 
     async def apply_config(self) -> bool:
-        """写入配置文件，留待运维层面触发重载（或后续增加重载操作）"""
+        """原子写入配置文件并重载ExaBGP，写入或重载失败时返回 False"""
         try:
             config = await self.generate_config()
             os.makedirs(os.path.dirname(self.config_path), exist_ok=True)
-            with open(self.config_path, "w", encoding="utf-8") as f:
-                f.write(config)
+            atomic_write(self.config_path, config, 0o640)
             logger.info(f"ExaBGP配置已写入: {self.config_path}")
-            return True
         except Exception as e:
             logger.error(f"写入ExaBGP配置失败: {e}")
             return False
 
+        result = await command_executor.run(["systemctl", "reload", EXABGP_SERVICE_NAME], timeout=30)
+        command_executor.invalidate("systemctl", "is-active", EXABGP_SERVICE_NAME)
+        if not result.ok:
+            reason = "重载超时" if result.timed_out else result.stderr.strip()
+            logger.error(f"重载ExaBGP失败: {reason}")
+            return False
+        return True
+
+    async def push_route(self, prefix: str, next_hop: Optional[str] = None, announce: bool = True) -> dict:
+        """增量宣告/撤销单条路由
+
+        API通道已连接时通过进程API下发（毫秒级，不影响BGP会话）；通道不可用时
+        退回重新生成配置文件。
+        """
+        action = "announce" if announce else "withdraw"
+        if exabgp_api.connected:
+            try:
+                await exabgp_api.send([route_command(action, prefix, next_hop)])
+                return {"success": True, "method": "api"}
+            except ExaBGPCommandError as e:
+                logger.warning(f"通过ExaBGP API {action} {prefix} 失败，改为写入配置: {e}")
+        return {"success": await self.apply_config(), "method": "config"}
+
     async def get_status(self) -> dict:
         """
-        返回简化状态；后续可接入真实exabgp运行状态（例如通过进程/套接字查询）。
+        返回配置文件状态和进程API通道状态。
         """
         try:
             exists = os.path.exists(self.config_path)
-            return {"exabgp": "configured" if exists else "not_configured", "config_path": self.config_path}
+            return {
+                "exabgp": "configured" if exists else "not_configured",
+                "config_path": self.config_path,
+                "api": exabgp_api.get_stats(),
+            }
         except Exception:
             return {"exabgp": "unknown", "config_path": self.config_path}
\ No newline at end of file
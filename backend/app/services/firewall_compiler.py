@@ -0,0 +1,152 @@
+"""
+防火墙规则批量编译与原子应用
+将数据库中的全部有效规则渲染为一份 iptables-restore / ip6tables-restore 载荷，
+一次调用按表原子提交；与上次成功应用的载荷相同时跳过
+"""
+import hashlib
+import ipaddress
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ..core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 重新加载时整体重建的表，与规则校验允许的表一致（network_service.allowed_tables）；
+# 其他表的规则不会被编译
+MANAGED_TABLES = ("filter", "nat", "mangle", "raw")
+
+RESTORE_COMMANDS = {
+    4: "iptables-restore",
+    6: "ip6tables-restore",
+}
+
+
+@dataclass
+class CompiledRuleset:
+    """编译结果：按地址族划分的 restore 载荷"""
+    payloads: Dict[int, str] = field(default_factory=dict)
+    family_counts: Dict[int, int] = field(default_factory=dict)
+    rule_count: int = 0
+    skipped: List[str] = field(default_factory=list)
+
+    def digest(self, family: int) -> str:
+        return hashlib.sha256(self.payloads.get(family, "").encode()).hexdigest()
+
+
+class FirewallCompiler:
+    """将规则集编译为 iptables-restore 格式
+
+    每个表以 `-F` 开头并在 COMMIT 时整体生效；配合 `--noflush` 使用，
+    不影响未管理的表，也保留内置链的默认策略。
+    """
+
+    def __init__(self, validator: Optional[Callable[[str, str, str, str], bool]] = None):
+        self.validator = validator
+
+    @staticmethod
+    def rule_family(rule_spec: str) -> int:
+        """根据规则中的 -s/-d 地址判断地址族，未指定地址时按IPv4处理"""
+        parts = (rule_spec or "").split()
+        for flag, value in zip(parts, parts[1:]):
+            if flag in ("-s", "-d", "--source", "--destination") and ":" in value:
+                try:
+                    return ipaddress.ip_network(value.lstrip("!"), strict=False).version
+                except ValueError:
+                    continue
+        return 4
+
+    def compile(self, rules: Iterable) -> CompiledRuleset:
+        """编译有效规则，按 priority、id 排序"""
+        result = CompiledRuleset()
+        tables: Dict[int, Dict[str, List[str]]] = {
+            family: {table: [] for table in MANAGED_TABLES} for family in RESTORE_COMMANDS
+        }
+
+        ordered = sorted(
+            (rule for rule in rules if rule.is_active),
+            key=lambda rule: (rule.priority or 0, rule.id or 0),
+        )
+        for rule in ordered:
+            rule_spec = (rule.rule_spec or "").strip()
+            if self.validator and not self.validator(rule.table_name, rule.chain_name, rule.action, rule_spec):
+                result.skipped.append(rule.name)
+                continue
+
+            line = f"-A {rule.chain_name}"
+            if rule_spec:
+                line += f" {rule_spec}"
+            line += f" -j {rule.action}"
+
+            family = self.rule_family(rule_spec)
+            table_lines = tables[family].get(rule.table_name)
+            if table_lines is None:
+                logger.warning(f"防火墙规则 {rule.name} 的表 {rule.table_name} 不受管理，已跳过")
+                result.skipped.append(rule.name)
+                continue
+            table_lines.append(line)
+            result.family_counts[family] = result.family_counts.get(family, 0) + 1
+            result.rule_count += 1
+
+        for family, family_tables in tables.items():
+            lines: List[str] = []
+            for table, table_lines in family_tables.items():
+                lines.append(f"*{table}")
+                lines.append("-F")
+                lines.extend(table_lines)
+                lines.append("COMMIT")
+            result.payloads[family] = "\n".join(lines) + "\n"
+        return result
+
+
+class FirewallApplier:
+    """原子应用编译后的规则集，并记录每个地址族最后一次成功应用的摘要"""
+
+    def __init__(self, executor=None):
+        self._executor = executor
+        self._applied: Dict[int, str] = {}
+        # IPv4 始终由本系统管理；IPv6 表在出现IPv6规则后才接管，避免清空主机上已有的 ip6tables 规则
+        self._managed = {4}
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            from ..core.command_executor import command_executor
+            self._executor = command_executor
+        return self._executor
+
+    def invalidate(self) -> None:
+        """规则被单独增删后调用，下次重新加载时强制应用"""
+        self._applied.clear()
+
+    async def apply(self, ruleset: CompiledRuleset, force: bool = False) -> Dict[int, str]:
+        """应用规则集，返回各地址族的结果：applied / unchanged / failed"""
+        outcome: Dict[int, str] = {}
+        for family, command in RESTORE_COMMANDS.items():
+            if ruleset.family_counts.get(family):
+                self._managed.add(family)
+            if family not in self._managed:
+                continue
+            digest = ruleset.digest(family)
+            if not force and self._applied.get(family) == digest:
+                outcome[family] = "unchanged"
+                continue
+
+            result = await self.executor.run(
+                [command, "--noflush"],
+                input_data=ruleset.payloads[family].encode(),
+                timeout=60,
+            )
+            if result.ok:
+                self._applied[family] = digest
+                outcome[family] = "applied"
+            else:
+                # restore 按表原子提交，失败时内核中仍是旧规则
+                self._applied.pop(family, None)
+                outcome[family] = "failed"
+                logger.error(f"{command} 应用失败: {result.stderr.strip()}")
+        return outcome
+
+
+# 全局应用器实例
+firewall_applier = FirewallApplier()
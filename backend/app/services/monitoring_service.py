@@ -1,9 +1,8 @@
 import uuid
-import psutil
 import time
-import json
+import asyncio
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import and_, desc
@@ -13,9 +12,26 @@ from ..schemas.monitoring import (
     SystemStats, ServiceStatus, AlertRule, Alert, LogQuery, LogResponse
 )
 from ..core.logging import get_logger
+from ..core.system_sampler import system_sampler
+from ..core.log_store import log_store
+from ..core.log_export import (
+    ExportEncoder, aencode_records,
+    format_cursor as format_export_cursor, parse_cursor as parse_export_cursor
+)
+from ..core.command_executor import command_executor
+from ..core.unified_config import settings
 
 logger = get_logger(__name__)
 
+# 数据库日志导出的来源（按此顺序导出）及各自的时间列（导出为 timestamp 字段）与 CSV 列
+EXPORT_SOURCES = {"audit": (AuditLog, "created_at"), "operation": (OperationLog, "timestamp")}
+EXPORT_COLUMNS = [
+    "type", "id", "timestamp", "cursor",
+    "user_id", "action", "resource_type", "resource_id", "description", "ip_address", "user_agent",
+    "request_method", "request_path", "success",
+    "operation_type", "status", "error_message", "execution_time", "operation_data",
+]
+
 class MonitoringService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -23,33 +39,18 @@ class MonitoringService:
     async def collect_system_metrics(self) -> SystemStats:
         """收集系统性能指标"""
         try:
-            # CPU使用率
-            cpu_percent = psutil.cpu_percent(interval=1)
-            
-            # 内存使用率
-            memory = psutil.virtual_memory()
-            memory_percent = memory.percent
-            
-            # 磁盘使用率
-            disk = psutil.disk_usage('/')
-            disk_percent = (disk.used / disk.total) * 100
-            
-            # 网络统计
-            net_io = psutil.net_io_counters()
-            network_rx = net_io.bytes_recv
-            network_tx = net_io.bytes_sent
-            
-            # 活跃连接数
-            connections = len(psutil.net_connections())
+            # 读取后台采样器的最新快照
+            sample = await system_sampler.latest()
             
             return SystemStats(
-                cpu_usage=cpu_percent,
-                memory_usage=memory_percent,
-                disk_usage=disk_percent,
-                network_rx=network_rx,
-                network_tx=network_tx,
-                active_connections=connections,
-                timestamp=datetime.utcnow()
+                cpu_usage=sample.cpu_percent,
+                memory_usage=sample.memory_percent,
+                disk_usage=sample.disk_percent,
+                network_rx=sample.net_bytes_recv,
+                network_tx=sample.net_bytes_sent,
+                active_connections=sample.connections,
+                timestamp=datetime.utcfromtimestamp(sample.timestamp),
+                staleness=sample.staleness
             )
         except Exception as e:
             logger.error(f"收集系统指标失败: {e}")
@@ -126,9 +127,9 @@ class MonitoringService:
             
             conditions = []
             if start_time:
-                conditions.append(AuditLog.timestamp >= start_time)
+                conditions.append(AuditLog.created_at >= start_time)
             if end_time:
-                conditions.append(AuditLog.timestamp <= end_time)
+                conditions.append(AuditLog.created_at <= end_time)
             if user_id:
                 conditions.append(AuditLog.user_id == user_id)
             if action:
@@ -137,7 +138,7 @@ class MonitoringService:
             if conditions:
                 query = query.where(and_(*conditions))
             
-            query = query.order_by(desc(AuditLog.timestamp)).offset(offset).limit(limit)
+            query = query.order_by(desc(AuditLog.created_at)).offset(offset).limit(limit)
             
             result = await self.db.execute(query)
             return result.scalars().all()
@@ -195,55 +196,52 @@ class MonitoringService:
     async def get_service_status(self) -> List[ServiceStatus]:
         """获取服务状态"""
         try:
-            services = []
-            
             # 检查主要服务
             service_checks = [
-                ("postgresql", "systemctl is-active postgresql"),
-                ("redis", "systemctl is-active redis"),
-                ("nginx", "systemctl is-active nginx"),
-                ("wireguard", "systemctl is-active wg-quick@wg0")
+                ("postgresql", "postgresql"),
+                ("redis", "redis"),
+                ("nginx", "nginx"),
+                ("wireguard", "wg-quick@wg0")
             ]
             
-            for service_name, check_cmd in service_checks:
+            async def check(service_name: str, unit: str) -> ServiceStatus:
                 try:
-                    import subprocess
-                    result = subprocess.run(
-                        check_cmd.split(), 
-                        capture_output=True, 
-                        text=True, 
-                        timeout=5
+                    result = await command_executor.run(
+                        ["systemctl", "is-active", unit],
+                        timeout=5,
+                        cache_ttl=settings.SERVICE_STATUS_CACHE_TTL
                     )
+                    if result.timed_out:
+                        raise TimeoutError(result.stderr)
                     
-                    status = "running" if result.returncode == 0 else "stopped"
+                    status = "running" if result.ok else "stopped"
                     
                     # 获取运行时间
                     uptime = None
-                    try:
-                        uptime_result = subprocess.run(
-                            ["systemctl", "show", service_name, "--property=ActiveEnterTimestamp"],
-                            capture_output=True, text=True, timeout=5
-                        )
-                        if uptime_result.returncode == 0:
-                            # 解析运行时间
-                            uptime = 0  # 简化实现
-                    except:
-                        pass
+                    uptime_result = await command_executor.run(
+                        ["systemctl", "show", service_name, "--property=ActiveEnterTimestamp"],
+                        timeout=5,
+                        cache_ttl=settings.SERVICE_STATUS_CACHE_TTL
+                    )
+                    if uptime_result.ok:
+                        # 解析运行时间
+                        uptime = 0  # 简化实现
                     
-                    services.append(ServiceStatus(
+                    return ServiceStatus(
                         service_name=service_name,
                         status=status,
                         uptime=uptime,
                         last_check=datetime.utcnow()
-                    ))
-                except Exception as e:
-                    services.append(ServiceStatus(
+                    )
+                except Exception:
+                    return ServiceStatus(
                         service_name=service_name,
                         status="error",
                         last_check=datetime.utcnow()
-                    ))
+                    )
             
-            return services
+            # 并发检查，受命令执行器的并发上限约束
+            return list(await asyncio.gather(*(check(name, unit) for name, unit in service_checks)))
         except Exception as e:
             logger.error(f"获取服务状态失败: {e}")
             return []
@@ -340,39 +338,24 @@ class MonitoringService:
             raise
 
     async def search_logs(self, query: LogQuery) -> LogResponse:
-        """搜索日志"""
+        """搜索应用日志（基于日志存储的段索引，total 为精确命中数）"""
         try:
-            # 这里应该实现更复杂的日志搜索逻辑
-            # 简化实现，只搜索操作日志
-            
-            logs = await self.get_operation_logs(
+            result = await asyncio.to_thread(
+                log_store.query,
+                text=query.message,
+                level=query.level,
+                service=query.service,
                 start_time=query.start_time,
                 end_time=query.end_time,
-                operation_type=query.service,
-                status=query.level,
                 limit=query.limit,
-                offset=query.offset
+                offset=0 if query.cursor else query.offset,
+                cursor=query.cursor,
             )
-            
-            # 转换为字典格式
-            log_dicts = []
-            for log in logs:
-                log_dict = {
-                    "timestamp": log.timestamp.isoformat(),
-                    "level": log.status,
-                    "service": log.operation_type,
-                    "message": log.operation_data.get("message", ""),
-                    "details": log.operation_data
-                }
-                log_dicts.append(log_dict)
-            
-            # 检查是否有更多数据
-            has_more = len(logs) == query.limit
-            
             return LogResponse(
-                logs=log_dicts,
-                total=len(log_dicts),  # 简化实现
-                has_more=has_more
+                logs=result.items,
+                total=result.total,
+                has_more=result.next_cursor is not None,
+                next_cursor=result.next_cursor
             )
         except Exception as e:
             logger.error(f"搜索日志失败: {e}")
@@ -382,50 +365,55 @@ class MonitoringService:
         self,
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None,
-        log_type: str = "all"
-    ) -> str:
-        """导出日志"""
-        try:
-            logs = []
-            
-            if log_type in ["all", "audit"]:
-                audit_logs = await self.get_audit_logs(
-                    start_time=start_time,
-                    end_time=end_time,
-                    limit=10000
-                )
-                for log in audit_logs:
-                    logs.append({
-                        "type": "audit",
-                        "timestamp": log.timestamp.isoformat(),
-                        "user_id": str(log.user_id) if log.user_id else None,
-                        "action": log.action,
-                        "resource_type": log.resource_type,
-                        "resource_id": str(log.resource_id) if log.resource_id else None,
-                        "details": log.details,
-                        "ip_address": log.ip_address,
-                        "user_agent": log.user_agent
-                    })
-            
-            if log_type in ["all", "operation"]:
-                operation_logs = await self.get_operation_logs(
-                    start_time=start_time,
-                    end_time=end_time,
-                    limit=10000
-                )
-                for log in operation_logs:
-                    logs.append({
-                        "type": "operation",
-                        "timestamp": log.timestamp.isoformat(),
-                        "operation_type": log.operation_type,
-                        "status": log.status,
-                        "error_message": log.error_message,
-                        "execution_time": log.execution_time,
-                        "operation_data": log.operation_data
-                    })
-            
-            # 转换为JSON格式
-            return json.dumps(logs, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"导出日志失败: {e}")
-            raise
+        log_type: str = "all",
+        format: str = "ndjson",
+        compress: bool = False,
+        cursor: Optional[str] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[bytes]:
+        """流式导出审计/操作日志
+
+        按类型依次导出（audit 在前），类型内按 ID 升序读取服务端游标；
+        每条记录带有 cursor 字段，传入最后收到的 cursor 即可从其后续传。
+        """
+        encoder = ExportEncoder(format, columns=EXPORT_COLUMNS, compress=compress)
+        async for chunk in aencode_records(
+            self._iter_export_records(start_time, end_time, log_type, cursor, batch_size), encoder
+        ):
+            yield chunk
+
+    async def _iter_export_records(
+        self,
+        start_time: Optional[datetime],
+        end_time: Optional[datetime],
+        log_type: str,
+        cursor: Optional[str],
+        batch_size: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        sources = [name for name in EXPORT_SOURCES if log_type in ("all", name)]
+        after_source, after_id = parse_export_cursor(cursor, sources) if cursor else (None, 0)
+        if after_source:
+            sources = sources[sources.index(after_source):]
+
+        for name in sources:
+            model, time_column = EXPORT_SOURCES[name]
+            timestamp = model.__table__.c[time_column]
+            conditions = []
+            if start_time:
+                conditions.append(timestamp >= start_time)
+            if end_time:
+                conditions.append(timestamp <= end_time)
+            if name == after_source:
+                conditions.append(model.id > after_id)
+
+            # 只查询列而不加载ORM实体，避免对象进入会话标识映射
+            query = select(*model.__table__.columns).order_by(model.id)
+            if conditions:
+                query = query.where(and_(*conditions))
+            result = await self.db.stream(query.execution_options(yield_per=batch_size))
+            async for row in result.mappings():
+                record = {"type": name, "cursor": format_export_cursor(name, row["id"])}
+                record.update(row)
+                record["timestamp"] = record.pop(time_column)
+                yield record
+
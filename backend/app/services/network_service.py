@@ -1,5 +1,4 @@
 import uuid
-import subprocess
 import psutil
 import json
 import re
@@ -13,6 +12,8 @@ from ..schemas.network import (
     NetworkStatus, InterfaceStats
 )
 from ..core.logging import get_logger
+from ..core.command_executor import command_executor
+from .firewall_compiler import FirewallCompiler, firewall_applier
 
 logger = get_logger(__name__)
 
@@ -302,10 +303,11 @@ class NetworkService:
                 logger.error(f"无法构建安全的防火墙命令: {rule.name}")
                 return False
             
-            # 执行命令（使用shell=False避免注入）
-            result = subprocess.run(cmd_parts, capture_output=True, text=True, shell=False)
+            # 执行命令（参数列表，不经过shell）
+            result = await command_executor.run(cmd_parts, timeout=10)
+            firewall_applier.invalidate()
             
-            if result.returncode == 0:
+            if result.ok:
                 logger.info(f"防火墙规则应用成功: {rule.name}")
                 return True
             else:
@@ -326,10 +328,11 @@ class NetworkService:
                 logger.warning(f"无法构建安全的删除命令: {rule.name}")
                 return True  # 删除失败不算严重错误
             
-            # 执行命令（使用shell=False避免注入）
-            result = subprocess.run(cmd_parts, capture_output=True, text=True, shell=False)
+            # 执行命令（参数列表，不经过shell）
+            result = await command_executor.run(cmd_parts, timeout=10)
+            firewall_applier.invalidate()
             
-            if result.returncode == 0:
+            if result.ok:
                 logger.info(f"防火墙规则删除成功: {rule.name}")
                 return True
             else:
@@ -386,10 +389,9 @@ class NetworkService:
         """获取路由表"""
         try:
             routes = []
-            # 使用shell=False避免命令注入
-            result = subprocess.run(["ip", "route", "show"], capture_output=True, text=True, shell=False)
+            result = await command_executor.run(["ip", "route", "show"], timeout=10)
             
-            if result.returncode == 0:
+            if result.ok:
                 for line in result.stdout.strip().split('\n'):
                     if line:
                         route_info = self.parse_route_line(line)
@@ -436,21 +438,24 @@ class NetworkService:
             logger.error(f"解析路由行失败: {e}")
             return None
 
-    async def reload_firewall_rules(self) -> bool:
-        """重新加载所有防火墙规则"""
+    async def reload_firewall_rules(self, force: bool = False) -> bool:
+        """重新加载所有防火墙规则
+
+        全部有效规则编译为一份 iptables-restore 载荷并按表原子提交，
+        与上次成功应用的规则集相同时不执行任何操作。
+        """
         try:
-            # 清空现有规则（使用shell=False避免注入）
-            subprocess.run(["iptables", "-F"], capture_output=True, shell=False)
-            subprocess.run(["iptables", "-t", "nat", "-F"], capture_output=True, shell=False)
-            subprocess.run(["iptables", "-t", "mangle", "-F"], capture_output=True, shell=False)
-            
-            # 重新应用所有规则
             rules = await self.get_firewall_rules()
-            for rule in rules:
-                if rule.is_active:
-                    await self.apply_firewall_rule(rule)
+            ruleset = FirewallCompiler(self.validate_firewall_parameters).compile(rules)
+            for name in ruleset.skipped:
+                logger.error(f"无法构建安全的防火墙命令: {name}")
+            
+            outcome = await firewall_applier.apply(ruleset, force=force)
+            if "failed" in outcome.values():
+                logger.error(f"重新加载防火墙规则失败: {outcome}")
+                return False
             
-            logger.info("防火墙规则重新加载完成")
+            logger.info(f"防火墙规则重新加载完成: {ruleset.rule_count} 条规则, {outcome}")
             return True
         except Exception as e:
             logger.error(f"重新加载防火墙规则失败: {e}")
@@ -0,0 +1,123 @@
+"""
+前缀池空闲区间表
+每个空闲区间 [start, end) 保存为 pool_free_ranges 的一行，分配/释放/保留在池行锁内
+按 (pool_id, start_slot) 索引查找相邻区间，每次操作最多读写两行，
+开销与碎片数量和已分配数量无关（不再读取、序列化和写回整个区间列表）
+"""
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..core.prefix_index import PrefixFreeIndex
+from ..models.ipv6 import PoolFreeRange, PrefixPool
+
+# 槽位以零填充的十六进制字符串保存（最多 2^128 个槽位），字符串顺序即数值顺序
+SLOT_WIDTH = 32
+
+
+def slot_key(slot: int) -> str:
+    return f"{slot:0{SLOT_WIDTH}x}"
+
+
+def slot_value(key: str) -> int:
+    return int(key, 16)
+
+
+class PoolFreeRanges:
+    """一个前缀池的空闲区间表，调用方需持有池行锁
+
+    槽位换算复用 PrefixFreeIndex，区间本身只存在于数据库中。
+    """
+
+    def __init__(self, db: AsyncSession, pool: PrefixPool):
+        self.db = db
+        self.pool = pool
+        self.index = PrefixFreeIndex(pool.base_prefix, pool.prefix_len, free_ranges=[])
+
+    async def build(self, used_prefixes: Iterable[str]) -> None:
+        """按已占用前缀重建区间表（O(n log n)，仅在区间表缺失时执行一次）"""
+        await self.db.execute(delete(PoolFreeRange).where(PoolFreeRange.pool_id == self.pool.id))
+        index = PrefixFreeIndex.from_used(self.pool.base_prefix, self.pool.prefix_len, used_prefixes)
+        rows = [
+            {"pool_id": self.pool.id, "start_slot": slot_key(start), "end_slot": slot_key(end)}
+            for start, end in index.ranges()
+        ]
+        if rows:
+            await self.db.execute(insert(PoolFreeRange), rows)
+        self.pool.free_ranges_built = True
+
+    # 相邻区间查询（均走 (pool_id, start_slot) 索引，取一行）
+    async def _first(self, *conditions, descending: bool = False) -> Optional[PoolFreeRange]:
+        order = PoolFreeRange.start_slot.desc() if descending else PoolFreeRange.start_slot
+        result = await self.db.execute(
+            select(PoolFreeRange).where(PoolFreeRange.pool_id == self.pool.id, *conditions).order_by(order).limit(1)
+        )
+        return result.scalars().first()
+
+    async def _floor(self, slot: int) -> Optional[PoolFreeRange]:
+        """起点不大于 slot 的最后一个区间"""
+        return await self._first(PoolFreeRange.start_slot <= slot_key(slot), descending=True)
+
+    async def _after(self, slot: int) -> Optional[PoolFreeRange]:
+        """起点大于 slot 的第一个区间"""
+        return await self._first(PoolFreeRange.start_slot > slot_key(slot))
+
+    # 变更
+    async def allocate(self) -> Optional[str]:
+        """取出最低的空闲槽位"""
+        row = await self._first()
+        if row is None:
+            return None
+        slot = slot_value(row.start_slot)
+        await self._take(row, slot)
+        return self.index.prefix_at(slot)
+
+    async def reserve(self, prefix: str) -> bool:
+        """取出指定前缀（须为 PrefixFreeIndex.normalize 规范化后的前缀），已被占用时返回False"""
+        slot = self.index.slot_range(prefix)[0]
+        row = await self._floor(slot)
+        if row is None or slot_value(row.end_slot) <= slot:
+            return False
+        await self._take(row, slot)
+        return True
+
+    async def _take(self, row: PoolFreeRange, slot: int) -> None:
+        start, end = slot_value(row.start_slot), slot_value(row.end_slot)
+        if start == slot and slot + 1 == end:
+            await self.db.delete(row)
+        elif start == slot:
+            row.start_slot = slot_key(slot + 1)
+        elif slot + 1 == end:
+            row.end_slot = slot_key(slot)
+        else:
+            row.end_slot = slot_key(slot)
+            self.db.add(PoolFreeRange(pool_id=self.pool.id, start_slot=slot_key(slot + 1), end_slot=slot_key(end)))
+
+    async def release(self, prefix: str) -> bool:
+        """将前缀归还并与相邻区间合并，已空闲或不在池内时返回False"""
+        slot_range = self.index.slot_range(prefix)
+        if slot_range is None:
+            return False
+        start, end = slot_range
+
+        left = await self._floor(start)
+        if left is not None and slot_value(left.end_slot) > start:
+            return False
+        right = await self._after(start)
+        if right is not None and slot_value(right.start_slot) < end:
+            return False
+
+        merge_left = left is not None and slot_value(left.end_slot) == start
+        merge_right = right is not None and slot_value(right.start_slot) == end
+        if merge_left and merge_right:
+            left.end_slot = right.end_slot
+            await self.db.delete(right)
+        elif merge_left:
+            left.end_slot = slot_key(end)
+        elif merge_right:
+            right.start_slot = slot_key(start)
+        else:
+            self.db.add(PoolFreeRange(pool_id=self.pool.id, start_slot=slot_key(start), end_slot=slot_key(end)))
+        return True
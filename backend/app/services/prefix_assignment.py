@@ -0,0 +1,102 @@
+"""
+前缀粘性分配
+池被等分为最多 MAX_BLOCKS 个块，以前缀池为密钥的 BLAKE2b 哈希把客户端映射到
+固定的块，在块内取最低空闲槽位；块已满时按双重哈希序列探测其他块。
+块内从低到高依次填充，空闲区间数（碎片）不超过块数加上释放造成的空洞，
+不随分配数量增长。结果只取决于池、客户端标识和当前占用情况，
+与进程、节点、重启和 PYTHONHASHSEED 无关
+"""
+import hashlib
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from ..core.prefix_index import PrefixFreeIndex
+
+try:
+    from ..core.monitoring import monitoring_manager
+except ImportError:  # prometheus_client 未安装
+    monitoring_manager = None
+
+# 池最多分为的块数，决定碎片上限
+MAX_BLOCKS = 64
+# 超过该探测次数仍未找到有空闲槽位的块时（池接近满）退回最低空闲槽位
+MAX_PROBES = 16
+
+
+def pool_hash_key(pool_id: Any, base_prefix: str) -> bytes:
+    """前缀池的哈希密钥：不同池中同一客户端的落点互不相关"""
+    return hashlib.blake2b(f"{pool_id}|{base_prefix}".encode(), digest_size=32).digest()
+
+
+def probe_sequence(key: bytes, client_key: str, capacity: int) -> Iterator[int]:
+    """客户端的块探测序列（双重哈希）
+
+    块数总是2的幂，步长取奇数即可在 capacity 次探测内遍历全部块。
+    """
+    digest = hashlib.blake2b(client_key.encode(), key=key, digest_size=16).digest()
+    home = int.from_bytes(digest[:8], "big") % capacity
+    step = (int.from_bytes(digest[8:], "big") | 1) % capacity or 1
+    for i in range(capacity):
+        yield (home + i * step) % capacity
+
+
+class StickyPrefixAssigner:
+    """粘性前缀分配器，记录探测长度分布"""
+
+    def __init__(self, max_probes: int = MAX_PROBES, max_blocks: int = MAX_BLOCKS):
+        self.max_probes = max_probes
+        self.max_blocks = max_blocks
+        self.probe_lengths: Counter = Counter()
+        self.stats = {"assigned": 0, "fallback": 0, "exhausted": 0}
+
+    def blocks(self, index: PrefixFreeIndex) -> Tuple[int, int]:
+        """返回 (块数, 每块槽位数)；容量为2的幂，块数取不超过 max_blocks 的2的幂"""
+        count = min(index.capacity, 1 << (max(self.max_blocks, 1).bit_length() - 1))
+        return count, index.capacity // count
+
+    def home_block(self, index: PrefixFreeIndex, key: bytes, client_key: str) -> Tuple[int, int]:
+        """客户端首选块的槽位区间 [start, end)（不考虑占用）"""
+        count, size = self.blocks(index)
+        block = next(probe_sequence(key, client_key, count))
+        return block * size, (block + 1) * size
+
+    def assign(self, index: PrefixFreeIndex, key: bytes, client_key: str) -> Tuple[Optional[str], int]:
+        """在索引中为客户端取出前缀，返回 (前缀, 探测次数)；池已满时前缀为 None"""
+        count, size = self.blocks(index)
+        probes = 0
+        for block in islice(probe_sequence(key, client_key, count), self.max_probes):
+            probes += 1
+            prefix = index.allocate_in(block * size, (block + 1) * size)
+            if prefix is not None:
+                self._record(probes, fallback=False)
+                return prefix, probes
+
+        prefix = index.allocate()
+        if prefix is None:
+            self.stats["exhausted"] += 1
+            return None, probes
+        self._record(probes + 1, fallback=True)
+        return prefix, probes + 1
+
+    def _record(self, probes: int, fallback: bool) -> None:
+        self.stats["assigned"] += 1
+        if fallback:
+            self.stats["fallback"] += 1
+        self.probe_lengths[probes] += 1
+        if monitoring_manager is not None:
+            monitoring_manager.record_prefix_probes(probes, fallback)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = sum(self.probe_lengths.values())
+        return {
+            **self.stats,
+            "max_probes": self.max_probes,
+            "max_blocks": self.max_blocks,
+            "mean_probes": sum(k * v for k, v in self.probe_lengths.items()) / total if total else 0.0,
+            "probe_lengths": dict(sorted(self.probe_lengths.items())),
+        }
+
+
+# 全局粘性前缀分配器
+sticky_prefix_assigner = StickyPrefixAssigner()
@@ -0,0 +1,163 @@
+"""
+RPKI 起源校验
+定期检查本地 ROA 导出文件（rpki-client / Routinator 的 JSON 或 CSV），文件变化时在
+线程中构建新的 ROA 前缀树，构建完成后整体替换引用：查询方始终看到完整的旧表或新表，
+载入失败时继续使用旧表。替换后调用注册的处理函数（如重新校验全部宣告）。
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..core.unified_config import settings
+from ..core.logging import get_logger
+from ..core.roa_table import ROATable, load_roa_file
+
+logger = get_logger(__name__)
+
+
+class RPKIValidator:
+    """ROA 前缀树的持有者与热替换任务"""
+
+    def __init__(self, roa_file: str = "", reload_interval: float = 60.0):
+        self.roa_file = roa_file
+        self.reload_interval = reload_interval
+        self._table: Optional[ROATable] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._handlers: List[Callable[[ROATable], Awaitable[Any]]] = []
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "loads": 0,
+            "load_failures": 0,
+            "last_load_at": 0.0,
+            "last_load_duration": 0.0,
+        }
+
+    @property
+    def table(self) -> Optional[ROATable]:
+        return self._table
+
+    @property
+    def loaded(self) -> bool:
+        return self._table is not None
+
+    def add_reload_handler(self, handler: Callable[[ROATable], Awaitable[Any]]) -> None:
+        """注册新表生效后调用的协程函数"""
+        self._handlers.append(handler)
+
+    # 载入
+    def _file_signature(self) -> Tuple[int, int, int]:
+        # rpki-client/Routinator 以改名方式原子替换输出文件，inode 变化即视为新文件
+        st = os.stat(self.roa_file)
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    async def reload(self, force: bool = False) -> bool:
+        """文件有变化（或 force）时重新载入，返回是否替换了前缀树"""
+        if not self.roa_file:
+            return False
+        async with self._lock:
+            try:
+                signature = self._file_signature()
+            except OSError as e:
+                logger.warning(f"ROA文件不可用: {e}")
+                return False
+            if not force and signature == self._signature:
+                return False
+
+            started = time.perf_counter()
+            try:
+                table = await asyncio.to_thread(load_roa_file, self.roa_file)
+            except Exception as e:
+                # 可能读到了写入中的文件，保留旧表，下个周期重试
+                self.stats["load_failures"] += 1
+                logger.warning(f"载入ROA文件失败，继续使用旧的ROA表: {e}")
+                return False
+            if len(table) == 0 and self._table is not None and len(self._table) > 0:
+                self.stats["load_failures"] += 1
+                logger.warning(f"ROA文件 {self.roa_file} 没有有效条目，继续使用旧的ROA表")
+                return False
+
+            self._table = table
+            self._signature = signature
+            self.stats["loads"] += 1
+            self.stats["last_load_at"] = time.time()
+            self.stats["last_load_duration"] = time.perf_counter() - started
+            logger.info(
+                f"已载入ROA表: {len(table)} 条ROA，跳过 {table.skipped} 条，"
+                f"耗时 {self.stats['last_load_duration']:.2f}s"
+            )
+
+        for handler in self._handlers:
+            try:
+                await handler(table)
+            except Exception as e:
+                logger.warning(f"ROA表更新处理失败: {e}")
+        return True
+
+    # 查询
+    def validate(self, prefix: str, origin_asn: int) -> Optional[str]:
+        """返回 valid / invalid / not_found；未载入ROA表时返回 None"""
+        table = self._table
+        return table.validate(prefix, origin_asn) if table is not None else None
+
+    def validate_many(self, routes: Iterable[Tuple[str, int]]) -> List[Optional[str]]:
+        """一次校验一批 (前缀, 起源AS)，整批使用同一个ROA表"""
+        table = self._table
+        if table is None:
+            return [None for _ in routes]
+        return table.validate_many(routes)
+
+    def covering(self, prefix: str) -> List[Dict[str, Any]]:
+        table = self._table
+        return table.covering(prefix) if table is not None else []
+
+    # 生命周期
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"ROA表检查失败: {e}")
+            await asyncio.sleep(self.reload_interval)
+
+    def start(self) -> None:
+        """启动后台载入任务（未配置 ROA 文件时不启动）"""
+        if not self.roa_file:
+            logger.info("未配置ROA文件，RPKI校验未启用")
+            return
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"RPKI校验已启动: {self.roa_file}，检查间隔 {self.reload_interval}s")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        table = self._table
+        return {
+            **self.stats,
+            "roa_file": self.roa_file,
+            "loaded": table is not None,
+            "roas": len(table) if table is not None else 0,
+            "skipped": table.skipped if table is not None else 0,
+            "nodes": table.node_count if table is not None else 0,
+            "memory_bytes": table.memory_bytes if table is not None else 0,
+            "metadata": table.metadata if table is not None else {},
+        }
+
+
+# 全局RPKI校验器
+rpki_validator = RPKIValidator(
+    roa_file=getattr(settings, "RPKI_ROA_FILE", ""),
+    reload_interval=getattr(settings, "RPKI_RELOAD_INTERVAL", 60.0),
+)
@@ -3,11 +3,12 @@
 """
 from typing import Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
-import psutil
 import time
-import subprocess
 import asyncio
 from ..core.logging import get_logger
+from ..core.unified_config import settings
+from ..core.command_executor import command_executor
+from ..core.system_sampler import system_sampler
 
 logger = get_logger(__name__)
 
@@ -20,36 +21,33 @@ class StatusService:
     async def get_system_status(self) -> Dict[str, Any]:
         """获取系统状态"""
         try:
-            # 获取系统信息
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
-            # 获取网络信息
-            network = psutil.net_io_counters()
+            # 读取后台采样器的最新快照
+            sample = await system_sampler.latest()
             
             return {
                 "system": {
-                    "cpu_percent": cpu_percent,
+                    "cpu_percent": sample.cpu_percent,
                     "memory": {
-                        "total": memory.total,
-                        "available": memory.available,
-                        "percent": memory.percent,
-                        "used": memory.used
+                        "total": sample.memory_total,
+                        "available": sample.memory_available,
+                        "percent": sample.memory_percent,
+                        "used": sample.memory_used
                     },
                     "disk": {
-                        "total": disk.total,
-                        "used": disk.used,
-                        "free": disk.free,
-                        "percent": (disk.used / disk.total) * 100
+                        "total": sample.disk_total,
+                        "used": sample.disk_used,
+                        "free": sample.disk_free,
+                        "percent": (sample.disk_used / sample.disk_total) * 100
                     },
                     "network": {
-                        "bytes_sent": network.bytes_sent,
-                        "bytes_recv": network.bytes_recv,
-                        "packets_sent": network.packets_sent,
-                        "packets_recv": network.packets_recv
+                        "bytes_sent": sample.net_bytes_sent,
+                        "bytes_recv": sample.net_bytes_recv,
+                        "packets_sent": sample.net_packets_sent,
+                        "packets_recv": sample.net_packets_recv
                     }
                 },
+                "sampled_at": sample.timestamp,
+                "staleness": sample.staleness,
                 "timestamp": time.time()
             }
         except Exception as e:
@@ -61,11 +59,17 @@ class StatusService:
     
     async def get_services_status(self) -> Dict[str, Any]:
         """获取服务状态"""
+        postgresql, redis, nginx, wireguard = await asyncio.gather(
+            self._check_service("postgresql"),
+            self._check_service("redis-server"),
+            self._check_service("nginx"),
+            self._check_wireguard_service()
+        )
         services = {
-            "postgresql": self._check_service("postgresql"),
-            "redis": self._check_service("redis-server"),
-            "nginx": self._check_service("nginx"),
-            "wireguard": self._check_wireguard_service()
+            "postgresql": postgresql,
+            "redis": redis,
+            "nginx": nginx,
+            "wireguard": wireguard
         }
         
         return {
@@ -73,17 +77,18 @@ class StatusService:
             "timestamp": time.time()
         }
     
-    def _check_service(self, service_name: str) -> Dict[str, Any]:
+    async def _check_service(self, service_name: str) -> Dict[str, Any]:
         """检查服务状态"""
         try:
-            result = subprocess.run(
+            result = await command_executor.run(
                 ["systemctl", "is-active", service_name],
-                capture_output=True,
-                text=True,
-                timeout=5
+                timeout=5,
+                cache_ttl=settings.SERVICE_STATUS_CACHE_TTL
             )
+            if result.timed_out:
+                raise TimeoutError(result.stderr)
             
-            is_active = result.returncode == 0
+            is_active = result.ok
             status = result.stdout.strip()
             
             return {
@@ -101,17 +106,18 @@ class StatusService:
                 "error": str(e)
             }
     
-    def _check_wireguard_service(self) -> Dict[str, Any]:
+    async def _check_wireguard_service(self) -> Dict[str, Any]:
         """检查WireGuard服务状态"""
         try:
-            result = subprocess.run(
+            result = await command_executor.run(
                 ["wg", "show"],
-                capture_output=True,
-                text=True,
-                timeout=5
+                timeout=5,
+                cache_ttl=settings.SERVICE_STATUS_CACHE_TTL
             )
+            if result.timed_out:
+                raise TimeoutError(result.stderr)
             
-            is_active = result.returncode == 0
+            is_active = result.ok
             interfaces = []
             
             if is_active:
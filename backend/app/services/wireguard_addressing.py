@@ -0,0 +1,157 @@
+"""
+WireGuard客户端隧道地址分配
+每个服务器的IPv4/IPv6子网各维护一份主机粒度的空闲区间索引（PrefixFreeIndex，
+目标长度 /32 或 /128），持久化在服务器记录上，分配/释放在服务器行锁下进行
+"""
+import ipaddress
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..models import WireGuardServer, WireGuardClient
+from ..core.unified_config import settings
+from ..core.logging import get_logger
+from ..core.prefix_index import PrefixFreeIndex
+
+logger = get_logger(__name__)
+
+FAMILIES = {
+    4: ("ipv4_address", "ipv4_free_ranges"),
+    6: ("ipv6_address", "ipv6_free_ranges"),
+}
+
+AddressPair = Tuple[Optional[str], Optional[str]]
+
+
+class AddressAllocationError(ValueError):
+    """地址不在服务器子网内、已被占用或子网已耗尽"""
+
+
+def server_interface(server_address: str):
+    """服务器地址及其子网；地址未写前缀长度时按配置的WireGuard网络取长度"""
+    if "/" not in server_address:
+        address = ipaddress.ip_address(server_address.strip())
+        configured = getattr(settings, "WIREGUARD_NETWORK" if address.version == 4 else "WIREGUARD_IPV6_NETWORK", None)
+        if configured:
+            prefixlen = ipaddress.ip_network(configured, strict=False).prefixlen
+            return ipaddress.ip_interface(f"{address}/{prefixlen}")
+    return ipaddress.ip_interface(server_address)
+
+
+def reserved_addresses(server_address: str) -> List[str]:
+    """子网内不分配给客户端的地址：网络地址、IPv4广播地址和服务器自身（网关）地址"""
+    interface = server_interface(server_address)
+    network = interface.network
+    reserved = {interface.ip}
+    # /31、/32 和 /127、/128 没有网络地址和广播地址（RFC 3021 / RFC 6164）
+    if network.max_prefixlen - network.prefixlen > 1:
+        reserved.add(network.network_address)
+        if network.version == 4:
+            reserved.add(network.broadcast_address)
+    return [f"{address}/{network.max_prefixlen}" for address in reserved]
+
+
+def build_host_index(server_address: str, used_addresses: Iterable[Optional[str]]) -> PrefixFreeIndex:
+    """根据服务器地址和已分配的客户端地址构建空闲索引"""
+    network = server_interface(server_address).network
+    used = [address for address in used_addresses if address]
+    return PrefixFreeIndex.from_used(str(network), network.max_prefixlen, used + reserved_addresses(server_address))
+
+
+def normalize_address(address: str, version: int) -> str:
+    """客户端地址统一为主机前缀形式（10.0.0.2/32、fd00::2/128）"""
+    try:
+        host = ipaddress.ip_interface(address).ip
+    except ValueError:
+        raise AddressAllocationError(f"无效的地址: {address}")
+    if host.version != version:
+        raise AddressAllocationError(f"地址 {address} 不是IPv{version}地址")
+    return f"{host}/{host.max_prefixlen}"
+
+
+class TunnelAddressAllocator:
+    """服务器子网内的客户端地址分配器
+
+    调用方负责提交事务：空闲索引和客户端记录在同一个事务里写入，
+    服务器行锁保证同一服务器上的并发分配串行化，(server_id, 地址)
+    唯一约束作为最后一道防线。
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def lock_server(self, server_id: int) -> Optional[WireGuardServer]:
+        """加行锁读取服务器记录，串行化同一服务器上的地址分配"""
+        result = await self.db.execute(
+            select(WireGuardServer).where(WireGuardServer.id == server_id).with_for_update()
+        )
+        return result.scalars().first()
+
+    async def _load_index(self, server: WireGuardServer, version: int) -> Optional[PrefixFreeIndex]:
+        """读取服务器某个地址族的空闲索引，服务器未配置该地址族时返回None"""
+        address_field, ranges_field = FAMILIES[version]
+        server_address = getattr(server, address_field)
+        if not server_address:
+            return None
+        network = server_interface(server_address).network
+
+        data = getattr(server, ranges_field)
+        if data:
+            try:
+                return PrefixFreeIndex.loads(str(network), network.max_prefixlen, data)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"服务器 {server.id} IPv{version} 地址索引损坏，重新构建: {e}")
+
+        column = getattr(WireGuardClient, address_field)
+        result = await self.db.execute(select(column).where(WireGuardClient.server_id == server.id))
+        return build_host_index(server_address, result.scalars().all())
+
+    async def assign(self, server: WireGuardServer, requested: Sequence[AddressPair]) -> List[AddressPair]:
+        """为一批客户端确定地址：指定了地址的校验并占用，未指定的按最低空闲地址分配
+
+        server 必须是通过 lock_server 读取的记录。任一地址无法分配时抛出
+        AddressAllocationError，索引不会写回。
+        """
+        assigned: List[List[Optional[str]]] = [[None, None] for _ in requested]
+        updates = {}
+        for column, version in enumerate((4, 6)):
+            index = await self._load_index(server, version)
+            # 先占用指定的地址，避免被同批次的自动分配抢先取走
+            for i, pair in enumerate(requested):
+                address = pair[column]
+                if not address:
+                    continue
+                address = normalize_address(address, version)
+                if index is not None and not index.reserve(address):
+                    raise AddressAllocationError(f"地址 {address} 不在服务器子网内或已被占用")
+                # 服务器未配置该地址族时保留调用方给出的值
+                assigned[i][column] = address
+            if index is None:
+                continue
+            for i, pair in enumerate(requested):
+                if pair[column]:
+                    continue
+                address = index.allocate()
+                if address is None:
+                    raise AddressAllocationError(f"服务器 {server.name} 的IPv{version}子网已耗尽")
+                assigned[i][column] = address
+            updates[FAMILIES[version][1]] = index.dumps()
+        for field, value in updates.items():
+            setattr(server, field, value)
+        return [(ipv4, ipv6) for ipv4, ipv6 in assigned]
+
+    async def release(self, server: WireGuardServer, addresses: Iterable[AddressPair]) -> None:
+        """将客户端地址归还服务器的空闲索引（server 必须已加锁）"""
+        addresses = list(addresses)
+        for column, version in enumerate((4, 6)):
+            index = await self._load_index(server, version)
+            if index is None:
+                continue
+            for pair in addresses:
+                if pair[column]:
+                    try:
+                        index.release(normalize_address(pair[column], version))
+                    except AddressAllocationError:
+                        logger.warning(f"忽略无效的客户端地址: {pair[column]}")
+            setattr(server, FAMILIES[version][1], index.dumps())
@@ -0,0 +1,141 @@
+"""
+WireGuard客户端配置打包下载
+ZIP 边生成边输出：每写完一页客户端就把已生成的字节交给响应流，内存中只保留
+当前一页的内容和 ZIP 中央目录所需的条目元数据
+"""
+import asyncio
+import re
+import struct
+import time
+import zlib
+from concurrent.futures import Executor
+from typing import List, Optional, Sequence
+
+from ..core.logging import get_logger
+from .wireguard_qr import qr_code_cache
+from .wireguard_render import render_qr_images
+
+logger = get_logger(__name__)
+
+# 每个进程池任务渲染的QR码数量
+QR_CHUNK_SIZE = 25
+
+_UNSAFE_NAME = re.compile(r"[^\w.-]+")
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_STORED, _DEFLATED = 0, 8
+_UTF8_FLAG = 0x0800
+_MADE_BY_UNIX = (3 << 8) | 45
+_FILE_MODE = 0o100600 << 16  # 配置包含私钥
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+
+def member_name(name: str, client_id: int) -> str:
+    """ZIP 内的文件名：只保留安全字符并附加客户端ID
+
+    "a b"、"a_b"、"a/b" 替换后相同，附加ID保证同一归档中的文件名不重复
+    （不需要记住已写入的名称）；名称为空时使用 client-<ID>。
+    """
+    safe = _UNSAFE_NAME.sub("_", name or "").strip("._")
+    return f"{safe}-{client_id}" if safe else f"client-{client_id}"
+
+
+class ZipStream:
+    """增量生成的 ZIP 归档
+
+    每个条目整块写入（本地文件头中直接带上CRC和大小，不需要回写或数据描述符），
+    中央目录记录在写入条目时就编码好并追加到一个 bytearray 中，每个条目约
+    占 46 字节加文件名，不保留逐条目的 Python 对象。条目数超过 65535 或偏移
+    超过 4GB 时写入 ZIP64 结束记录；单个条目的大小需小于 4GB。
+    """
+
+    def __init__(self, compresslevel: int = 6):
+        self.compresslevel = compresslevel
+        self._chunks: List[bytes] = []
+        self._central = bytearray()
+        self._offset = 0
+        now = time.localtime()
+        self._dos_time = (now.tm_hour << 11) | (now.tm_min << 5) | (now.tm_sec // 2)
+        self._dos_date = ((now.tm_year - 1980) << 9) | (now.tm_mon << 5) | now.tm_mday
+        self.entries = 0
+
+    def _emit(self, data) -> None:
+        self._chunks.append(data)
+        self._offset += len(data)
+
+    def write(self, name: str, data: bytes, compress: bool = True) -> None:
+        encoded_name = name.encode()
+        crc = zlib.crc32(data)
+        if compress:
+            compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+            payload = compressor.compress(data) + compressor.flush()
+            method = _DEFLATED
+        else:
+            payload = data
+            method = _STORED
+
+        offset = self._offset
+        self._emit(_LOCAL_HEADER.pack(
+            0x04034B50, 20, _UTF8_FLAG, method, self._dos_time, self._dos_date,
+            crc, len(payload), len(data), len(encoded_name), 0,
+        ) + encoded_name)
+        self._emit(payload)
+
+        extra = b""
+        if offset >= _ZIP64_LIMIT:
+            extra = struct.pack("<HHQ", 0x0001, 8, offset)
+            offset = _ZIP64_LIMIT
+        self._central += _CENTRAL_HEADER.pack(
+            0x02014B50, _MADE_BY_UNIX, 45 if extra else 20, _UTF8_FLAG, method,
+            self._dos_time, self._dos_date, crc, len(payload), len(data),
+            len(encoded_name), len(extra), 0, 0, 0, _FILE_MODE, offset,
+        ) + encoded_name + extra
+        self.entries += 1
+
+    def drain(self) -> bytes:
+        """取出自上次调用以来生成的字节"""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+    def close(self) -> bytes:
+        """写入中央目录和结束记录并返回剩余字节"""
+        central_offset = self._offset
+        central, self._central = self._central, bytearray()
+        central_size = len(central)
+        self._emit(central)
+
+        if self.entries >= 0xFFFF or central_offset >= _ZIP64_LIMIT or central_size >= _ZIP64_LIMIT:
+            zip64_end_offset = self._offset
+            self._emit(struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0,
+                self.entries, self.entries, central_size, central_offset,
+            ))
+            self._emit(struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1))
+            entries, central_size, central_offset = 0xFFFF, min(central_size, _ZIP64_LIMIT), _ZIP64_LIMIT
+        else:
+            entries = self.entries
+        self._emit(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, entries, entries, central_size, central_offset, 0))
+        return self.drain()
+
+
+async def render_qr_batch(configs: Sequence[str], executor: Executor, fmt: str = "png") -> List[bytes]:
+    """批量获取QR码：命中内容寻址缓存的直接使用，其余分块在进程池中渲染
+
+    同时提交的任务数由调用方的分页大小限定（每页最多 页大小/QR_CHUNK_SIZE 个任务）。
+    """
+    images: List[Optional[bytes]] = [qr_code_cache.peek(config, fmt) for config in configs]
+    missing = [i for i, image in enumerate(images) if image is None]
+    if missing:
+        loop = asyncio.get_running_loop()
+        chunks = [missing[i:i + QR_CHUNK_SIZE] for i in range(0, len(missing), QR_CHUNK_SIZE)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, render_qr_images, [configs[i] for i in chunk], fmt)
+            for chunk in chunks
+        ))
+        for chunk, rendered in zip(chunks, results):
+            for i, image in zip(chunk, rendered):
+                images[i] = image
+                qr_code_cache.put(configs[i], fmt, image)
+    return images
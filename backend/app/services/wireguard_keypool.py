@@ -0,0 +1,179 @@
+"""
+WireGuard密钥对预生成池
+后台任务在池深度低于水位线时批量生成 X25519 密钥对（在线程中执行），创建服务器/
+客户端时 O(1) 取出，池为空时退回同步生成；池中的私钥用应用密钥派生的 AES-GCM
+密钥加密保存
+"""
+import asyncio
+import base64
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from ..core.unified_config import settings
+from ..core.logging import get_logger
+from .wireguard_render import generate_keypair
+
+try:
+    from ..core.monitoring import monitoring_manager
+except ImportError:  # prometheus_client 未安装
+    monitoring_manager = None
+
+logger = get_logger(__name__)
+
+# 每次在线程中生成的密钥对数量
+REFILL_BATCH_SIZE = 32
+_NONCE_SIZE = 12
+
+
+def _derive_key(secret: str) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=b"wireguard-keypair-pool"
+    ).derive(secret.encode())
+
+
+class KeypairReservoir:
+    """预生成密钥对池
+
+    池中每项为 (nonce + 加密后的私钥, 公钥)，公钥作为附加认证数据，密文与公钥
+    不匹配时解密失败。池深度低于 low_watermark 时唤醒后台任务补充到 capacity。
+    """
+
+    def __init__(self, capacity: int = 256, low_watermark: Optional[int] = None, secret: str = ""):
+        self.capacity = capacity
+        self.low_watermark = capacity // 2 if low_watermark is None else low_watermark
+        self._aead = AESGCM(_derive_key(secret or os.urandom(32).hex()))
+        self._pool: Deque[Tuple[bytes, str]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "served_pool": 0,
+            "served_inline": 0,
+            "refilled": 0,
+            "refill_rate": 0.0,  # 最近一批的生成速率（对/秒）
+            "last_refill_at": 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    # 加解密
+    def _seal(self, private_key: str, public_key: str) -> bytes:
+        nonce = os.urandom(_NONCE_SIZE)
+        return nonce + self._aead.encrypt(nonce, base64.b64decode(private_key), public_key.encode())
+
+    def _open(self, sealed: bytes, public_key: str) -> str:
+        plaintext = self._aead.decrypt(sealed[:_NONCE_SIZE], sealed[_NONCE_SIZE:], public_key.encode())
+        return base64.b64encode(plaintext).decode("ascii")
+
+    def _generate_batch(self, count: int) -> List[Tuple[bytes, str]]:
+        """生成并加密一批密钥对（在线程中执行）"""
+        sealed = []
+        for _ in range(count):
+            private_key, public_key = generate_keypair()
+            sealed.append((self._seal(private_key, public_key), public_key))
+        return sealed
+
+    # 取用
+    def take(self) -> Tuple[str, str]:
+        """取出一对密钥 (私钥, 公钥)；池为空时同步生成"""
+        try:
+            sealed, public_key = self._pool.popleft()
+        except IndexError:
+            self.stats["served_inline"] += 1
+            self._report("inline")
+            self._wake()
+            return generate_keypair()
+
+        self.stats["served_pool"] += 1
+        self._report("pool")
+        if len(self._pool) < self.low_watermark:
+            self._wake()
+        return self._open(sealed, public_key), public_key
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _report(self, source: str) -> None:
+        if monitoring_manager is not None:
+            monitoring_manager.record_keypool_served(source)
+            monitoring_manager.update_keypool(len(self._pool), self.stats["refill_rate"])
+
+    # 后台补充
+    async def refill(self) -> int:
+        """将池补充到 capacity，返回新增数量"""
+        added = 0
+        while len(self._pool) < self.capacity:
+            count = min(REFILL_BATCH_SIZE, self.capacity - len(self._pool))
+            started = time.perf_counter()
+            batch = await asyncio.to_thread(self._generate_batch, count)
+            elapsed = time.perf_counter() - started
+            self._pool.extend(batch[:self.capacity - len(self._pool)])
+            added += len(batch)
+            self.stats["refill_rate"] = len(batch) / elapsed if elapsed > 0 else 0.0
+            if monitoring_manager is not None:
+                monitoring_manager.record_keypool_refill(len(batch))
+        if added:
+            self.stats["refilled"] += added
+            self.stats["last_refill_at"] = time.time()
+            if monitoring_manager is not None:
+                monitoring_manager.update_keypool(len(self._pool), self.stats["refill_rate"])
+        return added
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"密钥对池补充失败: {e}")
+                await asyncio.sleep(5)
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        """启动后台补充任务（capacity 为 0 时不启用）"""
+        if self.capacity <= 0 or (self._task and not self._task.done()):
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"WireGuard密钥对池已启动，容量 {self.capacity}")
+
+    async def stop(self) -> None:
+        """停止后台任务并丢弃池中的密钥"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+        self._pool.clear()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "depth": len(self._pool),
+            "capacity": self.capacity,
+            "low_watermark": self.low_watermark,
+            "running": self.running,
+        }
+
+
+# 全局密钥对池
+keypair_reservoir = KeypairReservoir(
+    capacity=getattr(settings, "WIREGUARD_KEYPOOL_SIZE", 256),
+    secret=getattr(settings, "SECRET_KEY", ""),
+)
@@ -0,0 +1,119 @@
+"""
+WireGuard对等节点在多个接口间的放置
+一致性哈希环（虚拟节点）加有界负载：新节点落在哈希位置顺时针方向第一个
+未超过负载上限的接口上；增加接口时只有落在新接口哈希区间内的节点需要迁移
+"""
+import hashlib
+import math
+from bisect import bisect_right
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# 每个接口在环上的虚拟节点数，越多分布越均匀
+VIRTUAL_NODES = 160
+# 有界负载系数：单个接口的节点数不超过平均值的该倍数
+LOAD_FACTOR = 1.25
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+@dataclass(frozen=True)
+class PeerMove:
+    """再平衡计划中的一次迁移"""
+    peer_id: int
+    source: Optional[int]
+    target: int
+
+
+class PlacementRing:
+    """以服务器ID为节点的一致性哈希环
+
+    查找为一次二分（O(log n)，n 为虚拟节点总数）；有界负载放置在此基础上
+    顺时针跳过已满的接口，期望只需少量步数。
+    """
+
+    def __init__(self, nodes: Iterable[int], replicas: int = VIRTUAL_NODES):
+        self.nodes = tuple(sorted(set(nodes)))
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def _start(self, key: str) -> int:
+        return bisect_right(self._hashes, _hash(key)) % len(self._hashes)
+
+    def lookup(self, key: str) -> Optional[int]:
+        """键在环上的归属接口（不考虑负载）"""
+        if not self.nodes:
+            return None
+        return self._owners[self._start(key)]
+
+    def limit(self, total: int, load_factor: float = LOAD_FACTOR) -> int:
+        """放入 total 个节点时单个接口的负载上限"""
+        return max(1, math.ceil(load_factor * total / len(self.nodes)))
+
+    def place(self, key: str, loads: Mapping[int, int], load_factor: float = LOAD_FACTOR) -> Optional[int]:
+        """有界负载放置：从键的哈希位置顺时针找第一个未满的接口"""
+        if not self.nodes:
+            return None
+        limit = self.limit(sum(loads.get(node, 0) for node in self.nodes) + 1, load_factor)
+        start = self._start(key)
+        visited = set()
+        for step in range(len(self._owners)):
+            node = self._owners[(start + step) % len(self._owners)]
+            if node in visited:
+                continue
+            if loads.get(node, 0) < limit:
+                return node
+            visited.add(node)
+            if len(visited) == len(self.nodes):
+                break
+        return self._owners[start]
+
+    def plan_rebalance(self, assignments: Sequence[Tuple[int, str, Optional[int]]], max_moves: int,
+                       load_factor: float = LOAD_FACTOR) -> List[PeerMove]:
+        """计算把节点迁回其归属接口的计划，最多 max_moves 次迁移
+
+        assignments 为 (节点ID, 放置键, 当前接口) 列表。
+
+        所在接口已不在环上（停用或删除）的节点优先迁移；其余节点只有在归属接口
+        未超过负载上限时才迁移，因此增加接口后迁移量约为总数的 1/接口数。
+        """
+        if not self.nodes or max_moves <= 0:
+            return []
+        loads: Dict[int, int] = Counter(current for _, _, current in assignments if current in self.nodes)
+        limit = self.limit(len(assignments), load_factor)
+        moves: List[PeerMove] = []
+
+        for peer_id, key, current in assignments:
+            if len(moves) >= max_moves:
+                return moves
+            if current not in self.nodes:
+                target = self.place(key, loads, load_factor)
+                moves.append(PeerMove(peer_id, current, target))
+                loads[target] += 1
+
+        for peer_id, key, current in assignments:
+            if len(moves) >= max_moves:
+                break
+            if current not in self.nodes:
+                continue
+            target = self.lookup(key)
+            if target == current or loads[target] >= limit:
+                continue
+            moves.append(PeerMove(peer_id, current, target))
+            loads[current] -= 1
+            loads[target] += 1
+        return moves
+
+
+@lru_cache(maxsize=16)
+def placement_ring(server_ids: Tuple[int, ...]) -> PlacementRing:
+    """按活动服务器集合缓存哈希环，服务器集合不变时不重复构建"""
+    return PlacementRing(server_ids)
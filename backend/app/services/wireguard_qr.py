@@ -0,0 +1,112 @@
+"""
+WireGuard客户端QR码按需渲染
+QR码不再保存到数据库，请求时在线程池中渲染，结果按配置内容哈希缓存
+"""
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..core.unified_config import settings
+from ..core.logging import get_logger
+from .wireguard_render import QR_MEDIA_TYPES, render_qr_image
+
+logger = get_logger(__name__)
+
+
+class QRCodeCache:
+    """内容寻址的QR码LRU缓存
+
+    键为 (配置内容的SHA-256, 格式)，配置变化（密钥轮换、地址变更）后自然失效，
+    无需显式清理；并发请求同一内容时只渲染一次。
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024, max_entries: int = 2048):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size_bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    async def get(self, config_content: str, fmt: str = "png") -> bytes:
+        """获取配置对应的QR码图片"""
+        if fmt not in QR_MEDIA_TYPES:
+            raise ValueError(f"不支持的QR码格式: {fmt}")
+
+        key = self._key(config_content, fmt)
+        image = self._entries.get(key)
+        if image is not None:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return image
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            # 渲染在独立任务中执行：发起请求被取消时渲染继续，合并进来的等待者不受影响
+            self.stats["misses"] += 1
+            task = asyncio.get_running_loop().create_task(self._render(key, config_content, fmt))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._render_done(k, t))
+        return await asyncio.shield(task)
+
+    async def _render(self, key: Tuple[str, str], config_content: str, fmt: str) -> bytes:
+        image = await asyncio.to_thread(render_qr_image, config_content, fmt)
+        self._put(key, image)
+        return image
+
+    def _render_done(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待者都已取消时避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    def _key(config_content: str, fmt: str) -> Tuple[str, str]:
+        return hashlib.sha256(config_content.encode()).hexdigest(), fmt
+
+    def peek(self, config_content: str, fmt: str = "png") -> Optional[bytes]:
+        """只查缓存不渲染，未命中时返回 None"""
+        key = self._key(config_content, fmt)
+        image = self._entries.get(key)
+        if image is not None:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+        return image
+
+    def put(self, config_content: str, fmt: str, image: bytes) -> None:
+        """写入在其他地方（如进程池）渲染好的图片"""
+        self._put(self._key(config_content, fmt), image)
+
+    def _put(self, key: Tuple[str, str], image: bytes) -> None:
+        if len(image) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size_bytes -= len(previous)
+        self._entries[key] = image
+        self.size_bytes += len(image)
+        while self.size_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            **self.stats,
+        }
+
+
+# 全局QR码缓存
+qr_code_cache = QRCodeCache(max_bytes=getattr(settings, "WIREGUARD_QR_CACHE_BYTES", 8 * 1024 * 1024))
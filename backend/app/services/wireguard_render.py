@@ -0,0 +1,123 @@
+"""
+WireGuard密钥生成和客户端配置渲染
+只包含纯函数，不依赖应用配置和数据库，可以在进程池中执行（批量开通客户端时并行渲染）
+"""
+import io
+import base64
+import logging
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+logger = logging.getLogger(__name__)
+
+
+def generate_keypair() -> Tuple[str, str]:
+    """生成WireGuard密钥对，返回 (私钥, 公钥) 的base64字符串"""
+    private_key = X25519PrivateKey.generate()
+    private_bytes = private_key.private_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PrivateFormat.Raw,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    public_bytes = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    return base64.b64encode(private_bytes).decode('ascii'), base64.b64encode(public_bytes).decode('ascii')
+
+
+def allowed_ips_list(value: Any) -> List[str]:
+    """数据库中 allowed_ips 以逗号分隔的字符串保存，请求中为列表"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [ip.strip() for ip in value.split(",") if ip.strip()]
+    return list(value)
+
+
+def render_client_config(server: Mapping[str, Any], client: Mapping[str, Any]) -> str:
+    """渲染客户端配置文件内容
+
+    Args:
+        server: 服务器字段（public_key、ipv4_address、ipv6_address、listen_port、dns_servers）
+        client: 客户端字段（private_key、ipv4_address、ipv6_address、allowed_ips、persistent_keepalive）
+    """
+    dns_servers = server.get("dns_servers")
+    allowed_ips = allowed_ips_list(client.get("allowed_ips"))
+    return f"""[Interface]
+PrivateKey = {client['private_key']}
+Address = {client.get('ipv4_address') or ''}
+Address = {client.get('ipv6_address') or ''}
+DNS = {', '.join(dns_servers) if dns_servers else ''}
+
+[Peer]
+PublicKey = {server['public_key']}
+Endpoint = {server.get('ipv4_address') or server.get('ipv6_address')}:{server['listen_port']}
+AllowedIPs = {', '.join(allowed_ips) if allowed_ips else '${SERVER_HOST}/0, ::/0'}
+PersistentKeepalive = {client.get('persistent_keepalive')}
+"""
+
+
+QR_MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def render_qr_image(config_content: str, fmt: str = "png") -> bytes:
+    """将配置渲染为QR码图片（png 或 svg）"""
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(config_content)
+    qr.make(fit=True)
+
+    if fmt == "svg":
+        from qrcode.image.svg import SvgPathImage
+        return qr.make_image(image_factory=SvgPathImage).to_string()
+    if fmt != "png":
+        raise ValueError(f"不支持的QR码格式: {fmt}")
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_qr_images(configs: Sequence[str], fmt: str = "png") -> List[bytes]:
+    """批量渲染QR码图片（进程池任务）"""
+    return [render_qr_image(config, fmt) for config in configs]
+
+
+def render_qr_code(config_content: str) -> str:
+    """生成配置的QR码（PNG data URL），失败时返回空字符串"""
+    try:
+        img_str = base64.b64encode(render_qr_image(config_content)).decode()
+        return f"data:image/png;base64,{img_str}"
+    except Exception as e:
+        logger.error(f"生成QR码失败: {e}")
+        return ""
+
+
+def provision_clients(server: Mapping[str, Any], clients: Sequence[Mapping[str, Any]],
+                      with_qr_code: bool = False) -> List[Dict[str, str]]:
+    """为一组客户端生成密钥对和配置文件内容（进程池任务）
+
+    QR码默认不生成，由 /clients/{id}/qr 接口按需渲染。
+
+    Returns:
+        与 clients 顺序一致的列表，每项包含 private_key、public_key、config、qr_code
+    """
+    results = []
+    for client in clients:
+        private_key, public_key = generate_keypair()
+        config = render_client_config(server, {**client, "private_key": private_key})
+        results.append({
+            "private_key": private_key,
+            "public_key": public_key,
+            "config": config,
+            "qr_code": render_qr_code(config) if with_qr_code else "",
+        })
+    return results
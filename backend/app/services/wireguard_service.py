@@ -2,30 +2,150 @@
 WireGuard服务
 """
 import uuid
-import subprocess
 import os
-import qrcode
-import io
-import base64
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Tuple
+from sqlalchemy import insert, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
-from ..models.wireguard import WireGuardServer, WireGuardClient
+from ..models import WireGuardServer, WireGuardClient
 from ..schemas.wireguard import (
     WireGuardServerCreate, WireGuardServerUpdate,
     WireGuardClientCreate, WireGuardClientUpdate,
+    WireGuardClientBatchCreate,
     WireGuardStatus, WireGuardInterfaceStatus, WireGuardPeerStatus,
     WireGuardConfig, WireGuardPeer
 )
+from ..core.unified_config import settings
 from ..core.path_config import path_config
 from ..core.logging import get_logger
+from ..core.atomic_file import config_file_writer
+from .wireguard_sync import PeerSpec, peer_reconciler
+from .wireguard_render import (
+    generate_keypair, render_client_config, render_qr_code, provision_clients, allowed_ips_list
+)
+from .wireguard_telemetry import peer_telemetry
+from .wireguard_qr import qr_code_cache
+from .wireguard_addressing import TunnelAddressAllocator
+from .wireguard_placement import placement_ring
+from .wireguard_bundle import ZipStream, member_name, render_qr_batch
+from .wireguard_keypool import keypair_reservoir
 
 logger = get_logger(__name__)
 
+# 批量开通时每个进程池任务处理的客户端数
+PROVISION_CHUNK_SIZE = 50
+# 按公钥回查自增ID时每条 IN 查询的公钥数
+ID_LOOKUP_CHUNK_SIZE = 500
+# 打包下载时每页读取的客户端数
+BUNDLE_PAGE_SIZE = 200
+
+_provision_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_provision_pool() -> ProcessPoolExecutor:
+    """批量开通使用的进程池（首次使用时创建）
+
+    密钥生成和配置渲染是CPU密集操作，放在独立进程中不占用事件循环和GIL；
+    使用 spawn 方式启动，子进程只导入 wireguard_render，不继承事件循环和数据库连接。
+    """
+    global _provision_pool
+    if _provision_pool is None:
+        workers = getattr(settings, "WIREGUARD_PROVISION_WORKERS", 0) or min(4, os.cpu_count() or 1)
+        _provision_pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _provision_pool
+
+
+def shutdown_provision_pool() -> None:
+    """关闭批量开通进程池（应用关闭时调用）"""
+    global _provision_pool
+    if _provision_pool is not None:
+        _provision_pool.shutdown(wait=False, cancel_futures=True)
+        _provision_pool = None
+
+
+def _server_fields(server: WireGuardServer) -> Dict[str, Any]:
+    return {
+        "public_key": server.public_key,
+        "ipv4_address": server.ipv4_address,
+        "ipv6_address": server.ipv6_address,
+        "listen_port": server.listen_port,
+        "dns_servers": server.dns_servers,
+    }
+
+
+def _client_fields(client: WireGuardClient) -> Dict[str, Any]:
+    return {
+        "private_key": client.private_key,
+        "ipv4_address": client.ipv4_address,
+        "ipv6_address": client.ipv6_address,
+        "allowed_ips": client.allowed_ips,
+        "persistent_keepalive": client.persistent_keepalive,
+    }
+
+
+def _server_header(server: WireGuardServer) -> str:
+    """渲染服务器配置的 [Interface] 段"""
+    lines = [
+        "[Interface]",
+        f"PrivateKey = {server.private_key}",
+        f"Address = {server.ipv4_address or ''}",
+        f"Address = {server.ipv6_address or ''}",
+        f"ListenPort = {server.listen_port}",
+        f"MTU = {server.mtu}",
+    ]
+    if server.dns_servers:
+        dns_servers = " ".join(server.dns_servers)
+        lines.append(f"DNS = {dns_servers}")
+    return "\n".join(lines) + "\n"
+
+
+async def _load_interface(interface: str) -> Optional[Tuple[str, Optional[str], List[PeerSpec]]]:
+    """按接口名从数据库读取服务器配置头和对等节点，供协调器渲染配置文件
+
+    配置文件始终按数据库渲染：重启后首次变更即可写入，多个 worker 写出的内容也一致。
+    """
+    from ..core.database_manager import database_manager
+
+    async with database_manager.get_session() as session:
+        result = await session.execute(
+            select(WireGuardServer)
+            .where(WireGuardServer.interface == interface, WireGuardServer.is_active.is_(True))
+            .order_by(WireGuardServer.id)
+        )
+        server = result.scalars().first()
+        if server is None:
+            return None
+        result = await session.execute(
+            select(WireGuardClient).where(WireGuardClient.server_id == server.id).order_by(WireGuardClient.id)
+        )
+        peers = [PeerSpec.from_client(client) for client in result.scalars().all()]
+        return _server_header(server), server.config_file_path, peers
+
+
+peer_reconciler.set_loader(_load_interface)
+
+
+def _write_client_config(path: str, content: str) -> None:
+    # 原子替换（权限 0600），内容未变化时不写磁盘
+    config_file_writer.write(path, content)
+
+
+def _write_client_configs(files: List[Tuple[str, str]]) -> None:
+    for path, content in files:
+        try:
+            _write_client_config(path, content)
+        except OSError:
+            continue  # 已记录日志，继续写入其余客户端
+
+
 class WireGuardService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -52,52 +172,30 @@ class WireGuardService:
             logger.error(f"设置WireGuard配置目录权限失败: {e}")
 
     def generate_keypair(self) -> tuple[str, str]:
-        """生成WireGuard密钥对"""
+        """生成WireGuard密钥对（从预生成池O(1)取出，池为空时同步生成）"""
         try:
-            # 生成私钥
-            private_key = X25519PrivateKey.generate()
-            private_bytes = private_key.private_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PrivateFormat.Raw,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-            private_key_str = base64.b64encode(private_bytes).decode('ascii')
-
-            # 生成公钥
-            public_key = private_key.public_key()
-            public_bytes = public_key.public_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PublicFormat.Raw
-            )
-            public_key_str = base64.b64encode(public_bytes).decode('ascii')
-
-            return private_key_str, public_key_str
+            return keypair_reservoir.take()
         except Exception as e:
             logger.error(f"生成密钥对失败: {e}")
             raise
 
-    async def get_config(self) -> WireGuardConfig:
-        """获取WireGuard配置"""
+    async def get_config(self, server_id: Optional[int] = None) -> WireGuardConfig:
+        """获取指定接口的WireGuard配置（未指定时为ID最小的启用服务器）"""
         try:
-            # 获取所有服务器
-            servers = await self.get_servers()
-            if not servers:
+            server = await self._resolve_server(server_id)
+            if not server:
                 return WireGuardConfig(server_config="", client_configs=[])
             
-            server = servers[0]  # 使用第一个服务器
-            server_config = await self.generate_server_config(server)
-            
-            # 获取所有客户端
+            # 只读渲染，不向接口下发变更，也不写入配置文件
             clients = await self.get_clients_by_server(server.id)
-            client_configs = []
+            server_config = self.render_server_config(server, clients)
             
-            for client in clients:
-                client_config = await self.generate_client_config(client)
-                client_configs.append({
-                    "id": str(client.id),
-                    "name": client.name,
-                    "config": client_config
-                })
+            server_fields = _server_fields(server)
+            client_configs = [{
+                "id": str(client.id),
+                "name": client.name,
+                "config": render_client_config(server_fields, _client_fields(client))
+            } for client in clients]
             
             return WireGuardConfig(
                 server_config=server_config,
@@ -142,13 +240,11 @@ class WireGuardService:
     async def create_peer(self, peer: WireGuardPeer) -> WireGuardPeer:
         """创建新的对等节点"""
         try:
-            # 获取第一个服务器
-            servers = await self.get_servers()
-            if not servers:
+            # 按一致性哈希（有界负载）选择接口
+            server = await self.choose_server(peer.name)
+            if not server:
                 raise Exception("没有可用的服务器")
             
-            server = servers[0]
-            
             # 创建客户端
             client_data = WireGuardClientCreate(
                 server_id=server.id,
@@ -231,70 +327,68 @@ class WireGuardService:
             logger.error(f"删除对等节点失败: {e}")
             return False
 
-    async def get_status(self) -> WireGuardStatus:
-        """获取WireGuard状态"""
-        try:
-            # 获取所有服务器
-            servers = await self.get_servers()
-            if not servers:
-                return WireGuardStatus(
-                    interface=WireGuardInterfaceStatus(
-                        name="wg0",
-                        public_key="",
-                        private_key="",
-                        listen_port=51820,
-                        fwmark=0,
-                        peers=0
-                    ),
-                    peers=[]
-                )
-            
-            # 使用第一个服务器
-            server = servers[0]
-            
-            # 获取所有客户端作为peers
-            clients = await self.get_all_clients()
-            peers = []
-            
-            for client in clients:
-                peer_status = WireGuardPeerStatus(
-                    public_key=client.public_key,
-                    preshared_key="",
-                    allowed_ips=client.allowed_ips or [],
-                    persistent_keepalive=client.persistent_keepalive or 25,
-                    latest_handshake=int(datetime.now().timestamp()),
-                    transfer_rx=0,
-                    transfer_tx=0
-                )
-                peers.append(peer_status)
-            
-            interface_status = WireGuardInterfaceStatus(
-                name=server.interface or "wg0",
-                public_key=server.public_key,
-                private_key=server.private_key,
-                listen_port=server.listen_port or 51820,
-                fwmark=0,
-                peers=len(peers)
-            )
-            
-            return WireGuardStatus(
-                interface=interface_status,
-                peers=peers
+    @staticmethod
+    def _empty_status() -> WireGuardStatus:
+        return WireGuardStatus(
+            interface=WireGuardInterfaceStatus(
+                interface="wg0",
+                public_key="",
+                private_key="",
+                listening_port=51820,
+                peers=0
+            ),
+            peers=[]
+        )
+
+    async def _interface_status(self, server: WireGuardServer) -> WireGuardStatus:
+        """单个接口的状态，对等节点为该服务器上的客户端"""
+        clients = await self.get_clients_by_server(server.id)
+        peers = []
+        
+        for client in clients:
+            # 握手时间和流量来自遥测采集器，未采集到的节点视为从未握手
+            telemetry = peer_telemetry.peer(client.public_key) or {}
+            latest_handshake = telemetry.get("latest_handshake")
+            peer_status = WireGuardPeerStatus(
+                public_key=client.public_key,
+                preshared_key="",
+                endpoint=telemetry.get("endpoint"),
+                allowed_ips=allowed_ips_list(client.allowed_ips),
+                persistent_keepalive=client.persistent_keepalive or 25,
+                latest_handshake=datetime.fromtimestamp(latest_handshake, tz=timezone.utc) if latest_handshake else None,
+                transfer_rx=telemetry.get("transfer_rx", 0),
+                transfer_tx=telemetry.get("transfer_tx", 0)
             )
+            peers.append(peer_status)
+        
+        interface_status = WireGuardInterfaceStatus(
+            interface=server.interface or "wg0",
+            public_key=server.public_key,
+            private_key=server.private_key,
+            listening_port=server.listen_port or 51820,
+            peers=len(peers)
+        )
+        
+        return WireGuardStatus(
+            interface=interface_status,
+            peers=peers
+        )
+
+    async def get_status(self, server_id: Optional[int] = None) -> WireGuardStatus:
+        """获取指定接口的WireGuard状态（未指定时为ID最小的启用服务器）"""
+        try:
+            server = await self._resolve_server(server_id)
+            if not server:
+                return self._empty_status()
+            return await self._interface_status(server)
         except Exception as e:
             logger.error(f"获取WireGuard状态失败: {e}")
             # 返回默认状态
-            return WireGuardStatus(
-                interface=WireGuardInterfaceStatus(
-                    name="wg0",
-                    public_key="",
-                    private_key="",
-                    listen_port=51820,
-                    fwmark=0,
-                    peers=0
-                ),
-                peers=[]
-            )
+            return self._empty_status()
+
+    async def get_statuses(self) -> List[WireGuardStatus]:
+        """获取所有启用接口的状态"""
+        return [await self._interface_status(server) for server in await self.get_active_servers()]
 
     async def restart_peer(self, peer_id: str) -> bool:
         """重启对等节点"""
@@ -351,47 +445,117 @@ class WireGuardService:
         result = await self.db.execute(select(WireGuardServer))
         return result.scalars().all()
 
+    async def get_active_servers(self) -> List[WireGuardServer]:
+        """获取所有启用的服务器（按ID排序）"""
+        result = await self.db.execute(
+            select(WireGuardServer).where(WireGuardServer.is_active.is_(True)).order_by(WireGuardServer.id)
+        )
+        return result.scalars().all()
+
+    async def _resolve_server(self, server_id: Optional[int]) -> Optional[WireGuardServer]:
+        if server_id is not None:
+            return await self.get_server_by_id(server_id)
+        servers = await self.get_active_servers()
+        return servers[0] if servers else None
+
+    async def get_server_loads(self) -> Dict[int, int]:
+        """各服务器上的客户端数量"""
+        result = await self.db.execute(
+            select(WireGuardClient.server_id, func.count()).group_by(WireGuardClient.server_id)
+        )
+        return dict(result.tuples().all())
+
+    async def choose_server(self, key: str) -> Optional[WireGuardServer]:
+        """为新对等节点选择接口：一致性哈希环上顺时针第一个未超过负载上限的启用服务器"""
+        servers = {server.id: server for server in await self.get_active_servers()}
+        if not servers:
+            return None
+        ring = placement_ring(tuple(servers))
+        return servers[ring.place(key, await self.get_server_loads())]
+
+    async def rebalance(self, max_moves: int = 100, dry_run: bool = False) -> Dict[str, Any]:
+        """将对等节点迁回其在哈希环上的归属接口，最多迁移 max_moves 个
+
+        增加接口后只有落在新接口哈希区间内的节点需要迁移；所在服务器已停用的
+        节点优先迁移。迁移后客户端地址在新服务器上重新分配，需要重新下发客户端配置。
+        """
+        servers = await self.get_active_servers()
+        ring = placement_ring(tuple(server.id for server in servers))
+        result = await self.db.execute(
+            select(WireGuardClient.id, WireGuardClient.name, WireGuardClient.server_id).order_by(WireGuardClient.id)
+        )
+        moves = ring.plan_rebalance(result.tuples().all(), max_moves)
+
+        moved = 0
+        if not dry_run:
+            for move in moves:
+                client = await self.get_client_by_id(move.peer_id)
+                if client is None:
+                    continue
+                await self.update_client(client, WireGuardClientUpdate(server_id=move.target))
+                moved += 1
+            logger.info(f"对等节点再平衡完成: 计划 {len(moves)} 个，已迁移 {moved} 个")
+
+        return {
+            "servers": [server.id for server in servers],
+            "planned": len(moves),
+            "moved": moved,
+            "dry_run": dry_run,
+            "moves": [{"client_id": m.peer_id, "from": m.source, "to": m.target} for m in moves],
+        }
+
     async def generate_server_config(self, server: WireGuardServer) -> str:
-        """生成服务器配置文件"""
+        """生成服务器配置，并将对等节点差异同步到接口（配置文件延迟写入）
+
+        [Peer] 段按节点状态缓存，整份配置由协调器一次拼接后原子写入，内容未变化时不写文件。
+        """
         try:
-            config_content = f"""[Interface]
-PrivateKey = {server.private_key}
-Address = {server.ipv4_address or ''}
-Address = {server.ipv6_address or ''}
-ListenPort = {server.listen_port}
-MTU = {server.mtu}
-"""
-            
-            if server.dns_servers:
-                dns_servers = " ".join(server.dns_servers)
-                config_content += f"DNS = {dns_servers}\n"
+            config_content = _server_header(server)
+            interface = server.interface or "wg0"
+            peer_reconciler.configure(interface, config_content, server.config_file_path)
             
-            # 添加客户端配置
+            # 按客户端列表同步对等节点，仅下发差异
             clients = await self.get_clients_by_server(server.id)
-            for client in clients:
-                config_content += f"""
-[Peer]
-PublicKey = {client.public_key}
-AllowedIPs = {client.ipv4_address or ''}
-AllowedIPs = {client.ipv6_address or ''}
-PersistentKeepalive = {client.persistent_keepalive}
-"""
-            
-            # 写入配置文件
-            with open(server.config_file_path, 'w') as f:
-                f.write(config_content)
+            specs = [PeerSpec.from_client(client) for client in clients]
+            await peer_reconciler.sync(interface, specs)
             
-            # 设置文件权限
-            os.chmod(server.config_file_path, 0o600)
-            
-            return config_content
+            return "".join([config_content, *(peer_reconciler.fragment(interface, spec) for spec in specs)])
         except Exception as e:
             logger.error(f"生成服务器配置失败: {e}")
             raise
 
+    def render_server_config(self, server: WireGuardServer, clients: List[WireGuardClient]) -> str:
+        """按数据库记录渲染服务器配置（只读，不同步接口）"""
+        interface = server.interface or "wg0"
+        specs = [PeerSpec.from_client(client) for client in clients]
+        return "".join([_server_header(server), *(peer_reconciler.fragment(interface, spec) for spec in specs)])
+
+    @staticmethod
+    def _configure_interface(server: WireGuardServer) -> str:
+        """登记接口的配置头和配置文件路径（重启后首次单节点变更时也可用），返回接口名"""
+        interface = server.interface or "wg0"
+        peer_reconciler.configure(interface, _server_header(server), server.config_file_path)
+        return interface
+
+    async def _sync_client_peer(self, client: WireGuardClient, replaces: Optional[str] = None):
+        """将单个客户端的变更下发到所属服务器接口；replaces 为需要一并移除的旧公钥"""
+        server = await self.get_server_by_id(client.server_id)
+        if server:
+            interface = self._configure_interface(server)
+            await peer_reconciler.upsert(interface, PeerSpec.from_client(client), replaces=replaces)
+
     async def create_client(self, client_in: WireGuardClientCreate) -> WireGuardClient:
-        """创建WireGuard客户端"""
+        """创建WireGuard客户端（未指定隧道地址时从服务器子网自动分配）"""
         try:
+            # 在服务器行锁下分配地址，与客户端记录同一事务提交
+            allocator = TunnelAddressAllocator(self.db)
+            server = await allocator.lock_server(client_in.server_id)
+            if not server:
+                raise ValueError("服务器不存在")
+            [(ipv4_address, ipv6_address)] = await allocator.assign(
+                server, [(client_in.ipv4_address, client_in.ipv6_address)]
+            )
+            
             # 生成密钥对
             private_key, public_key = self.generate_keypair()
             
@@ -402,9 +566,9 @@ PersistentKeepalive = {client.persistent_keepalive}
                 description=client_in.description,
                 private_key=private_key,
                 public_key=public_key,
-                ipv4_address=client_in.ipv4_address,
-                ipv6_address=client_in.ipv6_address,
-                allowed_ips=client_in.allowed_ips,
+                ipv4_address=ipv4_address,
+                ipv6_address=ipv6_address,
+                allowed_ips=",".join(client_in.allowed_ips) if client_in.allowed_ips else None,
                 persistent_keepalive=client_in.persistent_keepalive,
                 config_file_path=f"{self.config_dir}/clients/{client_in.name}.conf"
             )
@@ -413,15 +577,135 @@ PersistentKeepalive = {client.persistent_keepalive}
             await self.db.commit()
             await self.db.refresh(client)
             
-            # 生成客户端配置和QR码
+            # 生成客户端配置（QR码按需渲染）
             await self.generate_client_config(client)
             
+            # 下发到接口
+            await self._sync_client_peer(client)
+            
             return client
         except Exception as e:
             await self.db.rollback()
             logger.error(f"创建客户端失败: {e}")
             raise
 
+    async def create_clients_batch(
+        self,
+        batch: WireGuardClientBatchCreate,
+        progress: Optional[Callable[[str, int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """批量创建WireGuard客户端
+
+        密钥对和配置内容在进程池中并行生成（QR码按需渲染），所有记录在一个事务中
+        以多行INSERT写入，最后对服务器接口只做一次对等节点同步。
+
+        Args:
+            batch: 批量创建请求
+            progress: 进度回调 progress(stage, done, total)，stage 为
+                render / insert / files / sync
+        """
+        report = progress or (lambda stage, done, total: None)
+        started = time.perf_counter()
+        total = len(batch.clients)
+
+        names = [item.name for item in batch.clients]
+        result = await self.db.execute(
+            select(WireGuardClient.name).where(
+                WireGuardClient.server_id == batch.server_id, WireGuardClient.name.in_(names)
+            )
+        )
+        existing = result.scalars().all()
+        if existing:
+            raise ValueError(f"客户端名称已存在: {', '.join(existing[:10])}")
+
+        # 地址分配、渲染和多行INSERT在同一个事务内，服务器行锁持有到提交
+        try:
+            allocator = TunnelAddressAllocator(self.db)
+            server = await allocator.lock_server(batch.server_id)
+            if not server:
+                raise ValueError("服务器不存在")
+            addresses = await allocator.assign(
+                server, [(item.ipv4_address, item.ipv6_address) for item in batch.clients]
+            )
+
+            # 生成密钥对和配置
+            specs = [{
+                "ipv4_address": ipv4_address,
+                "ipv6_address": ipv6_address,
+                "allowed_ips": item.allowed_ips,
+                "persistent_keepalive": item.persistent_keepalive,
+            } for item, (ipv4_address, ipv6_address) in zip(batch.clients, addresses)]
+            loop = asyncio.get_running_loop()
+            pool = _get_provision_pool()
+            server_fields = _server_fields(server)
+            futures = [
+                loop.run_in_executor(pool, provision_clients, server_fields, specs[i:i + PROVISION_CHUNK_SIZE])
+                for i in range(0, total, PROVISION_CHUNK_SIZE)
+            ]
+            rendered: List[Dict[str, str]] = []
+            for future in futures:
+                rendered.extend(await future)
+                report("render", len(rendered), total)
+
+            rows = []
+            for item, spec, (ipv4_address, ipv6_address) in zip(batch.clients, rendered, addresses):
+                rows.append({
+                    "server_id": server.id,
+                    "name": item.name,
+                    "description": item.description,
+                    "private_key": spec["private_key"],
+                    "public_key": spec["public_key"],
+                    "ipv4_address": ipv4_address,
+                    "ipv6_address": ipv6_address,
+                    "allowed_ips": ",".join(item.allowed_ips) if item.allowed_ips else None,
+                    "persistent_keepalive": item.persistent_keepalive,
+                    "config_file_path": f"{self.config_dir}/clients/{item.name}.conf",
+                })
+
+            # 多行INSERT，再按公钥回查自增ID
+            await self.db.execute(insert(WireGuardClient), rows)
+            ids: Dict[str, int] = {}
+            public_keys = [row["public_key"] for row in rows]
+            for i in range(0, total, ID_LOOKUP_CHUNK_SIZE):
+                result = await self.db.execute(
+                    select(WireGuardClient.public_key, WireGuardClient.id).where(
+                        WireGuardClient.public_key.in_(public_keys[i:i + ID_LOOKUP_CHUNK_SIZE])
+                    )
+                )
+                ids.update(result.tuples().all())
+            await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"批量创建客户端失败: {e}")
+            raise
+        report("insert", total, total)
+
+        # 写入客户端配置文件
+        await asyncio.to_thread(
+            _write_client_configs, [(row["config_file_path"], spec["config"]) for row, spec in zip(rows, rendered)]
+        )
+        report("files", total, total)
+
+        # 一次同步全部对等节点，服务器配置文件由协调器合并写入一次
+        await self.generate_server_config(server)
+        report("sync", total, total)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"批量创建客户端完成: 服务器 {server.id}, {total} 个, 耗时 {elapsed:.2f}s")
+        return {
+            "server_id": server.id,
+            "created": total,
+            "clients": [{
+                "id": ids.get(row["public_key"]),
+                "name": row["name"],
+                "public_key": row["public_key"],
+                "ipv4_address": row["ipv4_address"],
+                "ipv6_address": row["ipv6_address"],
+            } for row in rows],
+            "elapsed": elapsed,
+            "clients_per_second": total / elapsed if elapsed > 0 else 0.0,
+        }
+
     async def get_client_by_id(self, client_id: uuid.UUID) -> Optional[WireGuardClient]:
         """根据ID获取客户端"""
         result = await self.db.execute(
@@ -441,70 +725,97 @@ PersistentKeepalive = {client.persistent_keepalive}
         result = await self.db.execute(select(WireGuardClient))
         return result.scalars().all()
 
-    async def generate_client_config(self, client: WireGuardClient) -> str:
-        """生成客户端配置文件"""
+    async def generate_client_configs(self, server: WireGuardServer, clients: List[WireGuardClient]) -> List[str]:
+        """渲染并写入同一服务器下一组客户端的配置文件（服务器字段只取一次，文件在线程中批量写入）"""
+        server_fields = _server_fields(server)
+        configs = [render_client_config(server_fields, _client_fields(client)) for client in clients]
+        await asyncio.to_thread(
+            _write_client_configs, [(client.config_file_path, config) for client, config in zip(clients, configs)]
+        )
+        return configs
+
+    async def generate_client_config(self, client: WireGuardClient, server: Optional[WireGuardServer] = None) -> str:
+        """生成客户端配置文件（已持有服务器记录时可直接传入，避免重复查询）"""
         try:
-            server = await self.get_server_by_id(client.server_id)
+            server = server or await self.get_server_by_id(client.server_id)
             if not server:
                 raise Exception("服务器不存在")
             
-            config_content = f"""[Interface]
-PrivateKey = {client.private_key}
-Address = {client.ipv4_address or ''}
-Address = {client.ipv6_address or ''}
-DNS = {', '.join(server.dns_servers) if server.dns_servers else ''}
-
-[Peer]
-PublicKey = {server.public_key}
-Endpoint = {server.ipv4_address or server.ipv6_address}:{server.listen_port}
-AllowedIPs = {', '.join(client.allowed_ips) if client.allowed_ips else '${SERVER_HOST}/0, ::/0'}
-PersistentKeepalive = {client.persistent_keepalive}
-"""
-            
-            # 写入配置文件
-            client_dir = os.path.dirname(client.config_file_path)
-            if not os.path.exists(client_dir):
-                os.makedirs(client_dir, mode=0o700)
+            config_content = render_client_config(_server_fields(server), _client_fields(client))
             
-            with open(client.config_file_path, 'w') as f:
-                f.write(config_content)
-            
-            # 设置文件权限
-            os.chmod(client.config_file_path, 0o600)
-            
-            # 生成QR码
-            qr_code = self.generate_qr_code(config_content)
-            client.qr_code = qr_code
-            await self.db.commit()
+            # 在线程中写入配置文件（QR码由 get_client_qr 按需渲染，不再写入数据库）
+            await asyncio.to_thread(_write_client_config, client.config_file_path, config_content)
             
             return config_content
         except Exception as e:
             logger.error(f"生成客户端配置失败: {e}")
             raise
 
+    async def iter_client_bundle(self, server: WireGuardServer, with_qr: bool = False) -> AsyncIterator[bytes]:
+        """以ZIP流逐页产出服务器下所有客户端的配置（可选附带QR码PNG）
+
+        客户端按主键分页读取（只取渲染需要的列），每页渲染后立即写入ZIP并交出
+        已生成的字节；QR码优先取内容寻址缓存，未命中的在进程池中分块渲染。
+        内存占用与客户端总数无关（ZIP 中央目录的条目元数据除外）。
+        """
+        server_fields = _server_fields(server)
+        archive = ZipStream()
+        columns = (
+            WireGuardClient.id, WireGuardClient.name, WireGuardClient.private_key,
+            WireGuardClient.ipv4_address, WireGuardClient.ipv6_address,
+            WireGuardClient.allowed_ips, WireGuardClient.persistent_keepalive,
+        )
+        last_id = 0
+        while True:
+            result = await self.db.execute(
+                select(*columns)
+                .where(WireGuardClient.server_id == server.id, WireGuardClient.id > last_id)
+                .order_by(WireGuardClient.id)
+                .limit(BUNDLE_PAGE_SIZE)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            configs = [render_client_config(server_fields, _client_fields(row)) for row in rows]
+            images = await render_qr_batch(configs, _get_provision_pool()) if with_qr else None
+            for i, (row, config) in enumerate(zip(rows, configs)):
+                name = member_name(row.name, row.id)
+                archive.write(f"{name}.conf", config.encode())
+                if images:
+                    # PNG 已压缩，直接存储
+                    archive.write(f"{name}.png", images[i], compress=False)
+            yield archive.drain()
+
+        yield archive.close()
+        logger.info(f"客户端配置打包完成: 服务器 {server.id}, {archive.entries} 个文件")
+
     def generate_qr_code(self, config_content: str) -> str:
         """生成配置的QR码"""
-        try:
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(config_content)
-            qr.make(fit=True)
-            
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # 转换为base64
-            buffer = io.BytesIO()
-            img.save(buffer, format='PNG')
-            img_str = base64.b64encode(buffer.getvalue()).decode()
-            
-            return f"data:image/png;base64,{img_str}"
-        except Exception as e:
-            logger.error(f"生成QR码失败: {e}")
-            return ""
+        return render_qr_code(config_content)
+
+    async def get_client_qr(self, client_id: int, fmt: str = "png") -> Optional[bytes]:
+        """按需渲染客户端配置的QR码，客户端不存在时返回 None"""
+        client = await self.db.get(WireGuardClient, client_id)
+        if not client:
+            return None
+        server = await self.get_server_by_id(client.server_id)
+        if not server:
+            raise ValueError("服务器不存在")
+        config_content = render_client_config(_server_fields(server), _client_fields(client))
+        return await qr_code_cache.get(config_content, fmt)
 
     async def update_client(self, client: WireGuardClient, client_in: WireGuardClientUpdate) -> WireGuardClient:
         """更新WireGuard客户端"""
         try:
+            previous_server_id = client.server_id
+            previous_public_key = client.public_key
             update_data = client_in.model_dump(exclude_unset=True)
+            if {"server_id", "ipv4_address", "ipv6_address"} & update_data.keys():
+                await self._reassign_addresses(client, update_data)
+            if isinstance(update_data.get("allowed_ips"), list):
+                update_data["allowed_ips"] = ",".join(update_data["allowed_ips"])
             for field, value in update_data.items():
                 setattr(client, field, value)
             
@@ -514,22 +825,70 @@ PersistentKeepalive = {client.persistent_keepalive}
             # 重新生成配置
             await self.generate_client_config(client)
             
+            # 更换服务器时从原接口移除（按原公钥）
+            replaces = previous_public_key if previous_public_key != client.public_key else None
+            if previous_server_id != client.server_id:
+                previous_server = await self.get_server_by_id(previous_server_id)
+                if previous_server:
+                    interface = self._configure_interface(previous_server)
+                    await peer_reconciler.remove(interface, previous_public_key)
+                replaces = None
+            await self._sync_client_peer(client, replaces=replaces)
+            
             return client
         except Exception as e:
             await self.db.rollback()
             logger.error(f"更新客户端失败: {e}")
             raise
 
+    async def _reassign_addresses(self, client: WireGuardClient, update_data: Dict[str, Any]) -> None:
+        """客户端更换服务器或地址时释放原地址并占用新地址，结果写回 update_data
+
+        涉及两个服务器时按ID顺序加锁，避免并发迁移互相等待。
+        """
+        allocator = TunnelAddressAllocator(self.db)
+        target_id = update_data.get("server_id", client.server_id)
+        servers = {}
+        for server_id in sorted({client.server_id, target_id} - {None}):
+            servers[server_id] = await allocator.lock_server(server_id)
+        target = servers.get(target_id)
+        if not target:
+            raise ValueError("服务器不存在")
+
+        previous = servers.get(client.server_id)
+        if previous:
+            await allocator.release(previous, [(client.ipv4_address, client.ipv6_address)])
+
+        # 更换服务器且未指定新地址时重新分配，否则沿用原地址
+        moved = target_id != client.server_id
+        requested = (
+            update_data.get("ipv4_address", None if moved else client.ipv4_address),
+            update_data.get("ipv6_address", None if moved else client.ipv6_address),
+        )
+        [(update_data["ipv4_address"], update_data["ipv6_address"])] = await allocator.assign(target, [requested])
+
     async def delete_client(self, client: WireGuardClient):
         """删除WireGuard客户端"""
         try:
             # 删除配置文件
             if client.config_file_path and os.path.exists(client.config_file_path):
                 os.remove(client.config_file_path)
+                config_file_writer.forget(client.config_file_path)
+            
+            # 归还隧道地址，与删除记录同一事务提交
+            allocator = TunnelAddressAllocator(self.db)
+            server = await allocator.lock_server(client.server_id) if client.server_id else None
+            if server:
+                await allocator.release(server, [(client.ipv4_address, client.ipv6_address)])
             
             # 删除数据库记录
             await self.db.delete(client)
             await self.db.commit()
+            
+            # 从接口移除
+            if server:
+                interface = self._configure_interface(server)
+                await peer_reconciler.remove(interface, client.public_key)
         except Exception as e:
             await self.db.rollback()
             logger.error(f"删除客户端失败: {e}")
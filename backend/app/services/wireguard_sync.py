@@ -0,0 +1,355 @@
+"""
+WireGuard对等节点增量同步
+完整同步时读取接口当前的对等节点并按差异批量执行 `wg set`；单个节点的变更直接下发
+（`wg set` 幂等，多个 worker 各自持有的快照可能过期，不据此跳过下发）。
+配置文件由后台任务延迟合并写入，内容按数据库中的服务器和客户端渲染。
+"""
+import asyncio
+import shutil
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..core.unified_config import settings
+from ..core.logging import get_logger
+from ..core.command_executor import command_executor
+from ..core.atomic_file import config_file_writer
+
+logger = get_logger(__name__)
+
+# 单次 `wg set` 调用携带的最大对等节点数，避免命令行超过 ARG_MAX
+WG_SET_BATCH_SIZE = 200
+
+# 按接口名读取 ([Interface] 段, 配置文件路径, 对等节点)，接口不存在时返回 None
+InterfaceLoader = Callable[[str], Awaitable[Optional[Tuple[str, Optional[str], List["PeerSpec"]]]]]
+
+
+@dataclass(frozen=True)
+class PeerSpec:
+    """接口上一个对等节点的期望状态"""
+    public_key: str
+    allowed_ips: Tuple[str, ...] = ()
+    persistent_keepalive: int = 0
+
+    @classmethod
+    def from_client(cls, client) -> "PeerSpec":
+        allowed_ips = tuple(ip for ip in (client.ipv4_address, client.ipv6_address) if ip)
+        return cls(
+            public_key=client.public_key,
+            allowed_ips=allowed_ips,
+            persistent_keepalive=client.persistent_keepalive or 0,
+        )
+
+    @cached_property
+    def fragment(self) -> str:
+        """服务器配置中的 [Peer] 段
+
+        PeerSpec 不可变，客户端行的相关字段变化时会生成新实例，因此片段按实例
+        缓存即相当于按行版本缓存；快照未变化的节点重写配置时不再重新渲染。
+        """
+        lines = ["", "[Peer]", f"PublicKey = {self.public_key}"]
+        lines.extend(f"AllowedIPs = {ip}" for ip in self.allowed_ips)
+        lines.append(f"PersistentKeepalive = {self.persistent_keepalive}")
+        return "\n".join(lines) + "\n"
+
+    def render(self) -> str:
+        """渲染为服务器配置中的 [Peer] 段"""
+        return self.fragment
+
+    def wg_args(self) -> List[str]:
+        """`wg set` 中描述该节点的参数"""
+        return [
+            "peer", self.public_key,
+            "allowed-ips", ",".join(self.allowed_ips),
+            "persistent-keepalive", str(self.persistent_keepalive or "off"),
+        ]
+
+
+@dataclass
+class PeerDiff:
+    """期望状态与已应用快照之间的差异"""
+    added: List[PeerSpec] = field(default_factory=list)
+    updated: List[PeerSpec] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.updated or self.removed)
+
+
+class PeerBackend:
+    """对等节点下发后端"""
+
+    async def dump(self, interface: str) -> Dict[str, PeerSpec]:
+        """读取接口上当前的对等节点"""
+        raise NotImplementedError
+
+    async def apply(self, interface: str, upserts: List[PeerSpec], removals: List[str]) -> None:
+        """批量新增/更新/删除对等节点，失败时抛出异常"""
+        raise NotImplementedError
+
+
+class WgCommandBackend(PeerBackend):
+    """通过 `wg` 命令行工具操作内核接口"""
+
+    def __init__(self, wg_binary: str = "wg"):
+        self.wg_binary = wg_binary
+
+    async def _run(self, *args: str) -> str:
+        result = await command_executor.run([self.wg_binary, *args])
+        if not result.ok:
+            raise RuntimeError(f"wg {args[0]} 执行失败: {result.stderr.strip()}")
+        return result.stdout
+
+    async def dump(self, interface: str) -> Dict[str, PeerSpec]:
+        output = await self._run("show", interface, "dump")
+        return parse_wg_dump(output)
+
+    async def apply(self, interface: str, upserts: List[PeerSpec], removals: List[str]) -> None:
+        groups = [peer.wg_args() for peer in upserts]
+        groups.extend(["peer", public_key, "remove"] for public_key in removals)
+
+        for i in range(0, len(groups), WG_SET_BATCH_SIZE):
+            args = [arg for group in groups[i:i + WG_SET_BATCH_SIZE] for arg in group]
+            await self._run("set", interface, *args)
+
+
+class StubPeerBackend(PeerBackend):
+    """内存后端，用于测试和没有 `wg` 工具的开发环境"""
+
+    def __init__(self):
+        self.interfaces: Dict[str, Dict[str, PeerSpec]] = {}
+        self.calls: List[Tuple[str, List[PeerSpec], List[str]]] = []
+
+    async def dump(self, interface: str) -> Dict[str, PeerSpec]:
+        return dict(self.interfaces.get(interface, {}))
+
+    async def apply(self, interface: str, upserts: List[PeerSpec], removals: List[str]) -> None:
+        self.calls.append((interface, list(upserts), list(removals)))
+        peers = self.interfaces.setdefault(interface, {})
+        for peer in upserts:
+            peers[peer.public_key] = peer
+        for public_key in removals:
+            peers.pop(public_key, None)
+
+
+def parse_wg_dump(output: str) -> Dict[str, PeerSpec]:
+    """解析 `wg show <interface> dump` 输出（首行为接口自身信息）"""
+    peers: Dict[str, PeerSpec] = {}
+    for line in output.splitlines()[1:]:
+        fields = line.split("\t")
+        if len(fields) < 8:
+            continue
+        public_key, allowed_ips, keepalive = fields[0], fields[3], fields[7]
+        peers[public_key] = PeerSpec(
+            public_key=public_key,
+            allowed_ips=tuple(ip for ip in allowed_ips.split(",") if ip and ip != "(none)"),
+            persistent_keepalive=int(keepalive) if keepalive.isdigit() else 0,
+        )
+    return peers
+
+
+class _InterfaceState:
+    def __init__(self):
+        self.peers: Optional[Dict[str, PeerSpec]] = None
+        self.header: Optional[str] = None
+        self.config_path: Optional[str] = None
+        self.lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+
+
+class PeerReconciler:
+    """对等节点协调器
+
+    完整同步时按接口当前状态计算差异，只下发差异部分；配置文件由后台任务在静默
+    flush_delay 秒后写入一次。设置了 loader 时配置文件按 loader 读到的最新状态渲染
+    （重启后首次变更即可写入，也包含其他 worker 的变更），否则按本进程的快照渲染。
+    """
+
+    def __init__(self, backend: PeerBackend, flush_delay: float = 2.0,
+                 loader: Optional[InterfaceLoader] = None):
+        self.backend = backend
+        self.flush_delay = flush_delay
+        self.loader = loader
+        self._interfaces: Dict[str, _InterfaceState] = {}
+
+    def set_loader(self, loader: Optional[InterfaceLoader]) -> None:
+        """设置按接口读取配置和对等节点的协程函数"""
+        self.loader = loader
+
+    def _state(self, interface: str) -> _InterfaceState:
+        state = self._interfaces.get(interface)
+        if state is None:
+            state = self._interfaces[interface] = _InterfaceState()
+        return state
+
+    async def _snapshot(self, interface: str, state: _InterfaceState, refresh: bool = False) -> Dict[str, PeerSpec]:
+        """读取接口当前对等节点作为快照（refresh 为 False 时复用已有快照）"""
+        if state.peers is None or refresh:
+            try:
+                state.peers = await self.backend.dump(interface)
+            except Exception as e:
+                logger.warning(f"读取接口 {interface} 对等节点失败，使用本进程快照: {e}")
+                if state.peers is None:
+                    state.peers = {}
+        return state.peers
+
+    @staticmethod
+    def diff(current: Dict[str, PeerSpec], desired: Iterable[PeerSpec], partial: bool = False) -> PeerDiff:
+        """计算差异；partial 为 True 时不删除 desired 中未出现的节点"""
+        result = PeerDiff()
+        seen = set()
+        for peer in desired:
+            seen.add(peer.public_key)
+            existing = current.get(peer.public_key)
+            if existing is None:
+                result.added.append(peer)
+            elif existing != peer:
+                result.updated.append(peer)
+        if not partial:
+            result.removed = [key for key in current if key not in seen]
+        return result
+
+    async def _apply(self, interface: str, state: _InterfaceState, diff: PeerDiff) -> bool:
+        if diff.empty:
+            return True
+        try:
+            await self.backend.apply(interface, diff.added + diff.updated, diff.removed)
+        except Exception as e:
+            # 快照保持不变，下次同步时重试
+            logger.error(f"接口 {interface} 对等节点下发失败: {e}")
+            return False
+
+        for peer in diff.added + diff.updated:
+            state.peers[peer.public_key] = peer
+        for public_key in diff.removed:
+            state.peers.pop(public_key, None)
+        logger.info(
+            f"接口 {interface} 对等节点已同步: +{len(diff.added)} ~{len(diff.updated)} -{len(diff.removed)}"
+        )
+        self._schedule_flush(interface, state)
+        return True
+
+    def configure(self, interface: str, header: str, config_path: Optional[str]) -> None:
+        """设置接口的 [Interface] 段和配置文件路径"""
+        state = self._state(interface)
+        if state.header != header or state.config_path != config_path:
+            state.header = header
+            state.config_path = config_path
+            self._schedule_flush(interface, state)
+
+    async def sync(self, interface: str, desired: Iterable[PeerSpec]) -> PeerDiff:
+        """将接口同步为 desired 描述的完整对等节点集合（按接口的当前状态计算差异）"""
+        state = self._state(interface)
+        async with state.lock:
+            current = await self._snapshot(interface, state, refresh=True)
+            diff = self.diff(current, desired)
+            await self._apply(interface, state, diff)
+            return diff
+
+    async def upsert(self, interface: str, peer: PeerSpec, replaces: Optional[str] = None) -> bool:
+        """新增或更新单个对等节点；replaces 为旧公钥（密钥轮换时一并移除）"""
+        state = self._state(interface)
+        async with state.lock:
+            await self._snapshot(interface, state)
+            diff = PeerDiff(updated=[peer])
+            if replaces and replaces != peer.public_key:
+                diff.removed.append(replaces)
+            return await self._apply(interface, state, diff)
+
+    async def remove(self, interface: str, public_key: str) -> bool:
+        """删除单个对等节点（节点不存在时 `wg set ... remove` 不报错）"""
+        state = self._state(interface)
+        async with state.lock:
+            await self._snapshot(interface, state)
+            return await self._apply(interface, state, PeerDiff(removed=[public_key]))
+
+    def peers(self, interface: str) -> List[PeerSpec]:
+        state = self._interfaces.get(interface)
+        return list(state.peers.values()) if state and state.peers else []
+
+    def fragment(self, interface: str, peer: PeerSpec) -> str:
+        """返回节点的 [Peer] 段，快照中已有相同状态的实例时复用其缓存的片段"""
+        state = self._interfaces.get(interface)
+        existing = state.peers.get(peer.public_key) if state and state.peers else None
+        return (existing if existing == peer else peer).fragment
+
+    def render(self, interface: str) -> str:
+        """根据快照渲染完整的服务器配置"""
+        state = self._state(interface)
+        return "".join([state.header or "", *(peer.fragment for peer in (state.peers or {}).values())])
+
+    # 配置文件延迟写入
+    def _schedule_flush(self, interface: str, state: _InterfaceState) -> None:
+        if self.loader is None and (not state.config_path or state.header is None):
+            return
+        if state.flush_task and not state.flush_task.done():
+            return
+        try:
+            state.flush_task = asyncio.get_running_loop().create_task(self._delayed_flush(interface))
+        except RuntimeError:
+            # 没有运行中的事件循环（脚本调用），直接写入
+            self._write(interface)
+
+    async def _delayed_flush(self, interface: str) -> None:
+        await asyncio.sleep(self.flush_delay)
+        await self.flush(interface)
+
+    async def flush(self, interface: str) -> None:
+        """立即写入接口配置文件（原子替换，内容未变化时跳过）"""
+        state = self._state(interface)
+        if self.loader is not None:
+            try:
+                loaded = await self.loader(interface)
+            except Exception as e:
+                logger.error(f"读取接口 {interface} 的配置失败，跳过写入配置文件: {e}")
+                return
+            if loaded is None:
+                return
+            header, state.config_path, peers = loaded
+            state.header = header
+            content = "".join([header, *(self.fragment(interface, peer) for peer in peers)])
+        else:
+            async with state.lock:
+                content = self.render(interface)
+        if state.config_path:
+            try:
+                await asyncio.to_thread(config_file_writer.write, state.config_path, content)
+            except OSError:
+                pass  # 已记录日志，下次变更时重试
+
+    def _write(self, interface: str) -> None:
+        state = self._state(interface)
+        if state.config_path and state.header is not None:
+            try:
+                config_file_writer.write(state.config_path, self.render(interface))
+            except OSError:
+                pass  # 已记录日志，下次变更时重试
+
+    async def flush_all(self) -> None:
+        """取消等待中的延迟写入并立即写入所有接口（应用关闭时调用）"""
+        for interface, state in self._interfaces.items():
+            if state.flush_task and not state.flush_task.done():
+                state.flush_task.cancel()
+                await self.flush(interface)
+
+
+def _create_backend() -> PeerBackend:
+    backend = getattr(settings, "WIREGUARD_SYNC_BACKEND", "auto")
+    if backend == "stub":
+        return StubPeerBackend()
+    wg_binary = shutil.which("wg")
+    if wg_binary:
+        return WgCommandBackend(wg_binary)
+    if backend == "wg":
+        logger.warning("未找到 wg 命令，对等节点将无法下发到接口")
+        return WgCommandBackend()
+    logger.info("未找到 wg 命令，使用内存后端同步对等节点")
+    return StubPeerBackend()
+
+
+# 全局协调器实例
+peer_reconciler = PeerReconciler(
+    _create_backend(),
+    flush_delay=getattr(settings, "WIREGUARD_CONFIG_FLUSH_DELAY", 2.0),
+)
@@ -0,0 +1,398 @@
+"""
+WireGuard对等节点遥测采集
+按固定间隔执行一次 `wg show all dump`，计算每个对等节点的流量增量，
+近期采样保存在共享时间轴的数组环形缓冲区中，每个周期批量回写数据库。
+每个 worker 都采样（供本进程查询），但只有持有执行者锁的 worker 回写数据库，
+否则同一增量会按 worker 数量重复累加。
+"""
+import asyncio
+import shutil
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, select, update
+
+from ..core.unified_config import settings
+from ..core.logging import get_logger
+from ..core.command_executor import command_executor
+from ..core.leader import leader_lock
+
+logger = get_logger(__name__)
+
+# 每条 UPDATE 语句携带的对等节点数
+UPDATE_CHUNK_SIZE = 1000
+# `wg show all dump` 输出上限（5万个对等节点约 10MB）
+MAX_DUMP_BYTES = 64 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class PeerCounters:
+    """`wg show all dump` 中一个对等节点的当前状态"""
+    interface: str
+    public_key: str
+    endpoint: Optional[str]
+    allowed_ips: str
+    latest_handshake: int
+    transfer_rx: int
+    transfer_tx: int
+
+
+def parse_wg_show_all_dump(output: str) -> List[PeerCounters]:
+    """解析 `wg show all dump` 输出
+
+    接口行有5个字段，对等节点行有9个字段：
+    interface public-key preshared-key endpoint allowed-ips latest-handshake transfer-rx transfer-tx persistent-keepalive
+    """
+    peers = []
+    for line in output.splitlines():
+        fields = line.split("\t")
+        if len(fields) != 9:
+            continue
+        try:
+            peers.append(PeerCounters(
+                interface=fields[0],
+                public_key=fields[1],
+                endpoint=None if fields[3] == "(none)" else fields[3],
+                allowed_ips=fields[4],
+                latest_handshake=int(fields[5]),
+                transfer_rx=int(fields[6]),
+                transfer_tx=int(fields[7]),
+            ))
+        except ValueError:
+            continue
+    return peers
+
+
+@dataclass
+class PeerChange:
+    """一个周期内需要回写数据库的变化"""
+    public_key: str
+    rx_delta: int
+    tx_delta: int
+    latest_handshake: int
+
+
+class PeerTelemetryRing:
+    """所有对等节点共享时间轴的环形缓冲区
+
+    每个周期写入一列：时间戳只保存一份，各对等节点的收发增量保存在按
+    槽位 * capacity 展开的 array('Q') 中，5万个节点、30个采样约占 24MB，
+    没有逐节点的 Python 对象开销。连续 capacity 个周期未出现的节点释放槽位。
+    """
+
+    def __init__(self, capacity: int = 30):
+        self.capacity = capacity
+        self.timestamps = array('d', [0.0] * capacity)
+        self.head = 0  # 下一次写入的列
+        self.count = 0
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._rx = array('Q')
+        self._tx = array('Q')
+        self._last_rx = array('Q')
+        self._last_tx = array('Q')
+        self._handshake = array('Q')
+        self._last_cycle = array('Q')
+        self._meta: List[Optional[Tuple[str, Optional[str]]]] = []  # (interface, endpoint)
+        self.cycles = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _allocate(self, public_key: str) -> int:
+        if self._free:
+            slot = self._free.pop()
+            # 复用槽位时清除上一个节点的历史
+            start = slot * self.capacity
+            for column in (self._rx, self._tx):
+                column[start:start + self.capacity] = array('Q', bytes(8 * self.capacity))
+            for column in (self._last_rx, self._last_tx, self._handshake):
+                column[slot] = 0
+        else:
+            slot = len(self._meta)
+            zeros = array('Q', bytes(8 * self.capacity))
+            self._rx.extend(zeros)
+            self._tx.extend(zeros)
+            for column in (self._last_rx, self._last_tx, self._handshake, self._last_cycle):
+                column.append(0)
+            self._meta.append(None)
+        self._slots[public_key] = slot
+        return slot
+
+    def record(self, timestamp: float, peers: Iterable[PeerCounters]) -> List[PeerChange]:
+        """写入一个周期的采样，返回流量或握手时间发生变化的节点"""
+        cap = self.capacity
+        pos = self.head
+        self.cycles += 1
+        cycle = self.cycles
+        rx, tx = self._rx, self._tx
+        last_rx, last_tx = self._last_rx, self._last_tx
+        changes: List[PeerChange] = []
+
+        for peer in peers:
+            slot = self._slots.get(peer.public_key)
+            first_seen = slot is None
+            if first_seen:
+                slot = self._allocate(peer.public_key)
+
+            if first_seen:
+                # 首次看到的节点只建立基线，避免应用重启后重复累计接口计数
+                rx_delta = tx_delta = 0
+            else:
+                # 计数器变小说明接口重建过，本周期增量即为当前计数
+                rx_delta = peer.transfer_rx - last_rx[slot]
+                if rx_delta < 0:
+                    rx_delta = peer.transfer_rx
+                tx_delta = peer.transfer_tx - last_tx[slot]
+                if tx_delta < 0:
+                    tx_delta = peer.transfer_tx
+
+            index = slot * cap + pos
+            rx[index] = rx_delta
+            tx[index] = tx_delta
+            last_rx[slot] = peer.transfer_rx
+            last_tx[slot] = peer.transfer_tx
+            self._meta[slot] = (peer.interface, peer.endpoint)
+            self._last_cycle[slot] = cycle
+
+            if rx_delta or tx_delta or (peer.latest_handshake and peer.latest_handshake != self._handshake[slot]):
+                changes.append(PeerChange(peer.public_key, rx_delta, tx_delta, peer.latest_handshake))
+            self._handshake[slot] = peer.latest_handshake
+
+        # 本周期未出现的节点：清零当前列，长期缺席的释放槽位
+        stale = []
+        for public_key, slot in self._slots.items():
+            seen = self._last_cycle[slot]
+            if seen != cycle:
+                index = slot * cap + pos
+                rx[index] = 0
+                tx[index] = 0
+                if cycle - seen >= cap:
+                    stale.append(public_key)
+        for public_key in stale:
+            slot = self._slots.pop(public_key)
+            self._meta[slot] = None
+            self._free.append(slot)
+
+        self.timestamps[pos] = timestamp
+        self.head = (pos + 1) % cap
+        self.count = min(self.count + 1, cap)
+        return changes
+
+    def _positions(self, limit: Optional[int]) -> List[int]:
+        count = min(self.count, limit) if limit else self.count
+        return [(self.head - count + i) % self.capacity for i in range(count)]
+
+    def history(self, public_key: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按时间顺序返回节点的近期增量采样"""
+        slot = self._slots.get(public_key)
+        if slot is None:
+            return []
+        base = slot * self.capacity
+        return [{
+            "timestamp": self.timestamps[pos],
+            "rx_bytes": self._rx[base + pos],
+            "tx_bytes": self._tx[base + pos],
+        } for pos in self._positions(limit)]
+
+    def latest(self, public_key: str) -> Optional[Dict[str, Any]]:
+        """节点的当前状态和最近一个周期的速率（字节/秒）"""
+        slot = self._slots.get(public_key)
+        if slot is None:
+            return None
+        interface, endpoint = self._meta[slot]
+        rx_rate = tx_rate = 0.0
+        if self.count >= 2 and self._last_cycle[slot] == self.cycles:
+            pos = (self.head - 1) % self.capacity
+            elapsed = self.timestamps[pos] - self.timestamps[(pos - 1) % self.capacity]
+            if elapsed > 0:
+                rx_rate = self._rx[slot * self.capacity + pos] / elapsed
+                tx_rate = self._tx[slot * self.capacity + pos] / elapsed
+        return {
+            "interface": interface,
+            "endpoint": endpoint,
+            "latest_handshake": self._handshake[slot],
+            "transfer_rx": self._last_rx[slot],
+            "transfer_tx": self._last_tx[slot],
+            "rx_rate": rx_rate,
+            "tx_rate": tx_rate,
+            "present": self._last_cycle[slot] == self.cycles,
+        }
+
+    def memory_bytes(self) -> int:
+        arrays = (self._rx, self._tx, self._last_rx, self._last_tx, self._handshake, self._last_cycle)
+        return sum(a.itemsize * len(a) for a in arrays) + self.timestamps.itemsize * self.capacity
+
+
+class PeerTelemetryCollector:
+    """对等节点遥测采集器"""
+
+    def __init__(self, interval: float = 10.0, history: int = 30, wg_binary: Optional[str] = None,
+                 persist: bool = True):
+        self.interval = interval
+        self.wg_binary = wg_binary
+        self.persist = persist
+        self.ring = PeerTelemetryRing(history)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._client_ids: Dict[str, int] = {}
+        self._ids_loaded_at = 0.0
+        self._leader = leader_lock("wireguard-telemetry")
+        self.stats = {
+            "cycles": 0,
+            "failures": 0,
+            "peers": 0,
+            "last_cycle_at": 0.0,
+            "last_duration": 0.0,
+            "last_changes": 0,
+            "rows_updated": 0,
+        }
+
+    # 采集
+    async def _dump(self) -> str:
+        result = await command_executor.run(
+            [self.wg_binary, "show", "all", "dump"], max_output_bytes=MAX_DUMP_BYTES
+        )
+        if not result.ok:
+            raise RuntimeError(f"wg show all dump 执行失败: {result.stderr.strip()}")
+        if result.truncated:
+            raise RuntimeError("wg show all dump 输出超过上限")
+        return result.stdout
+
+    def ingest(self, output: str, timestamp: Optional[float] = None) -> List[PeerChange]:
+        """解析一次 dump 输出并写入环形缓冲区（在线程中执行）"""
+        peers = parse_wg_show_all_dump(output)
+        with self._lock:
+            changes = self.ring.record(timestamp or time.time(), peers)
+        self.stats["peers"] = len(peers)
+        return changes
+
+    async def collect_once(self) -> List[PeerChange]:
+        """执行一个采集周期：dump -> 计算增量 -> 批量回写"""
+        started = time.perf_counter()
+        output = await self._dump()
+        changes = await asyncio.to_thread(self.ingest, output)
+        if self.persist and changes and self._leader.try_acquire():
+            await self._write_back(changes)
+        self.stats["cycles"] += 1
+        self.stats["last_cycle_at"] = time.time()
+        self.stats["last_duration"] = time.perf_counter() - started
+        self.stats["last_changes"] = len(changes)
+        return changes
+
+    # 数据库回写
+    async def _load_client_ids(self, session) -> None:
+        from ..models import WireGuardClient
+
+        result = await session.execute(select(WireGuardClient.public_key, WireGuardClient.id))
+        self._client_ids = dict(result.tuples().all())
+        self._ids_loaded_at = time.monotonic()
+
+    async def _write_back(self, changes: List[PeerChange]) -> None:
+        """一个事务内按主键批量更新 last_handshake 和流量计数（CASE 表达式，每条语句最多 UPDATE_CHUNK_SIZE 行）"""
+        from ..core.database_manager import database_manager
+        from ..models import WireGuardClient
+
+        table = WireGuardClient.__table__
+        async with database_manager.get_session() as session:
+            # 出现未知公钥（新客户端或密钥轮换）时刷新公钥 -> ID 映射，最多每30秒一次
+            if not self._client_ids or (
+                any(change.public_key not in self._client_ids for change in changes)
+                and time.monotonic() - self._ids_loaded_at > 30
+            ):
+                await self._load_client_ids(session)
+
+            rows = [(self._client_ids[c.public_key], c) for c in changes if c.public_key in self._client_ids]
+            updated = 0
+            for i in range(0, len(rows), UPDATE_CHUNK_SIZE):
+                chunk = rows[i:i + UPDATE_CHUNK_SIZE]
+                ids = [client_id for client_id, _ in chunk]
+                seen = {
+                    client_id: datetime.fromtimestamp(c.latest_handshake, tz=timezone.utc)
+                    for client_id, c in chunk if c.latest_handshake
+                }
+                values = {
+                    "bytes_received": table.c.bytes_received + case(
+                        {client_id: c.rx_delta for client_id, c in chunk}, value=table.c.id, else_=0
+                    ),
+                    "bytes_sent": table.c.bytes_sent + case(
+                        {client_id: c.tx_delta for client_id, c in chunk}, value=table.c.id, else_=0
+                    ),
+                }
+                if seen:
+                    values["last_handshake"] = case(seen, value=table.c.id, else_=table.c.last_handshake)
+                result = await session.execute(update(table).where(table.c.id.in_(ids)).values(**values))
+                updated += result.rowcount or 0
+        self.stats["rows_updated"] += updated
+
+    # 生命周期
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.collect_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failures"] += 1
+                logger.warning(f"WireGuard遥测采集失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """启动后台采集任务（找不到 wg 命令时不启动）"""
+        if self._task and not self._task.done():
+            return
+        self.wg_binary = self.wg_binary or shutil.which("wg")
+        if not self.wg_binary:
+            logger.info("未找到 wg 命令，WireGuard遥测采集未启动")
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"WireGuard遥测采集已启动，间隔 {self.interval}s")
+
+    async def stop(self) -> None:
+        """停止后台采集任务"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._leader.release()
+
+    @property
+    def is_writer(self) -> bool:
+        """本进程是否为回写数据库的执行者"""
+        return self._leader.held
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # 查询
+    def peer(self, public_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.ring.latest(public_key)
+
+    def history(self, public_key: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self.ring.history(public_key, limit)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "running": self.running,
+            "writer": self.is_writer,
+            "tracked_peers": len(self.ring),
+            "ring_bytes": self.ring.memory_bytes(),
+        }
+
+
+# 全局遥测采集器
+peer_telemetry = PeerTelemetryCollector(
+    interval=getattr(settings, "WIREGUARD_TELEMETRY_INTERVAL", 10.0),
+    history=getattr(settings, "WIREGUARD_TELEMETRY_HISTORY", 30),
+)
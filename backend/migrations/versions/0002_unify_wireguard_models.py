@@ -0,0 +1,96 @@
+"""Unify WireGuard server/client tables on models_complete
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+服务层使用的隧道地址、空闲区间索引、MTU、配置文件路径等列合并到 wireguard_servers /
+wireguard_clients。表可能已由 create_all 按任一版本的模型创建，逐列检查后补齐。
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+_LONGTEXT = sa.Text().with_variant(mysql.LONGTEXT(), "mysql")
+
+SERVER_COLUMNS = [
+    sa.Column('ipv4_address', sa.String(length=45), nullable=True),
+    sa.Column('ipv6_address', sa.String(length=45), nullable=True),
+    sa.Column('dns_servers', sa.JSON(), nullable=True),
+    sa.Column('mtu', sa.Integer(), server_default='1420', nullable=False),
+    sa.Column('config_file_path', sa.Text(), nullable=True),
+    sa.Column('ipv4_free_ranges', _LONGTEXT, nullable=True),
+    sa.Column('ipv6_free_ranges', _LONGTEXT, nullable=True),
+]
+
+CLIENT_COLUMNS = [
+    sa.Column('ipv4_address', sa.String(length=45), nullable=True),
+    sa.Column('ipv6_address', sa.String(length=45), nullable=True),
+    sa.Column('persistent_keepalive', sa.Integer(), server_default='25', nullable=False),
+    sa.Column('config_file_path', sa.Text(), nullable=True),
+]
+
+# (表, 列, 现有类型) —— 服务层创建的行没有创建者，地址由 ipv4/ipv6 列表示
+NULLABLE_COLUMNS = [
+    ('wireguard_servers', 'address', sa.String(length=100)),
+    ('wireguard_servers', 'created_by', sa.Integer()),
+    ('wireguard_clients', 'allowed_ips', sa.String(length=255)),
+    ('wireguard_clients', 'created_by', sa.Integer()),
+]
+
+CLIENT_UNIQUE = [
+    ('uq_wg_client_server_ipv4', ['server_id', 'ipv4_address']),
+    ('uq_wg_client_server_ipv6', ['server_id', 'ipv6_address']),
+]
+
+
+def _columns(inspector, table):
+    return {column['name']: column for column in inspector.get_columns(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    for table, columns in (('wireguard_servers', SERVER_COLUMNS), ('wireguard_clients', CLIENT_COLUMNS)):
+        if table not in tables:
+            continue
+        existing = _columns(inspector, table)
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column.copy())
+
+    for table, name, type_ in NULLABLE_COLUMNS:
+        if table in tables and not _columns(inspector, table).get(name, {}).get('nullable', True):
+            op.alter_column(table, name, existing_type=type_, nullable=True)
+
+    if 'wireguard_clients' in tables:
+        constraints = {c['name'] for c in inspector.get_unique_constraints('wireguard_clients')}
+        for name, columns in CLIENT_UNIQUE:
+            if name not in constraints:
+                op.create_unique_constraint(name, 'wireguard_clients', columns)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'wireguard_clients' in tables:
+        constraints = {c['name'] for c in inspector.get_unique_constraints('wireguard_clients')}
+        for name, _ in CLIENT_UNIQUE:
+            if name in constraints:
+                op.drop_constraint(name, 'wireguard_clients', type_='unique')
+
+    for table, columns in (('wireguard_servers', SERVER_COLUMNS), ('wireguard_clients', CLIENT_COLUMNS)):
+        if table not in tables:
+            continue
+        existing = _columns(inspector, table)
+        for column in columns:
+            if column.name in existing:
+                op.drop_column(table, column.name)
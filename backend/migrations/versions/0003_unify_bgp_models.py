@@ -0,0 +1,55 @@
+"""Unify BGP session/announcement tables on models_complete
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+ExaBGP配置生成和RPKI校验使用的会话密码、宣告下一跳和起源AS合并到 bgp_sessions /
+bgp_announcements。表可能已由 create_all 按任一版本的模型创建，逐列检查后补齐。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ('bgp_sessions', sa.Column('password', sa.String(length=128), nullable=True)),
+    ('bgp_announcements', sa.Column('next_hop', sa.String(length=128), nullable=True)),
+    ('bgp_announcements', sa.Column('asn', sa.Integer(), nullable=True)),
+]
+
+# 由API或分配即宣告创建的行没有创建者
+NULLABLE_COLUMNS = [
+    ('bgp_sessions', 'created_by', sa.Integer()),
+    ('bgp_announcements', 'created_by', sa.Integer()),
+]
+
+
+def _columns(inspector, table):
+    return {column['name']: column for column in inspector.get_columns(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    for table, column in COLUMNS:
+        if table in tables and column.name not in _columns(inspector, table):
+            op.add_column(table, column.copy())
+
+    for table, name, type_ in NULLABLE_COLUMNS:
+        if table in tables and not _columns(inspector, table).get(name, {}).get('nullable', True):
+            op.alter_column(table, name, existing_type=type_, nullable=True)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    for table, column in COLUMNS:
+        if table in tables and column.name in _columns(inspector, table):
+            op.drop_column(table, column.name)
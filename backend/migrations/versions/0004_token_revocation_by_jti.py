@@ -0,0 +1,112 @@
+"""Key blacklisted_tokens by jti, add user_token_watermarks
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00.000000
+
+令牌撤销记录改为按 jti 保存（不再保存令牌原文），按用户撤销改用水位线表。
+旧表中的记录按 TokenBlacklist 的规则换算为键：有 jti 的令牌取 jti，否则取令牌的 SHA-256。
+"""
+import base64
+import hashlib
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def _token_key(token: str) -> str:
+    """与 app.core.token_blacklist.token_key 相同的换算（迁移不导入应用代码）"""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        if isinstance(claims, dict) and claims.get('jti'):
+            return str(claims['jti'])[:128]
+    except (IndexError, ValueError):
+        pass
+    return 'sha256:' + hashlib.sha256(token.encode()).hexdigest()
+
+
+def _create_blacklisted_tokens() -> None:
+    op.create_table(
+        'blacklisted_tokens',
+        sa.Column('jti', sa.String(length=128), primary_key=True),
+        sa.Column('expires_at', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('user_id', sa.String(length=64), nullable=True),
+        sa.Column('reason', sa.String(length=255), nullable=True),
+    )
+    op.create_index('ix_blacklisted_tokens_expires_at', 'blacklisted_tokens', ['expires_at'])
+    op.create_index('ix_blacklisted_tokens_user_id', 'blacklisted_tokens', ['user_id'])
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    if 'blacklisted_tokens' not in tables:
+        _create_blacklisted_tokens()
+    elif 'jti' not in {column['name'] for column in inspector.get_columns('blacklisted_tokens')}:
+        old = sa.table(
+            'blacklisted_tokens',
+            sa.column('token', sa.String), sa.column('expires_at', sa.Float), sa.column('created_at', sa.DateTime),
+            sa.column('user_id', sa.String), sa.column('reason', sa.String),
+        )
+        rows = {}
+        for token, expires_at, created_at, user_id, reason in bind.execute(
+            sa.select(old.c.token, old.c.expires_at, old.c.created_at, old.c.user_id, old.c.reason)
+        ):
+            key = _token_key(token)
+            if key not in rows or rows[key]['expires_at'] < expires_at:
+                rows[key] = {
+                    'jti': key, 'expires_at': expires_at, 'created_at': created_at,
+                    'user_id': user_id[:64] if user_id else None, 'reason': reason[:255] if reason else None,
+                }
+        op.drop_table('blacklisted_tokens')
+        _create_blacklisted_tokens()
+        if rows:
+            new = sa.table(
+                'blacklisted_tokens',
+                sa.column('jti', sa.String), sa.column('expires_at', sa.Float), sa.column('created_at', sa.DateTime),
+                sa.column('user_id', sa.String), sa.column('reason', sa.String),
+            )
+            op.bulk_insert(new, list(rows.values()))
+
+    if 'user_token_watermarks' not in tables:
+        op.create_table(
+            'user_token_watermarks',
+            sa.Column('user_id', sa.String(length=64), primary_key=True),
+            sa.Column('revoked_before', sa.Float(), nullable=False),
+            sa.Column('expires_at', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_user_token_watermarks_expires_at', 'user_token_watermarks', ['expires_at'])
+
+
+def downgrade() -> None:
+    # 旧表保存令牌原文，无法从 jti 还原，降级后撤销记录为空
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'user_token_watermarks' in tables:
+        op.drop_table('user_token_watermarks')
+    if 'blacklisted_tokens' in tables:
+        op.drop_table('blacklisted_tokens')
+    op.create_table(
+        'blacklisted_tokens',
+        sa.Column('id', sa.String(length=36), primary_key=True),
+        sa.Column('token', sa.String(length=512), nullable=False, unique=True),
+        sa.Column('expires_at', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('user_id', sa.String(length=64), nullable=True),
+        sa.Column('reason', sa.String(length=255), nullable=True),
+    )
+    op.create_index('idx_token_expires', 'blacklisted_tokens', ['token', 'expires_at'])
+    op.create_index('idx_user_expires', 'blacklisted_tokens', ['user_id', 'expires_at'])
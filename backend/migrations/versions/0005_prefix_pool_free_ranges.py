@@ -0,0 +1,72 @@
+"""Add prefix pool free range storage
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00.000000
+
+ipv6_prefix_pools 的空闲区间索引（PrefixFreeIndex.dumps 的JSON）保存在 free_ranges 列；
+prefix_pools 的空闲区间按行保存在 pool_free_ranges 表，free_ranges_built 为假时下次分配
+按已占用前缀重建，因此都不需要回填。pool_prefixes 补齐 (pool_id, prefix) 索引，
+分配/释放按池和前缀查找记录。表可能已由 create_all 创建，逐项检查后补齐。
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+_LONGTEXT = sa.Text().with_variant(mysql.LONGTEXT(), "mysql")
+
+
+def _columns(inspector, table):
+    return {column['name'] for column in inspector.get_columns(table)}
+
+
+def _indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'ipv6_prefix_pools' in tables and 'free_ranges' not in _columns(inspector, 'ipv6_prefix_pools'):
+        op.add_column('ipv6_prefix_pools', sa.Column('free_ranges', _LONGTEXT, nullable=True))
+
+    if 'prefix_pools' in tables:
+        if 'free_ranges_built' not in _columns(inspector, 'prefix_pools'):
+            op.add_column('prefix_pools', sa.Column(
+                'free_ranges_built', sa.Boolean(), nullable=False, server_default=sa.false()
+            ))
+        if 'pool_free_ranges' not in tables:
+            op.create_table(
+                'pool_free_ranges',
+                sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+                sa.Column('pool_id', sa.Integer(), sa.ForeignKey('prefix_pools.id', ondelete='CASCADE'),
+                          nullable=False),
+                sa.Column('start_slot', sa.String(length=32), nullable=False),
+                sa.Column('end_slot', sa.String(length=32), nullable=False),
+            )
+            op.create_index('idx_pool_free_ranges_pool_start', 'pool_free_ranges',
+                            ['pool_id', 'start_slot'], unique=True)
+
+    if 'pool_prefixes' in tables and 'idx_pool_prefixes_pool_prefix' not in _indexes(inspector, 'pool_prefixes'):
+        op.create_index('idx_pool_prefixes_pool_prefix', 'pool_prefixes', ['pool_id', 'prefix'])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'pool_prefixes' in tables and 'idx_pool_prefixes_pool_prefix' in _indexes(inspector, 'pool_prefixes'):
+        op.drop_index('idx_pool_prefixes_pool_prefix', table_name='pool_prefixes')
+    if 'pool_free_ranges' in tables:
+        op.drop_table('pool_free_ranges')
+    if 'prefix_pools' in tables and 'free_ranges_built' in _columns(inspector, 'prefix_pools'):
+        op.drop_column('prefix_pools', 'free_ranges_built')
+    if 'ipv6_prefix_pools' in tables and 'free_ranges' in _columns(inspector, 'ipv6_prefix_pools'):
+        op.drop_column('ipv6_prefix_pools', 'free_ranges')
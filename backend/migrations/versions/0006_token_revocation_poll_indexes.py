@@ -0,0 +1,44 @@
+"""Index token revocation write times
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00.000000
+
+没有Redis时各worker按写入时间增量拉取撤销记录（created_at / updated_at 大于上次拉取时间），
+为这两列建立索引，避免每个拉取周期扫描全表。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_blacklisted_tokens_created_at', 'blacklisted_tokens', 'created_at'),
+    ('ix_user_token_watermarks_updated_at', 'user_token_watermarks', 'updated_at'),
+]
+
+
+def _indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    for name, table, column in INDEXES:
+        if table in tables and name not in _indexes(inspector, table):
+            op.create_index(name, table, [column])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    for name, table, column in INDEXES:
+        if table in tables and name in _indexes(inspector, table):
+            op.drop_index(name, table_name=table)
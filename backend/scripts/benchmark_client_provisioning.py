@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+批量开通客户端吞吐基准测试
+比较逐个生成（与单个创建接口相同的密钥生成 + 配置渲染 + QR码）
+和进程池分块并行生成的吞吐（客户端/秒）；数据库写入不在测试范围内
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.wireguard_render import generate_keypair, render_client_config, render_qr_code, provision_clients
+
+SERVER = {
+    "public_key": generate_keypair()[1],
+    "ipv4_address": "10.0.0.1",
+    "ipv6_address": "fd00::1",
+    "listen_port": 51820,
+    "dns_servers": ["1.1.1.1", "2606:4700:4700::1111"],
+}
+
+
+def make_specs(count: int) -> list:
+    return [{
+        "ipv4_address": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}/32",
+        "ipv6_address": f"fd00::{i + 2:x}/128",
+        "allowed_ips": ["0.0.0.0/0", "::/0"],
+        "persistent_keepalive": 25,
+    } for i in range(count)]
+
+
+def bench_serial(specs: list, with_qr_code: bool) -> float:
+    start = time.perf_counter()
+    for spec in specs:
+        private_key, _ = generate_keypair()
+        config = render_client_config(SERVER, {**spec, "private_key": private_key})
+        if with_qr_code:
+            render_qr_code(config)
+    return time.perf_counter() - start
+
+
+def bench_pool(specs: list, with_qr_code: bool, workers: int, chunk_size: int) -> float:
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # 预热，排除进程启动时间
+        list(pool.map(provision_clients, [SERVER] * workers, [specs[:1]] * workers))
+        start = time.perf_counter()
+        chunks = [specs[i:i + chunk_size] for i in range(0, len(specs), chunk_size)]
+        futures = [pool.submit(provision_clients, SERVER, chunk, with_qr_code) for chunk in chunks]
+        count = sum(len(future.result()) for future in futures)
+        assert count == len(specs)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量开通客户端吞吐基准测试")
+    parser.add_argument("--clients", type=int, default=2000, help="客户端数量")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="进程数")
+    parser.add_argument("--chunk-size", type=int, default=50, help="每个进程池任务处理的客户端数")
+    parser.add_argument("--no-qr", action="store_true", help="不生成QR码")
+    args = parser.parse_args()
+
+    specs = make_specs(args.clients)
+    with_qr_code = not args.no_qr
+
+    serial = bench_serial(specs, with_qr_code)
+    pooled = bench_pool(specs, with_qr_code, args.workers, args.chunk_size)
+
+    print(f"客户端数: {args.clients}  QR码: {'是' if with_qr_code else '否'}  进程数: {args.workers}")
+    print(f"{'方式':<12}{'耗时(s)':>10}{'客户端/秒':>14}")
+    print(f"{'逐个生成':<12}{serial:>10.2f}{args.clients / serial:>14.0f}")
+    print(f"{'进程池':<12}{pooled:>10.2f}{args.clients / pooled:>14.0f}")
+    print(f"加速比: {serial / pooled:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+ExaBGP 进程API通道基准测试
+启动 exabgp_api_bridge.py，由本脚本扮演 ExaBGP（读取桥接进程输出的命令并逐条
+回复 done/error、推送JSON事件），测量单条路由变更的确认延迟和批量下发吞吐，
+并检查确认顺序、错误传递和事件转发
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import tempfile
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.exabgp_api import ExaBGPAPIChannel, ExaBGPCommandError, route_command
+
+BRIDGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exabgp_api_bridge.py")
+REJECTED = "2001:db8:dead::/48"
+
+
+async def fake_exabgp(proc: asyncio.subprocess.Process, received: list) -> None:
+    """读取桥接进程发给 ExaBGP 的命令并确认；REJECTED 前缀回复 error"""
+    while True:
+        line = await proc.stdout.readline()
+        if not line:
+            return
+        command = line.decode().strip()
+        received.append(command)
+        proc.stdin.write(b"error\n" if REJECTED in command else b"done\n")
+        if len(received) % 1000 == 0:
+            event = {"type": "state", "neighbor": {"address": {"peer": "192.0.2.1"}, "state": "up"}}
+            proc.stdin.write(json.dumps(event).encode() + b"\n")
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(args) -> int:
+    socket_path = os.path.join(tempfile.mkdtemp(), "exabgp.sock")
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, BRIDGE, "--socket", socket_path, "--window", str(args.window),
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+    )
+    received = []
+    exabgp = asyncio.create_task(fake_exabgp(proc, received))
+
+    channel = ExaBGPAPIChannel(socket_path, batch_size=args.batch)
+    events = []
+    channel.add_event_handler(events.append)
+    channel.start()
+    for _ in range(100):
+        if channel.connected:
+            break
+        await asyncio.sleep(0.05)
+
+    failures = []
+    try:
+        # 单条路由变更延迟
+        latencies = []
+        for i in range(args.single):
+            start = time.perf_counter()
+            await channel.announce(f"2001:db8:{i:x}::/48")
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"单条宣告确认延迟: p50 {percentile(latencies, 0.5):.3f}ms  p99 {percentile(latencies, 0.99):.3f}ms")
+
+        # 批量下发吞吐
+        commands = [route_command("announce", f"2001:db8:{i >> 16:x}:{i & 0xffff:x}::/64")
+                    for i in range(args.routes)]
+        start = time.perf_counter()
+        await asyncio.gather(*(channel.send(commands[i:i + 500]) for i in range(0, len(commands), 500)))
+        elapsed = time.perf_counter() - start
+        print(f"批量宣告 {args.routes} 条: {elapsed:.2f}s ({args.routes / elapsed:.0f} 条/秒, "
+              f"{channel.stats['batches']} 次写入)")
+
+        # 错误确认只影响对应命令
+        try:
+            await channel.send([route_command("announce", "2001:db8:1::/48"),
+                                route_command("announce", REJECTED)])
+            failures.append("被拒绝的命令没有报错")
+        except ExaBGPCommandError as e:
+            print(f"错误传递: {e}")
+        await channel.withdraw("2001:db8:1::/48")
+
+        expected = args.single + args.routes + 3
+        if len(received) != expected:
+            failures.append(f"ExaBGP收到 {len(received)} 条命令，预期 {expected}")
+        if received[args.single:args.single + args.routes] != commands:
+            failures.append("命令顺序与发送顺序不一致")
+        if len(events) != len(received) // 1000:
+            failures.append(f"收到 {len(events)} 个事件，预期 {len(received) // 1000}")
+        print(f"统计: {channel.get_stats()}")
+    finally:
+        await channel.stop()
+        proc.stdin.close()
+        await proc.wait()
+        exabgp.cancel()
+
+    print("通过" if not failures else "失败: " + "; ".join(failures))
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ExaBGP进程API通道基准测试")
+    parser.add_argument("--single", type=int, default=1000, help="逐条宣告的次数（测延迟）")
+    parser.add_argument("--routes", type=int, default=50000, help="批量宣告的路由数量（测吞吐）")
+    parser.add_argument("--batch", type=int, default=64, help="每次写入合并的命令数")
+    parser.add_argument("--window", type=int, default=256, help="桥接进程允许未确认的命令数")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+防火墙规则编译基准测试
+生成指定数量的规则，测量校验+编译为 iptables-restore 载荷的耗时，
+以及规则集未变化时重新加载（摘要比较）的耗时
+"""
+import os
+import sys
+import time
+import argparse
+import asyncio
+from types import SimpleNamespace
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.firewall_compiler import FirewallCompiler, FirewallApplier
+from app.core.command_executor import CommandResult
+
+
+class DryRunExecutor:
+    """不执行命令，只记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def run(self, args, input_data=None, timeout=None, **kwargs):
+        self.calls += 1
+        return CommandResult(tuple(args), 0, "", "", 0.0)
+
+
+def make_rules(count: int):
+    rules = []
+    for i in range(count):
+        rules.append(SimpleNamespace(
+            id=i + 1,
+            name=f"rule-{i}",
+            table_name="filter",
+            chain_name="INPUT",
+            action="ACCEPT" if i % 2 else "DROP",
+            rule_spec=f"-p tcp -s 10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}/32 --dport {1024 + i % 60000}",
+            priority=i % 10,
+            is_active=True,
+        ))
+    return rules
+
+
+def validator(table_name, chain_name, action, rule_spec):
+    return table_name in {"filter", "nat", "mangle", "raw"} and action in {"ACCEPT", "DROP", "REJECT"}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="防火墙规则编译基准测试")
+    parser.add_argument("--rules", type=int, default=10000, help="规则数量")
+    args = parser.parse_args()
+
+    rules = make_rules(args.rules)
+    compiler = FirewallCompiler(validator)
+    executor = DryRunExecutor()
+    applier = FirewallApplier(executor)
+
+    start = time.perf_counter()
+    ruleset = compiler.compile(rules)
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    first = await applier.apply(ruleset)
+    apply_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    second = await applier.apply(compiler.compile(rules))
+    noop_ms = (time.perf_counter() - start) * 1000
+
+    payload_kb = len(ruleset.payloads[4]) / 1024
+    print(f"规则数: {ruleset.rule_count}, 载荷大小: {payload_kb:.1f} KiB")
+    print(f"编译耗时: {compile_ms:.1f} ms")
+    print(f"首次应用: {apply_ms:.1f} ms, 结果 {first}, restore 调用 {executor.calls} 次")
+    print(f"未变化重新加载(含编译): {noop_ms:.1f} ms, 结果 {second}")
+    print(f"对比: 逐条 iptables 需要 {ruleset.rule_count + 3} 次进程调用")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
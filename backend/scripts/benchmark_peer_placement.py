@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+对等节点放置基准测试
+测量不同接口数量下一致性哈希（有界负载）的单次放置耗时、负载分布，
+以及增加一个接口后再平衡需要迁移的节点数量
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.wireguard_placement import PlacementRing
+
+
+def bench(servers: int, peers: int) -> dict:
+    ring = PlacementRing(range(1, servers + 1))
+    loads = Counter()
+    assignments = []
+
+    start = time.perf_counter()
+    for i in range(peers):
+        key = f"client-{i}"
+        server = ring.place(key, loads)
+        loads[server] += 1
+        assignments.append((i, key, server))
+    place_us = (time.perf_counter() - start) / peers * 1e6
+
+    grown = PlacementRing(range(1, servers + 2))
+    start = time.perf_counter()
+    moves = grown.plan_rebalance(assignments, max_moves=peers)
+    plan_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "servers": servers,
+        "place_us": place_us,
+        "max_over_avg": max(loads.values()) / (peers / servers),
+        "moved_ratio": len(moves) / peers,
+        "ideal_ratio": 1 / (servers + 1),
+        "plan_ms": plan_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对等节点放置基准测试")
+    parser.add_argument("--peers", type=int, default=50000, help="放置的对等节点数量")
+    args = parser.parse_args()
+
+    print(f"{'接口数':>6} {'放置(us)':>10} {'最大/平均':>10} {'迁移比例':>10} {'理想比例':>10} {'计划(ms)':>10}")
+    for servers in (2, 4, 8, 32, 128):
+        result = bench(servers, args.peers)
+        print(f"{result['servers']:>6} {result['place_us']:>10.2f} {result['max_over_avg']:>10.2f} "
+              f"{result['moved_ratio']:>10.3f} {result['ideal_ratio']:>10.3f} {result['plan_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
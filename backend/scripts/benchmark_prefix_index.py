@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+前缀池空闲索引基准测试
+在不同的已分配规模下测量内存索引 allocate / release / reserve 的单次延迟；
+并在不同碎片数下测量包含持久化的单次分配+释放延迟：
+  JSON 列（bgp 前缀池）：读取并解析 free_ranges、变更、序列化并写回
+  区间表（ipv6_service 前缀池）：按索引读写 pool_free_ranges 的相邻行
+持久化路径使用 SQLite 内存数据库，需要 aiosqlite
+"""
+import os
+import sys
+import time
+import argparse
+import asyncio
+import random
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.prefix_index import PrefixFreeIndex
+from app.core.database import Base
+from app.models.ipv6 import PoolFreeRange, PrefixPool
+from app.models.ipv6_pool import IPv6PrefixPool
+from app.services.pool_free_ranges import PoolFreeRanges, slot_key
+
+BASE_PREFIX = "2001:db8::/32"
+PREFIX_LEN = 64
+
+
+def build_index(allocated: int, holes: int) -> PrefixFreeIndex:
+    """构造已分配 allocated 个前缀、其中随机释放 holes 个的索引（不逐个执行分配）"""
+    index = PrefixFreeIndex(BASE_PREFIX, PREFIX_LEN, free_ranges=[(allocated, 1 << 32)])
+    rng = random.Random(allocated)
+    for slot in rng.sample(range(allocated), min(holes, allocated)):
+        index.release(index.prefix_at(slot))
+    return index
+
+
+def bench(allocated: int, holes: int, ops: int) -> dict:
+    index = build_index(allocated, holes)
+    rng = random.Random(ops)
+
+    start = time.perf_counter()
+    prefixes = [index.allocate() for _ in range(ops)]
+    allocate_us = (time.perf_counter() - start) / ops * 1e6
+
+    start = time.perf_counter()
+    for prefix in prefixes:
+        index.release(prefix)
+    release_us = (time.perf_counter() - start) / ops * 1e6
+
+    targets = [index.prefix_at(allocated + rng.randrange(1 << 30)) for _ in range(ops)]
+    start = time.perf_counter()
+    for prefix in targets:
+        index.reserve(prefix)
+    reserve_us = (time.perf_counter() - start) / ops * 1e6
+
+    return {
+        "allocated": allocated,
+        "fragments": index.fragments,
+        "allocate_us": allocate_us,
+        "release_us": release_us,
+        "reserve_us": reserve_us,
+    }
+
+
+async def bench_persisted(holes: int, ops: int) -> dict:
+    """每次操作在独立事务中完成，包含数据库读写（与服务中的分配/释放路径相同）"""
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    allocated = holes * 4
+    index = build_index(allocated, holes)
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with factory() as session:
+        blob_pool = IPv6PrefixPool(name="bench", prefix=BASE_PREFIX, prefix_length=PREFIX_LEN,
+                                   total_capacity=1 << 32, free_ranges=index.dumps())
+        row_pool = PrefixPool(name="bench", base_prefix=BASE_PREFIX, prefix_len=PREFIX_LEN, free_ranges_built=True)
+        session.add_all([blob_pool, row_pool])
+        await session.flush()
+        await session.execute(insert(PoolFreeRange), [
+            {"pool_id": row_pool.id, "start_slot": slot_key(start), "end_slot": slot_key(end)}
+            for start, end in index.ranges()
+        ])
+        await session.commit()
+        blob_id, row_id = blob_pool.id, row_pool.id
+
+    async def blob_cycle(session):
+        pool = await session.get(IPv6PrefixPool, blob_id, populate_existing=True)
+        current = PrefixFreeIndex.loads(pool.prefix, pool.prefix_length, pool.free_ranges)
+        prefix = current.allocate()
+        current.release(prefix)
+        pool.free_ranges = current.dumps()
+
+    async def row_cycle(session):
+        ranges = PoolFreeRanges(session, await session.get(PrefixPool, row_id))
+        await ranges.release(await ranges.allocate())
+
+    result = {"fragments": index.fragments}
+    for name, cycle in (("json_us", blob_cycle), ("rows_us", row_cycle)):
+        start = time.perf_counter()
+        for _ in range(ops):
+            async with factory() as session:
+                await cycle(session)
+                await session.commit()
+        result[name] = (time.perf_counter() - start) / ops * 1e6
+    await engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="前缀池空闲索引基准测试")
+    parser.add_argument("--ops", type=int, default=10000, help="每个规模执行的操作次数")
+    parser.add_argument("--holes", type=int, default=1000, help="已分配空间中随机释放的前缀数量")
+    parser.add_argument("--persisted-ops", type=int, default=200, help="持久化路径每个碎片数执行的分配+释放次数")
+    args = parser.parse_args()
+
+    print("内存索引")
+    print(f"{'已分配':>12} {'碎片数':>8} {'allocate(us)':>14} {'release(us)':>13} {'reserve(us)':>13}")
+    for allocated in (1_000, 10_000, 100_000, 1_000_000, 10_000_000):
+        result = bench(allocated, args.holes, args.ops)
+        print(f"{result['allocated']:>12} {result['fragments']:>8} {result['allocate_us']:>14.2f} "
+              f"{result['release_us']:>13.2f} {result['reserve_us']:>13.2f}")
+
+    print("\n持久化路径（分配+释放，含事务提交）")
+    print(f"{'碎片数':>8} {'JSON列(us)':>12} {'区间表(us)':>12}")
+    for holes in (100, 1_000, 10_000, 100_000):
+        result = asyncio.run(bench_persisted(holes, args.persisted_ops))
+        print(f"{result['fragments']:>8} {result['json_us']:>12.1f} {result['rows_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+路由聚合基准测试
+在百万级 /64 前缀上测量增量聚合的加入/移除耗时、聚合后的前缀数和节点数组内存，
+并与每次变更都用 ipaddress.collapse_addresses 全量重算的耗时对比
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import ipaddress
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.route_aggregator import RouteAggregator
+
+ROOT = "2a0e:97c0::/32"
+_BASE = int(ipaddress.IPv6Network(ROOT).network_address)
+
+
+def slot_prefix(slot: int) -> str:
+    return f"{ipaddress.IPv6Address(_BASE + (slot << 64))}/64"
+
+
+def bench(name: str, slots: list, churn: int) -> dict:
+    prefixes = [slot_prefix(slot) for slot in slots]
+
+    aggregator = RouteAggregator(ROOT)
+    start = time.perf_counter()
+    for prefix in prefixes:
+        aggregator.add(prefix)
+    build_s = time.perf_counter() - start
+
+    # 随机释放再重新分配，模拟分配/释放时的增量更新
+    victims = random.sample(prefixes, churn)
+    changes = 0
+    start = time.perf_counter()
+    for prefix in victims:
+        added, removed = aggregator.discard(prefix)
+        changes += len(added) + len(removed)
+    discard_us = (time.perf_counter() - start) / churn * 1e6
+    start = time.perf_counter()
+    for prefix in victims:
+        added, removed = aggregator.add(prefix)
+        changes += len(added) + len(removed)
+    add_us = (time.perf_counter() - start) / churn * 1e6
+
+    networks = [ipaddress.IPv6Network(prefix) for prefix in prefixes]
+    start = time.perf_counter()
+    collapsed = list(ipaddress.collapse_addresses(networks))
+    full_s = time.perf_counter() - start
+    assert len(collapsed) == aggregator.aggregate_count
+
+    return {
+        "name": name,
+        "prefixes": len(prefixes),
+        "aggregates": aggregator.aggregate_count,
+        "nodes": aggregator.node_count,
+        "build_s": build_s,
+        "memory_mb": aggregator.memory_bytes / 1024 / 1024,
+        "add_us": add_us,
+        "discard_us": discard_us,
+        "changes_per_op": changes / (2 * churn),
+        "full_s": full_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="路由聚合基准测试")
+    parser.add_argument("--prefixes", type=int, default=1_000_000, help="加入的 /64 前缀数量")
+    parser.add_argument("--churn", type=int, default=10000, help="增量释放/重新分配的次数")
+    args = parser.parse_args()
+    random.seed(0)
+
+    n = args.prefixes
+    scenarios = [
+        ("连续分配", list(range(n))),
+        ("每隔一个", list(range(0, 2 * n, 2))),
+        ("随机75%", random.sample(range(n * 4 // 3), n)),
+    ]
+
+    print(f"{'场景':<8} {'前缀数':>9} {'聚合后':>9} {'节点数':>9} {'构建(s)':>8} {'节点内存(MB)':>9} "
+          f"{'add(us)':>8} {'discard(us)':>11} {'差量/次':>7} {'全量重算(s)':>10}")
+    for name, slots in scenarios:
+        r = bench(name, slots, min(args.churn, n))
+        print(f"{r['name']:<8} {r['prefixes']:>9} {r['aggregates']:>9} {r['nodes']:>9} {r['build_s']:>8.2f} "
+              f"{r['memory_mb']:>9.1f} {r['add_us']:>8.1f} {r['discard_us']:>11.1f} {r['changes_per_op']:>7.2f} "
+              f"{r['full_s']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
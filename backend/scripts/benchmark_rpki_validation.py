@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+RPKI 起源校验基准测试
+生成与全球 ROA 集规模相当的合成数据（默认约50万条，IPv4/IPv6 比例和前缀长度分布
+接近实际），分别以 rpki-client JSON 和 Routinator CSV 格式写入临时文件，测量载入
+与构建前缀树的耗时和内存、单条与批量校验吞吐，用按前缀长度分组的哈希表做参照检查
+结果，并在持续查询的同时替换 ROA 文件验证热替换
+"""
+import os
+import sys
+import csv
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import ipaddress
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.roa_table import INVALID, NOT_FOUND, VALID, load_roa_file
+from app.services.rpki_validation import RPKIValidator
+
+# (前缀长度, 权重)
+V4_LENGTHS = [(24, 60), (23, 6), (22, 12), (21, 5), (20, 6), (19, 3), (18, 2), (17, 2), (16, 3), (12, 1)]
+V6_LENGTHS = [(48, 45), (44, 5), (40, 6), (36, 4), (32, 30), (29, 6), (56, 2), (64, 2)]
+
+
+def generate_roas(count: int, v6_share: float, seed: int) -> list:
+    rng = random.Random(seed)
+    roas = []
+    for _ in range(count):
+        if rng.random() < v6_share:
+            length = rng.choices([l for l, _ in V6_LENGTHS], [w for _, w in V6_LENGTHS])[0]
+            value = (0x2000 << 112) | (rng.getrandbits(length - 3) << (128 - length))
+            prefix = f"{ipaddress.IPv6Address(value)}/{length}"
+            max_length = min(128, length + rng.choice([0, 0, 0, 4, 16]))
+        else:
+            length = rng.choices([l for l, _ in V4_LENGTHS], [w for _, w in V4_LENGTHS])[0]
+            value = rng.randrange(1 << 31, 0xE0000000) >> (32 - length) << (32 - length)
+            prefix = f"{ipaddress.IPv4Address(value)}/{length}"
+            max_length = min(32, length + rng.choice([0, 0, 0, 1, 2, 8]))
+        asn = 0 if rng.random() < 0.002 else rng.randrange(1, 400000)
+        roas.append({"asn": f"AS{asn}", "prefix": prefix, "maxLength": max_length, "ta": "arin"})
+    return roas
+
+
+def write_json(path: str, roas: list) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"metadata": {"generated": int(time.time()), "counts": len(roas)}, "roas": roas}, f)
+
+
+def write_csv(path: str, roas: list) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ASN", "IP Prefix", "Max Length", "Trust Anchor"])
+        for roa in roas:
+            writer.writerow([roa["asn"], roa["prefix"], roa["maxLength"], roa["ta"]])
+
+
+class Reference:
+    """参照实现：按前缀长度分组的哈希表，逐个长度查找覆盖 ROA"""
+
+    def __init__(self, roas: list):
+        self.tables = {}
+        for roa in roas:
+            network = ipaddress.ip_network(roa["prefix"])
+            key = (network.version, network.prefixlen)
+            self.tables.setdefault(key, {}).setdefault(int(network.network_address), []).append(
+                (int(roa["asn"][2:]), roa["maxLength"])
+            )
+
+    def validate(self, prefix: str, origin: int) -> str:
+        network = ipaddress.ip_network(prefix)
+        bits = network.max_prefixlen
+        value = int(network.network_address)
+        covered = False
+        for (version, length), table in self.tables.items():
+            if version != network.version or length > network.prefixlen:
+                continue
+            entries = table.get(value >> (bits - length) << (bits - length) if length else 0)
+            if entries:
+                covered = True
+                if any(asn == origin and origin != 0 and max_len >= network.prefixlen for asn, max_len in entries):
+                    return VALID
+        return INVALID if covered else NOT_FOUND
+
+
+def sample_routes(roas: list, count: int, seed: int) -> list:
+    """宣告样本：ROA 本身、更长的子前缀、错误的起源AS和没有 ROA 的随机前缀"""
+    rng = random.Random(seed)
+    routes = []
+    for _ in range(count):
+        roa = rng.choice(roas)
+        network = ipaddress.ip_network(roa["prefix"])
+        origin = int(roa["asn"][2:])
+        kind = rng.random()
+        if kind < 0.4:
+            routes.append((roa["prefix"], origin))
+        elif kind < 0.6:
+            extra = rng.randint(1, 4)
+            if network.prefixlen + extra <= network.max_prefixlen:
+                value = int(network.network_address) | (rng.getrandbits(extra) << (network.max_prefixlen - network.prefixlen - extra))
+                routes.append((f"{network.network_address.__class__(value)}/{network.prefixlen + extra}", origin))
+            else:
+                routes.append((roa["prefix"], origin))
+        elif kind < 0.8:
+            routes.append((roa["prefix"], origin + 1))
+        elif rng.random() < 0.5:
+            routes.append((f"{ipaddress.IPv4Address(rng.getrandbits(24) << 8)}/24", rng.randrange(1, 400000)))
+        else:
+            routes.append((f"{ipaddress.IPv6Address((0x3000 << 112) | (rng.getrandbits(32) << 80))}/48", 65001))
+    return routes
+
+
+async def hot_swap(json_path: str, other_path: str, routes: list) -> dict:
+    """持续查询期间把 ROA 文件原子替换为另一份，确认新表生效且查询从未落空"""
+    validator = RPKIValidator(json_path, reload_interval=0.05)
+    await validator.reload()
+    swapped = asyncio.Event()
+
+    async def on_reload(table):
+        swapped.set()
+
+    validator.add_reload_handler(on_reload)
+    validator.start()
+    queries = misses = 0
+    tmp_path = json_path + ".new"
+    with open(other_path, "rb") as src, open(tmp_path, "wb") as dst:
+        dst.write(src.read())
+    os.replace(tmp_path, json_path)
+    started = time.perf_counter()
+    while not swapped.is_set() and time.perf_counter() - started < 120:
+        for prefix, origin in routes[:200]:
+            if validator.validate(prefix, origin) is None:
+                misses += 1
+            queries += 1
+        await asyncio.sleep(0)
+    await validator.stop()
+    return {"swapped": swapped.is_set(), "queries": queries, "misses": misses,
+            "swap_s": time.perf_counter() - started, "roas": validator.get_stats()["roas"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RPKI起源校验基准测试")
+    parser.add_argument("--roas", type=int, default=500000, help="合成 ROA 数量")
+    parser.add_argument("--v6-share", type=float, default=0.25, help="IPv6 ROA 比例")
+    parser.add_argument("--queries", type=int, default=200000, help="校验的宣告数量")
+    parser.add_argument("--check", type=int, default=20000, help="与参照实现对比的宣告数量")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    roas = generate_roas(args.roas, args.v6_share, args.seed)
+    json_path = os.path.join(workdir, "vrps.json")
+    csv_path = os.path.join(workdir, "vrps.csv")
+    write_json(json_path, roas)
+    write_csv(csv_path, roas)
+    print(f"合成 {len(roas)} 条ROA: JSON {os.path.getsize(json_path) / 1e6:.1f}MB, "
+          f"CSV {os.path.getsize(csv_path) / 1e6:.1f}MB")
+
+    failures = []
+    tables = {}
+    for name, path in (("JSON", json_path), ("CSV", csv_path)):
+        start = time.perf_counter()
+        tables[name] = table = load_roa_file(path)
+        elapsed = time.perf_counter() - start
+        print(f"载入{name}: {elapsed:.2f}s, {len(table)} 条ROA（去重后，跳过 {table.skipped}）, "
+              f"{table.node_count} 个节点, 前缀树 {table.memory_bytes / 1024 / 1024:.1f}MB")
+    table = tables["JSON"]
+
+    routes = sample_routes(roas, args.queries, args.seed + 1)
+    start = time.perf_counter()
+    for prefix, origin in routes:
+        table.validate(prefix, origin)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    states = table.validate_many(routes)
+    bulk = time.perf_counter() - start
+    counts = {state: states.count(state) for state in (VALID, INVALID, NOT_FOUND)}
+    print(f"逐条校验 {len(routes)} 条: {single:.2f}s ({single / len(routes) * 1e6:.1f}us/条)")
+    print(f"批量校验 {len(routes)} 条: {bulk:.2f}s ({len(routes) / bulk:.0f} 条/秒), 结果 {counts}")
+
+    reference = Reference(roas)
+    checked = routes[:args.check]
+    mismatches = [(p, o) for (p, o), state in zip(checked, states) if reference.validate(p, o) != state]
+    if mismatches:
+        failures.append(f"{len(mismatches)} 条与参照实现不一致，例如 {mismatches[0]}")
+    if tables["CSV"].validate_many(checked) != states[:len(checked)]:
+        failures.append("CSV 与 JSON 载入的校验结果不一致")
+    print(f"与参照实现对比 {len(checked)} 条: 不一致 {len(mismatches)} 条")
+
+    other_path = os.path.join(workdir, "vrps-next.json")
+    write_json(other_path, roas[: len(roas) // 2])
+    swap = asyncio.run(hot_swap(json_path, other_path, routes))
+    print(f"热替换: {swap['swap_s']:.2f}s 内生效（新表 {swap['roas']} 条ROA），"
+          f"期间查询 {swap['queries']} 次，未命中ROA表 {swap['misses']} 次")
+    if not swap["swapped"] or swap["misses"]:
+        failures.append("热替换未生效或查询期间ROA表不可用")
+
+    print("通过" if not failures else "失败: " + "; ".join(failures))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
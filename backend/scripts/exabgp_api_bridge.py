@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+ExaBGP API 桥接进程
+由 ExaBGP 作为 announce-routes 进程启动（部署为 /etc/exabgp/announce-routes.py）：
+监听本地 Unix 套接字，把应用发来的 announce/withdraw 命令逐行写到标准输出交给
+ExaBGP；ExaBGP 写到标准输入的确认（done/error）按命令顺序回送给发出该命令的连接，
+JSON 事件广播给所有连接。未确认的命令数达到窗口上限时暂停读取套接字，背压传回应用。
+连接的发送缓冲超过上限（应用不再读取）时断开该连接，不让积压无限增长，也不阻塞其他连接。
+
+只依赖标准库；ExaBGP 需开启 api.ack（4.x 默认开启）。
+"""
+import os
+import sys
+import asyncio
+import argparse
+from collections import deque
+
+DEFAULT_SOCKET = os.environ.get("EXABGP_API_SOCKET", "/run/exabgp/ipv6wgm.sock")
+ACK_LINES = (b"done", b"error")
+
+
+class Bridge:
+    def __init__(self, window: int, max_buffer: int = 1 << 20):
+        self.window = window
+        self.max_buffer = max_buffer
+        # 每条已转发、尚未确认的命令对应的连接
+        self.pending = deque()
+        self.clients = set()
+        self.slot = asyncio.Condition()
+        self.stdout = sys.stdout.buffer
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                async with self.slot:
+                    await self.slot.wait_for(lambda: len(self.pending) < self.window)
+                    self.pending.append(writer)
+                    self.stdout.write(line if line.endswith(b"\n") else line + b"\n")
+                    self.stdout.flush()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def read_exabgp(self) -> None:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=1 << 20)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        while True:
+            line = await reader.readline()
+            if not line:
+                return  # ExaBGP 已退出
+            if line.strip() in ACK_LINES:
+                async with self.slot:
+                    client = self.pending.popleft() if self.pending else None
+                    self.slot.notify_all()
+                if client is not None and client in self.clients:
+                    self.send(client, line)
+            else:
+                for client in list(self.clients):
+                    self.send(client, line)
+
+    def send(self, client: asyncio.StreamWriter, line: bytes) -> None:
+        """写入连接的发送缓冲；缓冲超过上限说明对端不再读取，断开连接（对端重连后重新同步）"""
+        if client.transport.get_write_buffer_size() + len(line) > self.max_buffer:
+            sys.stderr.write("ipv6wgm bridge: client not reading, disconnecting\n")
+            sys.stderr.flush()
+            self.clients.discard(client)
+            client.transport.abort()
+            return
+        client.write(line)
+
+
+async def main_async(args) -> None:
+    bridge = Bridge(args.window, args.max_buffer)
+    os.makedirs(os.path.dirname(args.socket) or ".", exist_ok=True)
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    server = await asyncio.start_unix_server(bridge.handle_client, path=args.socket)
+    os.chmod(args.socket, 0o660)
+    try:
+        await bridge.read_exabgp()
+    finally:
+        server.close()
+        try:
+            os.unlink(args.socket)
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ExaBGP API 桥接进程")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="应用连接的Unix套接字路径")
+    parser.add_argument("--window", type=int, default=256, help="允许未确认的命令数")
+    parser.add_argument("--max-buffer", type=int, default=1 << 20, help="每个连接的发送缓冲上限（字节）")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
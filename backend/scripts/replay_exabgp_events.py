@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+ExaBGP 事件回放测试
+把 ExaBGP `encoder json` 输出的事件文件（每行一个JSON）逐行交给 BGP 会话状态跟踪器，
+检查内存状态和批量写回的结果。回放文件中除 ExaBGP 事件外还可包含控制行：
+  {"flush": true}                                   执行一次写回
+  {"expect": {"192.0.2.1": {"status": "established", "prefixes_received": 2}}}
+                                                    检查内存中的会话状态
+  {"expect_db": {"192.0.2.1": {"prefixes_received": 2}}}
+                                                    检查最近一次写回的行
+--generate 生成带预期结果的随机回放文件（会话翻动 + 大量 UPDATE），用于压测事件合并
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.bgp_session_state import BGPSessionTracker
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exabgp_events_sample.jsonl")
+
+
+class RecordingTracker(BGPSessionTracker):
+    """写回到内存字典而不是数据库的跟踪器"""
+
+    def __init__(self):
+        super().__init__(persist=True)
+        self.persisted = {}
+        self.writes = 0
+
+    async def _write_back(self, rows):
+        self.writes += 1
+        for row in rows:
+            self.persisted[row["neighbor"]] = {
+                **{k: v for k, v in row.items() if k != "neighbor"},
+                "status": row["status"].value,
+            }
+        return len(rows)
+
+
+def check(actual, expected, where: str, failures: list) -> None:
+    for neighbor, fields in expected.items():
+        state = actual.get(neighbor)
+        if state is None:
+            failures.append(f"{where}: 没有对等体 {neighbor}")
+            continue
+        for key, value in fields.items():
+            if state.get(key) != value:
+                failures.append(f"{where}: {neighbor}.{key} = {state.get(key)!r}，预期 {value!r}")
+
+
+async def replay(path: str) -> int:
+    tracker = RecordingTracker()
+    failures = []
+    events = 0
+    elapsed = 0.0
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            record = json.loads(line)
+            where = f"{os.path.basename(path)}:{lineno}"
+            if record.get("flush"):
+                await tracker.flush()
+            elif "expect" in record:
+                actual = {peer["neighbor"]: peer for peer in tracker.snapshot()}
+                check(actual, record["expect"], where, failures)
+            elif "expect_db" in record:
+                check(tracker.persisted, record["expect_db"], where, failures)
+            else:
+                start = time.perf_counter()
+                tracker.handle(record)
+                elapsed += time.perf_counter() - start
+                events += 1
+    await tracker.flush()
+
+    stats = tracker.get_stats()
+    print(f"回放 {events} 个事件: {elapsed * 1000:.1f}ms "
+          f"({events / elapsed if elapsed else 0:.0f} 个/秒), 写回 {tracker.writes} 次, 共 {stats['rows_updated']} 行")
+    print(f"会话概况: {tracker.summary()}")
+    for failure in failures[:20]:
+        print(f"  {failure}")
+    print("通过" if not failures else f"失败: {len(failures)} 项检查未通过")
+    return 1 if failures else 0
+
+
+def generate(path: str, peers: int, events: int, flush_every: int, seed: int) -> None:
+    """生成随机回放文件，预期结果由独立的简单模型计算"""
+    rng = random.Random(seed)
+    addresses = [f"2001:db8::{i + 1:x}" for i in range(peers)]
+    model = {address: {"status": "idle", "received": set()} for address in addresses}
+    now = 1_700_000_000.0
+
+    def neighbor(address):
+        return {"address": {"local": "2001:db8::ffff", "peer": address}, "asn": {"local": 65001, "peer": 65100}}
+
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(events):
+            now += 0.001
+            address = rng.choice(addresses)
+            peer = model[address]
+            if peer["status"] != "established" or rng.random() < 0.002:
+                state = "up" if peer["status"] != "established" else "down"
+                peer["status"] = "established" if state == "up" else "idle"
+                peer["received"].clear()
+                event = {"type": "state", "time": now, "neighbor": {**neighbor(address), "state": state}}
+            else:
+                announce = [f"2001:db8:{rng.randrange(4096):x}::/48" for _ in range(rng.randint(1, 8))]
+                withdraw = [p for p in rng.sample(sorted(peer["received"]), min(2, len(peer["received"])))]
+                peer["received"].update(announce)
+                peer["received"].difference_update(withdraw)
+                update = {"announce": {"ipv6 unicast": {"2001:db8::ffff": [{"nlri": p} for p in announce]}}}
+                if withdraw:
+                    update["withdraw"] = {"ipv6 unicast": [{"nlri": p} for p in withdraw]}
+                event = {"type": "update", "time": now,
+                         "neighbor": {**neighbor(address), "direction": "receive", "message": {"update": update}}}
+            f.write(json.dumps(event) + "\n")
+            if (i + 1) % flush_every == 0:
+                expected = {a: {"status": p["status"], "prefixes_received": len(p["received"])}
+                            for a, p in model.items() if p["status"] != "idle" or p["received"]}
+                f.write(json.dumps({"expect": expected}) + "\n")
+                f.write(json.dumps({"flush": True}) + "\n")
+                f.write(json.dumps({"expect_db": expected}) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ExaBGP事件回放测试")
+    parser.add_argument("file", nargs="?", default=SAMPLE, help="回放文件（默认为随附的样例）")
+    parser.add_argument("--generate", action="store_true", help="先生成随机回放文件再回放")
+    parser.add_argument("--peers", type=int, default=16, help="生成的对等体数量")
+    parser.add_argument("--events", type=int, default=200000, help="生成的事件数量")
+    parser.add_argument("--flush-every", type=int, default=5000, help="每隔多少个事件写回一次")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    path = args.file
+    if args.generate:
+        path = args.file if args.file != SAMPLE else "/tmp/exabgp_events_replay.jsonl"
+        generate(path, args.peers, args.events, args.flush_every, args.seed)
+        print(f"已生成回放文件: {path}")
+    sys.exit(asyncio.run(replay(path)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+测试公共夹具
+数据库使用临时 SQLite 文件（aiosqlite），替换全局数据库管理器的引擎和会话工厂
+"""
+import os
+import sys
+import tempfile
+
+# 配置目录在导入应用模块前指向临时目录
+_workdir = tempfile.mkdtemp(prefix="ipv6wgm-test-")
+os.environ.setdefault("WIREGUARD_CONFIG_DIR", os.path.join(_workdir, "wireguard"))
+os.environ.setdefault("INSTALL_DIR", _workdir)
+os.environ.setdefault("LEADER_LOCK_DIR", os.path.join(_workdir, "locks"))
+os.environ.setdefault("LOG_STORE_DIR", os.path.join(_workdir, "logs"))
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import app.models  # noqa: F401  注册全部模型
+from app.core.database import Base
+from app.core.database_manager import database_manager
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    """建好全部表的临时数据库，返回会话工厂"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    saved = (database_manager.engine, database_manager.async_engine, database_manager.session_factory,
+             database_manager.async_session_factory, database_manager._is_connected)
+    database_manager.engine = database_manager.async_engine = engine
+    database_manager.session_factory = database_manager.async_session_factory = factory
+    database_manager._is_connected = True
+    try:
+        yield factory
+    finally:
+        (database_manager.engine, database_manager.async_engine, database_manager.session_factory,
+         database_manager.async_session_factory, database_manager._is_connected) = saved
+        await engine.dispose()
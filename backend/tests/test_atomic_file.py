@@ -0,0 +1,36 @@
+"""
+配置文件原子写入：按磁盘内容判断是否跳过写入
+"""
+import os
+
+import pytest
+
+from app.core.atomic_file import ConfigFileWriter
+
+
+def test_write_detects_changes_by_other_writers(tmp_path):
+    path = str(tmp_path / "wg0.conf")
+    ours, other = ConfigFileWriter(), ConfigFileWriter()
+
+    assert ours.write(path, "A")
+    assert not ours.write(path, "A")
+
+    # 另一个 worker 改写后，本进程记录的哈希不能再用于跳过写入
+    assert other.write(path, "B")
+    assert ours.write(path, "A")
+    with open(path) as f:
+        assert f.read() == "A"
+
+    # 文件被外部删除后重新写入
+    os.unlink(path)
+    assert ours.write(path, "A")
+    assert ours.stats == {"writes": 3, "skipped": 1, "errors": 0}
+
+
+def test_write_failure_raises(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    writer = ConfigFileWriter()
+    with pytest.raises(OSError):
+        writer.write(str(blocker / "wg0.conf"), "A")
+    assert writer.stats["errors"] == 1
@@ -0,0 +1,94 @@
+"""
+分配即宣告：路由差量在事务提交后下发，失败后重新同步，配置/重放包含池的聚合前缀
+"""
+import asyncio
+
+from app.models.ipv6_pool import IPv6PrefixPool
+from app.services import bgp_service as bgp_module
+from app.services.bgp_service import BGPService
+from app.services.exabgp_api import ExaBGPCommandError
+from app.services.exabgp_service import replay_commands
+
+POOL_PREFIX = "2a0e:97c0:e60::/48"
+
+
+async def _pool(db) -> int:
+    async with db() as session:
+        pool = IPv6PrefixPool(name="announce", prefix=POOL_PREFIX, prefix_length=64,
+                              total_capacity=1024, used_count=0, auto_announce=True)
+        session.add(pool)
+        await session.commit()
+        return pool.id
+
+
+def _record_sends(monkeypatch, error=None):
+    sent = []
+
+    async def send(commands):
+        sent.append(list(commands))
+        if error:
+            raise error
+
+    monkeypatch.setattr(bgp_module.exabgp_api, "send", send)
+    return sent
+
+
+async def _settle(service):
+    for _ in range(10):
+        await asyncio.sleep(0)
+    if service._route_tasks:
+        await asyncio.gather(*service._route_tasks)
+
+
+async def test_caller_session_pushes_only_after_commit(db, monkeypatch):
+    pool_id = await _pool(db)
+    sent = _record_sends(monkeypatch)
+    service = BGPService()
+
+    async with db() as session:
+        result = await service.allocate_ipv6_prefix(pool_id, db=session)
+        assert result["success"]
+        await _settle(service)
+        assert sent == []
+        await session.commit()
+    await _settle(service)
+    assert sent == [[f"announce route {result['allocated_prefix']} next-hop self"]]
+
+    async with db() as session:
+        assert (await service.allocate_ipv6_prefix(pool_id, db=session))["success"]
+        await session.rollback()
+    await _settle(service)
+    assert len(sent) == 1 and pool_id not in service._pool_routes
+
+
+async def test_failed_push_invalidates_and_resyncs(db, monkeypatch):
+    pool_id = await _pool(db)
+    sent = _record_sends(monkeypatch, ExaBGPCommandError("ExaBGP返回error"))
+    service = BGPService()
+
+    first = await service.allocate_ipv6_prefix(pool_id)
+    second = await service.allocate_ipv6_prefix(pool_id)
+    assert first["success"] and second["success"]
+    assert pool_id not in service._pool_routes
+    assert service._route_tasks
+    for task in list(service._route_tasks):
+        task.cancel()
+    await asyncio.gather(*service._route_tasks, return_exceptions=True)
+
+    # 重新同步按分配记录宣告聚合后的前缀，并补发不再被覆盖的撤销
+    resent = _record_sends(monkeypatch)
+    await service._resync_pool_routes(pool_id, [first["allocated_prefix"], "2a0e:97c0:e60:ff::/64"], delay=0)
+    assert resent == [[
+        "announce route 2a0e:97c0:e60::/63 next-hop self",
+        "withdraw route 2a0e:97c0:e60::/64 next-hop self",
+        "withdraw route 2a0e:97c0:e60:ff::/64 next-hop self",
+    ]]
+
+
+async def test_replay_includes_pool_aggregates(db, monkeypatch):
+    pool_id = await _pool(db)
+    _record_sends(monkeypatch)
+    service = BGPService()
+    for _ in range(4):
+        assert (await service.allocate_ipv6_prefix(pool_id))["success"]
+    assert "announce route 2a0e:97c0:e60::/62 next-hop self" in await replay_commands()
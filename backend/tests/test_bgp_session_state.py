@@ -0,0 +1,101 @@
+"""
+BGP会话状态跟踪：事件合并写回、运行时间推算和单执行者写回
+"""
+import time
+from datetime import timezone
+
+from sqlalchemy import select
+
+from app.core.leader import LeaderLock
+from app.models import BGPSession, BGPStatus
+from app.services.bgp_service import bgp_service
+from app.services.bgp_session_state import BGPSessionTracker
+
+NEIGHBOR = {"address": {"local": "2001:db8::1", "peer": "2001:db8::2"}, "asn": {"local": 65001, "peer": 65002}}
+
+
+def state_event(state, at):
+    return {"type": "state", "time": at, "neighbor": {**NEIGHBOR, "state": state}}
+
+
+def update_event(prefixes, at):
+    announce = {"ipv6 unicast": {"2001:db8::1": [{"nlri": prefix} for prefix in prefixes]}}
+    return {"type": "update", "time": at,
+            "neighbor": {**NEIGHBOR, "direction": "receive", "message": {"update": {"announce": announce}}}}
+
+
+async def add_session(db):
+    async with db() as session:
+        row = BGPSession(name="peer", local_as=65001, remote_as=65002, local_ip="2001:db8::1", remote_ip="2001:db8::2")
+        session.add(row)
+        await session.commit()
+        return row.id
+
+
+async def test_flush_persists_established_time(db):
+    session_id = await add_session(db)
+    established_at = time.time() - 120
+    tracker = BGPSessionTracker()
+    tracker.handle(state_event("up", established_at))
+    tracker.handle(update_event(["2001:db8:1::/48", "2001:db8:2::/48"], established_at + 1))
+    tracker.handle(update_event(["2001:db8:3::/48"], established_at + 2))
+    assert await tracker.flush() == 1
+
+    async with db() as session:
+        row = await session.get(BGPSession, session_id)
+    assert row.status == BGPStatus.ESTABLISHED
+    assert row.prefixes_received == 3
+    assert abs(row.established_time.replace(tzinfo=timezone.utc).timestamp() - established_at) < 1
+
+    # 没有内存状态的 worker 按建立时间推算运行时间，而不是读取过期的快照
+    status = await bgp_service.get_session_status(str(session_id))
+    assert status["source"] == "database"
+    assert status["status"] == "established"
+    assert 119 <= status["uptime"] <= 125
+
+
+async def test_unknown_status_is_not_persisted(db):
+    session_id = await add_session(db)
+    tracker = BGPSessionTracker()
+    # 跟踪器在会话建立后才启动：只收到 UPDATE，没有状态事件
+    tracker.handle(update_event(["2001:db8:1::/48"], time.time()))
+    assert tracker.snapshot()[0]["status"] == "unknown"
+    await tracker.flush()
+
+    async with db() as session:
+        row = await session.get(BGPSession, session_id)
+    assert row.status == BGPStatus.IDLE
+
+
+async def test_restart_seeds_state_from_database(db):
+    session_id = await add_session(db)
+    established_at = time.time() - 600
+    first = BGPSessionTracker()
+    first.handle(state_event("up", established_at))
+    await first.flush()
+
+    # 重启后的跟踪器从数据库取得建立时间，运行时间继续累计
+    second = BGPSessionTracker()
+    async with db() as session:
+        await second._load_session_ids(session)
+    state = second.session(session_id)
+    assert state["status"] == "established"
+    assert state["uptime"] >= 599
+
+
+async def test_single_writer(db, tmp_path):
+    await add_session(db)
+    trackers = [BGPSessionTracker(), BGPSessionTracker()]
+    for tracker in trackers:
+        tracker._leader = LeaderLock("bgp-session-tracker", lock_dir=str(tmp_path))
+        tracker.handle(state_event("up", time.time()))
+
+    assert trackers[0]._elect()
+    assert not trackers[1]._elect()
+
+    # 执行者退出后另一个 worker 接替，并把当前全部状态写回一次
+    trackers[0]._leader.release()
+    trackers[1]._dirty.clear()
+    assert trackers[1]._elect()
+    assert await trackers[1].flush() == 1
+    trackers[1]._leader.release()
@@ -0,0 +1,119 @@
+"""
+缓存：单飞加载、标签过期时间与本地LRU淘汰
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.core.cache import CacheManager, LocalCache, _Entry
+
+
+async def test_cancelled_leader_does_not_fail_waiters():
+    cache = CacheManager()
+    release = asyncio.Event()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await release.wait()
+        return {"value": 42}
+
+    leader = asyncio.create_task(cache.get_or_set("k", loader))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(cache.get_or_set("k", loader))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    release.set()
+    assert await waiter == {"value": 42}
+    assert calls == [1]
+    assert await cache.get("k") == {"value": 42}
+    assert not cache._inflight
+
+
+async def test_tag_ttl_is_extended_with_evalsha():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    cache = CacheManager(redis_client=redis)
+
+    sent = []
+    pipeline = redis.pipeline
+
+    def recording_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute_command = pipe.execute_command
+
+        def record(*command, **options):
+            sent.append(command[0])
+            return execute_command(*command, **options)
+
+        pipe.execute_command = record
+        return pipe
+
+    redis.pipeline = recording_pipeline
+
+    await cache.set("a", 1, ttl=600, tags=["servers"])
+    assert 500 < await redis.ttl("cache:tag:servers") <= 600
+    # 更短的 TTL 不会缩短标签集合的过期时间，更长的会延长
+    await cache.set("b", 2, ttl=60, tags=["servers"])
+    assert await redis.ttl("cache:tag:servers") > 500
+    await cache.set("c", 3, ttl=1200, tags=["servers"])
+    assert await redis.ttl("cache:tag:servers") > 1100
+    assert await redis.smembers("cache:tag:servers") == {"a", "b", "c"}
+
+    assert "EVALSHA" in sent and "EVAL" not in sent
+    await cache.invalidate_tags("servers")
+    assert await redis.keys("cache:*") == []
+
+
+async def test_tagged_entries_expire_sooner_locally():
+    cache = CacheManager(local_ttl=300, tagged_local_ttl=30)
+    await cache.set("plain", 1, ttl=3600)
+    await cache.set("tagged", 2, ttl=3600, tags=["servers"])
+    await cache.set("short", 3, ttl=10, tags=["servers"])
+    now = time.time()
+    entries = cache.local_cache._entries
+    assert 290 < entries["plain"].expires_at - now <= 300
+    assert 20 < entries["tagged"].expires_at - now <= 30
+    assert entries["short"].expires_at - now <= 10
+
+
+def _entry(size):
+    return _Entry("v", size, time.time() + 60, 0.0, set())
+
+
+def test_local_cache_evicts_least_recently_used():
+    local = LocalCache(max_entries=3, max_bytes=10 ** 6)
+    for key in "abc":
+        local.set(key, _entry(10))
+    assert local.get("a", time.time()) is not None  # a 变为最近使用
+    local.set("d", _entry(10))
+    assert list(local._entries) == ["c", "a", "d"]
+    assert local.evictions == 1
+
+    # 覆盖已有键不计入淘汰，并移到最近使用端
+    local.set("c", _entry(10))
+    assert list(local._entries) == ["a", "d", "c"] and local.evictions == 1
+
+
+def test_local_cache_enforces_byte_limit():
+    local = LocalCache(max_entries=100, max_bytes=100)
+    for key in "abcd":
+        local.set(key, _entry(30))
+    assert list(local._entries) == ["b", "c", "d"]
+    assert local.size_bytes == 90
+
+    local.set("big", _entry(70))
+    assert list(local._entries) == ["d", "big"]
+    assert local.size_bytes == 100 and local.evictions == 3
+
+    # 超过总上限的单个条目不缓存，并移除同键的旧值
+    local.set("d", _entry(101))
+    assert "d" not in local._entries and local.size_bytes == 70
+
+    local.set("t", _Entry("v", 10, time.time() + 60, 0.0, {"x"}))
+    assert local.delete_tag("x") == 1 and local.size_bytes == 70
@@ -0,0 +1,25 @@
+"""
+命令执行器：子进程不读取标准输入时返回失败结果，而不是抛出异常
+"""
+import sys
+
+from app.core.command_executor import CommandExecutor
+
+
+async def test_broken_stdin_returns_failure():
+    executor = CommandExecutor()
+    # 子进程立即退出，不读取输入；输入大于管道缓冲，写入必然遇到断开的管道
+    result = await executor.run([sys.executable, "-c", "import sys; sys.exit(0)"],
+                                input_data=b"x" * (4 << 20), timeout=10)
+    assert not result.ok
+    assert "写入标准输入失败" in result.stderr
+
+
+async def test_large_input_and_output_do_not_deadlock():
+    executor = CommandExecutor()
+    data = b"y" * (1 << 20)
+    result = await executor.run(
+        [sys.executable, "-c", "import sys; sys.stdout.write(sys.stdin.read())"],
+        input_data=data, timeout=10, max_output_bytes=len(data),
+    )
+    assert result.ok and len(result.stdout) == len(data)
@@ -0,0 +1,122 @@
+"""
+ExaBGP：配置回退路径、API通道重连重放、桥接进程的慢连接处理
+"""
+import asyncio
+import importlib.util
+import os
+
+from app.core.command_executor import CommandResult
+from app.models import BGPAnnouncement, BGPSession
+from app.services import exabgp_service
+from app.services.exabgp_api import ExaBGPAPIChannel
+from app.services.exabgp_service import ExaBGPService, replay_commands
+
+
+async def _seed(db):
+    async with db() as session:
+        peer = BGPSession(name="peer", local_as=65001, remote_as=65002, local_ip="2001:db8::1", remote_ip="2001:db8::2")
+        session.add(peer)
+        await session.flush()
+        session.add_all([
+            BGPAnnouncement(prefix="2001:db8:100::/48", session_id=peer.id),
+            BGPAnnouncement(prefix="2001:db8:101::/48", session_id=peer.id),
+            BGPAnnouncement(prefix="2001:db8:200::/48", session_id=peer.id, is_active=False),
+        ])
+        await session.commit()
+
+
+async def test_apply_config_reloads_and_reports_failure(db, tmp_path, monkeypatch):
+    await _seed(db)
+    calls = []
+
+    def fake_run(returncode):
+        async def run(args, timeout=None, **kwargs):
+            calls.append(list(args))
+            return CommandResult(tuple(args), returncode, "", "unit not found" if returncode else "", 0.0)
+        return run
+
+    async with db() as session:
+        service = ExaBGPService(session, config_path=str(tmp_path / "exabgp.conf"))
+        monkeypatch.setattr(exabgp_service.command_executor, "run", fake_run(0))
+        assert await service.apply_config()
+        assert calls == [["systemctl", "reload", "exabgp"]]
+        config = (tmp_path / "exabgp.conf").read_text()
+        # 相邻的两个 /48 聚合为 /47，未启用的宣告不出现
+        assert "announce route 2001:db8:100::/47 next-hop self" in config
+        assert "2001:db8:200::" not in config
+
+        monkeypatch.setattr(exabgp_service.command_executor, "run", fake_run(1))
+        assert not await service.apply_config()
+
+
+async def test_channel_replays_routes_on_every_connect(db, tmp_path):
+    await _seed(db)
+    received = []
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        while line := await reader.readline():
+            received.append(line.decode().strip())
+            writer.write(b"done\n")
+            await writer.drain()
+
+    path = str(tmp_path / "bridge.sock")
+    server = await asyncio.start_unix_server(handle, path=path)
+    channel = ExaBGPAPIChannel(path, ack_timeout=2.0)
+    channel.set_replay(replay_commands)
+    channel.start()
+    try:
+        async def wait_for(count):
+            for _ in range(200):
+                if len(received) >= count:
+                    return
+                await asyncio.sleep(0.01)
+            raise AssertionError(f"只收到 {received}")
+
+        await wait_for(1)
+        assert received == ["announce route 2001:db8:100::/47 next-hop self community [65001:100]"]
+
+        # 桥接进程重启（连接断开）后重新宣告
+        connections[0].close()
+        await wait_for(2)
+        assert received[1] == received[0]
+        assert channel.stats["replayed"] == 2
+    finally:
+        await channel.stop()
+        server.close()
+
+
+def test_bridge_drops_client_that_stops_reading():
+    path = os.path.join(os.path.dirname(__file__), "..", "scripts", "exabgp_api_bridge.py")
+    spec = importlib.util.spec_from_file_location("exabgp_api_bridge", path)
+    bridge_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bridge_module)
+
+    class Transport:
+        def __init__(self):
+            self.buffered = 0
+            self.aborted = False
+
+        def get_write_buffer_size(self):
+            return self.buffered
+
+        def abort(self):
+            self.aborted = True
+
+    class Client:
+        def __init__(self):
+            self.transport = Transport()
+
+        def write(self, data):
+            self.transport.buffered += len(data)
+
+    bridge = bridge_module.Bridge(window=8, max_buffer=100)
+    slow, fast = Client(), Client()
+    bridge.clients.update({slow, fast})
+    for _ in range(20):
+        bridge.send(slow, b'{"type": "state"}\n')
+        bridge.send(fast, b'{"type": "state"}\n')
+        fast.transport.buffered = 0  # 正常读取的连接缓冲被排空
+    assert slow.transport.aborted and slow not in bridge.clients
+    assert not fast.transport.aborted and fast in bridge.clients
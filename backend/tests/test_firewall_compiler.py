@@ -0,0 +1,97 @@
+"""
+防火墙规则编译与原子应用：restore 载荷格式、未变更跳过、invalidate 强制重新应用
+"""
+from types import SimpleNamespace
+
+from app.core.command_executor import CommandResult
+from app.services.firewall_compiler import MANAGED_TABLES, FirewallApplier, FirewallCompiler
+
+
+def _rule(rule_id, table, chain, spec, action="ACCEPT", priority=0, active=True, name=None):
+    return SimpleNamespace(id=rule_id, name=name or f"rule-{rule_id}", table_name=table, chain_name=chain,
+                           rule_spec=spec, action=action, priority=priority, is_active=active)
+
+
+RULES = [
+    _rule(1, "filter", "INPUT", "-p tcp --dport 22", priority=10),
+    _rule(2, "filter", "INPUT", "-p udp --dport 51820", priority=5),
+    _rule(3, "nat", "POSTROUTING", "-s 10.8.0.0/24 -o eth0", action="MASQUERADE"),
+    _rule(4, "filter", "FORWARD", "-s 2001:db8::/64", priority=1),
+    _rule(5, "filter", "INPUT", "-p icmp", active=False),
+    _rule(6, "raw", "PREROUTING", "-p udp --dport 51820", action="NOTRACK"),
+    _rule(7, "security", "INPUT", "-p tcp", name="unmanaged"),
+]
+
+
+class FakeExecutor:
+    def __init__(self, returncode=0):
+        self.calls = []
+        self.returncode = returncode
+
+    async def run(self, args, input_data=None, timeout=None):
+        self.calls.append((args[0], input_data.decode()))
+        return CommandResult(tuple(args), self.returncode, "", "restore failed" if self.returncode else "", 0.0)
+
+
+def test_payload_orders_rules_and_commits_each_table():
+    ruleset = FirewallCompiler().compile(RULES)
+    assert ruleset.rule_count == 5
+    assert ruleset.family_counts == {4: 4, 6: 1}
+    assert ruleset.skipped == ["unmanaged"]  # 不受管理的表不编译
+
+    lines = ruleset.payloads[4].splitlines()
+    # 每个受管理的表：*table、-F、按 priority/id 排序的规则、COMMIT
+    assert [line for line in lines if line.startswith("*")] == [f"*{table}" for table in MANAGED_TABLES]
+    assert lines.count("-F") == lines.count("COMMIT") == len(MANAGED_TABLES)
+    filter_block = lines[lines.index("*filter"):lines.index("COMMIT") + 1]
+    assert filter_block == [
+        "*filter", "-F",
+        "-A INPUT -p udp --dport 51820 -j ACCEPT",
+        "-A INPUT -p tcp --dport 22 -j ACCEPT",
+        "COMMIT",
+    ]
+    assert "-A POSTROUTING -s 10.8.0.0/24 -o eth0 -j MASQUERADE" in lines
+    assert "-A PREROUTING -p udp --dport 51820 -j NOTRACK" in lines
+    assert "icmp" not in ruleset.payloads[4]  # 未启用的规则
+    assert "-A FORWARD -s 2001:db8::/64 -j ACCEPT" in ruleset.payloads[6].splitlines()
+    assert ruleset.payloads[4].endswith("COMMIT\n")
+
+
+def test_validator_rejects_rules():
+    compiler = FirewallCompiler(lambda table, chain, action, spec: action != "MASQUERADE")
+    ruleset = compiler.compile(RULES)
+    assert "rule-3" in ruleset.skipped
+    assert "MASQUERADE" not in ruleset.payloads[4]
+
+
+async def test_unchanged_ruleset_is_skipped_until_invalidated():
+    executor = FakeExecutor()
+    applier = FirewallApplier(executor)
+    compiler = FirewallCompiler()
+    ipv4_only = [rule for rule in RULES if rule.id != 4]
+
+    # 没有IPv6规则时不接管 ip6tables
+    assert await applier.apply(compiler.compile(ipv4_only)) == {4: "applied"}
+    assert [command for command, _ in executor.calls] == ["iptables-restore"]
+    assert executor.calls[0][1] == compiler.compile(ipv4_only).payloads[4]
+
+    assert await applier.apply(compiler.compile(ipv4_only)) == {4: "unchanged"}
+    assert len(executor.calls) == 1
+
+    applier.invalidate()
+    assert await applier.apply(compiler.compile(ipv4_only)) == {4: "applied"}
+    assert len(executor.calls) == 2
+
+    # 出现IPv6规则后接管 ip6tables；IPv4 载荷未变
+    assert await applier.apply(compiler.compile(RULES)) == {4: "unchanged", 6: "applied"}
+    assert await applier.apply(compiler.compile(RULES), force=True) == {4: "applied", 6: "applied"}
+
+
+async def test_failed_restore_is_retried():
+    executor = FakeExecutor(returncode=1)
+    applier = FirewallApplier(executor)
+    ruleset = FirewallCompiler().compile(RULES[:3])
+    assert await applier.apply(ruleset) == {4: "failed"}
+    executor.returncode = 0
+    assert await applier.apply(ruleset) == {4: "applied"}
+    assert len(executor.calls) == 2
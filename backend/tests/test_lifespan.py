@@ -0,0 +1,12 @@
+"""
+应用生命周期：启动全部后台任务后正常关闭
+"""
+from app.main_production import app, lifespan
+from app.services.bgp_session_state import bgp_session_tracker
+
+
+async def test_lifespan_starts_and_stops(db):
+    async with lifespan(app):
+        assert bgp_session_tracker.running
+    assert not bgp_session_tracker.running
+    assert not bgp_session_tracker.is_writer
@@ -0,0 +1,112 @@
+"""
+日志流式导出：编码器的 NDJSON / CSV 输出与 gzip 分块，数据库日志的游标续传
+"""
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.api_v1.endpoints import logs as logs_endpoint
+from app.core.log_export import ExportEncoder, aencode_records, encode_records
+from app.models.monitoring import AuditLog, OperationLog
+from app.services.monitoring_service import EXPORT_COLUMNS, MonitoringService
+
+RECORDS = [
+    {"id": i, "message": f"第{i}条, \"引号\"", "tags": {"n": i}, "at": datetime(2026, 1, 1) + timedelta(seconds=i)}
+    for i in range(50)
+]
+
+
+def test_ndjson_lines_round_trip():
+    data = b"".join(encode_records(RECORDS, ExportEncoder("ndjson")))
+    lines = data.decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == list(range(50))
+    assert json.loads(lines[3])["at"] == "2026-01-01T00:00:03"
+
+
+def test_csv_header_and_quoting():
+    encoder = ExportEncoder("csv", columns=["id", "message", "tags", "missing"])
+    rows = list(csv.reader(io.StringIO(b"".join(encode_records(RECORDS, encoder)).decode())))
+    assert rows[0] == ["id", "message", "tags", "missing"]
+    assert rows[1] == ["0", "第0条, \"引号\"", '{"n": 0}', ""]
+    assert len(rows) == 51
+
+
+def test_csv_requires_columns_and_known_format():
+    with pytest.raises(ValueError):
+        ExportEncoder("csv")
+    with pytest.raises(ValueError):
+        ExportEncoder("xml")
+
+
+def test_gzip_chunks_form_one_stream():
+    encoder = ExportEncoder("ndjson", compress=True, chunk_size=256)
+    chunks = list(encode_records(RECORDS, encoder))
+    assert len(chunks) > 1
+    assert encoder.media_type == "application/gzip"
+    assert encoder.filename("logs") == "logs.ndjson.gz"
+    plain = b"".join(encode_records(RECORDS, ExportEncoder("ndjson")))
+    assert gzip.decompress(b"".join(chunks)) == plain
+
+
+async def test_async_encoder_matches_sync():
+    async def records():
+        for record in RECORDS:
+            yield record
+
+    chunks = [chunk async for chunk in aencode_records(records(), ExportEncoder("json", chunk_size=128))]
+    assert len(chunks) > 1
+    assert [r["id"] for r in json.loads(b"".join(chunks))] == list(range(50))
+
+
+async def _seed(factory):
+    async with factory() as session:
+        session.add_all([AuditLog(action=f"login-{i}", resource_type="user", success=True) for i in range(3)])
+        session.add_all([
+            OperationLog(operation_type="sync", operation_data=f'{{"n": {i}}}', status="success")
+            for i in range(2)
+        ])
+        await session.commit()
+
+
+async def _export(factory, **kwargs):
+    async with factory() as session:
+        data = b"".join([chunk async for chunk in MonitoringService(session).export_logs(**kwargs)])
+    return data
+
+
+async def test_export_db_logs_and_resume(db):
+    await _seed(db)
+
+    records = [json.loads(line) for line in (await _export(db)).decode().splitlines()]
+    assert [(r["type"], r["id"]) for r in records] == [
+        ("audit", 1), ("audit", 2), ("audit", 3), ("operation", 1), ("operation", 2)
+    ]
+    assert records[0]["action"] == "login-0" and records[0]["timestamp"]
+    assert records[3]["operation_type"] == "sync" and records[3]["timestamp"]
+
+    # 从中途的游标续传，只输出其后的记录（跨越类型边界）
+    resumed = [json.loads(line) for line in (await _export(db, cursor=records[1]["cursor"])).decode().splitlines()]
+    assert [r["cursor"] for r in resumed] == [r["cursor"] for r in records[2:]]
+
+    # CSV + gzip，按类型过滤
+    data = gzip.decompress(await _export(db, log_type="operation", format="csv", compress=True))
+    rows = list(csv.DictReader(io.StringIO(data.decode())))
+    assert list(rows[0].keys()) == EXPORT_COLUMNS
+    assert [row["cursor"] for row in rows] == ["operation:1", "operation:2"]
+
+
+async def test_export_rejects_malformed_cursor(db):
+    params = dict(format="ndjson", compress=False, level=None, service=None, start_time=None, end_time=None)
+    for cursor in ("audit:abc", "bogus:1", "operation:1"):
+        source = "audit" if cursor == "operation:1" else "all"
+        with pytest.raises(HTTPException) as exc_info:
+            await logs_endpoint.export_logs(source=source, cursor=cursor, **params)
+        assert exc_info.value.status_code == 400
+
+    response = await logs_endpoint.export_logs(source="all", cursor="audit:1", **params)
+    assert response.status_code == 200
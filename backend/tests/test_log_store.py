@@ -0,0 +1,206 @@
+"""
+日志存储：多 worker 时只有一个采集进程；查询总数、过滤、全文检索与游标分页
+"""
+import json
+
+from app.core.leader import LeaderLock
+from app.core import log_store as log_store_module
+from app.core.log_store import LogSegment, LogStore, LogTailer
+
+
+def _write(path, *messages):
+    with open(path, "a") as f:
+        for message in messages:
+            f.write(json.dumps({"timestamp": "2026-10-17T00:00:00Z", "level": "INFO", "message": message}) + "\n")
+
+
+def _tailer(store_dir, source, lock_dir):
+    store = LogStore(str(store_dir))
+    store.load()
+    tailer = LogTailer(store, str(source))
+    tailer._leader = LeaderLock("log-tailer", lock_dir=str(lock_dir))
+    return tailer
+
+
+async def _cycle(tailer):
+    """执行一次采集周期（与 _run 的循环体相同）"""
+    if await tailer._elect():
+        tailer.poll()
+    else:
+        tailer.store.refresh()
+
+
+async def test_single_tailer_and_followers_see_new_lines(tmp_path):
+    source = tmp_path / "app.log"
+    _write(source, "alpha", "beta")
+    workers = [_tailer(tmp_path / "store", source, tmp_path / "locks") for _ in range(3)]
+
+    for tailer in workers:
+        await _cycle(tailer)
+    assert [tailer.is_writer for tailer in workers] == [True, False, False]
+
+    _write(source, "gamma")
+    for tailer in workers:
+        await _cycle(tailer)
+    for tailer in workers:
+        assert tailer.store.query(text="gamma").total == 1
+        assert tailer.store.query().total == 3
+
+    # 执行者退出后由下一个 worker 接替，不重复采集
+    await workers[0].stop()
+    _write(source, "delta")
+    for tailer in workers[1:]:
+        await _cycle(tailer)
+    assert workers[1].is_writer
+    assert workers[2].store.query().total == 4
+
+    for tailer in workers[1:]:
+        await tailer.stop()
+
+
+async def test_take_over_truncates_partial_line(tmp_path):
+    store_dir = tmp_path / "store"
+    writer = LogStore(str(store_dir))
+    writer.append_lines([json.dumps({"level": "INFO", "message": "complete"})])
+    writer.close()
+    segment_path = writer._segments[-1].path
+    with open(segment_path, "ab") as f:
+        f.write(b'{"level": "INFO", "mess')  # 写入进程崩溃时的半行
+
+    store = LogStore(str(store_dir))
+    store.take_over()
+    store.append_lines([json.dumps({"level": "INFO", "message": "after"})])
+    store.close()
+
+    with open(segment_path, "rb") as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line)["message"] for line in lines] == ["complete", "after"]
+
+
+def _entry(hour, minute, level="INFO", service="api", message="request handled"):
+    return json.dumps({"timestamp": f"2026-10-17T{hour:02d}:{minute:02d}:00Z", "level": level,
+                       "service": service, "message": message})
+
+
+def _filled_store(directory, **kwargs):
+    """3 个小时分区各 10 条日志，每个分区一个段"""
+    store = LogStore(str(directory), **kwargs)
+    lines = []
+    for hour in range(3):
+        for minute in range(10):
+            level = "ERROR" if minute % 5 == 0 else "INFO"
+            service = "bgp" if minute % 2 else "api"
+            message = f"peer 网络 timeout hour{hour}" if minute == 3 else f"request handled hour{hour}"
+            lines.append(_entry(hour, minute, level, service, message))
+    assert store.append_lines(lines) == 30
+    store.close()
+    return store
+
+
+def test_query_totals_and_filters(tmp_path):
+    store = _filled_store(tmp_path)
+    assert len(store._segments) == 3
+
+    assert store.query(limit=5).total == 30
+    assert store.query(level="error").total == 6
+    assert store.query(service="bgp").total == 15
+    assert store.query(level="ERROR", service="bgp").total == 3  # 分钟 5
+    assert store.query(level="DEBUG").total == 0
+    assert store.query(start_time="2026-10-17T01:00:00Z", end_time="2026-10-17T01:59:59Z").total == 10
+    assert store.query(start_time="2026-10-17T01:05:00Z", end_time="2026-10-17T02:04:00Z").total == 10
+
+    # 全文检索对词元做 AND 匹配
+    assert store.query(text="timeout").total == 3
+    assert store.query(text="timeout hour1").total == 1
+    assert store.query(text="timeout missing").total == 0
+    assert store.query(text="网络").total == 3
+    result = store.query(text="request hour2", service="api")
+    assert result.total == 5
+    assert all(item["service"] == "api" and "hour2" in item["message"] for item in result.items)
+
+
+def test_cursor_paging_across_segments(tmp_path):
+    store = _filled_store(tmp_path)
+    expected = [item["id"] for item in store.query(limit=100).items]
+    assert len(expected) == 30
+    timestamps = [item["timestamp"] for item in store.query(limit=100).items]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+    # 页边界跨越段边界（每页 7 条，每段 10 条），不遗漏也不重复
+    seen, cursor = [], None
+    while True:
+        result = store.query(limit=7, cursor=cursor)
+        assert result.total == 30
+        seen.extend(item["id"] for item in result.items)
+        cursor = result.next_cursor
+        if cursor is None:
+            break
+    assert seen == expected
+
+    # 游标分页同样适用于过滤后的结果
+    errors = [item["id"] for item in store.query(level="ERROR", limit=100).items]
+    first = store.query(level="ERROR", limit=4)
+    second = store.query(level="ERROR", limit=4, cursor=first.next_cursor)
+    assert [item["id"] for item in first.items + second.items] == errors
+    assert second.next_cursor is None
+
+    # 偏移分页与游标分页结果一致
+    assert [item["id"] for item in store.query(limit=7, offset=7).items] == expected[7:14]
+
+
+def test_old_segments_without_token_index_scan_files(tmp_path):
+    store = _filled_store(tmp_path / "partial", index_segments=1)
+    full = _filled_store(tmp_path / "full", index_segments=0)
+    assert [segment.tokens is not None for segment in store._segments] == [False, False, True]
+    assert store.get_stats()["indexed_segments"] == 1
+
+    for kwargs in ({"text": "timeout"}, {"text": "网络 hour0"}, {"text": "request", "level": "ERROR"},
+                   {"text": "handled", "start_time": "2026-10-17T00:05:00Z"}):
+        expected = full.query(limit=100, **kwargs)
+        result = store.query(limit=100, **kwargs)
+        assert result.total == expected.total > 0
+        assert [item["id"] for item in result.items] == [item["id"] for item in expected.items]
+    assert [item["id"] for item in store.scan(text="timeout")] == \
+        [item["id"] for item in full.scan(text="timeout")]
+
+
+def test_refresh_reads_only_grown_segments(tmp_path, monkeypatch):
+    writer = _filled_store(tmp_path)
+    follower = LogStore(str(tmp_path))
+    follower.load()
+    assert follower.query().total == 30
+
+    opened = []
+    real_open = open
+
+    def counting_open(path, *args, **kwargs):
+        opened.append(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(log_store_module, "open", counting_open, raising=False)
+    assert follower.refresh() == 0
+    assert opened == []
+
+    writer.append_lines([_entry(2, 30, message="late arrival")])
+    writer.close()
+    opened.clear()
+    assert follower.refresh() == 1
+    assert opened == [writer._segments[-1].path]
+    assert follower.query(text="arrival").total == 1
+
+
+def test_query_reads_files_without_holding_lock(tmp_path, monkeypatch):
+    store = _filled_store(tmp_path, index_segments=1)
+    real_read = LogSegment.read
+    reads = []
+
+    def read(segment, rows):
+        assert not store._lock._is_owned()
+        reads.append(segment.segment_id)
+        return real_read(segment, rows)
+
+    monkeypatch.setattr(LogSegment, "read", read)
+    assert store.query(text="timeout", limit=2).total == 3
+    assert len(store.query(limit=15).items) == 15
+    assert store.get(store.query(limit=1).items[0]["id"]) is not None
+    assert reads
@@ -0,0 +1,118 @@
+"""
+前缀池空闲区间表：与内存索引的分配结果一致，每次操作只读写相邻区间
+"""
+import random
+
+from sqlalchemy import event
+from sqlalchemy.future import select
+
+from app.core.prefix_index import PrefixFreeIndex
+from app.models.ipv6 import PoolFreeRange, PoolPrefix, PrefixPool
+from app.schemas.ipv6 import PrefixPoolCreate, PrefixPoolUpdate
+from app.services.ipv6_service import IPv6PoolService
+from app.services.pool_free_ranges import PoolFreeRanges, slot_value
+
+BASE = "2001:db8::/56"
+
+
+async def _rows(session, pool_id):
+    result = await session.execute(
+        select(PoolFreeRange.start_slot, PoolFreeRange.end_slot)
+        .where(PoolFreeRange.pool_id == pool_id).order_by(PoolFreeRange.start_slot)
+    )
+    return [(slot_value(start), slot_value(end)) for start, end in result.all()]
+
+
+async def _create_pool(session, base=BASE):
+    pool = await IPv6PoolService(session).create_pool(PrefixPoolCreate(name="pool", base_prefix=base, prefix_len=64))
+    await session.commit()
+    return pool.id
+
+
+async def test_operations_match_in_memory_index(db):
+    async with db() as session:
+        service = IPv6PoolService(session)
+        pool_id = await _create_pool(session)
+        reference = PrefixFreeIndex(BASE, 64)
+        rng = random.Random(7)
+        records = {}
+
+        for _ in range(400):
+            roll = rng.random()
+            if records and roll < 0.35:
+                prefix = rng.choice(sorted(records))
+                assert await service.release(records.pop(prefix))
+                assert reference.release(prefix)
+            elif roll < 0.45:
+                prefix = reference.prefix_at(rng.randrange(reference.capacity))
+                record = await service.reserve(pool_id, prefix)
+                assert (record is not None) == reference.reserve(prefix)
+                if record is not None:
+                    records[prefix] = record.id
+            else:
+                record = await service.allocate_next(pool_id)
+                expected = reference.allocate()
+                assert (record.prefix if record else None) == expected
+                if record is not None:
+                    records[record.prefix] = record.id
+        await session.commit()
+        assert await _rows(session, pool_id) == reference.ranges()
+
+        # 已释放的前缀再次释放不改变区间表
+        released = await service.allocate_next(pool_id)
+        assert await service.release(released.id)
+        before = await _rows(session, pool_id)
+        ranges = PoolFreeRanges(session, await session.get(PrefixPool, pool_id))
+        assert not await ranges.release(released.prefix)
+        assert await _rows(session, pool_id) == before
+
+
+async def test_rebuilds_from_existing_prefixes(db):
+    async with db() as session:
+        service = IPv6PoolService(session)
+        pool_id = await _create_pool(session)
+        session.add_all([
+            PoolPrefix(pool_id=pool_id, prefix="2001:db8:0:0::/64", status="allocated"),
+            PoolPrefix(pool_id=pool_id, prefix="2001:db8:0:2::/64", status="reserved"),
+            PoolPrefix(pool_id=pool_id, prefix="2001:db8:0:1::/64", status="free"),
+        ])
+        await session.commit()
+
+        assert (await service.allocate_next(pool_id)).prefix == "2001:db8:0:1::/64"
+        assert (await service.allocate_next(pool_id)).prefix == "2001:db8:0:3::/64"
+        assert await _rows(session, pool_id) == [(4, 256)]
+
+        # 分配长度变化后下次分配重建区间表
+        await service.update_pool(pool_id, PrefixPoolUpdate(prefix_len=60))
+        pool = await session.get(PrefixPool, pool_id)
+        await session.refresh(pool)
+        assert not pool.free_ranges_built
+        assert (await service.allocate_next(pool_id)).prefix == "2001:db8:0:10::/60"
+
+
+async def test_allocation_cost_does_not_grow_with_fragments(db):
+    async with db() as session:
+        service = IPv6PoolService(session)
+        pool_id = await _create_pool(session, base="2001:db8::/52")
+        # 每隔一个槽位占用一个前缀，形成 1001 个空闲区间
+        pool = await session.get(PrefixPool, pool_id)
+        ranges = PoolFreeRanges(session, pool)
+        await ranges.build(ranges.index.prefix_at(slot) for slot in range(1, 2001, 2))
+        await session.commit()
+        assert len(await _rows(session, pool_id)) == 1001
+
+        statements = []
+        engine = session.bind.sync_engine
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            for _ in range(3):
+                await service.allocate_next(pool_id)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+        # 每次分配：锁池、取首个区间、查找/写入分配记录、更新或删除一个区间
+        assert len(statements) <= 3 * 6
+        assert not any("free_ranges" in statement and "UPDATE prefix_pools" in statement for statement in statements)
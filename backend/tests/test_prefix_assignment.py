@@ -0,0 +1,37 @@
+"""
+粘性前缀分配：落点稳定，碎片数有上限
+"""
+from app.core.prefix_index import PrefixFreeIndex
+from app.services.prefix_assignment import StickyPrefixAssigner, pool_hash_key
+
+POOL_PREFIX = "2a0e:97c0:e60::/48"
+
+
+def test_assignment_is_stable_and_bounded_in_fragments():
+    assigner = StickyPrefixAssigner()
+    key = pool_hash_key(1, POOL_PREFIX)
+
+    # 同一客户端在新建的索引（其他 worker、重启后）中落在同一前缀
+    first, _ = assigner.assign(PrefixFreeIndex(POOL_PREFIX, 64), key, "client-1")
+    again, _ = assigner.assign(PrefixFreeIndex(POOL_PREFIX, 64), key, "client-1")
+    assert first == again
+
+    index = PrefixFreeIndex(POOL_PREFIX, 64)
+    start, end = assigner.home_block(index, key, "client-1")
+    assert index.slot_range(first) == (start, start + 1)
+
+    assigned = {assigner.assign(index, key, f"client-{i}")[0] for i in range(5000)}
+    assert len(assigned) == 5000 and None not in assigned
+    assert index.free_count == index.capacity - 5000
+    # 块内从低到高填充：碎片数不超过块数，而不是随分配数量增长
+    assert index.fragments <= assigner.blocks(index)[0]
+
+
+def test_small_pool_fills_completely():
+    assigner = StickyPrefixAssigner()
+    index = PrefixFreeIndex("2001:db8::/60", 64)
+    key = pool_hash_key(2, "2001:db8::/60")
+    prefixes = [assigner.assign(index, key, f"c{i}")[0] for i in range(16)]
+    assert len(set(prefixes)) == 16
+    assert assigner.assign(index, key, "overflow") == (None, 16)
+    assert assigner.stats["exhausted"] == 1
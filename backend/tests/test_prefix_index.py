@@ -0,0 +1,49 @@
+"""
+前缀池空闲索引：头部分配、空闲计数、保留输入校验
+"""
+import json
+import random
+
+from app.core.prefix_index import PrefixFreeIndex
+
+BASE = "2001:db8::/52"
+
+
+def _ranges(index):
+    return [tuple(r) for r in json.loads(index.dumps())]
+
+
+def test_operations_match_a_reference_set():
+    index = PrefixFreeIndex(BASE, 64)
+    free = set(range(index.capacity))
+    rng = random.Random(1)
+    allocated = []
+    for _ in range(3000):
+        if allocated and rng.random() < 0.3:
+            prefix = allocated.pop(rng.randrange(len(allocated)))
+            assert index.release(prefix)
+            free.add(index.slot_range(prefix)[0])
+        else:
+            prefix = index.allocate()
+            slot = index.slot_range(prefix)[0]
+            assert slot == min(free)
+            free.remove(slot)
+            allocated.append(prefix)
+        assert index.free_count == len(free)
+
+    # 序列化只包含仍空闲的区间，恢复后状态一致
+    restored = PrefixFreeIndex.loads(BASE, 64, index.dumps())
+    assert restored.free_count == len(free)
+    assert restored.fragments == index.fragments == len(_ranges(index))
+    assert sum(end - start for start, end in _ranges(restored)) == len(free)
+
+
+def test_reserve_rejects_malformed_prefixes():
+    index = PrefixFreeIndex(BASE, 64)
+    for prefix in ("2001:db8::1/64", "2001:db8::/56", "2001:db8:1::/64", "10.0.0.0/64", "garbage", None, 5):
+        assert not index.reserve(prefix)
+    assert index.free_count == index.capacity
+    assert index.normalize(" 2001:db8:0:1::/64") == "2001:db8:0:1::/64"
+    assert index.reserve("2001:db8:0:1::/64")
+    assert not index.reserve("2001:db8:0:1::/64")
+    assert index.free_count == index.capacity - 1
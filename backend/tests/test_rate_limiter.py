@@ -0,0 +1,65 @@
+"""
+速率限制：安全状态中的被限流IP数和被拒绝请求数；内存与 Redis 后端结果一致
+"""
+import asyncio
+
+import pytest
+
+from app.core import security_validator as security_module
+from app.core.rate_limiter import MemoryRateLimitBackend, RateLimit, RateLimiter, RedisRateLimitBackend
+from app.core.security_validator import SecurityValidator
+
+
+async def test_security_status_reports_limited_ips(monkeypatch):
+    limiter = RateLimiter()
+    monkeypatch.setattr(security_module, "rate_limiter", limiter)
+    validator = SecurityValidator()
+    validator.rate_limits = [RateLimit("minute", 2, 60)]
+
+    for ip in ("192.0.2.1", "192.0.2.2"):
+        for _ in range(3):
+            await validator._check_rate_limit(ip)
+    await validator._check_rate_limit("192.0.2.3")
+    for _ in range(2):
+        await limiter.hit("api", "192.0.2.9", [RateLimit("minute", 1, 60)])
+
+    status = await validator.get_security_status()
+    assert status["rate_limited_ips"] == 2
+    assert status["rate_limited_requests"] == 3
+    # 其他 scope（如 API 限流）不计入请求校验的被限流IP
+    assert limiter.get_stats()["limited"] == 3
+
+
+def _burst_limits():
+    # 突发 3 次（每秒 100 次）与每分钟 10 次
+    return [RateLimit("burst", 100, 1, burst=3), RateLimit("minute", 10, 60)]
+
+
+async def test_memory_and_redis_backends_agree():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    memory = MemoryRateLimitBackend()
+    redis_backend = RedisRateLimitBackend(fakeredis.FakeAsyncRedis(decode_responses=True))
+    limits = _burst_limits()
+
+    async def run(backend):
+        keys = [f"ratelimit:test:192.0.2.1:{limit.name}" for limit in limits]
+        results = []
+        for _ in range(4):
+            results.append(await backend.hit(keys, limits, 1))
+        await asyncio.sleep(0.1)  # 突发额度完全恢复
+        for cost in (1, 1, 2):
+            results.append(await backend.hit(keys, limits, cost))
+        return results
+
+    expected, actual = await run(memory), await run(redis_backend)
+    assert [r.allowed for r in expected] == [True, True, True, False, True, True, False]
+    for want, got in zip(expected, actual):
+        assert got.allowed == want.allowed
+        assert got.exceeded == want.exceeded
+        assert got.remaining == want.remaining
+        assert got.retry_after == pytest.approx(want.retry_after, abs=0.02)
+    assert expected[3].exceeded == ["burst"]
+    # cost 2 超出仍剩 1 次额度的突发限制：按脚本返回的序号判断，而不是剩余额度是否为 0
+    assert expected[6].exceeded == ["burst"]
+    assert actual[6].remaining == {"burst": 1, "minute": 5}
@@ -0,0 +1,160 @@
+"""
+响应压缩：线程池压缩、流式压缩、ETag/304、预压缩缓存和小响应不压缩
+"""
+import gzip
+import zlib
+
+from app.core import response_compression
+from app.core.response_compression import CompressionConfig, CompressionMiddleware, CompressionType
+
+BODY = b'{"key": "value"}' * 512
+
+
+def _app(body: bytes, headers=()):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json"), *headers]})
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+def _stream_app(chunks, content_type=b"text/event-stream"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+async def _request(middleware, method="GET", headers=()):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": "/api/v1/test",
+             "headers": [(b"accept-encoding", b"gzip"), *headers]}
+    await middleware(scope, None, send)
+    return messages
+
+
+def _headers(messages):
+    return {key.decode(): value.decode() for key, value in messages[0]["headers"]}
+
+
+def _gzip_config(**kwargs):
+    return CompressionConfig(enabled_types=[CompressionType.GZIP], **kwargs)
+
+
+async def test_high_level_and_large_bodies_compress_in_thread(monkeypatch):
+    offloaded = []
+
+    async def to_thread(func, *args):
+        offloaded.append(args[2])
+        return func(*args)
+
+    monkeypatch.setattr(response_compression.asyncio, "to_thread", to_thread)
+    config = _gzip_config(offload_size=64 * 1024)
+
+    # GET 响应会被缓存，使用高压缩率级别，在线程池中压缩
+    middleware = CompressionMiddleware(_app(BODY), config)
+    messages = await _request(middleware)
+    assert offloaded == [9]
+    assert gzip.decompress(messages[1]["body"]) == BODY
+
+    # 不缓存的小响应使用默认级别，直接压缩
+    await _request(middleware, method="POST")
+    assert offloaded == [9]
+
+    # 超过 offload_size 的响应即使使用默认级别也在线程池中压缩
+    large = b'{"key": "value"}' * 8192
+    await _request(CompressionMiddleware(_app(large), config), method="POST")
+    assert offloaded == [9, 6]
+
+
+async def test_etag_and_not_modified():
+    middleware = CompressionMiddleware(_app(BODY), _gzip_config())
+    first = await _request(middleware)
+    etag = _headers(first)["etag"]
+    assert etag.startswith('W/"')
+
+    messages = await _request(middleware, headers=[(b"if-none-match", etag.encode())])
+    assert messages[0]["status"] == 304
+    assert messages[1]["body"] == b""
+    headers = _headers(messages)
+    assert headers["etag"] == etag and "content-type" not in headers
+    assert middleware.get_stats()["not_modified"] == 1
+
+    # 内容变化后旧 ETag 不再匹配
+    changed = CompressionMiddleware(_app(BODY + b" "), _gzip_config())
+    assert (await _request(changed, headers=[(b"if-none-match", etag.encode())]))[0]["status"] == 200
+
+
+async def test_no_etag_for_credentialed_requests_or_cookies():
+    middleware = CompressionMiddleware(_app(BODY), _gzip_config())
+    etag = _headers(await _request(middleware))["etag"]
+
+    # 带凭据的请求不生成 ETag，也不按 If-None-Match 返回 304
+    for credential in ((b"authorization", b"Bearer token"), (b"cookie", b"session=1")):
+        messages = await _request(middleware, headers=[credential, (b"if-none-match", etag.encode())])
+        assert messages[0]["status"] == 200
+        assert "etag" not in _headers(messages)
+        assert gzip.decompress(messages[1]["body"]) == BODY
+
+    # 设置 Cookie 的响应同样不生成 ETag
+    cookie_app = CompressionMiddleware(_app(BODY, [(b"set-cookie", b"session=2")]), _gzip_config())
+    messages = await _request(cookie_app, headers=[(b"if-none-match", etag.encode())])
+    assert messages[0]["status"] == 200 and "etag" not in _headers(messages)
+
+    # 路由自己设置的 ETag 表示允许条件请求
+    opted_in = CompressionMiddleware(_app(BODY, [(b"etag", b'"v1"')]), _gzip_config())
+    messages = await _request(opted_in, headers=[(b"authorization", b"Bearer token"), (b"if-none-match", b'"v1"')])
+    assert messages[0]["status"] == 304
+
+
+async def test_precompressed_cache_hit(monkeypatch):
+    calls = []
+    real_compress = response_compression.compress_bytes
+
+    def compress_bytes(*args):
+        calls.append(args[2])
+        return real_compress(*args)
+
+    async def to_thread(func, *args):
+        return func(*args)
+
+    monkeypatch.setattr(response_compression, "compress_bytes", compress_bytes)
+    monkeypatch.setattr(response_compression.asyncio, "to_thread", to_thread)
+    middleware = CompressionMiddleware(_app(BODY), _gzip_config())
+
+    first, second = await _request(middleware), await _request(middleware)
+    assert calls == [9]
+    assert first[1]["body"] == second[1]["body"]
+    assert middleware.get_stats()["cache_hits"] == 1
+    # 带凭据的请求同样复用按响应体摘要缓存的压缩结果
+    await _request(middleware, headers=[(b"authorization", b"Bearer token")])
+    assert calls == [9]
+
+
+async def test_small_bodies_are_not_compressed():
+    messages = await _request(CompressionMiddleware(_app(b'{"ok": true}'), _gzip_config(min_size=1024)))
+    headers = _headers(messages)
+    assert "content-encoding" not in headers
+    assert headers["vary"] == "Accept-Encoding"
+    assert messages[1]["body"] == b'{"ok": true}'
+
+
+async def test_streaming_compresses_each_event():
+    chunks = [b"data: %d\n\n" % i * 20 for i in range(5)]
+    middleware = CompressionMiddleware(_stream_app(chunks), _gzip_config())
+    messages = await _request(middleware)
+
+    headers = _headers(messages)
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    bodies = [message["body"] for message in messages[1:]]
+    assert [message["more_body"] for message in messages[1:]] == [True] * 4 + [False]
+
+    # SSE 每块都会刷新：逐块解压即可得到对应事件
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert [decoder.decompress(body) for body in bodies] == chunks
+    assert middleware.get_stats()["streamed_responses"] == 1
@@ -0,0 +1,56 @@
+"""
+RPKI告警：告警状态保存在数据库，多 worker、重启后不重复告警
+"""
+from sqlalchemy import select
+
+from app.core.leader import LeaderLock
+from app.core.roa_table import ROATable
+from app.models import BGPAnnouncement, BGPSession
+from app.models.ipv6_pool import BGPAlert
+from app.services.bgp_service import BGPService
+from app.services.rpki_validation import rpki_validator
+
+
+def _worker(lock_dir):
+    service = BGPService()
+    service._rpki_leader = LeaderLock("rpki-alerts", lock_dir=str(lock_dir))
+    return service
+
+
+async def _alerts(db):
+    async with db() as session:
+        result = await session.execute(select(BGPAlert.prefix, BGPAlert.is_resolved).order_by(BGPAlert.id))
+        return result.tuples().all()
+
+
+async def test_alerts_are_deduplicated_across_workers_and_restarts(db, tmp_path, monkeypatch):
+    async with db() as session:
+        peer = BGPSession(name="peer", local_as=65001, remote_as=65002, local_ip="2001:db8::1", remote_ip="2001:db8::2")
+        session.add(peer)
+        await session.flush()
+        session.add(BGPAnnouncement(prefix="2001:db8:100::/48", session_id=peer.id))
+        await session.commit()
+
+    invalid = ROATable.from_entries([("2001:db8::/32", 48, 64999)])
+    monkeypatch.setattr(rpki_validator, "_table", invalid)
+    workers = [_worker(tmp_path) for _ in range(2)]
+    for worker in workers:
+        assert (await worker.validate_announcements())["invalid_prefixes"] == ["2001:db8:100::/48"]
+    assert await _alerts(db) == [("2001:db8:100::/48", False)]
+
+    # 持锁 worker 重启后不会再次告警
+    workers[0]._rpki_leader.release()
+    restarted = _worker(tmp_path)
+    await restarted.validate_announcements()
+    assert await _alerts(db) == [("2001:db8:100::/48", False)]
+
+    # 恢复后关闭告警，再次变为 invalid 时重新告警
+    monkeypatch.setattr(rpki_validator, "_table", ROATable.from_entries([("2001:db8::/32", 48, 65001)]))
+    await restarted.validate_announcements()
+    assert await _alerts(db) == [("2001:db8:100::/48", True)]
+    monkeypatch.setattr(rpki_validator, "_table", invalid)
+    await restarted.validate_announcements()
+    assert await _alerts(db) == [("2001:db8:100::/48", True), ("2001:db8:100::/48", False)]
+
+    for worker in (*workers, restarted):
+        worker._rpki_leader.release()
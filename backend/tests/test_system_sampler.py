@@ -0,0 +1,27 @@
+"""
+系统指标采样器：latest() 不在事件循环中采集
+"""
+import asyncio
+import threading
+
+from app.core.system_sampler import SystemMetricsSampler
+
+
+async def test_latest_samples_off_the_event_loop(monkeypatch):
+    sampler = SystemMetricsSampler()
+    collect = sampler._collect
+    threads = []
+
+    def tracked():
+        threads.append(threading.current_thread())
+        return collect()
+
+    monkeypatch.setattr(sampler, "_collect", tracked)
+    first, second = await asyncio.gather(sampler.latest(), sampler.latest())
+    assert first is second
+    assert threads and threading.main_thread() not in threads
+    assert len(threads) == 1
+
+    # 有数据后直接返回缓存的快照
+    assert await sampler.latest() is first
+    assert len(threads) == 1
@@ -0,0 +1,128 @@
+"""
+令牌撤销：校验只查内存，没有Redis时多个worker定时从数据库拉取彼此的撤销
+"""
+import asyncio
+import importlib.util
+import os
+import time
+import uuid
+
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from app.core.database_token_blacklist import DatabaseTokenBlacklist
+from app.core.token_blacklist import POLL_OVERLAP, TokenBlacklist
+
+
+def _payload(user_id="7", iat=None):
+    now = time.time()
+    return {"jti": uuid.uuid4().hex, "sub": user_id, "iat": int(iat or now), "exp": now + 600}
+
+
+class CountingStore(DatabaseTokenBlacklist):
+    """记录持久化后端的调用次数"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def load_active(self, now):
+        self.calls += 1
+        return await super().load_active(now)
+
+    async def changes_since(self, since):
+        self.calls += 1
+        return await super().changes_since(since)
+
+
+async def test_check_does_no_store_io(db):
+    store = CountingStore()
+    blacklist = TokenBlacklist(store=store)
+    revoked = _payload()
+    await blacklist.revoke_by_jti(revoked["jti"], revoked["exp"], user_id="7")
+
+    store.calls = 0
+    for _ in range(100):
+        assert not await blacklist.check_payload(_payload())
+    assert await blacklist.check_payload(revoked)
+    assert store.calls == 0
+
+
+async def test_revocation_reaches_other_worker_by_polling(db):
+    store = DatabaseTokenBlacklist()
+    worker_a, worker_b = TokenBlacklist(store=store), TokenBlacklist(store=store)
+    assert worker_b.polls_store
+    await worker_b.load()
+
+    revoked, valid = _payload(), _payload()
+    assert await worker_a.revoke_by_jti(revoked["jti"], revoked["exp"], user_id="7")
+    await worker_a.revoke_user_tokens("8", revoked_before=time.time() + 5)
+    assert not await worker_b.check_payload(revoked)  # 拉取之前只看内存
+
+    assert await worker_b.poll() == 2
+    assert await worker_b.check_payload(revoked)
+    assert not await worker_b.check_payload(valid)
+    # 按用户撤销同样可见，之后签发的令牌不受影响
+    assert await worker_b.check_payload(_payload(user_id="8"))
+    assert not await worker_b.check_payload(_payload(user_id="8", iat=time.time() + 10))
+
+    # 下一次拉取只回看重叠窗口内的记录，不重新读取全部撤销
+    worker_b._synced_at = time.time() + POLL_OVERLAP
+    assert await worker_b.poll() == 0
+
+
+async def test_poll_loop_runs_until_stopped(db):
+    store = DatabaseTokenBlacklist()
+    worker_a, worker_b = TokenBlacklist(store=store), TokenBlacklist(store=store)
+    worker_b.poll_interval = 0.01
+    await worker_b.start()
+    try:
+        revoked = _payload()
+        await worker_a.revoke_by_jti(revoked["jti"], revoked["exp"])
+        for _ in range(200):
+            if await worker_b.check_payload(revoked):
+                break
+            await asyncio.sleep(0.01)
+        assert await worker_b.check_payload(revoked)
+    finally:
+        await worker_b.stop()
+    assert worker_b._poller is None
+
+
+async def test_persist_failure_is_reported():
+    class BrokenStore(DatabaseTokenBlacklist):
+        async def add(self, *args, **kwargs):
+            raise RuntimeError("db down")
+
+    blacklist = TokenBlacklist(store=BrokenStore())
+    payload = _payload()
+    assert not await blacklist.revoke_by_jti(payload["jti"], payload["exp"])
+    assert blacklist.is_payload_revoked(payload)  # 当前进程内仍然生效
+
+
+def test_migration_rekeys_old_blacklist(tmp_path):
+    path = os.path.join(os.path.dirname(__file__), "..", "migrations", "versions", "0004_token_revocation_by_jti.py")
+    spec = importlib.util.spec_from_file_location("migration_0004", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'm.db'}")
+    with engine.begin() as conn:
+        conn.execute(sa.text(
+            "CREATE TABLE blacklisted_tokens (id VARCHAR PRIMARY KEY, token VARCHAR NOT NULL UNIQUE, "
+            "expires_at FLOAT NOT NULL, created_at DATETIME, user_id VARCHAR, reason VARCHAR)"
+        ))
+        # 载荷 {"jti": "abc"} 的令牌和一个无法解析的旧令牌
+        conn.execute(sa.text(
+            "INSERT INTO blacklisted_tokens (id, token, expires_at) VALUES "
+            "('1', 'h.eyJqdGkiOiAiYWJjIn0.s', 100.0), ('2', 'opaque', 200.0)"
+        ))
+        migration.op = Operations(MigrationContext.configure(conn))
+        migration.upgrade()
+
+        rows = dict(conn.execute(sa.text("SELECT jti, expires_at FROM blacklisted_tokens")).all())
+        tables = set(sa.inspect(conn).get_table_names())
+    assert rows["abc"] == 100.0
+    assert any(key.startswith("sha256:") for key in rows)
+    assert "user_token_watermarks" in tables
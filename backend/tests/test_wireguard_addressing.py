@@ -0,0 +1,27 @@
+"""
+隧道地址索引：旧数据中的接口写法与未写前缀长度的服务器地址
+"""
+from app.core.prefix_index import PrefixFreeIndex
+from app.services import wireguard_addressing
+from app.services.wireguard_addressing import build_host_index, reserved_addresses
+
+
+def test_host_index_treats_interface_notation_as_single_host():
+    index = PrefixFreeIndex.from_used("10.8.0.0/24", 32, ["10.8.0.2/24", "10.8.0.3/32"])
+    assert index.free_count == 254
+    assert not index.is_free("10.8.0.2/32") and index.is_free("10.8.0.4/32")
+
+    # 前缀池（非主机粒度）仍按前缀覆盖的范围占用
+    pool = PrefixFreeIndex.from_used("2001:db8::/48", 64, ["2001:db8:0:10::/60"])
+    assert pool.free_count == (1 << 16) - 16
+
+
+def test_server_address_without_length_uses_configured_network(monkeypatch):
+    monkeypatch.setattr(wireguard_addressing.settings, "WIREGUARD_NETWORK", "10.9.0.0/24", raising=False)
+    monkeypatch.setattr(wireguard_addressing.settings, "WIREGUARD_IPV6_NETWORK", "fd00:9::/64", raising=False)
+
+    index = build_host_index("10.9.0.1", ["10.9.0.2"])
+    assert index.capacity == 256
+    assert index.allocate() == "10.9.0.3/32"
+    assert set(reserved_addresses("10.9.0.1")) == {"10.9.0.0/32", "10.9.0.1/32", "10.9.0.255/32"}
+    assert build_host_index("fd00:9::1", []).network.prefixlen == 64
@@ -0,0 +1,91 @@
+"""
+WireGuard 接口与模型
+"""
+import io
+import ipaddress
+import zipfile
+
+from sqlalchemy import select
+
+from app.models import WireGuardClient
+from app.schemas.wireguard import WireGuardClientCreate, WireGuardServerCreate
+from app.services import wireguard_service
+from app.services.wireguard_service import WireGuardService
+
+
+def test_wireguard_routes_registered():
+    """端点模块导入失败时路由注册只记录警告，这里确认路由确实注册上了"""
+    from app.main_production import app
+
+    paths = {route.path for route in app.routes}
+    for path in (
+        "/api/v1/wireguard/config",
+        "/api/v1/wireguard/peers",
+        "/api/v1/wireguard/servers",
+        "/api/v1/wireguard/servers/{server_id}/status",
+        "/api/v1/wireguard/servers/{server_id}/config",
+        "/api/v1/wireguard/servers/{server_id}/bundle.zip",
+        "/api/v1/wireguard/servers:rebalance",
+        "/api/v1/wireguard/clients:batch",
+        "/api/v1/wireguard/clients/{client_id}/qr",
+    ):
+        assert path in paths
+    assert sum(path.startswith("/api/v1/wireguard/") for path in paths) >= 11
+
+
+async def test_create_server_and_clients(db):
+    async with db() as session:
+        service = WireGuardService(session)
+        server = await service.create_server(WireGuardServerCreate(
+            name="wg-test", interface="wgtest0", listen_port=51820,
+            ipv4_address="10.8.0.1/24", ipv6_address="fd00:8::1/64", dns_servers=["1.1.1.1"],
+        ))
+        assert server.is_active and server.dns_servers == ["1.1.1.1"]
+
+        for name in ("alice", "bob"):
+            await service.create_client(WireGuardClientCreate(
+                server_id=server.id, name=name, allowed_ips=["0.0.0.0/0", "::/0"],
+            ))
+
+    async with db() as session:
+        clients = (await session.execute(select(WireGuardClient).order_by(WireGuardClient.id))).scalars().all()
+    assert [client.name for client in clients] == ["alice", "bob"]
+    assert clients[0].allowed_ips == "0.0.0.0/0,::/0"
+    addresses = [ipaddress.ip_interface(client.ipv4_address).ip for client in clients]
+    assert len(set(addresses)) == 2
+    assert all(address in ipaddress.ip_network("10.8.0.0/24") for address in addresses)
+
+
+async def test_bundle_member_names_are_unique(db):
+    async with db() as session:
+        service = WireGuardService(session)
+        server = await service.create_server(WireGuardServerCreate(
+            name="wg-bundle", interface="wgbundle0", listen_port=51822,
+            ipv4_address="10.7.0.1/24", ipv6_address="fd00:7::1/64",
+        ))
+        for name in ("a b", "a_b", "a/b"):
+            await service.create_client(WireGuardClientCreate(server_id=server.id, name=name))
+        data = b"".join([chunk async for chunk in service.iter_client_bundle(server)])
+
+    names = zipfile.ZipFile(io.BytesIO(data)).namelist()
+    assert len(names) == len(set(names)) == 3
+    assert all(name.startswith("a_b-") and name.endswith(".conf") for name in names)
+
+
+async def test_get_config_renders_without_writing(db, monkeypatch):
+    async with db() as session:
+        service = WireGuardService(session)
+        server = await service.create_server(WireGuardServerCreate(
+            name="wg-read", interface="wgread0", listen_port=51823,
+            ipv4_address="10.6.0.1/24", ipv6_address="fd00:6::1/64",
+        ))
+        client = await service.create_client(WireGuardClientCreate(server_id=server.id, name="carol"))
+
+        writes = []
+        monkeypatch.setattr(wireguard_service.config_file_writer, "write", lambda *args: writes.append(args))
+        config = await service.get_config(server.id)
+
+    assert writes == []
+    assert "[Interface]" in config.server_config and client.public_key in config.server_config
+    assert [entry["name"] for entry in config.client_configs] == ["carol"]
+    assert client.private_key in config.client_configs[0]["config"]
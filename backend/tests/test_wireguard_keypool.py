@@ -0,0 +1,87 @@
+"""
+WireGuard密钥对预生成池：补充到容量、池空时同步生成、加密保存与公钥绑定
+"""
+import asyncio
+import base64
+
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+from app.services.wireguard_keypool import KeypairReservoir
+
+
+def _public_of(private_key: str) -> str:
+    key = X25519PrivateKey.from_private_bytes(base64.b64decode(private_key))
+    raw = key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return base64.b64encode(raw).decode("ascii")
+
+
+async def test_refill_fills_to_capacity():
+    reservoir = KeypairReservoir(capacity=40, secret="test-secret")
+    assert await reservoir.refill() == 40
+    assert len(reservoir) == 40
+    assert await reservoir.refill() == 0
+    assert reservoir.get_stats()["refilled"] == 40
+
+
+async def test_background_task_refills_below_watermark():
+    reservoir = KeypairReservoir(capacity=8, low_watermark=4, secret="test-secret")
+    reservoir.start()
+    try:
+        for _ in range(200):
+            if len(reservoir) == 8:
+                break
+            await asyncio.sleep(0.01)
+        assert len(reservoir) == 8
+
+        for _ in range(5):
+            reservoir.take()
+        for _ in range(200):
+            if len(reservoir) == 8:
+                break
+            await asyncio.sleep(0.01)
+        assert len(reservoir) == 8
+        assert reservoir.stats["served_pool"] == 5
+    finally:
+        await reservoir.stop()
+    assert len(reservoir) == 0 and not reservoir.running
+
+
+def test_take_generates_inline_when_empty():
+    reservoir = KeypairReservoir(capacity=4, secret="test-secret")
+    private_key, public_key = reservoir.take()
+    assert _public_of(private_key) == public_key
+    assert (reservoir.stats["served_inline"], reservoir.stats["served_pool"]) == (1, 0)
+
+
+async def test_pooled_keypairs_are_sealed_and_valid():
+    reservoir = KeypairReservoir(capacity=4, secret="test-secret")
+    await reservoir.refill()
+    sealed, public_key = reservoir._pool[0]
+    # 池中不保存明文私钥
+    private_key, taken_public = reservoir.take()
+    assert taken_public == public_key
+    assert base64.b64decode(private_key) not in sealed
+    assert _public_of(private_key) == public_key
+
+    keys = {reservoir.take() for _ in range(3)}
+    assert len(keys) == 3 and all(_public_of(private) == public for private, public in keys)
+
+
+async def test_tampered_public_key_fails_decryption():
+    reservoir = KeypairReservoir(capacity=2, secret="test-secret")
+    await reservoir.refill()
+    (sealed, public_key), (_, other_public) = reservoir._pool
+    with pytest.raises(InvalidTag):
+        reservoir._open(sealed, other_public)
+
+    # 池项被替换为错配的公钥时取出失败，而不是返回不匹配的密钥对
+    reservoir._pool[0] = (sealed, other_public)
+    with pytest.raises(InvalidTag):
+        reservoir.take()
+
+    # 不同应用密钥派生的加密密钥无法解开
+    with pytest.raises(InvalidTag):
+        KeypairReservoir(secret="other-secret")._open(sealed, public_key)
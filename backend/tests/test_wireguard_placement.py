@@ -0,0 +1,87 @@
+"""
+WireGuard对等节点放置：有界负载一致性哈希，增删接口时的再平衡迁移量
+"""
+from collections import Counter
+
+from app.services.wireguard_placement import LOAD_FACTOR, PlacementRing, placement_ring
+
+PEERS = 1000
+
+
+def _place_all(ring, count=PEERS):
+    """按顺序逐个放置，返回 {节点ID: 接口} 与各接口负载"""
+    loads, current = Counter(), {}
+    for peer_id in range(count):
+        target = ring.place(f"peer-{peer_id}", loads)
+        loads[target] += 1
+        current[peer_id] = target
+    return current, loads
+
+
+def _apply(current, moves):
+    after = dict(current)
+    for move in moves:
+        assert after[move.peer_id] == move.source
+        after[move.peer_id] = move.target
+    return after, Counter(after.values())
+
+
+def test_bounded_load_placement_respects_cap():
+    ring = PlacementRing([1, 2, 3, 4])
+    current, loads = _place_all(ring)
+    assert sum(loads.values()) == PEERS
+    assert set(loads) == {1, 2, 3, 4}
+    assert max(loads.values()) <= ring.limit(PEERS)
+
+    # 哈希集中到同一位置的键也不会超过上限：同一个键重复放置
+    hot = Counter()
+    for _ in range(40):
+        hot[ring.place("same-key", hot)] += 1
+    assert max(hot.values()) <= ring.limit(40, LOAD_FACTOR)
+    assert len(hot) == 4
+
+
+def test_lookup_is_stable_and_empty_ring_places_nothing():
+    ring = PlacementRing([3, 1, 2])
+    assert ring.nodes == (1, 2, 3)
+    assert all(ring.lookup(f"k{i}") == PlacementRing([1, 2, 3]).lookup(f"k{i}") for i in range(100))
+    assert PlacementRing([]).place("k", {}) is None
+    assert PlacementRing([1]).plan_rebalance([(1, "k", 2)], max_moves=0) == []
+    assert placement_ring((1, 2)) is placement_ring((1, 2))
+
+
+def test_rebalance_after_adding_interface_moves_about_one_share():
+    current, _ = _place_all(PlacementRing([1, 2, 3, 4]))
+    assignments = [(peer_id, f"peer-{peer_id}", server) for peer_id, server in current.items()]
+    ring = PlacementRing([1, 2, 3, 4, 5])
+
+    moves = ring.plan_rebalance(assignments, max_moves=PEERS)
+    # 只有落在新接口哈希区间内的节点迁移（期望约 1/5），且几乎都迁往新接口
+    assert PEERS // 10 <= len(moves) <= PEERS * LOAD_FACTOR / 5
+    assert sum(move.target == 5 for move in moves) >= len(moves) * 0.95
+    _, loads = _apply(current, moves)
+    assert max(loads.values()) <= ring.limit(PEERS)
+
+    # 迁移次数受 max_moves 限制
+    assert len(ring.plan_rebalance(assignments, max_moves=25)) == 25
+
+
+def test_rebalance_after_removing_interface_moves_only_its_peers():
+    current, loads = _place_all(PlacementRing([1, 2, 3, 4]))
+    assignments = [(peer_id, f"peer-{peer_id}", server) for peer_id, server in current.items()]
+    ring = PlacementRing([1, 2, 3])
+
+    moves = ring.plan_rebalance(assignments, max_moves=PEERS)
+    orphaned = [move for move in moves if move.source == 4]
+    assert len(orphaned) == loads[4]
+    assert len(moves) - len(orphaned) <= PEERS * 0.02
+    # 被移除接口上的节点优先迁移，即使 max_moves 不足以完成全部迁移
+    limited = ring.plan_rebalance(assignments, max_moves=loads[4])
+    assert all(move.source == 4 for move in limited)
+
+    after, after_loads = _apply(current, moves)
+    assert 4 not in after_loads
+    assert max(after_loads.values()) <= ring.limit(PEERS)
+    # 再次规划时已收敛，不再迁移
+    settled = [(peer_id, f"peer-{peer_id}", server) for peer_id, server in after.items()]
+    assert len(ring.plan_rebalance(settled, max_moves=PEERS)) <= PEERS * 0.02
@@ -0,0 +1,36 @@
+"""
+QR码缓存：单飞渲染，发起请求被取消时其他等待者仍拿到结果
+"""
+import asyncio
+import threading
+
+import pytest
+
+from app.services import wireguard_qr
+from app.services.wireguard_qr import QRCodeCache
+
+
+async def test_cancelled_leader_does_not_fail_waiters(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def render(config_content, fmt):
+        calls.append(fmt)
+        release.wait(5)
+        return b"png"
+
+    monkeypatch.setattr(wireguard_qr, "render_qr_image", render)
+    cache = QRCodeCache()
+    leader = asyncio.create_task(cache.get("[Interface]"))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(cache.get("[Interface]"))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    release.set()
+    assert await waiter == b"png"
+    assert calls == ["png"]
+    assert cache.peek("[Interface]") == b"png"
+    assert not cache._inflight
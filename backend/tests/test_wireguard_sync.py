@@ -0,0 +1,67 @@
+"""
+WireGuard 对等节点同步与配置文件写入
+"""
+from app.schemas.wireguard import WireGuardClientCreate, WireGuardServerCreate
+from app.services.wireguard_service import WireGuardService, _load_interface
+from app.services.wireguard_sync import PeerReconciler, PeerSpec, StubPeerBackend, peer_reconciler
+
+HEADER = "[Interface]\nPrivateKey = test\n"
+
+
+def _peer(key: str, ip: str) -> PeerSpec:
+    return PeerSpec(public_key=key, allowed_ips=(ip,), persistent_keepalive=25)
+
+
+async def test_flush_after_restart_renders_from_loader(tmp_path):
+    """重启后没有调用过 configure，单节点变更也按 loader 读到的完整状态写入配置文件"""
+    path = tmp_path / "wg0.conf"
+    peers = [_peer("A=", "10.0.0.2/32"), _peer("B=", "10.0.0.3/32")]
+
+    async def loader(interface):
+        return HEADER, str(path), peers
+
+    reconciler = PeerReconciler(StubPeerBackend(), flush_delay=0, loader=loader)
+    assert await reconciler.upsert("wg0", peers[1])
+    await reconciler.flush_all()
+
+    content = path.read_text()
+    assert content.startswith(HEADER)
+    assert "PublicKey = A=" in content and "PublicKey = B=" in content
+
+
+async def test_upsert_and_remove_ignore_stale_snapshot():
+    """其他 worker 的变更不在本进程快照中，密钥轮换和删除仍要下发"""
+    backend = StubPeerBackend()
+    reconciler = PeerReconciler(backend, flush_delay=0)
+    await reconciler.sync("wg0", [])
+    backend.interfaces["wg0"] = {"OLD=": _peer("OLD=", "10.0.0.2/32")}  # 另一个 worker 添加的节点
+
+    assert await reconciler.upsert("wg0", _peer("NEW=", "10.0.0.2/32"), replaces="OLD=")
+    assert set(backend.interfaces["wg0"]) == {"NEW="}
+
+    backend.interfaces["wg0"]["GONE="] = _peer("GONE=", "10.0.0.9/32")
+    assert await reconciler.remove("wg0", "GONE=")
+    assert "GONE=" not in backend.interfaces["wg0"]
+
+
+async def test_get_config_does_not_touch_interface(db, monkeypatch):
+    backend = StubPeerBackend()
+    monkeypatch.setattr(peer_reconciler, "backend", backend)
+    async with db() as session:
+        service = WireGuardService(session)
+        server = await service.create_server(WireGuardServerCreate(
+            name="wg-sync", interface="wgsync0", listen_port=51821,
+            ipv4_address="10.9.0.1/24", ipv6_address="fd00:9::1/64",
+        ))
+        client = await service.create_client(WireGuardClientCreate(
+            server_id=server.id, name="carol", allowed_ips=["0.0.0.0/0"],
+        ))
+        calls = len(backend.calls)
+
+        config = await service.get_config(server.id)
+        assert f"PublicKey = {client.public_key}" in config.server_config
+        assert len(backend.calls) == calls
+
+    header, config_path, peers = await _load_interface("wgsync0")
+    assert header.startswith("[Interface]") and config_path.endswith("wgsync0.conf")
+    assert [peer.public_key for peer in peers] == [client.public_key]
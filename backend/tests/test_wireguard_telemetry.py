@@ -0,0 +1,93 @@
+"""
+WireGuard 对等节点遥测
+"""
+import base64
+import random
+
+from sqlalchemy import select
+
+from app.core.leader import LeaderLock
+from app.models import WireGuardClient
+from app.schemas.wireguard import WireGuardClientCreate, WireGuardServerCreate
+from app.services.wireguard_service import WireGuardService
+from app.services.wireguard_sync import StubPeerBackend, peer_reconciler
+from app.services.wireguard_telemetry import PeerTelemetryCollector, PeerTelemetryRing, parse_wg_show_all_dump
+
+
+def _render_dump(peers) -> str:
+    """按 `wg show all dump` 格式输出（接口行5个字段，对等节点行9个字段）"""
+    lines = ["wg0\tprivate=\tpublic=\t51820\toff"]
+    for key, handshake, rx, tx in peers:
+        lines.append(f"wg0\t{key}\t(none)\t198.51.100.1:51820\t10.0.0.2/32\t{handshake}\t{rx}\t{tx}\t25")
+    return "\n".join(lines) + "\n"
+
+
+def test_ring_deltas_match_counters():
+    rng = random.Random(7)
+    peers = [[base64.b64encode(rng.getrandbits(256).to_bytes(32, "big")).decode(), 0,
+              rng.randrange(1 << 30), rng.randrange(1 << 30)] for _ in range(500)]
+    ring = PeerTelemetryRing(capacity=4)
+    assert ring.record(0.0, parse_wg_show_all_dump(_render_dump(peers))) == []  # 首个周期只建立基线
+
+    for cycle in range(1, 10):
+        expected = {}
+        for peer in peers:
+            if rng.random() < 0.3:
+                rx, tx = rng.randrange(1, 1 << 20), rng.randrange(1 << 20)
+                peer[1], peer[2], peer[3] = cycle, peer[2] + rx, peer[3] + tx
+                expected[peer[0]] = (rx, tx)
+        changes = ring.record(float(cycle), parse_wg_show_all_dump(_render_dump(peers)))
+        assert {c.public_key: (c.rx_delta, c.tx_delta) for c in changes} == expected
+
+    key = peers[0][0]
+    assert len(ring.history(key)) == 4
+    # 接口重建后计数器归零，本周期增量即为当前计数
+    peers[0][2] = 100
+    [change] = [c for c in ring.record(10.0, parse_wg_show_all_dump(_render_dump(peers))) if c.public_key == key]
+    assert change.rx_delta == 100
+
+    # 连续 capacity 个周期未出现的节点释放槽位
+    for cycle in range(11, 15):
+        ring.record(float(cycle), parse_wg_show_all_dump(_render_dump(peers[1:])))
+    assert ring.latest(key) is None and len(ring) == len(peers) - 1
+
+
+async def test_only_writer_persists_deltas(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(peer_reconciler, "backend", StubPeerBackend())
+    async with db() as session:
+        service = WireGuardService(session)
+        server = await service.create_server(WireGuardServerCreate(
+            name="wg-telemetry", interface="wgtel0", listen_port=51822,
+            ipv4_address="10.7.0.1/24", ipv6_address="fd00:7::1/64",
+        ))
+        client = await service.create_client(WireGuardClientCreate(server_id=server.id, name="dave"))
+
+    dumps = iter([
+        _render_dump([(client.public_key, 1_700_000_000, 1000, 2000)]),
+        _render_dump([(client.public_key, 1_700_000_010, 1500, 2600)]),
+    ])
+    workers = []
+    for _ in range(4):
+        collector = PeerTelemetryCollector()
+        collector._leader = LeaderLock("wireguard-telemetry", lock_dir=str(tmp_path))
+        workers.append(collector)
+
+    for _ in range(2):
+        output = next(dumps)
+
+        async def dump(output=output):
+            return output
+
+        for collector in workers:
+            collector._dump = dump
+            await collector.collect_once()
+
+    assert [collector.is_writer for collector in workers] == [True, False, False, False]
+    async with db() as session:
+        stored = (await session.execute(select(WireGuardClient).where(WireGuardClient.id == client.id))).scalar_one()
+    assert (stored.bytes_received, stored.bytes_sent) == (500, 600)
+    assert stored.last_handshake is not None
+
+    for collector in workers:
+        await collector.stop()
+    assert not any(collector.is_writer for collector in workers)